@@ -5,8 +5,18 @@ from datetime import datetime, timedelta
 from fastapi import APIRouter, Depends, HTTPException, status
 
 from app.api.auth.jwt import get_current_active_user
+from app.core.executor import cpu_executor
+from app.core.metrics import metrics
 from app.models.user import User, UserRole
 from app.models.ride import Ride, RideStatus
+from app.services.dispatch.queue import dispatch_queue
+from app.services.ride_matching.fare_cache import fare_cache
+from app.services.ride_matching.matching import candidate_cache, lookahead_planner, offer_engine
+from app.services.ride_matching.pooling import pool_planner
+from app.services.ride_matching.rematch import rematch_candidates
+from app.services.ride_matching.reservations import driver_reservations
+from app.services.ride_matching.surge import surge_engine
+from app.services.routing.matrix import travel_time_matrix
 
 router = APIRouter()
 
@@ -198,4 +208,27 @@ async def get_demand_forecast(
     return {
         "hourly_forecast": hourly_forecast,
         "area_forecast": area_forecast,
-    } 
\ No newline at end of file
+    } 
+
+
+@router.get("/metrics", response_model=Dict[str, Any])
+async def get_service_metrics(
+    _: User = Depends(get_current_admin_user),
+) -> Any:
+    """
+    Get in-process service metrics such as cache hit rates (admin only).
+    """
+    return {
+        "fare_cache": fare_cache.stats(),
+        "eta_matrix_cache": travel_time_matrix.stats(),
+        "surge": surge_engine.stats(),
+        "cpu_executor": cpu_executor.stats(),
+        "dispatch": await dispatch_queue.stats(),
+        "candidate_cache": candidate_cache.stats(),
+        "offers": offer_engine.stats(),
+        "rematch": rematch_candidates.stats(),
+        "lookahead": lookahead_planner.stats(),
+        "pooling": pool_planner.stats(),
+        "driver_reservations": driver_reservations.stats(),
+        "histograms": metrics.snapshot(),
+    }
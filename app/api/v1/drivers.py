@@ -1,12 +1,23 @@
+import time
+from datetime import datetime
 from typing import Any, List
 
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, Depends, HTTPException, Request, status
 
 from app.api.auth.jwt import get_current_active_user
 from app.models.user import User, UserRole
 from app.models.ride import Ride, RideStatus
 from app.schemas.user import User as UserSchema
-from app.schemas.ride import Ride as RideSchema
+from app.schemas.location import LocationBatchResult
+from app.schemas.ride import Ride as RideSchema, RideOffer
+from app.services.location.store import location_store
+from app.services.location.telemetry import UnsupportedEncoding, decode_telemetry
+from app.services.location.tracks import track_store
+from app.services.ride_matching.driver_stats import driver_stats
+from app.services.ride_matching.matching import offer_engine
+from app.services.ride_matching.offers import OfferError
+from app.services.ride_matching.surge import surge_engine
+from app.services.tracking.hub import tracking_hub
 
 router = APIRouter()
 
@@ -97,6 +108,14 @@ async def update_driver_status(
     current_user.is_active = is_active
     await current_user.save()
     
+    # Offline drivers must not be offered rides
+    if is_active:
+        driver_stats.mark_idle(current_user.id)
+    else:
+        await location_store.remove(current_user.id)
+        driver_stats.mark_busy(current_user.id)
+        surge_engine.remove_driver(current_user.id)
+    
     return current_user
 
 
@@ -108,7 +127,8 @@ async def update_driver_location(
 ) -> None:
     """
     Update driver's current location.
-    In a real app, this would be stored in a real-time database or cache.
+    Pings are coalesced in memory and flushed in batches to the location
+    store backend and the geo index used by matching.
     """
     # Check if user is a driver
     if current_user.role != UserRole.DRIVER:
@@ -117,23 +137,92 @@ async def update_driver_location(
             detail="User is not a driver",
         )
     
-    # In a real application, you would store the driver's location
-    # in a real-time database or cache like Redis
-    # For demonstration purposes, we'll just return a success status
+    now = time.time()
+    location_store.record(current_user.id, latitude, longitude, now)
+    track_store.record_driver_point(current_user.id, latitude, longitude, now)
+    tracking_hub.publish_location(current_user.id, latitude, longitude, now)
     
-    # Example code for a real implementation:
-    # await redis.hset(
-    #     f"driver:location:{current_user.id}",
-    #     mapping={
-    #         "latitude": latitude,
-    #         "longitude": longitude,
-    #         "updated_at": datetime.utcnow().timestamp()
-    #     }
-    # )
+    # Only drivers without an active ride count as surge supply
+    if not track_store.rides_for_driver(current_user.id):
+        surge_engine.record_driver(current_user.id, latitude, longitude, now)
+    else:
+        surge_engine.remove_driver(current_user.id)
     
     return None
 
 
+@router.post("/me/locations", response_model=LocationBatchResult)
+async def upload_driver_locations(
+    request: Request,
+    current_user: User = Depends(get_current_active_user),
+) -> Any:
+    """
+    Upload a batch of timestamped GPS points in one request.
+    
+    The body is JSON or msgpack (`application/msgpack`) holding either a
+    "points" list of {latitude, longitude, timestamp} objects, parallel
+    "latitudes"/"longitudes"/"timestamps" arrays, or the same arrays
+    delta-encoded (micro-degrees and milliseconds) with "encoding": "delta".
+    The newest point becomes the driver's position and the whole batch is
+    appended to the GPS track of the driver's active ride.
+    """
+    # Check if user is a driver
+    if current_user.role != UserRole.DRIVER:
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="User is not a driver",
+        )
+    
+    try:
+        batch = decode_telemetry(await request.body(), request.headers.get("content-type"))
+    except UnsupportedEncoding as e:
+        raise HTTPException(
+            status_code=status.HTTP_415_UNSUPPORTED_MEDIA_TYPE,
+            detail=str(e),
+        )
+    except ValueError as e:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=str(e),
+        )
+    
+    if batch.size == 0:
+        return LocationBatchResult(accepted_points=0)
+    
+    latitude, longitude, timestamp = batch.latest()
+    location_store.record(current_user.id, float(latitude), float(longitude), float(timestamp))
+    tracking_hub.publish_location(current_user.id, float(latitude), float(longitude), float(timestamp))
+    
+    ride_ids = track_store.rides_for_driver(current_user.id)
+    if not ride_ids and not track_store.known_free(current_user.id):
+        # Not linked in this process yet (e.g. after a restart); idle
+        # drivers are remembered so their next uploads skip the query
+        ride_ids = sorted(await Ride.filter(
+            driver_id=current_user.id,
+            status__in=[RideStatus.ACCEPTED, RideStatus.ARRIVED, RideStatus.IN_PROGRESS],
+        ).values_list("id", flat=True))
+        for ride_id in ride_ids:
+            track_store.begin(ride_id, current_user.id)
+        if not ride_ids:
+            track_store.mark_free(current_user.id)
+    
+    # A pooled driver's points belong to every rider on board
+    for ride_id in ride_ids:
+        track_store.append(ride_id, batch.latitudes, batch.longitudes, batch.timestamps)
+    if ride_ids:
+        surge_engine.remove_driver(current_user.id)
+    else:
+        # Counted as of now, like single pings: surge expires its entries
+        # oldest first and relies on them arriving in time order
+        surge_engine.record_driver(current_user.id, float(latitude), float(longitude))
+    
+    return LocationBatchResult(
+        accepted_points=batch.size,
+        ride_id=ride_ids[0] if ride_ids else None,
+        ride_ids=ride_ids,
+    )
+
+
 @router.get("/me/rides/current", response_model=RideSchema)
 async def get_current_ride(
     current_user: User = Depends(get_current_active_user),
@@ -164,4 +253,90 @@ async def get_current_ride(
             detail="No active ride found",
         )
     
-    return active_ride 
\ No newline at end of file
+    return active_ride
+
+
+@router.get("/me/offer", response_model=RideOffer)
+async def get_ride_offer(
+    current_user: User = Depends(get_current_active_user),
+) -> Any:
+    """
+    Get the ride currently offered to the driver, if any.
+    """
+    # Check if user is a driver
+    if current_user.role != UserRole.DRIVER:
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="User is not a driver",
+        )
+    
+    offer = offer_engine.offer_for_driver(current_user.id)
+    ride = await Ride.filter(id=offer.ride_id).first() if offer else None
+    if not ride:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="No open offer",
+        )
+    
+    return RideOffer(
+        offer_id=offer.id,
+        ride_id=ride.id,
+        expires_at=datetime.utcfromtimestamp(offer.expires_at),
+        pickup_latitude=ride.pickup_latitude,
+        pickup_longitude=ride.pickup_longitude,
+        pickup_address=ride.pickup_address,
+        destination_latitude=ride.destination_latitude,
+        destination_longitude=ride.destination_longitude,
+        destination_address=ride.destination_address,
+    )
+
+
+@router.post("/me/offer/{offer_id}/accept", response_model=RideSchema)
+async def accept_ride_offer(
+    offer_id: int,
+    current_user: User = Depends(get_current_active_user),
+) -> Any:
+    """
+    Accept a ride offer. Fails with 409 if it expired or another driver
+    took the ride first.
+    """
+    # Check if user is a driver
+    if current_user.role != UserRole.DRIVER:
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="User is not a driver",
+        )
+    
+    try:
+        offer = await offer_engine.respond(offer_id, current_user.id, accepted=True)
+    except OfferError as exc:
+        raise HTTPException(
+            status_code=status.HTTP_409_CONFLICT,
+            detail=str(exc),
+        )
+    
+    return await Ride.get(id=offer.ride_id)
+
+
+@router.post("/me/offer/{offer_id}/decline", status_code=status.HTTP_204_NO_CONTENT)
+async def decline_ride_offer(
+    offer_id: int,
+    current_user: User = Depends(get_current_active_user),
+) -> None:
+    """
+    Decline a ride offer; it moves on to the next driver.
+    """
+    # Check if user is a driver
+    if current_user.role != UserRole.DRIVER:
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="User is not a driver",
+        )
+    
+    try:
+        await offer_engine.respond(offer_id, current_user.id, accepted=False)
+    except OfferError as exc:
+        raise HTTPException(
+            status_code=status.HTTP_409_CONFLICT,
+            detail=str(exc),
+        )
@@ -1,18 +1,35 @@
 from typing import Any, List, Optional
 from datetime import datetime
 
-from fastapi import APIRouter, BackgroundTasks, Depends, HTTPException, status, WebSocket, WebSocketDisconnect
-from fastapi.encoders import jsonable_encoder
+from fastapi import APIRouter, Depends, HTTPException, status, WebSocket
 
 from app.api.auth.jwt import get_current_active_user
+from app.core.config import settings
 from app.models.user import User, UserRole
 from app.models.ride import Ride, RideStatus
-from app.schemas.ride import RideCreate, RideUpdate, Ride as RideSchema, RideEstimate, RideRequest, RideTracking
-from app.services.ride_matching.matching import match_ride_with_driver
-from app.services.ride_matching.fare_estimator import estimate_fare
+from app.schemas.ride import (
+    RideCreate, RideUpdate, Ride as RideSchema, RideEstimate, RideEstimateBatch, RideEstimateBatchRequest, RideRequest
+)
+from app.services.dispatch.queue import KIND_MATCH, KIND_REMATCH, KIND_SOS, dispatch_queue
+from app.services.location.tracks import track_store
+from app.services.ride_matching.matching import (
+    hand_over_chained_ride,
+    lookahead_planner,
+    offer_engine,
+    release_driver,
+    rematch_ride,
+    track_ride_in_progress,
+)
+from app.services.ride_matching.rematch import rematch_candidates
+from app.services.ride_matching.surge import surge_engine
+from app.services.tracking.hub import tracking_hub
+from app.services.ride_matching.fare_estimator import estimate_fares_batch, quote_fare
 
 router = APIRouter()
 
+# Rides not yet completed or cancelled
+CANCELLABLE_STATUSES = [RideStatus.REQUESTED, RideStatus.ACCEPTED, RideStatus.ARRIVED, RideStatus.IN_PROGRESS]
+
 
 @router.post("/request", response_model=RideEstimate)
 async def request_ride_estimate(
@@ -30,22 +47,47 @@ async def request_ride_estimate(
             detail="Only riders can request rides",
         )
     
-    # Calculate estimate using AI model
-    estimate = await estimate_fare(
+    # Calculate estimate using AI model; quotes are cached per trip cell pair
+    estimate = await quote_fare(
         pickup_latitude=ride_in.pickup_latitude,
         pickup_longitude=ride_in.pickup_longitude,
         destination_latitude=ride_in.destination_latitude,
         destination_longitude=ride_in.destination_longitude,
+        rider_id=current_user.id,
     )
     
     return estimate
 
 
+@router.post("/estimate/batch", response_model=RideEstimateBatch)
+async def request_ride_estimates(
+    *,
+    batch_in: RideEstimateBatchRequest,
+    current_user: User = Depends(get_current_active_user),
+) -> Any:
+    """
+    Estimate several pickup/destination pairs in one call.
+    """
+    if current_user.role != UserRole.RIDER:
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="Only riders can request rides",
+        )
+
+    if len(batch_in.trips) > settings.FARE_ESTIMATE_MAX_BATCH:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"At most {settings.FARE_ESTIMATE_MAX_BATCH} trips per batch",
+        )
+
+    estimates = await estimate_fares_batch(batch_in.trips, precise=batch_in.precise)
+    return RideEstimateBatch(estimates=estimates)
+
+
 @router.post("/", response_model=RideSchema)
 async def create_ride(
     *,
     ride_in: RideCreate,
-    background_tasks: BackgroundTasks,
     current_user: User = Depends(get_current_active_user),
 ) -> Any:
     """
@@ -75,28 +117,36 @@ async def create_ride(
             detail="You already have an active ride",
         )
     
-    # Calculate estimate using AI model
-    estimate = await estimate_fare(
+    # Reuse the quote the rider was shown for this trip, if still cached
+    estimate = await quote_fare(
         pickup_latitude=ride_in.pickup_latitude,
         pickup_longitude=ride_in.pickup_longitude,
         destination_latitude=ride_in.destination_latitude,
         destination_longitude=ride_in.destination_longitude,
+        rider_id=current_user.id,
+        honour_previous_epoch=True,
     )
     
-    # Create ride object
+    # Create ride object; only pooled rides carry a detour tolerance
     ride_data = ride_in.dict()
+    if not ride_in.pooled:
+        ride_data["max_detour_minutes"] = None
+    elif ride_in.max_detour_minutes is not None and ride_in.max_detour_minutes <= 0:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="max_detour_minutes must be positive",
+        )
     ride_obj = Ride(**ride_data)
     ride_obj.rider = current_user
     ride_obj.estimated_fare = estimate.estimated_fare
     ride_obj.estimated_duration_minutes = estimate.estimated_duration_minutes
     ride_obj.estimated_distance_km = estimate.estimated_distance_km
     await ride_obj.save()
+    surge_engine.record_request(ride_obj.id, ride_obj.pickup_latitude, ride_obj.pickup_longitude)
     
-    # Start the driver matching process in the background
-    background_tasks.add_task(
-        match_ride_with_driver,
-        ride_id=ride_obj.id
-    )
+    # Start the driver matching process through the durable dispatch queue;
+    # it survives restarts and is retried until a driver is found
+    await dispatch_queue.enqueue(KIND_MATCH, ride_obj)
     
     return ride_obj
 
@@ -186,19 +236,67 @@ async def update_ride_status(
         )
     
     # Validate status transitions
+    backed_out = False
+    previous_driver_id = ride.driver_id
     if ride_in.status and ride_in.status != ride.status:
         # Here you would implement logic to validate status transitions
         # For example: a ride can only go from REQUESTED to ACCEPTED or CANCELLED
         # For simplicity, we'll accept any transition for now
-        ride.status = ride_in.status
+        backed_out = (
+            ride_in.status == RideStatus.REQUESTED
+            and ride.status in [RideStatus.ACCEPTED, RideStatus.ARRIVED]
+            and previous_driver_id is not None
+        )
+        changes = {"status": ride_in.status}
+        if backed_out:
+            changes["driver_id"] = None
         
         # Update timestamps based on status
         if ride_in.status == RideStatus.IN_PROGRESS and not ride.started_at:
-            ride.started_at = datetime.utcnow()
+            changes["started_at"] = datetime.utcnow()
         elif ride_in.status == RideStatus.COMPLETED and not ride.completed_at:
-            ride.completed_at = datetime.utcnow()
+            changes["completed_at"] = datetime.utcnow()
+        
+        # Only if the ride is still as loaded: matchers assign rides
+        # concurrently, and saving this copy would overwrite their change
+        updated = await Ride.filter(id=ride.id, status=ride.status, driver_id=previous_driver_id).update(**changes)
+        if not updated:
+            raise HTTPException(
+                status_code=status.HTTP_409_CONFLICT,
+                detail="Ride changed meanwhile, reload it and retry",
+            )
+        ride = await Ride.get(id=ride.id)
+        if ride_in.status != RideStatus.REQUESTED:
+            surge_engine.close_request(ride.id)
+            offer_engine.cancel(ride.id)
+            lookahead_planner.drop(ride.id)
+        
+        # The driver backed out before pickup: free them and find another
+        if backed_out:
+            await track_store.finish(ride.id)
+            release_driver(ride, previous_driver_id)
+        
+        # Persist the GPS track and free the driver once the ride is over
+        if ride_in.status in [RideStatus.COMPLETED, RideStatus.CANCELLED]:
+            track = await track_store.finish(ride.id)
+            if track is not None and ride_in.status == RideStatus.COMPLETED and ride.distance_km is None:
+                ride.distance_km = round(track.distance_km(), 2)
+                await Ride.filter(id=ride.id).update(distance_km=ride.distance_km)
+            rematch_candidates.forget(ride.id)
+            if ride.driver_id:
+                release_driver(ride, ride.driver_id)
     
-    await ride.save()
+    tracking_hub.publish_ride(ride)
+    if ride.status == RideStatus.IN_PROGRESS:
+        track_ride_in_progress(ride)
+    elif ride.status in [RideStatus.COMPLETED, RideStatus.CANCELLED] and ride.driver_id:
+        await hand_over_chained_ride(ride.driver_id)
+    if backed_out:
+        surge_engine.record_request(ride.id, ride.pickup_latitude, ride.pickup_longitude)
+        # The next candidates from the original match first, a full match
+        # through the dispatch queue when none of them can take it
+        if not await rematch_ride(ride, {previous_driver_id}):
+            await dispatch_queue.enqueue(KIND_REMATCH, ride)
     return ride
 
 
@@ -229,10 +327,8 @@ async def trigger_sos(
     ride.sos_triggered = True
     await ride.save()
     
-    # In a real application, you would also:
-    # 1. Send notifications to emergency contacts
-    # 2. Alert administrators
-    # 3. Potentially contact emergency services
+    # Escalation runs in the dispatch queue's highest priority lane
+    await dispatch_queue.enqueue(KIND_SOS, ride)
     
     return ride
 
@@ -260,16 +356,27 @@ async def cancel_ride(
             detail="Only the rider or admin can cancel a ride",
         )
     
-    # Check if ride can be cancelled (not already completed or cancelled)
-    if ride.status in [RideStatus.COMPLETED, RideStatus.CANCELLED]:
+    # Check if ride can be cancelled (not already completed or cancelled).
+    # Conditional, as a matcher may assign it meanwhile; the ride is then
+    # re-read for the driver it actually has
+    updated = await Ride.filter(id=ride.id, status__in=CANCELLABLE_STATUSES).update(status=RideStatus.CANCELLED)
+    ride = await Ride.get(id=ride.id)
+    if not updated:
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail=f"Cannot cancel a ride that is already {ride.status}",
         )
     
-    # Update ride status
-    ride.status = RideStatus.CANCELLED
-    await ride.save()
+    surge_engine.close_request(ride.id)
+    offer_engine.cancel(ride.id)
+    lookahead_planner.drop(ride.id)
+    tracking_hub.publish_ride(ride)
+    
+    # The driver is available again right away
+    await track_store.finish(ride.id)
+    rematch_candidates.forget(ride.id)
+    if ride.driver_id and release_driver(ride, ride.driver_id):
+        await hand_over_chained_ride(ride.driver_id)
     
     return ride
 
@@ -278,39 +385,18 @@ async def cancel_ride(
 async def track_ride(websocket: WebSocket, ride_id: int):
     """
     WebSocket endpoint for real-time ride tracking.
+    
+    Every location update from the ride's driver and every status change is
+    pushed as a RideTracking frame. The server sends {"heartbeat": ts}
+    frames when idle; clients must send a message (any text) at least every
+    TRACKING_IDLE_TIMEOUT_SECONDS or they are disconnected.
     """
     await websocket.accept()
-    try:
-        # In a real application, you would:
-        # 1. Authenticate the WebSocket connection
-        # 2. Verify the user has access to this ride
-        # 3. Subscribe to location updates from the driver
-        # 4. Send real-time updates to the client
-        
-        # For demonstration, we'll simulate location updates
-        ride = await Ride.filter(id=ride_id).first()
-        if not ride:
-            await websocket.close(code=status.WS_1008_POLICY_VIOLATION)
-            return
-        
-        # Example of sending tracking data
-        tracking_data = RideTracking(
-            ride_id=ride.id,
-            current_latitude=ride.pickup_latitude,  # In a real app, this would be the driver's current location
-            current_longitude=ride.pickup_longitude,
-            estimated_arrival_minutes=5,  # This would be calculated in real-time
-            status=ride.status
-        )
-        
-        await websocket.send_json(jsonable_encoder(tracking_data))
-        
-        # Keep the connection open for a while
-        # In a real app, you'd continue sending updates
-        while True:
-            # Wait for messages (could be used for client interaction)
-            data = await websocket.receive_text()
-            # Process client messages if needed
-            
-    except WebSocketDisconnect:
-        # Handle disconnection
-        pass 
\ No newline at end of file
+    
+    ride = await Ride.filter(id=ride_id).first()
+    if not ride:
+        await websocket.close(code=status.WS_1008_POLICY_VIOLATION)
+        return
+    
+    subscriber = tracking_hub.subscribe(websocket, ride)
+    await tracking_hub.serve(subscriber)
@@ -33,6 +33,79 @@ class Settings(BaseSettings):
     REDIS_HOST: str = "localhost"
     REDIS_PORT: int = 6379
     
+    # Driver location ingest: "memory" (single worker) or "redis" (shared)
+    LOCATION_BACKEND: str = "memory"
+    LOCATION_FLUSH_INTERVAL_SECONDS: float = 0.5
+    # Each sync re-reads this much of the previous window, covering writes
+    # still in flight and clock skew between workers
+    LOCATION_SYNC_OVERLAP_SECONDS: float = 2.0
+    # Drivers without a ping for this long drop out of matching
+    LOCATION_TTL_SECONDS: float = 30.0
+    TELEMETRY_MAX_POINTS_PER_BATCH: int = 1000
+    TELEMETRY_MAX_CLOCK_SKEW_SECONDS: float = 60.0
+    # Older points are rejected: a phone offline for longer has nothing
+    # worth tracking, and track deltas are stored as int32 milliseconds
+    TELEMETRY_MAX_POINT_AGE_SECONDS: float = 3600.0
+    # Completed ride GPS tracks; compressed files cannot be memory-mapped
+    TRACK_STORAGE_DIR: str = "data/tracks"
+    TRACK_STORAGE_COMPRESS: bool = False
+    # How long a driver found without an active ride skips the database
+    # lookup on batch uploads (rides assigned in this worker clear it)
+    TRACK_FREE_DRIVER_TTL_SECONDS: float = 30.0
+    TRACK_FREE_DRIVER_MAX_ENTRIES: int = 100000
+    
+    # Live ride tracking sockets
+    TRACKING_MAX_QUEUE: int = 16
+    TRACKING_HEARTBEAT_SECONDS: float = 15.0
+    # Sockets that send nothing (not even a heartbeat reply) for this long are closed
+    TRACKING_IDLE_TIMEOUT_SECONDS: float = 60.0
+    # Live ETA: speed prior, smoothing and recompute/publish thresholds
+    ETA_DEFAULT_SPEED_KMH: float = 25.0
+    ETA_MIN_SPEED_KMH: float = 5.0
+    ETA_SPEED_SMOOTHING: float = 0.2
+    ETA_MIN_MOVE_METERS: float = 25.0
+    ETA_MIN_CHANGE_MINUTES: int = 1
+    ETA_MAX_SILENCE_SECONDS: float = 60.0
+    ETA_REMEASURE_SECONDS: float = 30.0
+    
+    # Road routing over a local OSM-derived graph (.npz, see routing/graph.py);
+    # without one, distances and ETAs fall back to straight-line estimates
+    ROUTING_GRAPH_PATH: str = "data/roads.npz"
+    ROUTING_LANDMARKS: int = 8
+    # Points farther than this from the nearest road node are not routed
+    ROUTING_MAX_SNAP_KM: float = 0.5
+    ROUTING_ACCESS_SPEED_KMH: float = 15.0
+    ROUTING_SEARCH_LIMIT_SECONDS: float = 3600.0
+    # Driver-to-pickup travel times are cached per (origin cell, destination cell)
+    ETA_MATRIX_CELL_SIZE_KM: float = 0.25
+    ETA_MATRIX_CACHE_TTL_SECONDS: float = 300.0
+    ETA_MATRIX_CACHE_MAX_ENTRIES: int = 200000
+    ETA_MATRIX_WORKERS: int = 2
+    # Trip durations without a road route use historical median speeds per
+    # cell and hour of week, rebuilt from completed rides into a .npy table
+    SPEED_PROFILE_PATH: str = "data/speed_profiles.npy"
+    SPEED_PROFILE_CELL_SIZE_KM: float = 1.0
+    # Hour-of-week slots with fewer trips use the city-wide speed for that hour
+    SPEED_PROFILE_MIN_SAMPLES: int = 5
+    SPEED_PROFILE_HISTORY_DAYS: int = 56
+    SPEED_PROFILE_REBUILD_INTERVAL_SECONDS: float = 3600.0
+    SPEED_PROFILE_RELOAD_INTERVAL_SECONDS: float = 60.0
+    # Used until a table exists (2 minutes per km at average traffic)
+    SPEED_PROFILE_DEFAULT_KMH: float = 24.0
+    # A driver whose detour via their position exceeds the direct route by
+    # this factor (plus ROUTE_DEVIATION_SLACK_MINUTES) is off route
+    ROUTE_DEVIATION_FACTOR: float = 1.3
+    ROUTE_DEVIATION_SLACK_MINUTES: float = 2.0
+    
+    # CPU-bound service work (routing, geodesic distances, large candidate
+    # scoring) runs on a "thread" or "process" pool instead of the event
+    # loop; calls beyond workers + max queue are rejected with a 503
+    CPU_EXECUTOR_KIND: str = "thread"
+    CPU_EXECUTOR_WORKERS: int = 4
+    CPU_EXECUTOR_MAX_QUEUE: int = 256
+    # Smaller candidate sets are scored inline; the hop costs more than it saves
+    CPU_OFFLOAD_MIN_CANDIDATES: int = 256
+    
     # Google Maps / OpenStreetMap API Key
     MAPS_API_KEY: Optional[str] = None
     
@@ -44,6 +117,132 @@ class Settings(BaseSettings):
     RIDE_MATCHING_MODEL_PATH: str = "models/ride_matching_model.pkl"
     FARE_ESTIMATION_MODEL_PATH: str = "models/fare_estimation_model.pkl"
     FRAUD_DETECTION_MODEL_PATH: str = "models/fraud_detection_model.pkl"
+    # Model files are polled for changes and hot-swapped; replace them with
+    # an atomic rename so a half-written file is never picked up
+    MODEL_RELOAD_INTERVAL_SECONDS: float = 30.0
+    # Concurrent predictions are micro-batched: a batch is flushed when full
+    # or when its oldest row has waited ML_BATCH_MAX_WAIT_MS
+    ML_BATCH_MAX_SIZE: int = 64
+    ML_BATCH_MAX_WAIT_MS: float = 5.0
+    ML_BATCH_WORKERS: int = 2
+    # Upper bound on pickup/destination pairs per /rides/estimate/batch call
+    FARE_ESTIMATE_MAX_BATCH: int = 100
+    # Fare quotes are cached per (pickup cell, destination cell, surge epoch)
+    FARE_CACHE_CELL_SIZE_KM: float = 0.25
+    FARE_CACHE_TTL_SECONDS: float = 300.0
+    FARE_CACHE_MAX_ENTRIES: int = 50000
+    # Surge pricing from per-cell open requests vs. idle drivers seen within
+    # the window; factors are smoothed, capped and rounded to SURGE_STEP
+    SURGE_CELL_SIZE_KM: float = 1.0
+    SURGE_WINDOW_SECONDS: float = 300.0
+    SURGE_RECOMPUTE_SECONDS: float = 5.0
+    SURGE_SENSITIVITY: float = 0.5
+    SURGE_SMOOTHING: float = 0.3
+    SURGE_MAX_FACTOR: float = 2.0
+    SURGE_STEP: float = 0.1
+    
+    # Ride matching
+    DRIVER_INDEX_CELL_SIZE_KM: float = 0.5
+    MATCHING_MAX_DISTANCE_KM: float = 5.0
+    MATCHING_CANDIDATE_LIMIT: int = 5
+    # "greedy" matches each ride on its own, "batch" solves a min-cost
+    # assignment over all rides requested within MATCHING_WINDOW_SECONDS
+    MATCHING_MODE: str = "greedy"
+    MATCHING_WINDOW_SECONDS: float = 2.0
+    # Windows an unmatched ride stays in before the window drops it; the
+    # dispatch queue resubmits it with backoff until it is matched
+    MATCHING_WINDOW_MAX_ATTEMPTS: int = 3
+    # Greedy matching answers from precomputed lists of the idle drivers
+    # among the CANDIDATE_CACHE_TOP_K nearest to each active pickup cell,
+    # refreshed in the background when drivers nearby move or change state.
+    # A list older than the staleness bound (or not reaching far enough for
+    # a pickup) is not used; the request falls back to a live query
+    CANDIDATE_CACHE_ENABLED: bool = True
+    CANDIDATE_CACHE_CELL_SIZE_KM: float = 0.25
+    CANDIDATE_CACHE_TOP_K: int = 32
+    CANDIDATE_CACHE_MAX_STALENESS_SECONDS: float = 5.0
+    CANDIDATE_CACHE_REFRESH_SECONDS: float = 0.5
+    # Smaller moves of a driver do not invalidate the lists around them
+    CANDIDATE_CACHE_MIN_MOVE_METERS: float = 100.0
+    # Cells without a ride request for this long are no longer refreshed
+    CANDIDATE_CACHE_ACTIVE_SECONDS: float = 300.0
+    # Drivers are leased while being assigned so parallel matchers never
+    # double book them: "memory" (single worker) or "redis" (shared)
+    DRIVER_RESERVATION_BACKEND: str = "memory"
+    DRIVER_RESERVATION_LEASE_SECONDS: float = 5.0
+    # Greedy matching may chain a ride to a driver finishing another one
+    # within LOOKAHEAD_MAX_REMAINING_MINUTES when they would still reach the
+    # pickup LOOKAHEAD_MIN_GAIN_MINUTES sooner than the best free driver.
+    # Chains not handed over within the remaining time plus grace are
+    # matched again
+    LOOKAHEAD_ENABLED: bool = False
+    LOOKAHEAD_MAX_REMAINING_MINUTES: float = 5.0
+    LOOKAHEAD_MIN_GAIN_MINUTES: float = 2.0
+    LOOKAHEAD_GRACE_MINUTES: float = 3.0
+    # Pooled rides join a vehicle already carrying pooled riders when the
+    # insertion keeps every rider within their detour tolerance (minutes
+    # over their direct trip, requested per ride up to the maximum) and the
+    # new rider is picked up within POOL_MAX_WAIT_MINUTES
+    POOL_CAPACITY: int = 3
+    POOL_MAX_WAIT_MINUTES: float = 10.0
+    POOL_DEFAULT_MAX_DETOUR_MINUTES: float = 10.0
+    POOL_MAX_DETOUR_MINUTES: float = 20.0
+    # Nearest pooled vehicles evaluated per request
+    POOL_CANDIDATE_LIMIT: int = 50
+    # Greedy matches are offered to drivers, who accept or decline through
+    # /drivers/me/offer: "sequential" asks one driver at a time, "broadcast"
+    # the top OFFER_BROADCAST_SIZE at once (first to accept wins), "instant"
+    # assigns the best driver without asking. Offers live in the process
+    # that matched the ride and drivers must answer to that process, so
+    # run offers with a single API worker consuming dispatch jobs
+    OFFER_MODE: str = "sequential"
+    OFFER_TIMEOUT_SECONDS: float = 15.0
+    OFFER_BROADCAST_SIZE: int = 3
+    # Fetch more candidates in the background when fewer remain queued
+    OFFER_PREFETCH_REMAINING: int = 2
+    # A ride nobody accepted goes back to the dispatch queue after this delay
+    OFFER_RETRY_DELAY_SECONDS: float = 10.0
+    # The ranked candidates of each match are kept this long; a ride whose
+    # driver backs out goes straight to the next of them that is still
+    # available instead of through a new search
+    REMATCH_CACHE_ENABLED: bool = True
+    REMATCH_CANDIDATE_TTL_SECONDS: float = 120.0
+    REMATCH_CACHE_MAX_ENTRIES: int = 50000
+    
+    # Dispatch jobs (matching, re-matching, SOS) go through a durable queue:
+    # "memory" (single process), "sqlite" (processes on one machine) or
+    # "redis" (any machine). Jobs are partitioned by pickup region so
+    # dedicated workers (app/services/dispatch/worker.py) can own regions
+    DISPATCH_BROKER: str = "memory"
+    DISPATCH_SQLITE_PATH: str = "data/dispatch.db"
+    DISPATCH_PARTITIONS: int = 8
+    DISPATCH_REGION_SIZE_KM: float = 10.0
+    # API processes also consume every partition unless disabled
+    DISPATCH_API_WORKERS: bool = True
+    DISPATCH_WORKER_CONCURRENCY: int = 4
+    # A claimed job whose worker dies is retried after the lease expires
+    DISPATCH_LEASE_SECONDS: float = 60.0
+    DISPATCH_MAX_ATTEMPTS: int = 8
+    DISPATCH_RETRY_BASE_SECONDS: float = 2.0
+    DISPATCH_RETRY_MAX_SECONDS: float = 60.0
+    DISPATCH_POLL_SECONDS: float = 0.5
+    
+    # Sharded matching (app/services/sharding): regions of this size are
+    # spread over shard processes by consistent hashing. Keep it a multiple
+    # of DRIVER_INDEX_CELL_SIZE_KM and SURGE_CELL_SIZE_KM so no cell spans
+    # two shards
+    SHARD_REGION_SIZE_KM: float = 5.0
+    SHARD_VIRTUAL_NODES: int = 64
+    
+    # Driver ranking weights (higher score wins)
+    RANKING_WEIGHT_DISTANCE: float = 0.45
+    RANKING_WEIGHT_RATING: float = 0.25
+    RANKING_WEIGHT_ACCEPTANCE: float = 0.2
+    RANKING_WEIGHT_IDLE: float = 0.1
+    # Idle time beyond this no longer increases a driver's score
+    RANKING_IDLE_SATURATION_MINUTES: float = 30.0
+    DRIVER_DEFAULT_RATING: float = 4.5
+    DRIVER_DEFAULT_ACCEPTANCE_RATE: float = 0.8
     
     class Config:
         case_sensitive = True
@@ -0,0 +1,140 @@
+import asyncio
+import functools
+import importlib
+import time
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from typing import Any, Awaitable, Callable, Dict, Optional, Tuple, TypeVar
+
+from app.core.config import settings
+from app.core.metrics import metrics
+
+
+T = TypeVar("T")
+
+# Milliseconds
+EXECUTOR_BUCKETS = (0.1, 0.5, 1, 2, 5, 10, 25, 50, 100, 250, 1000)
+
+
+class ExecutorSaturated(Exception):
+    """
+    Raised instead of queueing when an executor's backlog is full.
+    """
+
+
+def _timed_call(fn: Callable[..., T], args: Tuple, kwargs: Dict[str, Any]) -> Tuple[float, float, T]:
+    # Wall-clock start so queue wait can be measured across processes
+    started = time.time()
+    result = fn(*args, **kwargs)
+    return started, time.time() - started, result
+
+
+def _call_cpu_bound(module: str, qualname: str, args: Tuple, kwargs: Dict[str, Any]) -> Any:
+    """
+    Run the undecorated body of a `cpu_bound` function. It is looked up by
+    name so it can also be sent to worker processes.
+    """
+    target: Any = importlib.import_module(module)
+    for part in qualname.split("."):
+        target = getattr(target, part)
+    return target.__wrapped__(*args, **kwargs)
+
+
+class CpuExecutor:
+    """
+    Bounded pool for CPU-bound service work, so it never runs on the event
+    loop.
+
+    `kind` is "thread" or "process". Threads share the process state
+    (geo index, road graph, models) and suit NumPy/SciPy work, which
+    releases the GIL. Processes sidestep the GIL for pure-Python work, but
+    only see state as it was when the pool forked, and arguments and
+    results must be picklable. At most `max_workers + max_queue` calls may
+    be pending; beyond that `run` raises ExecutorSaturated rather than
+    letting latency grow without bound. Queue wait and run time of every
+    call are recorded as histograms.
+    """
+
+    def __init__(
+        self,
+        name: str = "cpu",
+        kind: str = settings.CPU_EXECUTOR_KIND,
+        max_workers: int = settings.CPU_EXECUTOR_WORKERS,
+        max_queue: int = settings.CPU_EXECUTOR_MAX_QUEUE
+    ):
+        if kind not in ("thread", "process"):
+            raise ValueError(f"Unknown executor kind: {kind}")
+        self.name = name
+        self.kind = kind
+        self.max_workers = max_workers
+        self.max_pending = max_workers + max_queue
+        self.pending = 0
+        self.completed = 0
+        self.rejected = 0
+        self._executor: Optional[Executor] = None
+        self._queue_wait = metrics.histogram(f"executor.{name}.queue_wait_ms", EXECUTOR_BUCKETS)
+        self._run_time = metrics.histogram(f"executor.{name}.run_ms", EXECUTOR_BUCKETS)
+
+    def _ensure_executor(self) -> Executor:
+        if self._executor is None:
+            if self.kind == "process":
+                self._executor = ProcessPoolExecutor(max_workers=self.max_workers)
+            else:
+                self._executor = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix=self.name)
+        return self._executor
+
+    async def run(self, fn: Callable[..., T], *args: Any, **kwargs: Any) -> T:
+        """
+        Run `fn(*args, **kwargs)` on the pool and return its result.
+        """
+        if self.pending >= self.max_pending:
+            self.rejected += 1
+            raise ExecutorSaturated(f"{self.name} executor has {self.pending} calls pending")
+
+        self.pending += 1
+        submitted = time.time()
+        try:
+            loop = asyncio.get_running_loop()
+            started, run_seconds, result = await loop.run_in_executor(
+                self._ensure_executor(), _timed_call, fn, args, kwargs
+            )
+        finally:
+            self.pending -= 1
+        self.completed += 1
+        self._queue_wait.observe(max(0.0, started - submitted) * 1000)
+        self._run_time.observe(run_seconds * 1000)
+        return result
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "kind": self.kind,
+            "workers": self.max_workers,
+            "pending": self.pending,
+            "max_pending": self.max_pending,
+            "completed": self.completed,
+            "rejected": self.rejected,
+        }
+
+    def shutdown(self) -> None:
+        if self._executor is not None:
+            self._executor.shutdown(wait=False)
+            self._executor = None
+
+
+# Process-wide executor for CPU-bound service functions
+cpu_executor = CpuExecutor()
+
+
+def cpu_bound(fn: Callable[..., T]) -> Callable[..., Awaitable[T]]:
+    """
+    Turn a synchronous, CPU-heavy function into a coroutine function that
+    runs it on `cpu_executor`. The plain function stays available as
+    `__wrapped__` for callers already off the event loop.
+
+    Decorate module-level functions only, so process workers can import
+    them by name.
+    """
+    @functools.wraps(fn)
+    async def wrapper(*args: Any, **kwargs: Any) -> T:
+        return await cpu_executor.run(_call_cpu_bound, fn.__module__, fn.__qualname__, args, kwargs)
+
+    return wrapper
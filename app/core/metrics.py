@@ -0,0 +1,59 @@
+from bisect import bisect_left
+from typing import Any, Dict, Sequence, Tuple
+
+
+class Histogram:
+    """
+    Fixed-bucket histogram. Bucket bounds are inclusive upper limits; values
+    above the last bound land in an overflow bucket.
+    """
+
+    def __init__(self, buckets: Sequence[float]):
+        self.buckets: Tuple[float, ...] = tuple(sorted(buckets))
+        self.counts = [0] * (len(self.buckets) + 1)
+        self.count = 0
+        self.sum = 0.0
+
+    def observe(self, value: float) -> None:
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.count += 1
+        self.sum += value
+
+    def snapshot(self) -> Dict[str, Any]:
+        cumulative = {}
+        running = 0
+        for bound, count in zip(self.buckets, self.counts):
+            running += count
+            cumulative[str(bound)] = running
+        cumulative["+Inf"] = self.count
+        return {
+            "count": self.count,
+            "sum": self.sum,
+            "mean": self.sum / self.count if self.count else 0.0,
+            "buckets": cumulative,
+        }
+
+
+class MetricsRegistry:
+    """
+    Named in-process metrics, reported by the admin metrics endpoint.
+    """
+
+    def __init__(self):
+        self._histograms: Dict[str, Histogram] = {}
+
+    def histogram(self, name: str, buckets: Sequence[float]) -> Histogram:
+        """
+        Return the histogram called `name`, creating it on first use.
+        """
+        histogram = self._histograms.get(name)
+        if histogram is None:
+            histogram = self._histograms[name] = Histogram(buckets)
+        return histogram
+
+    def snapshot(self) -> Dict[str, Any]:
+        return {name: histogram.snapshot() for name, histogram in sorted(self._histograms.items())}
+
+
+# Process-wide metrics
+metrics = MetricsRegistry()
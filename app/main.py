@@ -1,12 +1,27 @@
-from fastapi import FastAPI
+from fastapi import FastAPI, Request, status
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import JSONResponse
 from fastapi.staticfiles import StaticFiles
 import uvicorn
 import logging
 
 from app.api.v1 import api_router
 from app.core.config import settings
+from app.core.executor import ExecutorSaturated, cpu_executor
 from app.db.init_db import init_db, close_db_connections
+from app.services.dispatch.handlers import register_handlers
+from app.services.dispatch.queue import dispatch_queue
+from app.services.location.store import location_store
+from app.services.ml.batcher import stop_batchers
+from app.services.ml.registry import model_registry
+from app.services.ride_matching.batch_matching import matching_window
+from app.services.ride_matching.matching import candidate_cache, lookahead_planner, offer_engine
+from app.services.ride_matching.pooling import pool_planner
+from app.services.ride_matching.reservations import driver_reservations
+from app.services.ride_matching.surge import surge_engine
+from app.services.routing.service import road_router
+from app.services.routing.speed_profiles import speed_profiles
+from app.services.tracking.hub import tracking_hub
 
 # Configure logging
 logging.basicConfig(
@@ -35,6 +50,19 @@ app.add_middleware(
 # Include API router
 app.include_router(api_router, prefix=settings.API_V1_STR)
 
+
+@app.exception_handler(ExecutorSaturated)
+async def executor_saturated_handler(request: Request, exc: ExecutorSaturated) -> JSONResponse:
+    """
+    Shed load when CPU-bound work is backed up instead of queueing it.
+    """
+    return JSONResponse(
+        status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+        content={"detail": "Server busy, please retry"},
+        headers={"Retry-After": "1"},
+    )
+
+
 # Mount static files
 app.mount("/static", StaticFiles(directory="app/static"), name="static")
 
@@ -46,6 +74,26 @@ async def startup_event():
     """
     logger.info("Starting up application...")
     await init_db()
+    await model_registry.load_all()
+    await road_router.load()
+    speed_profiles.load()
+    model_registry.start()
+    location_store.start()
+    tracking_hub.start()
+    surge_engine.start()
+    speed_profiles.start()
+    if settings.MATCHING_MODE == "batch":
+        matching_window.start()
+    if settings.CANDIDATE_CACHE_ENABLED:
+        candidate_cache.start()
+    offer_engine.start()
+    if settings.LOOKAHEAD_ENABLED:
+        await lookahead_planner.load()
+        lookahead_planner.start()
+    await pool_planner.load()
+    register_handlers(dispatch_queue)
+    if settings.DISPATCH_API_WORKERS:
+        dispatch_queue.start()
     logger.info("Application startup complete")
 
 
@@ -55,6 +103,22 @@ async def shutdown_event():
     Clean up resources on application shutdown.
     """
     logger.info("Shutting down application...")
+    await dispatch_queue.stop()
+    # Unanswered offers go back to the queue as re-match jobs
+    await offer_engine.stop()
+    await lookahead_planner.stop()
+    await candidate_cache.stop()
+    await dispatch_queue.broker.close()
+    await matching_window.stop()
+    await driver_reservations.backend.close()
+    await model_registry.stop()
+    await stop_batchers()
+    cpu_executor.shutdown()
+    await tracking_hub.stop()
+    await surge_engine.stop()
+    await speed_profiles.stop()
+    await location_store.stop()
+    await location_store.backend.close()
     await close_db_connections()
     logger.info("Application shutdown complete")
 
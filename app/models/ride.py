@@ -36,6 +36,11 @@ class Ride(Model):
     distance_km = fields.FloatField(null=True)
     duration_minutes = fields.IntField(null=True)
     
+    # Pooled rides share the vehicle with other riders; the detour
+    # tolerance falls back to the configured default
+    pooled = fields.BooleanField(default=False)
+    max_detour_minutes = fields.FloatField(null=True)
+    
     # AI-generated fields
     estimated_fare = fields.DecimalField(max_digits=10, decimal_places=2, null=True)
     estimated_duration_minutes = fields.IntField(null=True)
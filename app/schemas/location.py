@@ -0,0 +1,11 @@
+from typing import List, Optional
+
+from pydantic import BaseModel
+
+
+# Response for a batched telemetry upload
+class LocationBatchResult(BaseModel):
+    accepted_points: int
+    # The oldest active ride; `ride_ids` lists all of a pooled driver's
+    ride_id: Optional[int] = None
+    ride_ids: List[int] = []
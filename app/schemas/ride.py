@@ -1,4 +1,4 @@
-from typing import Optional
+from typing import List, Optional
 from datetime import datetime
 from decimal import Decimal
 
@@ -25,7 +25,8 @@ class RideBase(BaseModel):
 
 # Properties to receive via API on creation
 class RideCreate(RideBase):
-    pass
+    pooled: bool = False
+    max_detour_minutes: Optional[float] = None
 
 
 # Properties to receive via API on update
@@ -42,6 +43,8 @@ class RideInDBBase(RideBase):
     fare: Optional[Decimal] = None
     distance_km: Optional[float] = None
     duration_minutes: Optional[int] = None
+    pooled: bool = False
+    max_detour_minutes: Optional[float] = None
     estimated_fare: Optional[Decimal] = None
     estimated_duration_minutes: Optional[int] = None
     estimated_distance_km: Optional[float] = None
@@ -73,10 +76,36 @@ class RideEstimate(BaseModel):
     estimated_distance_km: float
 
 
+# One pickup/destination pair in a batch estimate
+class RideEstimateTrip(BaseModel):
+    pickup_latitude: float
+    pickup_longitude: float
+    destination_latitude: float
+    destination_longitude: float
+
+
+# Request for estimating many trips at once
+class RideEstimateBatchRequest(BaseModel):
+    trips: List[RideEstimateTrip]
+    precise: bool = False
+
+
+# Response for batch estimate, in request order
+class RideEstimateBatch(BaseModel):
+    estimates: List[RideEstimate]
+
+
 # Response for tracking ride
 class RideTracking(BaseModel):
     ride_id: int
     current_latitude: float
     current_longitude: float
     estimated_arrival_minutes: int
-    status: RideStatus 
\ No newline at end of file
+    status: RideStatus 
+
+
+# Ride offered to a driver, who must accept before expires_at
+class RideOffer(RideBase):
+    offer_id: int
+    ride_id: int
+    expires_at: datetime
@@ -0,0 +1,391 @@
+import asyncio
+import heapq
+import itertools
+import os
+import sqlite3
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, List, NamedTuple, Optional, Sequence, Tuple
+
+
+class DispatchJob(NamedTuple):
+    """
+    One unit of dispatch work. `id` is derived from kind and ride, so
+    enqueueing the same work twice replaces the pending job. `token` is
+    new on every enqueue: ack, retry and bury only touch the job while it
+    still carries the claimed token, so a copy enqueued again while the
+    first was being worked on is not lost.
+    """
+    id: str
+    kind: str
+    ride_id: int
+    partition: int
+    priority: int
+    attempts: int = 0
+    token: str = ""
+
+
+class DispatchBroker:
+    """
+    Storage interface for the dispatch queue.
+
+    Every job has an `available_at` time. Claiming the best due job (lowest
+    priority value, then oldest) moves its `available_at` forward by the
+    lease, so a job whose worker dies is claimed again once the lease runs
+    out; `ack` removes it and `retry` reschedules it, unless it was
+    enqueued again since it was claimed (its token changed). `shared`
+    brokers are visible to every worker process.
+    """
+
+    shared = False
+
+    async def enqueue(self, job: DispatchJob, available_at: float) -> None:
+        raise NotImplementedError
+
+    async def claim(self, partitions: Sequence[int], now: float, lease_seconds: float) -> Optional[DispatchJob]:
+        """
+        Lease the next due job in `partitions`; its attempts are incremented.
+        """
+        raise NotImplementedError
+
+    async def ack(self, job: DispatchJob) -> None:
+        raise NotImplementedError
+
+    async def retry(self, job: DispatchJob, available_at: float) -> None:
+        raise NotImplementedError
+
+    async def bury(self, job: DispatchJob) -> None:
+        """
+        Give up on a job, keeping it aside for inspection.
+        """
+        raise NotImplementedError
+
+    async def stats(self) -> Dict[str, int]:
+        raise NotImplementedError
+
+    async def close(self) -> None:
+        pass
+
+
+class InMemoryDispatchBroker(DispatchBroker):
+    """
+    Process-local broker, suitable for a single worker and for tests. Jobs
+    do not survive a restart.
+    """
+
+    def __init__(self):
+        self._jobs: Dict[str, Tuple[DispatchJob, float]] = {}
+        # (priority, partition) -> heap of (available_at, seq, job id); entries
+        # that no longer match the job's current available_at are stale
+        self._heaps: Dict[Tuple[int, int], List[Tuple[float, int, str]]] = {}
+        self._sequence = itertools.count()
+        self.dead: Dict[str, DispatchJob] = {}
+
+    def _schedule(self, job: DispatchJob, available_at: float) -> None:
+        self._jobs[job.id] = (job, available_at)
+        heap = self._heaps.setdefault((job.priority, job.partition), [])
+        heapq.heappush(heap, (available_at, next(self._sequence), job.id))
+
+    def _head(self, heap: List[Tuple[float, int, str]]) -> Optional[Tuple[float, int, str]]:
+        while heap:
+            available_at, _, job_id = heap[0]
+            current = self._jobs.get(job_id)
+            if current is not None and current[1] == available_at:
+                return heap[0]
+            heapq.heappop(heap)
+        return None
+
+    async def enqueue(self, job: DispatchJob, available_at: float) -> None:
+        self._schedule(job, available_at)
+
+    async def claim(self, partitions: Sequence[int], now: float, lease_seconds: float) -> Optional[DispatchJob]:
+        wanted = set(partitions)
+        best = None
+        for key in sorted(key for key in self._heaps if key[1] in wanted):
+            if best is not None and key[0] > best[0][0]:
+                break
+            head = self._head(self._heaps[key])
+            if head is not None and head[0] <= now and (best is None or head < best[1]):
+                best = (key, head)
+        if best is None:
+            return None
+
+        job = self._jobs[best[1][2]][0]
+        job = job._replace(attempts=job.attempts + 1)
+        self._schedule(job, now + lease_seconds)
+        return job
+
+    def _current(self, job: DispatchJob) -> bool:
+        entry = self._jobs.get(job.id)
+        return entry is not None and entry[0].token == job.token
+
+    async def ack(self, job: DispatchJob) -> None:
+        if self._current(job):
+            del self._jobs[job.id]
+
+    async def retry(self, job: DispatchJob, available_at: float) -> None:
+        if self._current(job):
+            self._schedule(job, available_at)
+
+    async def bury(self, job: DispatchJob) -> None:
+        if self._current(job):
+            del self._jobs[job.id]
+            self.dead[job.id] = job
+
+    async def stats(self) -> Dict[str, int]:
+        return {"jobs": len(self._jobs), "dead": len(self.dead)}
+
+
+class SQLiteDispatchBroker(DispatchBroker):
+    """
+    Durable broker in a SQLite file, shared by the worker processes of one
+    machine. Claims run in an IMMEDIATE transaction, so two processes never
+    lease the same job. Statements run on a private thread to keep the
+    event loop free.
+    """
+
+    shared = True
+
+    SCHEMA = """
+        CREATE TABLE IF NOT EXISTS dispatch_jobs (
+            id TEXT PRIMARY KEY,
+            kind TEXT NOT NULL,
+            ride_id INTEGER NOT NULL,
+            partition INTEGER NOT NULL,
+            priority INTEGER NOT NULL,
+            attempts INTEGER NOT NULL DEFAULT 0,
+            available_at REAL NOT NULL,
+            dead INTEGER NOT NULL DEFAULT 0,
+            token TEXT NOT NULL
+        );
+        CREATE INDEX IF NOT EXISTS dispatch_jobs_due
+            ON dispatch_jobs (dead, partition, priority, available_at);
+    """
+
+    def __init__(self, path: str):
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._connection = sqlite3.connect(path, isolation_level=None, check_same_thread=False, timeout=5.0)
+        self._connection.execute("PRAGMA journal_mode=WAL")
+        self._connection.executescript(self.SCHEMA)
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="dispatch-sqlite")
+
+    async def _call(self, fn, *args) -> Any:
+        return await asyncio.get_running_loop().run_in_executor(self._executor, fn, *args)
+
+    def _execute(self, sql: str, parameters: Sequence[Any]) -> None:
+        self._connection.execute(sql, parameters)
+
+    async def enqueue(self, job: DispatchJob, available_at: float) -> None:
+        await self._call(
+            self._execute,
+            "INSERT OR REPLACE INTO dispatch_jobs (id, kind, ride_id, partition, priority, attempts, token, available_at) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+            (job.id, job.kind, job.ride_id, job.partition, job.priority, job.attempts, job.token, available_at),
+        )
+
+    def _claim(self, partitions: Sequence[int], now: float, lease_seconds: float) -> Optional[DispatchJob]:
+        placeholders = ",".join("?" * len(partitions))
+        cursor = self._connection.cursor()
+        cursor.execute("BEGIN IMMEDIATE")
+        try:
+            row = cursor.execute(
+                "SELECT id, kind, ride_id, partition, priority, attempts, token FROM dispatch_jobs "
+                f"WHERE dead = 0 AND partition IN ({placeholders}) AND available_at <= ? "
+                "ORDER BY priority, available_at LIMIT 1",
+                (*partitions, now),
+            ).fetchone()
+            if row is not None:
+                cursor.execute(
+                    "UPDATE dispatch_jobs SET attempts = attempts + 1, available_at = ? WHERE id = ?",
+                    (now + lease_seconds, row[0]),
+                )
+            cursor.execute("COMMIT")
+        except BaseException:
+            cursor.execute("ROLLBACK")
+            raise
+        if row is None:
+            return None
+        job = DispatchJob(*row)
+        return job._replace(attempts=job.attempts + 1)
+
+    async def claim(self, partitions: Sequence[int], now: float, lease_seconds: float) -> Optional[DispatchJob]:
+        if not partitions:
+            return None
+        return await self._call(self._claim, list(partitions), now, lease_seconds)
+
+    async def ack(self, job: DispatchJob) -> None:
+        await self._call(self._execute, "DELETE FROM dispatch_jobs WHERE id = ? AND token = ?", (job.id, job.token))
+
+    async def retry(self, job: DispatchJob, available_at: float) -> None:
+        await self._call(
+            self._execute,
+            "UPDATE dispatch_jobs SET available_at = ? WHERE id = ? AND token = ?",
+            (available_at, job.id, job.token),
+        )
+
+    async def bury(self, job: DispatchJob) -> None:
+        await self._call(
+            self._execute, "UPDATE dispatch_jobs SET dead = 1 WHERE id = ? AND token = ?", (job.id, job.token)
+        )
+
+    def _stats(self) -> Dict[str, int]:
+        counts = dict(self._connection.execute("SELECT dead, COUNT(*) FROM dispatch_jobs GROUP BY dead").fetchall())
+        return {"jobs": counts.get(0, 0), "dead": counts.get(1, 0)}
+
+    async def stats(self) -> Dict[str, int]:
+        return await self._call(self._stats)
+
+    async def close(self) -> None:
+        await self._call(self._connection.close)
+        self._executor.shutdown(wait=False)
+
+
+# KEYS: due-job sorted sets, ARGV: now, lease, then each key's priority.
+# Returns the claimed job id, its key index and attempt count.
+REDIS_CLAIM_SCRIPT = """
+local now = tonumber(ARGV[1])
+local best_id, best_key, best_priority, best_score
+for i, key in ipairs(KEYS) do
+    local priority = tonumber(ARGV[i + 2])
+    if best_id == nil or priority <= best_priority then
+        local head = redis.call('ZRANGEBYSCORE', key, '-inf', now, 'WITHSCORES', 'LIMIT', 0, 1)
+        if head[1] and (best_id == nil or priority < best_priority or tonumber(head[2]) < best_score) then
+            best_id, best_key, best_priority, best_score = head[1], i, priority, tonumber(head[2])
+        end
+    end
+end
+if best_id == nil then
+    return nil
+end
+redis.call('ZADD', KEYS[best_key], now + tonumber(ARGV[2]), best_id)
+return {best_id, best_key, redis.call('HINCRBY', KEYS[best_key] .. ':attempts', best_id, 1)}
+"""
+
+
+# KEYS: jobs hash, lane, lane attempts, dead hash; ARGV: job id, its encoded
+# body (token included), "ack", "retry" or "bury", and the retry time.
+# Does nothing when the job was enqueued again since it was claimed.
+REDIS_SETTLE_SCRIPT = """
+if redis.call('HGET', KEYS[1], ARGV[1]) ~= ARGV[2] then
+    return 0
+end
+if ARGV[3] == 'retry' then
+    redis.call('ZADD', KEYS[2], 'XX', ARGV[4], ARGV[1])
+    return 1
+end
+redis.call('ZREM', KEYS[2], ARGV[1])
+redis.call('HDEL', KEYS[3], ARGV[1])
+redis.call('HDEL', KEYS[1], ARGV[1])
+if ARGV[3] == 'bury' then
+    redis.call('HSET', KEYS[4], ARGV[1], ARGV[2])
+end
+return 1
+"""
+
+
+class RedisDispatchBroker(DispatchBroker):
+    """
+    Redis broker shared by workers on any machine.
+
+    Each (partition, priority) lane is a sorted set of job ids scored by
+    `available_at`, with a companion hash of attempt counts; job bodies
+    live in one hash. A Lua script picks and leases the best due job across
+    the requested lanes atomically. `client` is a redis.asyncio client.
+    """
+
+    shared = True
+
+    PRIORITIES = (0, 1, 2)
+
+    def __init__(self, client, key_prefix: str = "dispatch"):
+        self.client = client
+        self.key_prefix = key_prefix
+        self.jobs_key = f"{key_prefix}:jobs"
+        self.dead_key = f"{key_prefix}:dead"
+        self._claim_script = client.register_script(REDIS_CLAIM_SCRIPT)
+        self._settle_script = client.register_script(REDIS_SETTLE_SCRIPT)
+
+    def _lane(self, partition: int, priority: int) -> str:
+        return f"{self.key_prefix}:lane:{partition}:{priority}"
+
+    @staticmethod
+    def _encode(job: DispatchJob) -> str:
+        return f"{job.kind},{job.ride_id},{job.partition},{job.priority},{job.token}"
+
+    @staticmethod
+    def _decode(job_id: str, raw, attempts: int) -> DispatchJob:
+        if isinstance(raw, bytes):
+            raw = raw.decode()
+        kind, ride_id, partition, priority, token = raw.split(",")
+        return DispatchJob(job_id, kind, int(ride_id), int(partition), int(priority), attempts, token)
+
+    async def enqueue(self, job: DispatchJob, available_at: float) -> None:
+        lane = self._lane(job.partition, job.priority)
+        pipe = self.client.pipeline(transaction=True)
+        pipe.hset(self.jobs_key, job.id, self._encode(job))
+        pipe.zadd(lane, {job.id: available_at})
+        pipe.hset(f"{lane}:attempts", job.id, job.attempts)
+        await pipe.execute()
+
+    async def claim(self, partitions: Sequence[int], now: float, lease_seconds: float) -> Optional[DispatchJob]:
+        lanes = [(self._lane(partition, priority), priority) for priority in self.PRIORITIES for partition in partitions]
+        if not lanes:
+            return None
+        claimed = await self._claim_script(
+            keys=[lane for lane, _ in lanes],
+            args=[now, lease_seconds, *(priority for _, priority in lanes)],
+        )
+        if not claimed:
+            return None
+        job_id, _, attempts = claimed
+        job_id = job_id.decode() if isinstance(job_id, bytes) else job_id
+        raw = await self.client.hget(self.jobs_key, job_id)
+        if raw is None:
+            return None
+        return self._decode(job_id, raw, int(attempts))
+
+    async def _settle(self, job: DispatchJob, action: str, available_at: float = 0.0) -> None:
+        lane = self._lane(job.partition, job.priority)
+        await self._settle_script(
+            keys=[self.jobs_key, lane, f"{lane}:attempts", self.dead_key],
+            args=[job.id, self._encode(job), action, available_at],
+        )
+
+    async def ack(self, job: DispatchJob) -> None:
+        await self._settle(job, "ack")
+
+    async def retry(self, job: DispatchJob, available_at: float) -> None:
+        await self._settle(job, "retry", available_at)
+
+    async def bury(self, job: DispatchJob) -> None:
+        await self._settle(job, "bury")
+
+    async def stats(self) -> Dict[str, int]:
+        pipe = self.client.pipeline(transaction=False)
+        pipe.hlen(self.jobs_key)
+        pipe.hlen(self.dead_key)
+        jobs, dead = await pipe.execute()
+        return {"jobs": int(jobs), "dead": int(dead)}
+
+    async def close(self) -> None:
+        await self.client.close()
+
+
+def create_dispatch_broker(name: str) -> DispatchBroker:
+    """
+    Build the broker selected by settings.DISPATCH_BROKER ("memory",
+    "sqlite" or "redis").
+    """
+    from app.core.config import settings
+
+    if name == "memory":
+        return InMemoryDispatchBroker()
+    if name == "sqlite":
+        return SQLiteDispatchBroker(settings.DISPATCH_SQLITE_PATH)
+    if name == "redis":
+        from redis import asyncio as redis_asyncio
+
+        client = redis_asyncio.Redis(host=settings.REDIS_HOST, port=settings.REDIS_PORT)
+        return RedisDispatchBroker(client)
+    raise ValueError(f"Unknown dispatch broker: {name}")
@@ -0,0 +1,72 @@
+import logging
+
+from app.core.config import settings
+from app.models.ride import Ride, RideStatus
+from app.services.dispatch.brokers import DispatchJob
+from app.services.dispatch.queue import KIND_MATCH, KIND_REMATCH, KIND_SOS, DispatchQueue
+from app.services.ride_matching.batch_matching import matching_window
+from app.services.ride_matching.matching import lookahead_planner, match_ride_with_driver, offer_ride
+from app.services.ride_matching.offers import MODE_INSTANT
+from app.services.tracking.hub import tracking_hub
+
+logger = logging.getLogger(__name__)
+
+
+async def handle_match(job: DispatchJob) -> bool:
+    """
+    Match a requested ride. Retried (with backoff) while no driver is
+    available; done once the ride is matched, offered to drivers or no
+    longer waiting.
+    """
+    # The batch window matches the ride; the job is only done once it has,
+    # so until then it is retried with backoff and survives a restart
+    if settings.MATCHING_MODE == "batch" and matching_window.running:
+        ride = await Ride.filter(id=job.ride_id).only("id", "status").first()
+        if ride is None or ride.status != RideStatus.REQUESTED:
+            return True
+        matching_window.submit(job.ride_id)
+        return False
+
+    # Drivers answer later; unanswered rides come back as re-match jobs
+    if settings.OFFER_MODE != MODE_INSTANT:
+        return await offer_ride(job.ride_id)
+
+    if await match_ride_with_driver(job.ride_id) is not None:
+        return True
+
+    # Chained to a driver about to drop off nearby; handed over when they do
+    if lookahead_planner.chained_driver(job.ride_id) is not None:
+        return True
+
+    # Nothing left to do if the ride was matched elsewhere or cancelled
+    ride = await Ride.filter(id=job.ride_id).only("id", "status").first()
+    return ride is None or ride.status != RideStatus.REQUESTED
+
+
+async def handle_sos(job: DispatchJob) -> bool:
+    """
+    Escalate an SOS: log it for the operations team and push the ride to
+    everyone tracking it.
+    """
+    ride = await Ride.filter(id=job.ride_id).first()
+    if ride is None:
+        return True
+
+    logger.warning(
+        "SOS for ride %d (status %s, pickup %.5f,%.5f, driver %s)",
+        ride.id, ride.status.value, ride.pickup_latitude, ride.pickup_longitude, ride.driver_id
+    )
+    tracking_hub.publish_ride(ride)
+
+    # In a real application, you would also:
+    # 1. Send notifications to emergency contacts
+    # 2. Alert administrators
+    # 3. Potentially contact emergency services
+
+    return True
+
+
+def register_handlers(queue: DispatchQueue) -> None:
+    queue.register(KIND_MATCH, handle_match)
+    queue.register(KIND_REMATCH, handle_match)
+    queue.register(KIND_SOS, handle_sos)
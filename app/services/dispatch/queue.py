@@ -0,0 +1,200 @@
+import asyncio
+import logging
+import math
+import random
+import time
+import uuid
+from typing import Awaitable, Callable, Dict, List, Optional, Sequence, Tuple
+
+from app.core.config import settings
+from app.models.ride import Ride
+from app.services.dispatch.brokers import DispatchBroker, DispatchJob, create_dispatch_broker
+from app.services.ride_matching.distance import KM_PER_DEGREE
+
+logger = logging.getLogger(__name__)
+
+
+KIND_MATCH = "match"
+KIND_REMATCH = "rematch"
+KIND_SOS = "sos"
+
+# Priority lanes, claimed lowest first
+PRIORITY_SOS = 0
+PRIORITY_REMATCH = 1
+PRIORITY_MATCH = 2
+
+PRIORITIES = {KIND_SOS: PRIORITY_SOS, KIND_REMATCH: PRIORITY_REMATCH, KIND_MATCH: PRIORITY_MATCH}
+
+# A handler returns True when the job is done and False to retry it later
+Handler = Callable[[DispatchJob], Awaitable[bool]]
+
+
+class DispatchQueue:
+    """
+    Durable queue of dispatch work: matching new rides, re-matching rides
+    whose driver backed out, and SOS escalation.
+
+    Jobs are partitioned by the coarse grid region of the pickup, so a
+    worker process can own a set of regions and keep their drivers hot;
+    within its partitions a worker always takes SOS jobs first, then
+    re-matches, then new rides. Failed jobs are retried with exponential
+    backoff and jitter, and set aside after `max_attempts`. A claimed job
+    is leased, so work held by a worker that dies is picked up again when
+    the lease expires.
+    """
+
+    def __init__(
+        self,
+        broker: DispatchBroker,
+        partitions: int = settings.DISPATCH_PARTITIONS,
+        region_size_km: float = settings.DISPATCH_REGION_SIZE_KM,
+        concurrency: int = settings.DISPATCH_WORKER_CONCURRENCY,
+        lease_seconds: float = settings.DISPATCH_LEASE_SECONDS,
+        max_attempts: int = settings.DISPATCH_MAX_ATTEMPTS,
+        retry_base_seconds: float = settings.DISPATCH_RETRY_BASE_SECONDS,
+        retry_max_seconds: float = settings.DISPATCH_RETRY_MAX_SECONDS,
+        poll_seconds: float = settings.DISPATCH_POLL_SECONDS
+    ):
+        self.broker = broker
+        self.partitions = partitions
+        self.region_degrees = region_size_km / KM_PER_DEGREE
+        self.concurrency = concurrency
+        self.lease_seconds = lease_seconds
+        self.max_attempts = max_attempts
+        self.retry_base_seconds = retry_base_seconds
+        self.retry_max_seconds = retry_max_seconds
+        self.poll_seconds = poll_seconds
+        self.owned: List[int] = []
+        self.processed = 0
+        self.retried = 0
+        self.buried = 0
+        self._handlers: Dict[str, Handler] = {}
+        self._wakeup: Optional[asyncio.Event] = None
+        self._tasks: List[asyncio.Task] = []
+
+    def region_for(self, latitude: float, longitude: float) -> Tuple[int, int]:
+        return (
+            int(math.floor(latitude / self.region_degrees)),
+            int(math.floor(longitude / self.region_degrees)),
+        )
+
+    def partition_for(self, latitude: float, longitude: float) -> int:
+        """
+        Partition owning a location. Stable across processes and restarts.
+        """
+        row, col = self.region_for(latitude, longitude)
+        return ((row * 73856093) ^ (col * 19349663)) % self.partitions
+
+    def register(self, kind: str, handler: Handler) -> None:
+        self._handlers[kind] = handler
+
+    async def enqueue(self, kind: str, ride: Ride, delay_seconds: float = 0.0) -> DispatchJob:
+        job = DispatchJob(
+            id=f"{kind}:{ride.id}",
+            kind=kind,
+            ride_id=ride.id,
+            partition=self.partition_for(ride.pickup_latitude, ride.pickup_longitude),
+            priority=PRIORITIES[kind],
+            token=uuid.uuid4().hex,
+        )
+        await self.broker.enqueue(job, time.time() + delay_seconds)
+        if self._wakeup is not None:
+            self._wakeup.set()
+        return job
+
+    def backoff_seconds(self, attempts: int) -> float:
+        """
+        Delay before retry number `attempts`, with jitter so jobs that
+        failed together do not retry together.
+        """
+        delay = min(self.retry_max_seconds, self.retry_base_seconds * 2 ** (attempts - 1))
+        return delay * random.uniform(0.5, 1.0)
+
+    async def process(self, job: DispatchJob) -> bool:
+        """
+        Run one claimed job and ack, retry or bury it. Returns True when it
+        completed.
+        """
+        handler = self._handlers.get(job.kind)
+        done = False
+        if handler is None:
+            logger.error("No dispatch handler for %s jobs", job.kind)
+        else:
+            try:
+                done = await handler(job)
+            except Exception:
+                logger.exception("Dispatch job %s failed (attempt %d)", job.id, job.attempts)
+
+        self.processed += 1
+        if done:
+            await self.broker.ack(job)
+        elif job.attempts >= self.max_attempts:
+            self.buried += 1
+            logger.warning("Giving up on dispatch job %s after %d attempts", job.id, job.attempts)
+            await self.broker.bury(job)
+        else:
+            self.retried += 1
+            await self.broker.retry(job, time.time() + self.backoff_seconds(job.attempts))
+        return done
+
+    async def run_once(self, partitions: Optional[Sequence[int]] = None) -> bool:
+        """
+        Claim and process one due job. Returns False when none was due.
+        """
+        job = await self.broker.claim(
+            self.owned if partitions is None else partitions, time.time(), self.lease_seconds
+        )
+        if job is None:
+            return False
+        await self.process(job)
+        return True
+
+    def start(self, partitions: Optional[Sequence[int]] = None) -> None:
+        """
+        Start consuming `partitions` (all of them by default).
+        """
+        if self._tasks:
+            return
+        self.owned = list(range(self.partitions)) if partitions is None else list(partitions)
+        self._wakeup = asyncio.Event()
+        self._tasks = [asyncio.create_task(self._run()) for _ in range(self.concurrency)]
+
+    async def stop(self) -> None:
+        for task in self._tasks:
+            task.cancel()
+        for task in self._tasks:
+            try:
+                await task
+            except asyncio.CancelledError:
+                pass
+        self._tasks = []
+
+    @property
+    def running(self) -> bool:
+        return bool(self._tasks)
+
+    async def stats(self) -> Dict[str, int]:
+        stats = await self.broker.stats()
+        stats.update(processed=self.processed, retried=self.retried, buried=self.buried)
+        return stats
+
+    async def _run(self) -> None:
+        wakeup = self._wakeup
+        while True:
+            # Cleared before claiming so an enqueue during the claim is not lost
+            wakeup.clear()
+            try:
+                if await self.run_once():
+                    continue
+            except Exception:
+                logger.exception("Dispatch worker failed")
+            # Local enqueues wake the workers at once; other processes'
+            # enqueues and retries that come due are found by polling
+            try:
+                await asyncio.wait_for(wakeup.wait(), self.poll_seconds)
+            except asyncio.TimeoutError:
+                pass
+
+
+# Process-wide dispatch queue
+dispatch_queue = DispatchQueue(create_dispatch_broker(settings.DISPATCH_BROKER))
@@ -0,0 +1,90 @@
+"""
+Standalone dispatch worker for a subset of region partitions.
+
+    python -m app.services.dispatch.worker --partitions 0,1,2,3
+
+Dedicated workers need a shared broker (DISPATCH_BROKER=sqlite on one
+machine, redis across machines) and shared driver locations
+(LOCATION_BACKEND=redis); set DISPATCH_API_WORKERS=false so the API
+processes only enqueue. Tracking sockets are served by the API processes,
+so riders see matches made here on their next status read. Drivers answer
+offers through the API too, so run workers with OFFER_MODE=instant.
+"""
+import argparse
+import asyncio
+import logging
+import signal
+from typing import List, Optional
+
+from app.core.config import settings
+from app.db.init_db import close_db_connections, init_db
+from app.services.dispatch.handlers import register_handlers
+from app.services.dispatch.queue import dispatch_queue
+from app.services.location.store import location_store
+from app.services.ml.registry import model_registry
+from app.services.ride_matching.matching import candidate_cache
+from app.services.ride_matching.offers import MODE_INSTANT
+from app.services.ride_matching.reservations import driver_reservations
+from app.services.routing.service import road_router
+from app.services.routing.speed_profiles import speed_profiles
+
+logger = logging.getLogger(__name__)
+
+
+def parse_partitions(value: str) -> Optional[List[int]]:
+    if value == "all":
+        return None
+    partitions = [int(part) for part in value.split(",") if part.strip()]
+    for partition in partitions:
+        if not 0 <= partition < settings.DISPATCH_PARTITIONS:
+            raise argparse.ArgumentTypeError(
+                f"Partition {partition} outside 0..{settings.DISPATCH_PARTITIONS - 1}"
+            )
+    return partitions
+
+
+async def run(partitions: Optional[List[int]]) -> None:
+    await init_db()
+    await model_registry.load_all()
+    await road_router.load()
+    speed_profiles.load()
+    location_store.start()
+    if settings.CANDIDATE_CACHE_ENABLED:
+        candidate_cache.start()
+    if settings.OFFER_MODE != MODE_INSTANT:
+        logger.warning("OFFER_MODE=%s: drivers cannot answer offers made by this worker", settings.OFFER_MODE)
+    register_handlers(dispatch_queue)
+    dispatch_queue.start(partitions)
+    logger.info("Dispatch worker consuming partitions %s", dispatch_queue.owned)
+
+    stopping = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        loop.add_signal_handler(sig, stopping.set)
+    await stopping.wait()
+
+    # Jobs in flight keep their lease and are picked up again after it expires
+    await dispatch_queue.stop()
+    await candidate_cache.stop()
+    await dispatch_queue.broker.close()
+    await driver_reservations.backend.close()
+    await location_store.stop()
+    await location_store.backend.close()
+    await close_db_connections()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--partitions", type=parse_partitions, default=None,
+                        help="comma-separated partition numbers, or 'all' (default)")
+    args = parser.parse_args()
+
+    logging.basicConfig(
+        level=logging.INFO,
+        format="%(asctime)s - %(name)s - %(levelname)s - %(message)s",
+    )
+    asyncio.run(run(args.partitions))
+
+
+if __name__ == "__main__":
+    main()
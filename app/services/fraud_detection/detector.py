@@ -1,8 +1,13 @@
 import random
 from typing import Dict, Tuple
 
+from app.core.config import settings
+from app.core.executor import cpu_bound
 from app.models.user import User
 from app.models.ride import Ride, RideStatus
+from app.services.location.tracks import track_store
+from app.services.ride_matching.distance import haversine_km
+from app.services.routing.service import road_router
 
 
 async def check_user_behavior(user: User) -> Dict[str, float]:
@@ -51,14 +56,44 @@ async def detect_route_deviation(
     if not ride or ride.status not in [RideStatus.ACCEPTED, RideStatus.IN_PROGRESS]:
         return False
     
-    # In a real application, this would:
-    # 1. Compare the current location to the expected route
-    # 2. Calculate the deviation distance
-    # 3. Determine if the deviation is significant
+    # The leg being driven: pickup -> destination once the trip started,
+    # otherwise from where the driver accepted (first track point) to pickup
+    if ride.status == RideStatus.IN_PROGRESS:
+        origin = (ride.pickup_latitude, ride.pickup_longitude)
+        target = (ride.destination_latitude, ride.destination_longitude)
+    else:
+        track = track_store.get(ride_id)
+        if track is None or track.size == 0:
+            return False
+        origin = (float(track.latitudes[0]), float(track.longitudes[0]))
+        target = (ride.pickup_latitude, ride.pickup_longitude)
+    return await route_deviates(origin, (current_latitude, current_longitude), target)
+
+
+@cpu_bound
+def route_deviates(
+    origin: Tuple[float, float],
+    current: Tuple[float, float],
+    target: Tuple[float, float]
+) -> bool:
+    """
+    Whether the detour from `origin` via `current` to `target` is too long
+    compared with the direct route. Runs on the CPU executor.
+    """
+    # Compare the direct route with the detour through the current position
+    direct = road_router.route(*origin, *target)
+    first_leg = road_router.route(*origin, *current)
+    second_leg = road_router.route(*current, *target)
+    if direct is not None and first_leg is not None and second_leg is not None:
+        detour_minutes = (first_leg.duration_seconds + second_leg.duration_seconds) / 60.0
+        direct_minutes = direct.duration_seconds / 60.0
+        return detour_minutes > direct_minutes * settings.ROUTE_DEVIATION_FACTOR + settings.ROUTE_DEVIATION_SLACK_MINUTES
     
-    # For demonstration, we'll randomly determine if there's a deviation
-    # with a low probability (10%)
-    return random.random() < 0.1
+    # Without a road graph, compare straight-line distances instead; the
+    # slack is converted at the default city speed
+    slack_km = settings.ROUTE_DEVIATION_SLACK_MINUTES / 60.0 * settings.ETA_DEFAULT_SPEED_KMH
+    detour_km = haversine_km(*origin, *current) + haversine_km(*current, *target)
+    return detour_km > haversine_km(*origin, *target) * settings.ROUTE_DEVIATION_FACTOR + slack_km
 
 
 async def detect_suspicious_cancellation_pattern(user_id: int) -> bool:
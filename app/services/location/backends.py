@@ -0,0 +1,180 @@
+import time
+from typing import Dict, Iterable, List, NamedTuple
+
+
+class DriverLocation(NamedTuple):
+    driver_id: int
+    latitude: float
+    longitude: float
+    timestamp: float
+
+
+class LocationBackend:
+    """
+    Storage interface for the latest position of each driver.
+
+    `shared` backends are visible to every worker process, so the location
+    store periodically pulls other workers' writes back into its local index.
+    """
+
+    shared = False
+
+    async def write_many(self, locations: List[DriverLocation]) -> None:
+        raise NotImplementedError
+
+    async def read_many(self, driver_ids: Iterable[int]) -> Dict[int, DriverLocation]:
+        raise NotImplementedError
+
+    async def read_since(self, since: float) -> List[DriverLocation]:
+        """
+        Return every location written at or after `since`. This is when the
+        write landed, not the ping's own timestamp: a ping flushed late, or
+        uploaded in a batch, is still picked up by the next sync.
+        """
+        raise NotImplementedError
+
+    async def remove(self, driver_id: int) -> None:
+        raise NotImplementedError
+
+    async def prune(self, older_than: float) -> int:
+        """
+        Drop locations last written before `older_than`; returns the count.
+        """
+        raise NotImplementedError
+
+    async def close(self) -> None:
+        pass
+
+
+class InMemoryLocationBackend(LocationBackend):
+    """
+    Process-local backend, suitable for a single worker and for tests.
+    """
+
+    def __init__(self):
+        self._locations: Dict[int, DriverLocation] = {}
+        self._written_at: Dict[int, float] = {}
+
+    async def write_many(self, locations: List[DriverLocation]) -> None:
+        written_at = time.time()
+        for location in locations:
+            self._locations[location.driver_id] = location
+            self._written_at[location.driver_id] = written_at
+
+    async def read_many(self, driver_ids: Iterable[int]) -> Dict[int, DriverLocation]:
+        return {
+            driver_id: self._locations[driver_id]
+            for driver_id in driver_ids
+            if driver_id in self._locations
+        }
+
+    async def read_since(self, since: float) -> List[DriverLocation]:
+        return [
+            self._locations[driver_id]
+            for driver_id, written_at in self._written_at.items()
+            if written_at >= since
+        ]
+
+    async def remove(self, driver_id: int) -> None:
+        self._locations.pop(driver_id, None)
+        self._written_at.pop(driver_id, None)
+
+    async def prune(self, older_than: float) -> int:
+        stale = [driver_id for driver_id, written_at in self._written_at.items() if written_at < older_than]
+        for driver_id in stale:
+            del self._locations[driver_id]
+            del self._written_at[driver_id]
+        return len(stale)
+
+
+class RedisLocationBackend(LocationBackend):
+    """
+    Redis backend shared by all workers.
+
+    Positions live in one hash (driver id -> "lat,lon,ts") and their write
+    times in a sorted set, so a batch is a single pipelined HSET + ZADD and
+    freshness queries are range scans on the sorted set. `client` is any
+    object exposing the redis.asyncio command subset used here.
+    """
+
+    shared = True
+
+    def __init__(self, client, key_prefix: str = "driver:location"):
+        self.client = client
+        self.positions_key = f"{key_prefix}:positions"
+        self.timestamps_key = f"{key_prefix}:timestamps"
+
+    @staticmethod
+    def _encode(location: DriverLocation) -> str:
+        return f"{location.latitude:.7f},{location.longitude:.7f},{location.timestamp:.3f}"
+
+    @staticmethod
+    def _decode(driver_id: int, raw) -> DriverLocation:
+        if isinstance(raw, bytes):
+            raw = raw.decode()
+        latitude, longitude, timestamp = raw.split(",")
+        return DriverLocation(driver_id, float(latitude), float(longitude), float(timestamp))
+
+    async def write_many(self, locations: List[DriverLocation]) -> None:
+        if not locations:
+            return
+        written_at = time.time()
+        pipe = self.client.pipeline(transaction=False)
+        pipe.hset(self.positions_key, mapping={
+            str(location.driver_id): self._encode(location) for location in locations
+        })
+        pipe.zadd(self.timestamps_key, {
+            str(location.driver_id): written_at for location in locations
+        })
+        await pipe.execute()
+
+    async def read_many(self, driver_ids: Iterable[int]) -> Dict[int, DriverLocation]:
+        driver_ids = list(driver_ids)
+        if not driver_ids:
+            return {}
+        values = await self.client.hmget(self.positions_key, [str(driver_id) for driver_id in driver_ids])
+        return {
+            driver_id: self._decode(driver_id, raw)
+            for driver_id, raw in zip(driver_ids, values)
+            if raw is not None
+        }
+
+    async def read_since(self, since: float) -> List[DriverLocation]:
+        members = await self.client.zrangebyscore(self.timestamps_key, since, "+inf")
+        found = await self.read_many(int(member) for member in members)
+        return list(found.values())
+
+    async def remove(self, driver_id: int) -> None:
+        pipe = self.client.pipeline(transaction=False)
+        pipe.hdel(self.positions_key, str(driver_id))
+        pipe.zrem(self.timestamps_key, str(driver_id))
+        await pipe.execute()
+
+    async def prune(self, older_than: float) -> int:
+        stale = await self.client.zrangebyscore(self.timestamps_key, "-inf", f"({older_than}")
+        if not stale:
+            return 0
+        pipe = self.client.pipeline(transaction=False)
+        pipe.hdel(self.positions_key, *stale)
+        pipe.zrem(self.timestamps_key, *stale)
+        await pipe.execute()
+        return len(stale)
+
+    async def close(self) -> None:
+        await self.client.close()
+
+
+def create_location_backend(name: str) -> LocationBackend:
+    """
+    Build the backend selected by settings.LOCATION_BACKEND ("memory" or "redis").
+    """
+    if name == "memory":
+        return InMemoryLocationBackend()
+    if name == "redis":
+        from redis import asyncio as redis_asyncio
+
+        from app.core.config import settings
+
+        client = redis_asyncio.Redis(host=settings.REDIS_HOST, port=settings.REDIS_PORT)
+        return RedisLocationBackend(client)
+    raise ValueError(f"Unknown location backend: {name}")
@@ -0,0 +1,200 @@
+import asyncio
+import logging
+import time
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from app.core.config import settings
+from app.services.location.backends import DriverLocation, LocationBackend, create_location_backend
+from app.services.ride_matching.geo_index import DriverGeoIndex, driver_index
+
+logger = logging.getLogger(__name__)
+
+
+class LocationStore:
+    """
+    Write-behind store for high-rate driver location pings.
+
+    `record` only overwrites the driver's slot in an in-memory buffer, so
+    repeated pings between flushes coalesce to the last position. A
+    background loop flushes the buffer to the backend in one batch, moves
+    the drivers in the geo index and evicts drivers whose last ping is older
+    than the freshness TTL.
+    """
+
+    def __init__(
+        self,
+        backend: LocationBackend,
+        index: DriverGeoIndex = driver_index,
+        ttl_seconds: float = settings.LOCATION_TTL_SECONDS,
+        flush_interval_seconds: float = settings.LOCATION_FLUSH_INTERVAL_SECONDS,
+        sync_overlap_seconds: float = settings.LOCATION_SYNC_OVERLAP_SECONDS
+    ):
+        self.backend = backend
+        self.index = index
+        self.ttl_seconds = ttl_seconds
+        self.flush_interval_seconds = flush_interval_seconds
+        self.sync_overlap_seconds = sync_overlap_seconds
+        self._buffer: Dict[int, DriverLocation] = {}
+        # Timestamp of the last flushed ping per indexed driver
+        self._last_seen: Dict[int, float] = {}
+        # When each driver went offline; their pings up to then are dropped,
+        # including any a flush already in flight writes back
+        self._removed: Dict[int, float] = {}
+        self._last_sync = 0.0
+        self._task: Optional[asyncio.Task] = None
+
+    def record(
+        self,
+        driver_id: int,
+        latitude: float,
+        longitude: float,
+        timestamp: Optional[float] = None
+    ) -> None:
+        """
+        Buffer a driver's position; only the latest one per flush is written.
+        """
+        timestamp = time.time() if timestamp is None else timestamp
+        if timestamp <= self._removed.get(driver_id, 0.0):
+            return
+        pending = self._buffer.get(driver_id)
+        if pending is not None and pending.timestamp > timestamp:
+            # Out-of-order ping, keep the newer buffered position
+            return
+        self._buffer[driver_id] = DriverLocation(driver_id, latitude, longitude, timestamp)
+
+    def is_fresh(self, driver_id: int, now: Optional[float] = None) -> bool:
+        last_seen = self._last_seen.get(driver_id)
+        if last_seen is None:
+            return False
+        now = time.time() if now is None else now
+        return now - last_seen <= self.ttl_seconds
+
+    def fresh_positions(
+        self,
+        driver_ids: Iterable[int],
+        now: Optional[float] = None
+    ) -> Dict[int, Tuple[float, float]]:
+        """
+        Return (latitude, longitude) for the drivers whose last ping is
+        within the freshness TTL. Served from memory, no backend round-trip.
+        """
+        now = time.time() if now is None else now
+        positions = {}
+        for driver_id in driver_ids:
+            if self.is_fresh(driver_id, now):
+                position = self.index.get(driver_id)
+                if position is not None:
+                    positions[driver_id] = position
+        return positions
+
+    async def flush(self) -> int:
+        """
+        Write buffered positions to the backend and the geo index.
+        Returns the number of drivers written.
+        """
+        if not self._buffer:
+            return 0
+        batch, self._buffer = list(self._buffer.values()), {}
+
+        try:
+            await self.backend.write_many(batch)
+        except Exception:
+            # Put the batch back unless a newer ping has arrived meanwhile
+            for location in batch:
+                if not self._is_removed(location):
+                    self._buffer.setdefault(location.driver_id, location)
+            raise
+
+        # Drivers removed while the write was in flight may have been written
+        # back after their removal; take them out again
+        for location in batch:
+            if self._is_removed(location):
+                await self.backend.remove(location.driver_id)
+        self._apply(batch)
+        return len(batch)
+
+    async def sync_from_backend(self) -> int:
+        """
+        Pull positions written by other workers into the local index.
+        Windows go by when writes landed and overlap a little, so positions
+        already applied may be read again; `_apply` skips them.
+        """
+        since = self._last_sync - self.sync_overlap_seconds
+        self._last_sync = time.time()
+        locations = await self.backend.read_since(max(since, self._last_sync - self.ttl_seconds))
+        self._apply(locations)
+        return len(locations)
+
+    async def evict_stale(self, now: Optional[float] = None) -> int:
+        """
+        Drop drivers whose last ping is older than the TTL from the index
+        and the backend.
+        """
+        now = time.time() if now is None else now
+        cutoff = now - self.ttl_seconds
+        stale = [driver_id for driver_id, last_seen in self._last_seen.items() if last_seen < cutoff]
+        for driver_id in stale:
+            del self._last_seen[driver_id]
+            self.index.remove(driver_id)
+        # Pings older than the TTL are stale anyway, so older removals can go
+        self._removed = {
+            driver_id: removed_at for driver_id, removed_at in self._removed.items() if removed_at >= cutoff
+        }
+
+        await self.backend.prune(cutoff)
+        return len(stale)
+
+    async def remove(self, driver_id: int) -> None:
+        """
+        Forget a driver immediately, e.g. when they go offline. A flush
+        already running will not bring them back; a newer ping will.
+        """
+        self._removed[driver_id] = time.time()
+        self._buffer.pop(driver_id, None)
+        self._last_seen.pop(driver_id, None)
+        self.index.remove(driver_id)
+        await self.backend.remove(driver_id)
+
+    def start(self) -> None:
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        await self.flush()
+
+    def _is_removed(self, location: DriverLocation) -> bool:
+        return location.timestamp <= self._removed.get(location.driver_id, 0.0)
+
+    def _apply(self, locations: List[DriverLocation]) -> None:
+        for location in locations:
+            if location.timestamp < self._last_seen.get(location.driver_id, 0.0) or self._is_removed(location):
+                continue
+            self._last_seen[location.driver_id] = location.timestamp
+            self.index.update(location.driver_id, location.latitude, location.longitude)
+
+    async def _run(self) -> None:
+        last_eviction = time.time()
+        while True:
+            await asyncio.sleep(self.flush_interval_seconds)
+            try:
+                await self.flush()
+                if self.backend.shared:
+                    await self.sync_from_backend()
+
+                now = time.time()
+                if now - last_eviction >= self.ttl_seconds / 2:
+                    await self.evict_stale(now)
+                    last_eviction = now
+            except Exception:
+                logger.exception("Location store flush failed")
+
+
+# Process-wide location store, started on application startup
+location_store = LocationStore(create_location_backend(settings.LOCATION_BACKEND))
@@ -0,0 +1,117 @@
+import json
+import time
+from typing import Any, Dict, NamedTuple, Optional
+
+import numpy as np
+
+from app.core.config import settings
+
+
+JSON_CONTENT_TYPES = ("application/json",)
+MSGPACK_CONTENT_TYPES = ("application/msgpack", "application/x-msgpack")
+
+# Delta encoding: coordinates as integer micro-degrees, timestamps as integer
+# milliseconds; the first element of each array is absolute, the rest are
+# differences from the previous point.
+DELTA_COORDINATE_SCALE = 1e6
+DELTA_TIMESTAMP_SCALE = 1e3
+
+
+class UnsupportedEncoding(ValueError):
+    pass
+
+
+class TelemetryBatch(NamedTuple):
+    """
+    A driver's GPS points as parallel arrays, ordered by timestamp.
+    """
+    latitudes: np.ndarray
+    longitudes: np.ndarray
+    timestamps: np.ndarray
+
+    @property
+    def size(self) -> int:
+        return len(self.timestamps)
+
+    def latest(self):
+        return self.latitudes[-1], self.longitudes[-1], self.timestamps[-1]
+
+
+def decode_telemetry(
+    body: bytes,
+    content_type: Optional[str],
+    now: Optional[float] = None
+) -> TelemetryBatch:
+    """
+    Decode an uploaded batch of GPS points.
+
+    The payload is JSON or msgpack and holds either
+    - "points": a list of {"latitude", "longitude", "timestamp"} objects,
+    - "latitudes", "longitudes", "timestamps": parallel arrays, or
+    - the same arrays delta-encoded, flagged with "encoding": "delta".
+
+    Raises UnsupportedEncoding for unknown content types and ValueError for
+    malformed or out-of-range data.
+    """
+    media_type = (content_type or JSON_CONTENT_TYPES[0]).split(";")[0].strip().lower()
+    if media_type in JSON_CONTENT_TYPES:
+        try:
+            payload = json.loads(body)
+        except ValueError as e:
+            raise ValueError(f"Invalid JSON: {e}")
+    elif media_type in MSGPACK_CONTENT_TYPES:
+        try:
+            import msgpack
+        except ImportError:
+            raise UnsupportedEncoding("msgpack payloads are not supported on this server")
+        try:
+            payload = msgpack.unpackb(body, raw=False)
+        except Exception as e:
+            raise ValueError(f"Invalid msgpack: {e}")
+    else:
+        raise UnsupportedEncoding(f"Unsupported content type: {media_type}")
+
+    if not isinstance(payload, dict):
+        raise ValueError("Telemetry payload must be an object")
+    return _to_arrays(payload, time.time() if now is None else now)
+
+
+def _to_arrays(payload: Dict[str, Any], now: float) -> TelemetryBatch:
+    try:
+        if "points" in payload:
+            points = payload["points"]
+            latitudes = np.fromiter((p["latitude"] for p in points), dtype=np.float64, count=len(points))
+            longitudes = np.fromiter((p["longitude"] for p in points), dtype=np.float64, count=len(points))
+            timestamps = np.fromiter((p["timestamp"] for p in points), dtype=np.float64, count=len(points))
+        elif payload.get("encoding") == "delta":
+            latitudes = np.cumsum(np.asarray(payload["latitudes"], dtype=np.int64)) / DELTA_COORDINATE_SCALE
+            longitudes = np.cumsum(np.asarray(payload["longitudes"], dtype=np.int64)) / DELTA_COORDINATE_SCALE
+            timestamps = np.cumsum(np.asarray(payload["timestamps"], dtype=np.int64)) / DELTA_TIMESTAMP_SCALE
+        else:
+            latitudes = np.asarray(payload["latitudes"], dtype=np.float64)
+            longitudes = np.asarray(payload["longitudes"], dtype=np.float64)
+            timestamps = np.asarray(payload["timestamps"], dtype=np.float64)
+    except (KeyError, TypeError, ValueError, OverflowError) as e:
+        # OverflowError: integers too large for the array type (e.g. 10**30)
+        raise ValueError(f"Malformed telemetry payload: {e}")
+
+    if not (latitudes.ndim == longitudes.ndim == timestamps.ndim == 1):
+        raise ValueError("Telemetry arrays must be one-dimensional")
+    if not (len(latitudes) == len(longitudes) == len(timestamps)):
+        raise ValueError("Telemetry arrays must have the same length")
+    if len(timestamps) > settings.TELEMETRY_MAX_POINTS_PER_BATCH:
+        raise ValueError(f"At most {settings.TELEMETRY_MAX_POINTS_PER_BATCH} points per batch")
+
+    valid = (
+        np.isfinite(latitudes) & np.isfinite(longitudes) & np.isfinite(timestamps)
+        & (np.abs(latitudes) <= 90.0) & (np.abs(longitudes) <= 180.0)
+    )
+    if not valid.all():
+        raise ValueError("Telemetry contains invalid coordinates or timestamps")
+    if len(timestamps) and timestamps.max() > now + settings.TELEMETRY_MAX_CLOCK_SKEW_SECONDS:
+        raise ValueError("Telemetry timestamps are in the future")
+    if len(timestamps) and timestamps.min() < now - settings.TELEMETRY_MAX_POINT_AGE_SECONDS:
+        raise ValueError(f"Telemetry timestamps are older than {settings.TELEMETRY_MAX_POINT_AGE_SECONDS:.0f} seconds")
+
+    order = np.argsort(timestamps, kind="stable")
+    return TelemetryBatch(latitudes[order], longitudes[order], timestamps[order])
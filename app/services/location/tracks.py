@@ -0,0 +1,306 @@
+import asyncio
+import os
+import struct
+import zlib
+from typing import Dict, List, NamedTuple, Optional, Set
+
+import numpy as np
+
+from app.core.cache import TTLCache
+from app.core.config import settings
+from app.services.ride_matching.distance import haversine_km_array
+
+
+# On-disk layout: a 16-byte header (magic, point count, base timestamp in ms)
+# followed by `count` packed POINT_DTYPE records. Plain ".trk" files can be
+# memory-mapped; ".trkz" files hold the same bytes zlib-compressed.
+TRACK_MAGIC = b"TRK1"
+HEADER = struct.Struct("<4sIq")
+POINT_DTYPE = np.dtype([("lat", "<i4"), ("lon", "<i4"), ("dt", "<i4")])
+COORDINATE_SCALE = 1e6
+
+INITIAL_CAPACITY = 64
+
+
+class Track(NamedTuple):
+    """
+    Decoded GPS track: timestamps in seconds, coordinates in degrees.
+    """
+    timestamps: np.ndarray
+    latitudes: np.ndarray
+    longitudes: np.ndarray
+
+    @property
+    def size(self) -> int:
+        return len(self.timestamps)
+
+    def distance_km(self) -> float:
+        if self.size < 2:
+            return 0.0
+        return float(haversine_km_array(
+            self.latitudes[:-1], self.longitudes[:-1], self.latitudes[1:], self.longitudes[1:]
+        ).sum())
+
+
+def decode_points(points: np.ndarray, base_ms: int) -> Track:
+    """
+    Decode packed points (possibly a memory map) into a Track ordered by time.
+    """
+    timestamps_ms = base_ms + np.cumsum(points["dt"], dtype=np.int64)
+    order = np.argsort(timestamps_ms, kind="stable")
+    return Track(
+        timestamps=timestamps_ms[order] / 1000.0,
+        latitudes=points["lat"][order] / COORDINATE_SCALE,
+        longitudes=points["lon"][order] / COORDINATE_SCALE,
+    )
+
+
+class RideTrack:
+    """
+    Append-only buffer of packed points for one active ride.
+
+    Coordinates are int32 micro-degrees (~11 cm resolution) and timestamps
+    int32 millisecond deltas from the previous point, so a point costs 12
+    bytes. The buffer doubles when full, keeping appends amortised O(1).
+    """
+
+    def __init__(self, driver_id: Optional[int] = None):
+        self.driver_id = driver_id
+        self.base_ms: Optional[int] = None
+        self._last_ms = 0
+        self._points = np.empty(INITIAL_CAPACITY, dtype=POINT_DTYPE)
+        self._size = 0
+
+    @property
+    def size(self) -> int:
+        return self._size
+
+    @property
+    def points(self) -> np.ndarray:
+        return self._points[:self._size]
+
+    @property
+    def nbytes(self) -> int:
+        return self._points.nbytes
+
+    def append(self, latitudes: np.ndarray, longitudes: np.ndarray, timestamps: np.ndarray) -> None:
+        count = len(timestamps)
+        if count == 0:
+            return
+
+        timestamps_ms = np.round(np.asarray(timestamps, dtype=np.float64) * 1000).astype(np.int64)
+        if self.base_ms is None:
+            self.base_ms = self._last_ms = int(timestamps_ms[0])
+
+        needed = self._size + count
+        self._reserve(needed)
+
+        chunk = self._points[self._size:needed]
+        chunk["lat"] = np.round(np.asarray(latitudes) * COORDINATE_SCALE)
+        chunk["lon"] = np.round(np.asarray(longitudes) * COORDINATE_SCALE)
+        chunk["dt"] = np.diff(timestamps_ms, prepend=self._last_ms)
+        self._last_ms = int(timestamps_ms[-1])
+        self._size = needed
+
+    def append_point(self, latitude: float, longitude: float, timestamp: float) -> None:
+        """
+        Scalar fast path for single pings, avoiding per-call array overhead.
+        """
+        timestamp_ms = int(round(timestamp * 1000))
+        if self.base_ms is None:
+            self.base_ms = self._last_ms = timestamp_ms
+
+        self._reserve(self._size + 1)
+        self._points[self._size] = (
+            int(round(latitude * COORDINATE_SCALE)),
+            int(round(longitude * COORDINATE_SCALE)),
+            timestamp_ms - self._last_ms,
+        )
+        self._last_ms = timestamp_ms
+        self._size += 1
+
+    def _reserve(self, needed: int) -> None:
+        if needed <= len(self._points):
+            return
+        capacity = len(self._points)
+        while capacity < needed:
+            capacity *= 2
+        grown = np.empty(capacity, dtype=POINT_DTYPE)
+        grown[:self._size] = self._points[:self._size]
+        self._points = grown
+
+    def decode(self) -> Track:
+        if self.base_ms is None:
+            return Track(np.empty(0), np.empty(0), np.empty(0))
+        return decode_points(self.points, self.base_ms)
+
+    def to_bytes(self) -> bytes:
+        return HEADER.pack(TRACK_MAGIC, self._size, self.base_ms or 0) + self.points.tobytes()
+
+
+class TrackStore:
+    """
+    Per-ride GPS tracks: packed in memory while the ride is active, written
+    to one file per ride when it ends. A ride that is re-matched after its
+    driver backed out adds each later segment to the same file.
+
+    Drivers are linked to their active rides (several when pooling), so
+    location pings can be routed to the right tracks without a database
+    lookup.
+    """
+
+    def __init__(
+        self,
+        directory: str = settings.TRACK_STORAGE_DIR,
+        compress: bool = settings.TRACK_STORAGE_COMPRESS
+    ):
+        self.directory = directory
+        self.compress = compress
+        self._tracks: Dict[int, RideTrack] = {}
+        self._driver_rides: Dict[int, Set[int]] = {}
+        # Drivers recently found to have no active ride in the database
+        self._free_drivers: TTLCache[bool] = TTLCache(
+            settings.TRACK_FREE_DRIVER_TTL_SECONDS, settings.TRACK_FREE_DRIVER_MAX_ENTRIES
+        )
+
+    def __contains__(self, ride_id: int) -> bool:
+        return ride_id in self._tracks
+
+    def begin(self, ride_id: int, driver_id: Optional[int] = None) -> RideTrack:
+        """
+        Start (or return) the track of a ride and route the driver's pings to it.
+        """
+        track = self._tracks.get(ride_id)
+        if track is None:
+            track = self._tracks[ride_id] = RideTrack(driver_id)
+        if driver_id is not None:
+            if track.driver_id != driver_id:
+                self._unlink_driver(track.driver_id, ride_id)
+                track.driver_id = driver_id
+            self._driver_rides.setdefault(driver_id, set()).add(ride_id)
+            self._free_drivers.discard(driver_id)
+        return track
+
+    def rides_for_driver(self, driver_id: int) -> List[int]:
+        """
+        The driver's active rides, oldest first; empty when they are free.
+        """
+        return sorted(self._driver_rides.get(driver_id, ()))
+
+    def mark_free(self, driver_id: int) -> None:
+        """
+        Remember that the database has no active ride for the driver, so
+        their uploads skip the lookup until a ride is linked or the mark
+        expires.
+        """
+        self._free_drivers.put(driver_id, True)
+
+    def known_free(self, driver_id: int) -> bool:
+        return self._free_drivers.get(driver_id) is not None
+
+    def append(
+        self,
+        ride_id: int,
+        latitudes: np.ndarray,
+        longitudes: np.ndarray,
+        timestamps: np.ndarray
+    ) -> None:
+        self.begin(ride_id).append(latitudes, longitudes, timestamps)
+
+    def record_driver_point(self, driver_id: int, latitude: float, longitude: float, timestamp: float) -> None:
+        """
+        Append a single ping to each of the driver's active rides.
+        """
+        for ride_id in self._driver_rides.get(driver_id, ()):
+            self._tracks[ride_id].append_point(latitude, longitude, timestamp)
+
+    def get(self, ride_id: int) -> Optional[Track]:
+        """
+        Return a ride's track from memory, or from disk once it was flushed.
+        """
+        track = self._tracks.get(ride_id)
+        if track is not None:
+            return track.decode()
+        return self.load(ride_id)
+
+    def path_for(self, ride_id: int, compressed: bool) -> str:
+        return os.path.join(self.directory, f"{ride_id}.{'trkz' if compressed else 'trk'}")
+
+    async def finish(self, ride_id: int) -> Optional[Track]:
+        """
+        Flush a ride's track to disk off the event loop and release it from
+        memory. Returns the decoded track, or None if nothing was recorded.
+        """
+        track = self._tracks.pop(ride_id, None)
+        if track is None:
+            return None
+        self._unlink_driver(track.driver_id, ride_id)
+        if track.size == 0:
+            return None
+
+        loop = asyncio.get_running_loop()
+        await loop.run_in_executor(None, self._write, ride_id, track)
+        return track.decode()
+
+    def _unlink_driver(self, driver_id: Optional[int], ride_id: int) -> None:
+        ride_ids = self._driver_rides.get(driver_id)
+        if ride_ids is not None:
+            ride_ids.discard(ride_id)
+            if not ride_ids:
+                del self._driver_rides[driver_id]
+
+    def open(self, ride_id: int) -> Optional[np.ndarray]:
+        """
+        Memory-map a flushed, uncompressed track for replay or audit.
+        Returns the packed points without reading them into memory.
+        """
+        path = self.path_for(ride_id, compressed=False)
+        if not os.path.exists(path):
+            return None
+        count, _ = self._read_header(path)
+        return np.memmap(path, dtype=POINT_DTYPE, mode="r", offset=HEADER.size, shape=(count,))
+
+    def load(self, ride_id: int) -> Optional[Track]:
+        path = self.path_for(ride_id, compressed=False)
+        if os.path.exists(path):
+            _, base_ms = self._read_header(path)
+            return decode_points(self.open(ride_id), base_ms)
+
+        path = self.path_for(ride_id, compressed=True)
+        if os.path.exists(path):
+            with open(path, "rb") as f:
+                raw = zlib.decompress(f.read())
+            _, count, base_ms = HEADER.unpack_from(raw)
+            points = np.frombuffer(raw, dtype=POINT_DTYPE, count=count, offset=HEADER.size)
+            return decode_points(points, base_ms)
+        return None
+
+    def _write(self, ride_id: int, track: RideTrack) -> None:
+        previous = self.load(ride_id)
+        if previous is not None:
+            # The ride was re-matched after a driver backed out: the file
+            # keeps the earlier segments ahead of this one
+            current = track.decode()
+            track = RideTrack(track.driver_id)
+            track.append(previous.latitudes, previous.longitudes, previous.timestamps)
+            track.append(current.latitudes, current.longitudes, current.timestamps)
+
+        os.makedirs(self.directory, exist_ok=True)
+        payload = track.to_bytes()
+        path = self.path_for(ride_id, self.compress)
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, "wb") as f:
+            f.write(zlib.compress(payload, 6) if self.compress else payload)
+        os.replace(tmp_path, path)
+
+    @staticmethod
+    def _read_header(path: str):
+        with open(path, "rb") as f:
+            magic, count, base_ms = HEADER.unpack(f.read(HEADER.size))
+        if magic != TRACK_MAGIC:
+            raise ValueError(f"Not a track file: {path}")
+        return count, base_ms
+
+
+# Process-wide store of ride tracks
+track_store = TrackStore()
@@ -0,0 +1,163 @@
+import asyncio
+import time
+from concurrent.futures import Executor, ThreadPoolExecutor
+from typing import Any, Dict, List, Optional, Set, Tuple
+
+import numpy as np
+
+from app.core.config import settings
+from app.core.metrics import metrics
+from app.services.ml.registry import ModelRegistry, model_registry
+
+
+BATCH_SIZE_BUCKETS = (1, 2, 4, 8, 16, 32, 64, 128, 256)
+WAIT_MS_BUCKETS = (0.5, 1, 2, 5, 10, 20, 50, 100, 250)
+
+
+class MicroBatcher:
+    """
+    Coalesces concurrent single-row predictions into batched `predict` calls.
+
+    Callers enqueue one feature row and await their own result. A flusher
+    task collects rows until `max_batch_size` is reached or the oldest row
+    has waited `max_wait_ms`, stacks them and runs the current registry
+    model on the executor, off the event loop. At most `max_concurrency`
+    batches are in flight; while they run, new rows keep accumulating into
+    the next batch.
+
+    The model is looked up per batch, so a hot-swapped model is picked up
+    by the next batch while running batches finish with the old one. The
+    default executor is a thread pool (sklearn and NumPy release the GIL
+    for most of predict); a process pool only works with picklable models.
+    """
+
+    def __init__(
+        self,
+        model_name: str,
+        max_batch_size: int = settings.ML_BATCH_MAX_SIZE,
+        max_wait_ms: float = settings.ML_BATCH_MAX_WAIT_MS,
+        max_concurrency: int = settings.ML_BATCH_WORKERS,
+        executor: Optional[Executor] = None,
+        registry: ModelRegistry = model_registry
+    ):
+        self.model_name = model_name
+        self.max_batch_size = max_batch_size
+        self.max_wait_seconds = max_wait_ms / 1000.0
+        self.max_concurrency = max_concurrency
+        self.registry = registry
+        self._executor = executor
+        self._pending: List[Tuple[np.ndarray, "asyncio.Future[Any]", float]] = []
+        self._wakeup: Optional[asyncio.Event] = None
+        self._full: Optional[asyncio.Event] = None
+        self._slots: Optional[asyncio.Semaphore] = None
+        self._task: Optional[asyncio.Task] = None
+        self._inflight: Set[asyncio.Task] = set()
+        self.batch_sizes = metrics.histogram(f"ml.{model_name}.batch_size", BATCH_SIZE_BUCKETS)
+        self.queue_wait_ms = metrics.histogram(f"ml.{model_name}.queue_wait_ms", WAIT_MS_BUCKETS)
+
+    @property
+    def running(self) -> bool:
+        return self._task is not None and not self._task.done()
+
+    async def predict(self, features: np.ndarray) -> Any:
+        """
+        Predict one feature row; resolves with that row's prediction.
+        """
+        if not self.running:
+            self.start()
+
+        future = asyncio.get_running_loop().create_future()
+        self._pending.append((np.asarray(features, dtype=np.float64).ravel(), future, time.perf_counter()))
+        self._wakeup.set()
+        if len(self._pending) >= self.max_batch_size:
+            self._full.set()
+        return await future
+
+    def start(self) -> None:
+        if self.running:
+            return
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(
+                max_workers=self.max_concurrency, thread_name_prefix=f"ml-{self.model_name}"
+            )
+        self._wakeup = asyncio.Event()
+        self._full = asyncio.Event()
+        self._slots = asyncio.Semaphore(self.max_concurrency)
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        pending, self._pending = self._pending, []
+        for _, future, _ in pending:
+            future.cancel()
+
+    async def _run(self) -> None:
+        while True:
+            await self._wakeup.wait()
+
+            # Give the batch until the oldest row's deadline to fill up
+            remaining = self._pending[0][2] + self.max_wait_seconds - time.perf_counter()
+            if len(self._pending) < self.max_batch_size and remaining > 0:
+                self._full.clear()
+                try:
+                    await asyncio.wait_for(self._full.wait(), remaining)
+                except asyncio.TimeoutError:
+                    pass
+
+            await self._slots.acquire()
+            batch = self._pending[:self.max_batch_size]
+            del self._pending[:self.max_batch_size]
+            if not self._pending:
+                self._wakeup.clear()
+            task = asyncio.create_task(self._dispatch(batch))
+            self._inflight.add(task)
+            task.add_done_callback(self._inflight.discard)
+
+    async def _dispatch(self, batch: List[Tuple[np.ndarray, "asyncio.Future[Any]", float]]) -> None:
+        try:
+            started = time.perf_counter()
+            self.batch_sizes.observe(len(batch))
+            for _, _, enqueued in batch:
+                self.queue_wait_ms.observe((started - enqueued) * 1000.0)
+
+            model = self.registry.get(self.model_name)
+            if model is None:
+                raise LookupError(f"No {self.model_name} model loaded")
+
+            rows = np.vstack([row for row, _, _ in batch])
+            loop = asyncio.get_running_loop()
+            predictions = await loop.run_in_executor(self._executor, model.predict, rows)
+        except Exception as exc:
+            for _, future, _ in batch:
+                if not future.done():
+                    future.set_exception(exc)
+        else:
+            for (_, future, _), prediction in zip(batch, predictions):
+                if not future.done():
+                    future.set_result(prediction)
+        finally:
+            self._slots.release()
+
+
+_batchers: Dict[str, MicroBatcher] = {}
+
+
+def batcher_for(model_name: str) -> MicroBatcher:
+    """
+    Return the process-wide batcher for a registry model.
+    """
+    batcher = _batchers.get(model_name)
+    if batcher is None:
+        batcher = _batchers[model_name] = MicroBatcher(model_name)
+    return batcher
+
+
+async def stop_batchers() -> None:
+    for batcher in _batchers.values():
+        await batcher.stop()
@@ -0,0 +1,134 @@
+import asyncio
+import logging
+import os
+from typing import Any, Dict, NamedTuple, Optional
+
+import joblib
+
+from app.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+
+FARE_MODEL = "fare"
+MATCHING_MODEL = "matching"
+FRAUD_MODEL = "fraud"
+
+
+class LoadedModel(NamedTuple):
+    """
+    A model together with the file version it was loaded from.
+    """
+    name: str
+    path: str
+    model: Any
+    mtime: float
+
+
+def load_model_file(path: str) -> Any:
+    """
+    Load a joblib model, memory-mapping its NumPy arrays read-only.
+
+    Memory-mapped arrays live in the OS page cache, so every worker process
+    that loads the same file shares one physical copy. Compressed dumps
+    cannot be mapped and are read into memory instead.
+    """
+    try:
+        return joblib.load(path, mmap_mode="r")
+    except ValueError:
+        return joblib.load(path)
+
+
+class ModelRegistry:
+    """
+    Process-wide registry of loaded ML models.
+
+    Models are loaded once (at startup) off the event loop and looked up by
+    name on the hot path. A background watcher reloads a model when its file
+    is replaced; the new model is swapped in with a single dict assignment,
+    so predictions already holding the previous model finish with it.
+    """
+
+    def __init__(self, reload_interval_seconds: float = settings.MODEL_RELOAD_INTERVAL_SECONDS):
+        self.reload_interval_seconds = reload_interval_seconds
+        self._paths: Dict[str, str] = {}
+        self._models: Dict[str, LoadedModel] = {}
+        self._task: Optional[asyncio.Task] = None
+
+    def register(self, name: str, path: str) -> None:
+        self._paths[name] = path
+
+    def get(self, name: str) -> Optional[Any]:
+        """
+        Return the current model for `name`, or None if none is loaded.
+        """
+        loaded = self._models.get(name)
+        return loaded.model if loaded is not None else None
+
+    def loaded(self, name: str) -> Optional[LoadedModel]:
+        return self._models.get(name)
+
+    def set(self, name: str, model: Any, path: str = "", mtime: float = 0.0) -> None:
+        """
+        Install a model directly, e.g. one trained in-process.
+        """
+        self._models[name] = LoadedModel(name, path, model, mtime)
+
+    async def load(self, name: str) -> bool:
+        """
+        (Re)load `name` from its file if the file changed since the last
+        load. Returns True when a new model was swapped in.
+        """
+        path = self._paths[name]
+        try:
+            mtime = os.stat(path).st_mtime
+        except FileNotFoundError:
+            return False
+
+        current = self._models.get(name)
+        if current is not None and current.path == path and current.mtime == mtime:
+            return False
+
+        loop = asyncio.get_running_loop()
+        try:
+            model = await loop.run_in_executor(None, load_model_file, path)
+        except Exception:
+            # A half-written or corrupt file must not replace a working model
+            logger.exception("Failed to load %s model from %s", name, path)
+            return False
+
+        self._models[name] = LoadedModel(name, path, model, mtime)
+        logger.info("Loaded %s model from %s", name, path)
+        return True
+
+    async def load_all(self) -> None:
+        for name in self._paths:
+            await self.load(name)
+
+    def start(self) -> None:
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def _run(self) -> None:
+        while True:
+            await asyncio.sleep(self.reload_interval_seconds)
+            try:
+                await self.load_all()
+            except Exception:
+                logger.exception("Model reload failed")
+
+
+# Process-wide model registry, loaded on application startup
+model_registry = ModelRegistry()
+model_registry.register(FARE_MODEL, settings.FARE_ESTIMATION_MODEL_PATH)
+model_registry.register(MATCHING_MODEL, settings.RIDE_MATCHING_MODEL_PATH)
+model_registry.register(FRAUD_MODEL, settings.FRAUD_DETECTION_MODEL_PATH)
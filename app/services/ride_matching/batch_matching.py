@@ -0,0 +1,214 @@
+import asyncio
+import logging
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+from scipy.optimize import linear_sum_assignment
+
+from app.core.config import settings
+from app.core.executor import cpu_executor
+from app.models.ride import Ride, RideStatus
+from app.services.location.store import location_store
+from app.services.ride_matching.geo_index import driver_index
+from app.services.ride_matching.matching import assign_driver, load_available_drivers
+from app.services.ride_matching.rematch import rematch_candidates
+from app.services.routing.matrix import travel_time_matrix
+
+logger = logging.getLogger(__name__)
+
+# Cost used for rider/driver pairs that are too far apart to be matched
+INFEASIBLE_COST = 1e9
+
+
+def solve_assignment(
+    candidates: Dict[int, List[Tuple[int, float]]]
+) -> Dict[int, Tuple[int, float]]:
+    """
+    Solve the rider x driver min-cost assignment.
+
+    `candidates` maps each ride id to its (driver_id, pickup_distance_km)
+    options. Returns ride_id -> (driver_id, pickup_distance_km) for every
+    ride that could be matched; a driver is used at most once.
+    """
+    ride_ids = [ride_id for ride_id, options in candidates.items() if options]
+    driver_ids = sorted({driver_id for ride_id in ride_ids for driver_id, _ in candidates[ride_id]})
+    if not ride_ids or not driver_ids:
+        return {}
+
+    column = {driver_id: j for j, driver_id in enumerate(driver_ids)}
+    cost = np.full((len(ride_ids), len(driver_ids)), INFEASIBLE_COST)
+    for i, ride_id in enumerate(ride_ids):
+        for driver_id, distance_km in candidates[ride_id]:
+            cost[i, column[driver_id]] = distance_km
+
+    rows, cols = linear_sum_assignment(cost)
+
+    return {
+        ride_ids[i]: (driver_ids[j], float(cost[i, j]))
+        for i, j in zip(rows, cols)
+        if cost[i, j] < INFEASIBLE_COST
+    }
+
+
+class MatchingWindow:
+    """
+    Collects requested rides over a short window and matches them together.
+
+    Matching a whole window at once as a bipartite assignment avoids two
+    nearby riders racing for the same driver, and minimises the total pickup
+    distance across the batch instead of per ride.
+    """
+
+    def __init__(
+        self,
+        window_seconds: float = settings.MATCHING_WINDOW_SECONDS,
+        max_distance_km: float = settings.MATCHING_MAX_DISTANCE_KM,
+        candidate_limit: int = settings.MATCHING_CANDIDATE_LIMIT,
+        max_attempts: int = settings.MATCHING_WINDOW_MAX_ATTEMPTS
+    ):
+        self.window_seconds = window_seconds
+        self.max_distance_km = max_distance_km
+        self.candidate_limit = candidate_limit
+        self.max_attempts = max_attempts
+        self.dropped = 0
+        # Ride ids waiting for the next flush, in submission order, with the
+        # windows each has already been through unmatched
+        self._pending: Dict[int, int] = {}
+        self._task: Optional[asyncio.Task] = None
+
+    @property
+    def running(self) -> bool:
+        return self._task is not None and not self._task.done()
+
+    def submit(self, ride_id: int) -> None:
+        """
+        Queue a ride for the next matching window.
+        """
+        self._pending.setdefault(ride_id, 0)
+
+    def _carry_over(self, ride_id: int, attempts: int) -> None:
+        """
+        Keep an unmatched ride for the next window, unless it has been
+        through max_attempts of them.
+        """
+        if attempts >= self.max_attempts:
+            self.dropped += 1
+            return
+        self._pending[ride_id] = max(attempts, self._pending.get(ride_id, 0))
+
+    def start(self) -> None:
+        if not self.running:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def _run(self) -> None:
+        while True:
+            await asyncio.sleep(self.window_seconds)
+            try:
+                await self.flush()
+            except Exception:
+                logger.exception("Matching window flush failed")
+
+    async def flush(self) -> Dict[int, int]:
+        """
+        Match every pending ride in one assignment pass.
+
+        Returns ride_id -> driver_id for the rides that were matched. Rides
+        with no feasible driver stay queued for up to max_attempts windows.
+        """
+        attempts, self._pending = self._pending, {}
+        if not attempts:
+            return {}
+
+        rides = await Ride.filter(id__in=list(attempts), status=RideStatus.REQUESTED)
+        if not rides:
+            return {}
+
+        # Over-fetch per ride so competing rides have alternatives
+        nearest = {
+            ride.id: driver_index.nearest(
+                ride.pickup_latitude,
+                ride.pickup_longitude,
+                k=self.candidate_limit * 2,
+                max_distance_km=self.max_distance_km
+            )
+            for ride in rides
+        }
+
+        all_driver_ids = list({driver_id for options in nearest.values() for driver_id, _ in options})
+        fresh = location_store.fresh_positions(all_driver_ids)
+        available_ids = {
+            driver.id for driver in await load_available_drivers([driver_id for driver_id in all_driver_ids if driver_id in fresh])
+        }
+
+        candidates = {
+            ride_id: [(driver_id, distance) for driver_id, distance in options if driver_id in available_ids]
+            for ride_id, options in nearest.items()
+        }
+        candidates = await self._with_road_etas(rides, candidates)
+        assignment = await cpu_executor.run(solve_assignment, candidates)
+
+        matched = {}
+        for ride in rides:
+            if ride.id not in assignment:
+                self._carry_over(ride.id, attempts[ride.id] + 1)
+                continue
+
+            driver_id, _ = assignment[ride.id]
+            if not await assign_driver(ride, driver_id):
+                # Taken by another matcher since the candidates were read
+                self._carry_over(ride.id, attempts[ride.id] + 1)
+                continue
+            if settings.REMATCH_CACHE_ENABLED:
+                rematch_candidates.remember(
+                    ride.id, [option[0] for option in sorted(candidates[ride.id], key=lambda option: option[1])]
+                )
+            matched[ride.id] = driver_id
+
+        logger.info("Matching window: %s/%s rides matched", len(matched), len(rides))
+        return matched
+
+    async def _with_road_etas(
+        self,
+        rides: List[Ride],
+        candidates: Dict[int, List[Tuple[int, float]]]
+    ) -> Dict[int, List[Tuple[int, float]]]:
+        """
+        Re-cost candidate pairs by road ETA (as distance at the default city
+        speed) using one drivers x pickups matrix query for the window.
+        """
+        driver_ids = sorted({driver_id for options in candidates.values() for driver_id, _ in options})
+        if not travel_time_matrix.available or not driver_ids:
+            return candidates
+
+        positions = np.array([driver_index.get(driver_id) for driver_id in driver_ids])
+        pickups = np.array([(ride.pickup_latitude, ride.pickup_longitude) for ride in rides])
+        eta_seconds = await travel_time_matrix.many_to_many(
+            positions[:, 0], positions[:, 1], pickups[:, 0], pickups[:, 1]
+        )
+        if eta_seconds is None:
+            return candidates
+
+        row = {driver_id: i for i, driver_id in enumerate(driver_ids)}
+        column = {ride.id: j for j, ride in enumerate(rides)}
+        eta_km = eta_seconds / 3600.0 * settings.ETA_DEFAULT_SPEED_KMH
+        return {
+            ride_id: [
+                (driver_id, float(eta_km[row[driver_id], column[ride_id]]))
+                for driver_id, _ in options
+                if eta_km[row[driver_id], column[ride_id]] <= self.max_distance_km
+            ]
+            for ride_id, options in candidates.items()
+        }
+
+
+# Process-wide matching window, started on application startup in batch mode
+matching_window = MatchingWindow()
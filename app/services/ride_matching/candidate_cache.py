@@ -0,0 +1,355 @@
+import asyncio
+import logging
+import math
+import time
+from typing import Any, Awaitable, Callable, Dict, List, NamedTuple, Optional, Sequence, Set, Tuple
+
+import numpy as np
+
+from app.core.config import settings
+from app.services.ride_matching.distance import KM_PER_DEGREE, haversine_km, haversine_km_array
+from app.services.ride_matching.driver_stats import DriverStatsStore, driver_stats
+from app.services.ride_matching.geo_index import CellKey, DriverGeoIndex, driver_index
+from app.services.ride_matching.ranking import (
+    DriverCandidates, rank_candidates, ranking_weights_from_settings, score_candidates, with_road_etas
+)
+
+logger = logging.getLogger(__name__)
+
+
+# Filters driver ids down to those online and free, preserving order
+AvailableDrivers = Callable[[List[int]], Awaitable[List[int]]]
+
+
+class CellCandidates(NamedTuple):
+    """
+    Idle drivers among the K nearest to one cell's centre, ranked from the
+    centre; every idle driver within `coverage_km` of the centre is listed.
+    Per driver: the score without its distance term, the ranking distance
+    (road ETA as km when routed) and the straight-line distance, both from
+    the centre.
+    """
+    driver_ids: Tuple[int, ...]
+    base_scores: Tuple[float, ...]
+    distance_km: Tuple[float, ...]
+    centre_km: Tuple[float, ...]
+    coverage_km: float
+    computed_at: float
+
+
+class CandidateCache:
+    """
+    Precomputed ranked driver candidates per active pickup cell.
+
+    A cell becomes active when a ride is requested in it. A background
+    refresher keeps, per active cell, the idle drivers among the K nearest
+    to the cell centre with their scores (availability check, road ETAs,
+    scoring as for a live request). It recomputes a cell only when
+    a driver on its list moved or changed state, a driver came within the
+    list's coverage radius, or the list is about to exceed the staleness
+    bound. Requests then read the list in O(K).
+
+    A request takes the drivers on the list closest to its pickup, which
+    are the ones a live query would find as long as they lie inside the
+    list's coverage radius (otherwise it falls back to a live query), and
+    redoes their distance terms for the actual pickup: the straight-line
+    change from the centre is added to the ranking distance, which is exact
+    without a road graph. Lists may lag by up to `max_staleness_seconds`,
+    so callers still confirm availability.
+    """
+
+    def __init__(
+        self,
+        available: AvailableDrivers,
+        cell_size_km: float = settings.CANDIDATE_CACHE_CELL_SIZE_KM,
+        top_k: int = settings.CANDIDATE_CACHE_TOP_K,
+        max_staleness_seconds: float = settings.CANDIDATE_CACHE_MAX_STALENESS_SECONDS,
+        refresh_seconds: float = settings.CANDIDATE_CACHE_REFRESH_SECONDS,
+        min_move_meters: float = settings.CANDIDATE_CACHE_MIN_MOVE_METERS,
+        active_seconds: float = settings.CANDIDATE_CACHE_ACTIVE_SECONDS,
+        max_distance_km: float = settings.MATCHING_MAX_DISTANCE_KM,
+        index: DriverGeoIndex = driver_index,
+        stats: DriverStatsStore = driver_stats
+    ):
+        self.available = available
+        self.cell_size_km = cell_size_km
+        self.cell_degrees = cell_size_km / KM_PER_DEGREE
+        self.top_k = top_k
+        # A pickup is at most this far from its cell centre
+        self.half_diagonal_km = cell_size_km * math.sqrt(2) / 2
+        self.max_staleness_seconds = max_staleness_seconds
+        self.refresh_seconds = refresh_seconds
+        self.min_move_km = min_move_meters / 1000.0
+        self.active_seconds = active_seconds
+        self.max_distance_km = max_distance_km
+        self.index = index
+        self.driver_stats = stats
+        self.hits = 0
+        self.misses = 0
+        self.refreshed = 0
+        self.uncovered = 0
+        self._lists: Dict[CellKey, CellCandidates] = {}
+        self._last_used: Dict[CellKey, float] = {}
+        self._dirty: Set[CellKey] = set()
+        self._changed: Set[int] = set()
+        self._moved: Set[int] = set()
+        # Where each moved driver was when lists were last invalidated for them
+        self._evaluated_at: Dict[int, Tuple[float, float]] = {}
+        self._last_pickup: Optional[Tuple[CellCandidates, Tuple[float, float], Dict[int, Tuple[float, float]]]] = None
+        self._wakeup: Optional[asyncio.Event] = None
+        self._task: Optional[asyncio.Task] = None
+
+    def cell_for(self, latitude: float, longitude: float) -> CellKey:
+        return (
+            int(math.floor(latitude / self.cell_degrees)),
+            int(math.floor(longitude / self.cell_degrees)),
+        )
+
+    def centre(self, cell: CellKey) -> Tuple[float, float]:
+        return (cell[0] + 0.5) * self.cell_degrees, (cell[1] + 0.5) * self.cell_degrees
+
+    # Reads
+
+    def lookup(self, latitude: float, longitude: float, now: Optional[float] = None) -> Optional[CellCandidates]:
+        """
+        The list for the cell containing a pickup, or None when the cache is
+        not running or the list is missing or too stale. A miss activates
+        the cell so the refresher builds its list.
+        """
+        if self._task is None:
+            return None
+        now = time.time() if now is None else now
+        cell = self.cell_for(latitude, longitude)
+        self._last_used[cell] = now
+        entry = self._lists.get(cell)
+        if entry is None or now - entry.computed_at > self.max_staleness_seconds:
+            self.misses += 1
+            if cell not in self._dirty:
+                self._dirty.add(cell)
+                self._wakeup.set()
+            return None
+        self.hits += 1
+        return entry
+
+    def nearby(
+        self,
+        latitude: float,
+        longitude: float,
+        max_distance_km: float,
+        limit: int
+    ) -> Optional[List[int]]:
+        """
+        Up to `limit` listed drivers within `max_distance_km` of the pickup,
+        closest first, or None when the list cannot answer: it is stale, was
+        built for a smaller radius, or a closer driver might be off the list.
+        """
+        if limit > self.top_k or max_distance_km > self.max_distance_km:
+            return None
+        entry = self.lookup(latitude, longitude)
+        if entry is None:
+            return None
+        centre = self.centre(self.cell_for(latitude, longitude))
+        # Drivers within this straight-line distance of the pickup are all listed
+        covered_km = entry.coverage_km - haversine_km(latitude, longitude, centre[0], centre[1])
+        distances = self._distances(entry, latitude, longitude)
+        found = sorted(distances, key=lambda driver_id: distances[driver_id][0])[:limit]
+        reach_km = distances[found[-1]][0] if len(found) == limit else max_distance_km
+        if reach_km > covered_km:
+            self.uncovered += 1
+            return None
+        return [driver_id for driver_id in found if distances[driver_id][1] <= max_distance_km]
+
+    def scores(self, latitude: float, longitude: float, driver_ids: Sequence[int]) -> Optional[List[float]]:
+        """
+        Cached scores for `driver_ids`, or None unless all of them are on a
+        fresh list for the pickup's cell.
+        """
+        entry = self.lookup(latitude, longitude)
+        if entry is None:
+            return None
+        distances = self._distances(entry, latitude, longitude)
+        if any(driver_id not in distances for driver_id in driver_ids):
+            return None
+        base = dict(zip(entry.driver_ids, entry.base_scores))
+        weight = ranking_weights_from_settings().distance
+        scores = []
+        for driver_id in driver_ids:
+            distance_km = distances[driver_id][1]
+            scores.append(
+                base[driver_id] + weight * (1.0 - distance_km / self.max_distance_km)
+                if distance_km <= self.max_distance_km else -math.inf
+            )
+        return scores
+
+    def _distances(
+        self,
+        entry: CellCandidates,
+        latitude: float,
+        longitude: float
+    ) -> Dict[int, Tuple[float, float]]:
+        # Straight-line and ranking distance from the pickup for listed
+        # drivers still indexed; kept for the last pickup, which nearby()
+        # and scores() share within one request
+        last = self._last_pickup
+        if last is not None and last[0] is entry and last[1] == (latitude, longitude):
+            return last[2]
+        distances = {}
+        for driver_id, distance_km, centre_km in zip(entry.driver_ids, entry.distance_km, entry.centre_km):
+            position = self.index.get(driver_id)
+            if position is not None:
+                pickup_km = haversine_km(latitude, longitude, position[0], position[1])
+                distances[driver_id] = (pickup_km, distance_km + pickup_km - centre_km)
+        self._last_pickup = (entry, (latitude, longitude), distances)
+        return distances
+
+    # Refreshing
+
+    def driver_changed(self, driver_id: int) -> None:
+        """
+        Listener for idle/busy changes.
+        """
+        self._changed.add(driver_id)
+
+    def driver_moved(self, driver_id: int) -> None:
+        """
+        Listener for geo index updates and removals.
+        """
+        self._moved.add(driver_id)
+
+    def _significant_moves(self, moved: Set[int]) -> Set[int]:
+        # Pings that barely move a driver do not invalidate anything
+        significant = set()
+        for driver_id in moved:
+            position = self.index.get(driver_id)
+            if position is None:
+                self._evaluated_at.pop(driver_id, None)
+                significant.add(driver_id)
+                continue
+            last = self._evaluated_at.get(driver_id)
+            if last is None or haversine_km(last[0], last[1], position[0], position[1]) >= self.min_move_km:
+                self._evaluated_at[driver_id] = position
+                significant.add(driver_id)
+        return significant
+
+    async def refresh(self, now: Optional[float] = None) -> int:
+        """
+        Rebuild the lists invalidated since the last refresh; returns how
+        many were rebuilt.
+        """
+        now = time.time() if now is None else now
+        for cell, used in list(self._last_used.items()):
+            if now - used > self.active_seconds:
+                del self._last_used[cell]
+                self._lists.pop(cell, None)
+
+        changed, self._changed = self._changed, set()
+        moved, self._moved = self._moved, set()
+        dirty, self._dirty = self._dirty, set()
+        changed |= self._significant_moves(moved - changed)
+        if changed and self._lists:
+            dirty |= self._affected(changed)
+        # Lists age out even when nothing nearby changes: idle times drift
+        # and other processes assign drivers
+        dirty |= {cell for cell, entry in self._lists.items() if now - entry.computed_at >= self.max_staleness_seconds / 2}
+
+        dirty &= self._last_used.keys()
+        if not dirty:
+            return 0
+        # One availability check for the drivers around every dirty cell
+        nearest = {
+            cell: self.index.nearest(*self.centre(cell), k=self.top_k, max_distance_km=self.max_distance_km + self.half_diagonal_km)
+            for cell in dirty
+        }
+        available = set(await self.available(list({driver_id for options in nearest.values() for driver_id, _ in options})))
+        for cell, options in nearest.items():
+            self._lists[cell] = await self._rank(cell, options, available, now)
+        self.refreshed += len(dirty)
+        return len(dirty)
+
+    def _affected(self, changed: Set[int]) -> Set[CellKey]:
+        # Lists holding a changed driver, and lists whose coverage circle
+        # a changed driver is now inside
+        cells = list(self._lists)
+        affected = {cell for cell in cells if not changed.isdisjoint(self._lists[cell].driver_ids)}
+
+        positions = [position for position in map(self.index.get, changed) if position is not None]
+        if positions:
+            positions = np.array(positions)
+            centres = np.array([self.centre(cell) for cell in cells])
+            coverage = np.array([self._lists[cell].coverage_km for cell in cells])
+            distances = haversine_km_array(positions[:, 0:1], positions[:, 1:2], centres[None, :, 0], centres[None, :, 1])
+            reached = np.flatnonzero((distances <= coverage).any(axis=0))
+            affected.update(cells[column] for column in reached.tolist())
+        return affected
+
+    async def _rank(
+        self,
+        cell: CellKey,
+        nearest: List[Tuple[int, float]],
+        available: Set[int],
+        now: float
+    ) -> CellCandidates:
+        latitude, longitude = self.centre(cell)
+        # Short of K drivers, everyone within reach of any pickup in the cell is listed
+        coverage_km = nearest[-1][1] if len(nearest) == self.top_k else self.max_distance_km + self.half_diagonal_km
+        driver_ids = [driver_id for driver_id, _ in nearest if driver_id in available]
+        if not driver_ids:
+            return CellCandidates((), (), (), (), coverage_km, now)
+
+        candidates = DriverCandidates.build(driver_ids, latitude, longitude, self.index, self.driver_stats, now)
+        centre_km = candidates.distance_km
+        candidates = await with_road_etas(candidates, latitude, longitude, self.index)
+        weights = ranking_weights_from_settings()
+        base_scores = score_candidates(candidates, weights._replace(distance=0.0), self.max_distance_km)
+        order = [position for position, _ in rank_candidates(candidates, weights, max_distance_km=self.max_distance_km)]
+        return CellCandidates(
+            tuple(driver_ids[position] for position in order),
+            tuple(base_scores[order].tolist()),
+            tuple(candidates.distance_km[order].tolist()),
+            tuple(centre_km[order].tolist()),
+            coverage_km,
+            now,
+        )
+
+    def stats(self) -> Dict[str, Any]:
+        lookups = self.hits + self.misses
+        return {
+            "active_cells": len(self._last_used),
+            "lists": len(self._lists),
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / lookups, 3) if lookups else 0.0,
+            "uncovered": self.uncovered,
+            "refreshed": self.refreshed,
+        }
+
+    def start(self) -> None:
+        if self._task is None:
+            self._wakeup = asyncio.Event()
+            self.index.add_listener(self.driver_moved)
+            self.driver_stats.add_listener(self.driver_changed)
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+            self.index.remove_listener(self.driver_moved)
+            self.driver_stats.remove_listener(self.driver_changed)
+
+    async def _run(self) -> None:
+        wakeup = self._wakeup
+        while True:
+            try:
+                await asyncio.wait_for(wakeup.wait(), self.refresh_seconds)
+            except asyncio.TimeoutError:
+                pass
+            wakeup.clear()
+            try:
+                await self.refresh()
+            except Exception:
+                logger.exception("Candidate cache refresh failed")
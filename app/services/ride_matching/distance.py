@@ -0,0 +1,65 @@
+import math
+
+import numpy as np
+
+
+EARTH_RADIUS_KM = 6371.0088
+# Kilometres per degree of latitude on the same sphere, so grid cells and
+# haversine distances agree
+KM_PER_DEGREE = EARTH_RADIUS_KM * math.pi / 180
+
+
+def haversine_km(
+    latitude_a: float,
+    longitude_a: float,
+    latitude_b: float,
+    longitude_b: float
+) -> float:
+    """
+    Great-circle distance between two coordinates in kilometres.
+    """
+    lat_a = math.radians(latitude_a)
+    lat_b = math.radians(latitude_b)
+    d_lat = lat_b - lat_a
+    d_lon = math.radians(longitude_b - longitude_a)
+
+    a = math.sin(d_lat / 2) ** 2 + math.cos(lat_a) * math.cos(lat_b) * math.sin(d_lon / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * math.asin(min(1.0, math.sqrt(a)))
+
+
+def haversine_km_array(
+    latitude_a,
+    longitude_a,
+    latitude_b,
+    longitude_b
+) -> np.ndarray:
+    """
+    Vectorised great-circle distance in kilometres.
+
+    Arguments are scalars or NumPy arrays and broadcast against each other.
+    """
+    lat_a = np.radians(latitude_a)
+    lat_b = np.radians(latitude_b)
+    d_lat = lat_b - lat_a
+    d_lon = np.radians(np.asarray(longitude_b) - np.asarray(longitude_a))
+
+    a = np.sin(d_lat / 2) ** 2 + np.cos(lat_a) * np.cos(lat_b) * np.sin(d_lon / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * np.arcsin(np.minimum(1.0, np.sqrt(a)))
+
+
+def equirectangular_km_array(
+    latitude_a,
+    longitude_a,
+    latitude_b,
+    longitude_b
+) -> np.ndarray:
+    """
+    Vectorised flat-earth approximation of the distance in kilometres.
+
+    Cheaper than haversine and within a fraction of a percent of it at
+    city scale (tens of km); not suitable for long distances.
+    """
+    mean_lat = np.radians((np.asarray(latitude_a) + np.asarray(latitude_b)) / 2)
+    x = np.radians(np.asarray(longitude_b) - np.asarray(longitude_a)) * np.cos(mean_lat)
+    y = np.radians(np.asarray(latitude_b) - np.asarray(latitude_a))
+    return EARTH_RADIUS_KM * np.hypot(x, y)
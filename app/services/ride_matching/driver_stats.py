@@ -0,0 +1,96 @@
+import time
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+
+from app.core.config import settings
+
+
+class DriverStatsStore:
+    """
+    In-memory per-driver signals used to rank match candidates.
+
+    Ratings and acceptance rates fall back to neutral priors until real data
+    arrives, so new drivers are neither favoured nor penalised.
+    """
+
+    def __init__(
+        self,
+        default_rating: float = settings.DRIVER_DEFAULT_RATING,
+        default_acceptance_rate: float = settings.DRIVER_DEFAULT_ACCEPTANCE_RATE,
+        acceptance_smoothing: float = 0.1
+    ):
+        self.default_rating = default_rating
+        self.default_acceptance_rate = default_acceptance_rate
+        self.acceptance_smoothing = acceptance_smoothing
+        self._ratings: Dict[int, float] = {}
+        self._acceptance: Dict[int, float] = {}
+        self._idle_since: Dict[int, float] = {}
+        # Called with the driver id when a driver becomes idle or busy
+        self._listeners: List[Callable[[int], None]] = []
+
+    def add_listener(self, listener: Callable[[int], None]) -> None:
+        self._listeners.append(listener)
+
+    def remove_listener(self, listener: Callable[[int], None]) -> None:
+        if listener in self._listeners:
+            self._listeners.remove(listener)
+
+    def set_rating(self, driver_id: int, rating: float) -> None:
+        self._ratings[driver_id] = rating
+
+    def record_offer(self, driver_id: int, accepted: bool) -> None:
+        """
+        Fold an offer response into the driver's acceptance rate (EWMA).
+        """
+        current = self._acceptance.get(driver_id, self.default_acceptance_rate)
+        alpha = self.acceptance_smoothing
+        self._acceptance[driver_id] = (1 - alpha) * current + alpha * (1.0 if accepted else 0.0)
+
+    def mark_idle(self, driver_id: int, at: Optional[float] = None) -> None:
+        """
+        Record that a driver became free to take rides.
+        """
+        self._idle_since[driver_id] = time.time() if at is None else at
+        for listener in self._listeners:
+            listener(driver_id)
+
+    def mark_busy(self, driver_id: int) -> None:
+        self._idle_since.pop(driver_id, None)
+        for listener in self._listeners:
+            listener(driver_id)
+
+    def columns(
+        self,
+        driver_ids: Iterable[int],
+        now: Optional[float] = None
+    ) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """
+        Return (rating, acceptance_rate, idle_minutes) arrays for `driver_ids`.
+        """
+        now = time.time() if now is None else now
+        ratings = self._ratings
+        acceptance = self._acceptance
+        idle_since = self._idle_since
+        driver_ids = list(driver_ids)
+
+        rating = np.fromiter(
+            (ratings.get(driver_id, self.default_rating) for driver_id in driver_ids),
+            dtype=np.float64,
+            count=len(driver_ids)
+        )
+        acceptance_rate = np.fromiter(
+            (acceptance.get(driver_id, self.default_acceptance_rate) for driver_id in driver_ids),
+            dtype=np.float64,
+            count=len(driver_ids)
+        )
+        idle_minutes = np.fromiter(
+            ((now - idle_since.get(driver_id, now)) / 60.0 for driver_id in driver_ids),
+            dtype=np.float64,
+            count=len(driver_ids)
+        )
+        return rating, acceptance_rate, idle_minutes
+
+
+# Process-wide driver statistics
+driver_stats = DriverStatsStore()
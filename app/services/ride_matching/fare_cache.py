@@ -0,0 +1,121 @@
+import asyncio
+import math
+from typing import Any, Awaitable, Callable, Dict, Optional, Tuple
+
+from app.core.cache import TTLCache
+from app.core.config import settings
+from app.schemas.ride import RideEstimate
+from app.services.ride_matching.distance import KM_PER_DEGREE
+
+
+DEFAULT_PRODUCT = "standard"
+
+# (pickup cell, destination cell, surge epoch, product)
+FareCacheKey = Tuple[Tuple[int, int], Tuple[int, int], int, str]
+
+
+class FareEstimateCache(TTLCache[RideEstimate]):
+    """
+    TTL + LRU cache of fare estimates keyed by quantised trip endpoints.
+
+    Pickup and destination are snapped to square-degree cells roughly
+    `cell_size_km` wide, and the surge epoch is part of the key, so a quote
+    stays valid until either end moves to another cell or surge is
+    recomputed. Concurrent misses for the same key share one computation.
+
+    Quotes shown to each rider are also kept per rider, so a booking can
+    honour what that rider saw even after surge moved on.
+    """
+
+    def __init__(
+        self,
+        cell_size_km: float = settings.FARE_CACHE_CELL_SIZE_KM,
+        ttl_seconds: float = settings.FARE_CACHE_TTL_SECONDS,
+        max_entries: int = settings.FARE_CACHE_MAX_ENTRIES
+    ):
+        super().__init__(ttl_seconds, max_entries)
+        self.cell_degrees = cell_size_km / KM_PER_DEGREE
+        self._pending: Dict[FareCacheKey, "asyncio.Future[RideEstimate]"] = {}
+        self._shown: TTLCache[RideEstimate] = TTLCache(ttl_seconds, max_entries)
+        self.coalesced = 0
+
+    def cell_for(self, latitude: float, longitude: float) -> Tuple[int, int]:
+        return (
+            int(math.floor(latitude / self.cell_degrees)),
+            int(math.floor(longitude / self.cell_degrees)),
+        )
+
+    def key_for(
+        self,
+        pickup_latitude: float,
+        pickup_longitude: float,
+        destination_latitude: float,
+        destination_longitude: float,
+        surge_epoch: int,
+        product: str = DEFAULT_PRODUCT
+    ) -> FareCacheKey:
+        return (
+            self.cell_for(pickup_latitude, pickup_longitude),
+            self.cell_for(destination_latitude, destination_longitude),
+            surge_epoch,
+            product,
+        )
+
+    async def get_or_compute(
+        self,
+        key: FareCacheKey,
+        compute: Callable[[], Awaitable[RideEstimate]]
+    ) -> RideEstimate:
+        """
+        Return the cached estimate for `key`, computing it at most once even
+        when many requests miss at the same time.
+        """
+        estimate = self.get(key)
+        if estimate is not None:
+            return estimate
+
+        pending = self._pending.get(key)
+        if pending is not None:
+            self.coalesced += 1
+            return await asyncio.shield(pending)
+
+        self.misses += 1
+        future = asyncio.get_running_loop().create_future()
+        self._pending[key] = future
+        try:
+            estimate = await compute()
+        except asyncio.CancelledError:
+            future.cancel()
+            raise
+        except Exception as exc:
+            future.set_exception(exc)
+            # Waiters re-raise it; mark it retrieved so an unshared failure
+            # is not reported as never-retrieved
+            future.exception()
+            raise
+        else:
+            self.put(key, estimate)
+            future.set_result(estimate)
+            return estimate
+        finally:
+            del self._pending[key]
+
+    def record_shown(self, rider_id: int, key: FareCacheKey, estimate: RideEstimate) -> None:
+        self._shown.put((rider_id, key), estimate)
+
+    def shown(self, rider_id: int, key: FareCacheKey) -> Optional[RideEstimate]:
+        """
+        The quote `rider_id` was shown for `key`, if still kept.
+        """
+        return self._shown.get((rider_id, key))
+
+    def stats(self) -> Dict[str, Any]:
+        stats = super().stats()
+        lookups = self.hits + self.misses + self.coalesced
+        stats["coalesced"] = self.coalesced
+        stats["hit_rate"] = (self.hits + self.coalesced) / lookups if lookups else 0.0
+        return stats
+
+
+# Process-wide cache of fare quotes
+fare_cache = FareEstimateCache()
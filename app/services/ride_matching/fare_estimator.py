@@ -1,12 +1,20 @@
 import math
-import random
+from datetime import datetime
 from decimal import Decimal
-from typing import Optional, Tuple
+from typing import List, Optional, Sequence, Tuple
 
 import numpy as np
 from geopy.distance import geodesic
 
-from app.schemas.ride import RideEstimate
+from app.core.executor import cpu_bound
+from app.schemas.ride import RideEstimate, RideEstimateTrip
+from app.services.ml.batcher import batcher_for
+from app.services.ml.registry import FARE_MODEL, model_registry
+from app.services.ride_matching.distance import haversine_km, haversine_km_array
+from app.services.ride_matching.fare_cache import DEFAULT_PRODUCT, FareEstimateCache, fare_cache
+from app.services.ride_matching.surge import surge_engine
+from app.services.routing.service import road_router
+from app.services.routing.speed_profiles import speed_profiles
 
 
 # In a real application, this would be implemented with a machine learning model
@@ -22,70 +30,171 @@ async def estimate_distance(
     pickup_latitude: float,
     pickup_longitude: float, 
     destination_latitude: float,
-    destination_longitude: float
+    destination_longitude: float,
+    precise: bool = False
 ) -> float:
     """
-    Estimate the distance between two coordinates using geodesic distance.
+    Estimate the distance between two coordinates in kilometres.
+
+    Uses haversine by default; `precise` switches to the (much slower)
+    ellipsoidal geodesic distance.
     """
-    pickup = (pickup_latitude, pickup_longitude)
-    destination = (destination_latitude, destination_longitude)
-    
-    # Calculate distance in kilometers
-    distance_km = geodesic(pickup, destination).kilometers
-    return distance_km
+    return straight_line_km(pickup_latitude, pickup_longitude, destination_latitude, destination_longitude, precise)
+
+
+def straight_line_km(
+    pickup_latitude: float,
+    pickup_longitude: float,
+    destination_latitude: float,
+    destination_longitude: float,
+    precise: bool = False
+) -> float:
+    if precise:
+        pickup = (pickup_latitude, pickup_longitude)
+        destination = (destination_latitude, destination_longitude)
+        return geodesic(pickup, destination).kilometers
+
+    return haversine_km(pickup_latitude, pickup_longitude, destination_latitude, destination_longitude)
 
 
-async def estimate_duration(distance_km: float) -> int:
+def estimate_distances(trips: Sequence[RideEstimateTrip], precise: bool = False) -> np.ndarray:
+    """
+    Estimate the distance of many trips at once, in kilometres.
+    """
+    if precise:
+        return np.array([
+            geodesic(
+                (trip.pickup_latitude, trip.pickup_longitude),
+                (trip.destination_latitude, trip.destination_longitude)
+            ).kilometers
+            for trip in trips
+        ], dtype=np.float64)
+
+    coordinates = np.array([
+        (trip.pickup_latitude, trip.pickup_longitude, trip.destination_latitude, trip.destination_longitude)
+        for trip in trips
+    ], dtype=np.float64).reshape(-1, 4)
+    return haversine_km_array(coordinates[:, 0], coordinates[:, 1], coordinates[:, 2], coordinates[:, 3])
+
+
+async def estimate_duration(
+    distance_km: float,
+    pickup_latitude: Optional[float] = None,
+    pickup_longitude: Optional[float] = None,
+    at: Optional[datetime] = None
+) -> int:
     """
     Estimate the duration of a ride based on distance.
+
+    Uses the historical median speed for the pickup cell at this hour of
+    the week, or the city-wide default when no location is given or no
+    profile table is deployed.
     """
-    # Simple heuristic: 2 minutes per km + random factor for traffic
-    # In a real app, this would use historical traffic data and ML predictions
-    base_duration = distance_km * 2  # 2 minutes per km
-    traffic_factor = random.uniform(1.0, 1.5)  # Random traffic factor
-    
-    duration_minutes = math.ceil(base_duration * traffic_factor)
+    if pickup_latitude is None or pickup_longitude is None:
+        speed_kmh = speed_profiles.default_speed_kmh
+    else:
+        speed_kmh = speed_profiles.speed_kmh(pickup_latitude, pickup_longitude, at)
+    return duration_at_speed(distance_km, speed_kmh)
+
+
+def duration_at_speed(distance_km: float, speed_kmh: float) -> int:
+    duration_minutes = math.ceil(distance_km / speed_kmh * 60)
     return max(5, duration_minutes)  # Minimum 5 minutes
 
 
-async def calculate_surge_factor() -> Decimal:
+def estimate_durations(
+    distances_km: np.ndarray,
+    pickup_latitudes: np.ndarray,
+    pickup_longitudes: np.ndarray,
+    at: Optional[datetime] = None
+) -> np.ndarray:
     """
-    Calculate the surge pricing factor based on demand.
-    In a real app, this would use ML to predict demand levels.
+    Vectorised `estimate_duration` for an array of distances.
     """
-    # Simple random surge between 1.0 and 2.0
-    # In a real app, this would be based on actual demand and supply metrics
-    surge = random.uniform(1.0, 2.0)
-    return Decimal(str(round(surge, 2)))
+    speeds_kmh = speed_profiles.speeds_kmh(pickup_latitudes, pickup_longitudes, at)
+    durations = np.ceil(distances_km / speeds_kmh * 60)
+    return np.maximum(durations, 5).astype(np.int64)
 
 
-async def load_fare_prediction_model():
+@cpu_bound
+def measure_trip(
+    pickup_latitude: float,
+    pickup_longitude: float,
+    destination_latitude: float,
+    destination_longitude: float,
+    precise: bool = False
+) -> Tuple[float, int]:
     """
-    Load the ML model for fare prediction.
-    In a real app, this would load a trained ML model.
+    Distance (km) and duration (minutes) of a trip: along the road network
+    when a road graph is loaded, otherwise from the straight-line distance.
+    Runs on the CPU executor.
     """
-    # Placeholder for loading a model
-    # In a real app, this might be:
-    # model = joblib.load('path/to/model.pkl')
-    # return model
-    return None
+    route = road_router.route(pickup_latitude, pickup_longitude, destination_latitude, destination_longitude)
+    if route is not None:
+        return route.distance_km, max(5, route.duration_minutes)
+
+    distance_km = straight_line_km(
+        pickup_latitude, pickup_longitude, destination_latitude, destination_longitude, precise
+    )
+    return distance_km, duration_at_speed(distance_km, speed_profiles.speed_kmh(pickup_latitude, pickup_longitude))
 
 
-async def predict_fare_with_model(
-    model,
-    features: np.ndarray
-) -> Decimal:
+@cpu_bound
+def measure_trips(trips: Sequence[RideEstimateTrip], precise: bool = False) -> Tuple[np.ndarray, np.ndarray]:
     """
-    Predict the fare using a machine learning model.
-    In a real app, this would use the actual model prediction.
+    `measure_trip` for a whole batch: distances and durations with NumPy,
+    then road routes for the trips that can be routed.
     """
-    # Placeholder for model prediction
-    # In a real app, this might be:
-    # predicted_fare = model.predict(features)[0]
-    # return Decimal(str(round(predicted_fare, 2)))
-    
-    # For now, we'll return a random value
-    return Decimal(str(random.uniform(100, 500)))
+    distances_km = estimate_distances(trips, precise=precise)
+    durations = estimate_durations(
+        distances_km,
+        np.array([trip.pickup_latitude for trip in trips], dtype=np.float64),
+        np.array([trip.pickup_longitude for trip in trips], dtype=np.float64)
+    )
+
+    if road_router.available:
+        for i, trip in enumerate(trips):
+            route = road_router.route(
+                trip.pickup_latitude, trip.pickup_longitude,
+                trip.destination_latitude, trip.destination_longitude
+            )
+            if route is not None:
+                distances_km[i] = route.distance_km
+                durations[i] = max(5, route.duration_minutes)
+    return distances_km, durations
+
+
+async def calculate_surge_factor(latitude: float, longitude: float) -> Decimal:
+    """
+    Current surge pricing factor at a pickup point, from the live per-cell
+    supply/demand counters. Never touches the database.
+    """
+    return Decimal(str(surge_engine.factor(latitude, longitude)))
+
+
+def heuristic_fare(distance_km: float, surge_factor: Decimal) -> Decimal:
+    """
+    Base fare plus a per-km rate scaled by surge, rounded to whole rupees.
+    """
+    fare = BASE_FARE + (RATE_PER_KM * Decimal(str(distance_km)) * surge_factor)
+    return fare.quantize(Decimal('1.'))
+
+
+def load_fare_prediction_model():
+    """
+    Return the fare prediction model loaded at startup, or None when no
+    model file is deployed.
+    """
+    return model_registry.get(FARE_MODEL)
+
+
+async def predict_fare_with_model(features: np.ndarray) -> Decimal:
+    """
+    Predict the fare for one feature row using the fare model. Concurrent
+    calls are coalesced into batched predictions.
+    """
+    predicted_fare = await batcher_for(FARE_MODEL).predict(features)
+    return Decimal(str(round(float(predicted_fare), 2)))
 
 
 async def estimate_fare(
@@ -93,38 +202,40 @@ async def estimate_fare(
     pickup_longitude: float,
     destination_latitude: float,
     destination_longitude: float,
-    use_ml_model: bool = False
+    use_ml_model: bool = False,
+    precise: bool = False,
+    surge_factor: Optional[Decimal] = None
 ) -> RideEstimate:
     """
     Estimate the fare, distance, and duration for a ride.
+
+    Distance and duration come from the road network when a road graph is
+    loaded, otherwise from the straight-line distance; either way they are
+    computed off the event loop.
     """
-    # Calculate distance
-    distance_km = await estimate_distance(
+    distance_km, duration_minutes = await measure_trip(
         pickup_latitude,
         pickup_longitude,
         destination_latitude,
-        destination_longitude
+        destination_longitude,
+        precise=precise
     )
     
-    # Calculate duration
-    duration_minutes = await estimate_duration(distance_km)
-    
     # Calculate fare
-    if use_ml_model:
-        # In a real app, we would use the ML model here
-        model = await load_fare_prediction_model()
-        
+    # Fall back to the heuristic when no model is deployed
+    if use_ml_model and load_fare_prediction_model() is not None:
         # Prepare features for the model
         features = np.array([
             [distance_km, duration_minutes, pickup_latitude, pickup_longitude, 
              destination_latitude, destination_longitude]
         ])
         
-        estimated_fare = await predict_fare_with_model(model, features)
+        estimated_fare = await predict_fare_with_model(features)
     else:
         # Simple heuristic calculation
-        surge_factor = await calculate_surge_factor()
-        estimated_fare = BASE_FARE + (RATE_PER_KM * Decimal(str(distance_km)) * surge_factor)
+        if surge_factor is None:
+            surge_factor = await calculate_surge_factor(pickup_latitude, pickup_longitude)
+        estimated_fare = heuristic_fare(distance_km, surge_factor)
     
     # Round fare to nearest whole number
     estimated_fare = estimated_fare.quantize(Decimal('1.'))
@@ -133,4 +244,72 @@ async def estimate_fare(
         estimated_fare=estimated_fare,
         estimated_duration_minutes=duration_minutes,
         estimated_distance_km=round(distance_km, 2)
-    ) 
\ No newline at end of file
+    )
+
+
+async def estimate_fares_batch(
+    trips: Sequence[RideEstimateTrip],
+    precise: bool = False
+) -> List[RideEstimate]:
+    """
+    Estimate fares for many pickup/destination pairs in one pass.
+
+    Distances and durations are computed for the whole batch with NumPy
+    in one call on the CPU executor; only the final Decimal pricing runs
+    per trip. With a road graph loaded, trips that can be routed use road
+    distance and duration instead.
+    """
+    if not trips:
+        return []
+
+    distances_km, durations = await measure_trips(trips, precise=precise)
+
+    estimates = []
+    for trip, distance_km, duration_minutes in zip(trips, distances_km.tolist(), durations.tolist()):
+        surge_factor = await calculate_surge_factor(trip.pickup_latitude, trip.pickup_longitude)
+        estimates.append(RideEstimate(
+            estimated_fare=heuristic_fare(distance_km, surge_factor),
+            estimated_duration_minutes=duration_minutes,
+            estimated_distance_km=round(distance_km, 2)
+        ))
+    return estimates 
+
+
+async def quote_fare(
+    pickup_latitude: float,
+    pickup_longitude: float,
+    destination_latitude: float,
+    destination_longitude: float,
+    product: str = DEFAULT_PRODUCT,
+    rider_id: Optional[int] = None,
+    honour_previous_epoch: bool = False,
+    cache: FareEstimateCache = fare_cache
+) -> RideEstimate:
+    """
+    Cached `estimate_fare` for a trip.
+
+    Quotes are keyed by the pickup cell's surge epoch, which only changes
+    when that cell's factor does, and the quotes shown to `rider_id` are
+    remembered. With `honour_previous_epoch`, when the current epoch has no
+    quote yet, the one this rider was shown in the cell's previous epoch is
+    reused, so a rider who books right after surge moved is still charged
+    what they saw. Other riders' old quotes are never reused.
+    """
+    surge = surge_engine.surge_for(pickup_latitude, pickup_longitude)
+    coordinates = (pickup_latitude, pickup_longitude, destination_latitude, destination_longitude)
+    key = cache.key_for(*coordinates, surge_epoch=surge.epoch, product=product)
+
+    quoted = cache.get(key)
+    if quoted is None and honour_previous_epoch and rider_id is not None and surge.previous_epoch is not None:
+        shown = cache.shown(rider_id, cache.key_for(*coordinates, surge_epoch=surge.previous_epoch, product=product))
+        if shown is not None:
+            return shown
+
+    if quoted is None:
+        quoted = await cache.get_or_compute(
+            key,
+            lambda: estimate_fare(*coordinates, surge_factor=Decimal(str(surge.factor)))
+        )
+    if rider_id is not None:
+        cache.record_shown(rider_id, key, quoted)
+    return quoted
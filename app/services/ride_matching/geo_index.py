@@ -0,0 +1,205 @@
+import heapq
+import math
+from typing import Callable, Dict, Iterator, List, Optional, Tuple
+
+from app.core.config import settings
+from app.services.ride_matching.distance import EARTH_RADIUS_KM, KM_PER_DEGREE
+
+
+CellKey = Tuple[int, int]
+
+# Called with the driver id whenever a driver is moved or removed
+DriverListener = Callable[[int], None]
+
+
+class DriverGeoIndex:
+    """
+    In-memory grid index of driver positions.
+
+    Coordinates are bucketed into square-degree cells roughly `cell_size_km`
+    tall. Queries walk rings of cells outward from the query cell, so a
+    lookup only touches drivers in the neighbourhood of the pickup point.
+    """
+
+    def __init__(self, cell_size_km: float = 0.5):
+        self.cell_size_km = cell_size_km
+        self.cell_degrees = cell_size_km / KM_PER_DEGREE
+        self._cells: Dict[CellKey, Dict[int, Tuple[float, float]]] = {}
+        self._driver_cells: Dict[int, CellKey] = {}
+        self._listeners: List[DriverListener] = []
+
+    def __len__(self) -> int:
+        return len(self._driver_cells)
+
+    def __contains__(self, driver_id: int) -> bool:
+        return driver_id in self._driver_cells
+
+    def cell_for(self, latitude: float, longitude: float) -> CellKey:
+        """
+        Return the grid cell containing a coordinate.
+        """
+        return (
+            int(math.floor(latitude / self.cell_degrees)),
+            int(math.floor(longitude / self.cell_degrees)),
+        )
+
+    def update(self, driver_id: int, latitude: float, longitude: float) -> None:
+        """
+        Insert or move a driver.
+        """
+        cell = self.cell_for(latitude, longitude)
+        previous = self._driver_cells.get(driver_id)
+
+        if previous is not None and previous != cell:
+            self._discard_from_cell(previous, driver_id)
+
+        self._cells.setdefault(cell, {})[driver_id] = (latitude, longitude)
+        self._driver_cells[driver_id] = cell
+        for listener in self._listeners:
+            listener(driver_id)
+
+    def remove(self, driver_id: int) -> None:
+        """
+        Remove a driver from the index, e.g. when they go offline.
+        """
+        cell = self._driver_cells.pop(driver_id, None)
+        if cell is not None:
+            self._discard_from_cell(cell, driver_id)
+            for listener in self._listeners:
+                listener(driver_id)
+
+    def get(self, driver_id: int) -> Optional[Tuple[float, float]]:
+        """
+        Return the last indexed (latitude, longitude) of a driver.
+        """
+        cell = self._driver_cells.get(driver_id)
+        if cell is None:
+            return None
+        return self._cells[cell][driver_id]
+
+    def clear(self) -> None:
+        self._cells.clear()
+        self._driver_cells.clear()
+
+    def add_listener(self, listener: DriverListener) -> None:
+        self._listeners.append(listener)
+
+    def remove_listener(self, listener: DriverListener) -> None:
+        if listener in self._listeners:
+            self._listeners.remove(listener)
+
+    def within_radius(
+        self,
+        latitude: float,
+        longitude: float,
+        radius_km: float
+    ) -> List[Tuple[int, float]]:
+        """
+        Return (driver_id, distance_km) for every driver within `radius_km`,
+        closest first.
+        """
+        found = []
+        for ring_cells, _ in self._rings(latitude, longitude, radius_km):
+            for cell in ring_cells:
+                for driver_id, distance_km in self._scan_cell(cell, latitude, longitude):
+                    if distance_km <= radius_km:
+                        found.append((driver_id, distance_km))
+
+        found.sort(key=lambda item: item[1])
+        return found
+
+    def nearest(
+        self,
+        latitude: float,
+        longitude: float,
+        k: int,
+        max_distance_km: float
+    ) -> List[Tuple[int, float]]:
+        """
+        Return up to `k` (driver_id, distance_km) pairs within
+        `max_distance_km`, closest first.
+
+        Rings are expanded until K candidates are found whose distances are
+        all inside the radius already fully covered by the scanned rings.
+        """
+        if k <= 0:
+            return []
+
+        # Max-heap of the best K seen so far, stored as (-distance, driver_id)
+        best: List[Tuple[float, int]] = []
+        for ring_cells, covered_km in self._rings(latitude, longitude, max_distance_km):
+            for cell in ring_cells:
+                for driver_id, distance_km in self._scan_cell(cell, latitude, longitude):
+                    if distance_km > max_distance_km:
+                        continue
+                    if len(best) < k:
+                        heapq.heappush(best, (-distance_km, driver_id))
+                    elif distance_km < -best[0][0]:
+                        heapq.heapreplace(best, (-distance_km, driver_id))
+
+            if len(best) == k and -best[0][0] <= covered_km:
+                break
+
+        return sorted(((driver_id, -neg) for neg, driver_id in best), key=lambda item: item[1])
+
+    def _rings(
+        self,
+        latitude: float,
+        longitude: float,
+        max_distance_km: float
+    ) -> Iterator[Tuple[List[CellKey], float]]:
+        """
+        Yield successive rings of cells around a coordinate together with the
+        radius (km) that is guaranteed to be covered once the ring is scanned.
+        """
+        row0, col0 = self.cell_for(latitude, longitude)
+        max_rows = int(math.ceil(max_distance_km / self.cell_size_km))
+        previous_cols = -1
+
+        for ring in range(max_rows + 1):
+            # Cells shrink east-west away from the equator, so widen the
+            # column span using the narrowest row this ring can reach.
+            edge_latitude = min(89.9, abs(latitude) + (ring + 1) * self.cell_degrees)
+            cell_width_km = self.cell_size_km * math.cos(math.radians(edge_latitude))
+            cols = int(math.ceil(ring * self.cell_size_km / cell_width_km)) if ring else 0
+
+            cells = []
+            for row in range(row0 - ring, row0 + ring + 1):
+                inner_row = abs(row - row0) < ring
+                for col in range(col0 - cols, col0 + cols + 1):
+                    if inner_row and abs(col - col0) <= previous_cols:
+                        continue
+                    if (row, col) in self._cells:
+                        cells.append((row, col))
+
+            previous_cols = cols
+            yield cells, ring * self.cell_size_km
+
+    def _scan_cell(
+        self,
+        cell: CellKey,
+        latitude: float,
+        longitude: float
+    ) -> Iterator[Tuple[int, float]]:
+        # Inlined haversine with the query-side terms hoisted out of the loop
+        lat_q = math.radians(latitude)
+        lon_q = math.radians(longitude)
+        cos_q = math.cos(lat_q)
+        radians, sin, cos, asin, sqrt = math.radians, math.sin, math.cos, math.asin, math.sqrt
+
+        for driver_id, (lat, lon) in self._cells[cell].items():
+            lat_r = radians(lat)
+            a = sin((lat_r - lat_q) / 2) ** 2 + cos_q * cos(lat_r) * sin((radians(lon) - lon_q) / 2) ** 2
+            yield driver_id, 2 * EARTH_RADIUS_KM * asin(min(1.0, sqrt(a)))
+
+    def _discard_from_cell(self, cell: CellKey, driver_id: int) -> None:
+        drivers = self._cells.get(cell)
+        if drivers is None:
+            return
+        drivers.pop(driver_id, None)
+        if not drivers:
+            del self._cells[cell]
+
+
+# Process-wide index of online driver positions
+driver_index = DriverGeoIndex(cell_size_km=settings.DRIVER_INDEX_CELL_SIZE_KM)
@@ -0,0 +1,245 @@
+import asyncio
+import logging
+import time
+from typing import Any, Awaitable, Callable, Dict, List, NamedTuple, Optional, Tuple
+
+from app.core.config import settings
+from app.models.ride import Ride, RideStatus
+from app.services.ride_matching.distance import haversine_km
+from app.services.ride_matching.geo_index import DriverGeoIndex, driver_index
+from app.services.ride_matching.offers import TimerHeap
+from app.services.routing.speed_profiles import speed_profiles
+from app.services.tracking.eta import DEFAULT_ROUTE_FACTOR
+
+logger = logging.getLogger(__name__)
+
+
+# Called with the ride id when a chained driver did not free up in time
+ChainExpired = Callable[[int], Awaitable[None]]
+
+
+class SoonFreeDriver(NamedTuple):
+    """
+    A driver on a ride, with minutes left to their drop-off and from there
+    to a pickup.
+    """
+    driver_id: int
+    current_ride_id: int
+    remaining_minutes: float
+    pickup_minutes: float
+
+    @property
+    def total_minutes(self) -> float:
+        return self.remaining_minutes + self.pickup_minutes
+
+
+def travel_minutes(
+    from_latitude: float,
+    from_longitude: float,
+    to_latitude: float,
+    to_longitude: float,
+    route_factor: float = DEFAULT_ROUTE_FACTOR
+) -> float:
+    """
+    Driving time estimate from straight-line distance and the historical
+    speed where the trip starts.
+    """
+    distance_km = haversine_km(from_latitude, from_longitude, to_latitude, to_longitude) * route_factor
+    speed_kmh = max(speed_profiles.speed_kmh(from_latitude, from_longitude), settings.ETA_MIN_SPEED_KMH)
+    return distance_km / speed_kmh * 60.0
+
+
+class LookaheadPlanner:
+    """
+    Lets matching consider drivers who are about to finish a ride.
+
+    Rides in progress are indexed by drop-off point, so the drivers who
+    will be free near a pickup are a nearest-neighbour query. A soon-free
+    driver's pickup time is what is left of their current ride (from their
+    live position) plus the drive from the drop-off to the pickup. When that
+    beats the best free driver, the new ride is chained to them and handed
+    over once their current ride ends. A driver carries at most one chained
+    ride, and a chain that is not handed over within its deadline is
+    released back to matching.
+    """
+
+    def __init__(
+        self,
+        expired: ChainExpired,
+        max_remaining_minutes: float = settings.LOOKAHEAD_MAX_REMAINING_MINUTES,
+        min_gain_minutes: float = settings.LOOKAHEAD_MIN_GAIN_MINUTES,
+        grace_minutes: float = settings.LOOKAHEAD_GRACE_MINUTES,
+        cell_size_km: float = settings.DRIVER_INDEX_CELL_SIZE_KM
+    ):
+        self.expired = expired
+        self.max_remaining_minutes = max_remaining_minutes
+        self.min_gain_minutes = min_gain_minutes
+        self.grace_minutes = grace_minutes
+        self.chained = 0
+        self.handed_over = 0
+        self.timed_out = 0
+        self._dropoffs = DriverGeoIndex(cell_size_km)
+        self._current_rides: Dict[int, int] = {}
+        # driver id -> (chained ride id, deadline) and the reverse lookup
+        self._chains: Dict[int, Tuple[int, float]] = {}
+        self._chained_rides: Dict[int, int] = {}
+        self._timers = TimerHeap()
+        self._wakeup: Optional[asyncio.Event] = None
+        self._task: Optional[asyncio.Task] = None
+
+    # Rides in progress
+
+    def track(self, ride: Ride) -> None:
+        """
+        Start watching a ride that is now in progress.
+        """
+        if ride.driver_id is None:
+            return
+        self._current_rides[ride.driver_id] = ride.id
+        self._dropoffs.update(ride.driver_id, ride.destination_latitude, ride.destination_longitude)
+
+    def release(self, driver_id: int) -> Optional[int]:
+        """
+        A driver's current ride ended. Returns the ride chained to them, if
+        any, which should now be handed over.
+        """
+        self._current_rides.pop(driver_id, None)
+        self._dropoffs.remove(driver_id)
+        chain = self._chains.pop(driver_id, None)
+        if chain is None:
+            return None
+        self._chained_rides.pop(chain[0], None)
+        self.handed_over += 1
+        return chain[0]
+
+    async def load(self) -> int:
+        """
+        Index the rides already in progress, e.g. after a restart.
+        """
+        rides = await Ride.filter(status=RideStatus.IN_PROGRESS, driver_id__isnull=False).only(
+            "id", "driver_id", "destination_latitude", "destination_longitude"
+        )
+        for ride in rides:
+            self.track(ride)
+        return len(rides)
+
+    # Matching
+
+    def candidates(
+        self,
+        latitude: float,
+        longitude: float,
+        max_distance_km: float = settings.MATCHING_MAX_DISTANCE_KM,
+        limit: int = settings.MATCHING_CANDIDATE_LIMIT
+    ) -> List[SoonFreeDriver]:
+        """
+        Unchained drivers finishing within `max_remaining_minutes` whose
+        drop-off is near the pickup, soonest pickup first.
+        """
+        options = []
+        for driver_id, _ in self._dropoffs.nearest(latitude, longitude, limit * 2, max_distance_km):
+            if driver_id in self._chains:
+                continue
+            position = driver_index.get(driver_id)
+            dropoff = self._dropoffs.get(driver_id)
+            if position is None or dropoff is None:
+                continue
+            remaining = travel_minutes(position[0], position[1], dropoff[0], dropoff[1])
+            if remaining > self.max_remaining_minutes:
+                continue
+            pickup = travel_minutes(dropoff[0], dropoff[1], latitude, longitude)
+            options.append(SoonFreeDriver(driver_id, self._current_rides[driver_id], remaining, pickup))
+        options.sort(key=lambda option: option.total_minutes)
+        return options[:limit]
+
+    def chain_if_sooner(self, ride: Ride, free_pickup_minutes: Optional[float]) -> Optional[SoonFreeDriver]:
+        """
+        Chain `ride` to the soon-free driver who reaches it first, if they
+        beat the best free driver (None when there is none) by at least
+        `min_gain_minutes`.
+        """
+        if ride.id in self._chained_rides:
+            return None
+        for option in self.candidates(ride.pickup_latitude, ride.pickup_longitude):
+            if free_pickup_minutes is not None and option.total_minutes + self.min_gain_minutes > free_pickup_minutes:
+                break
+            deadline = time.time() + (option.remaining_minutes + self.grace_minutes) * 60.0
+            self._chains[option.driver_id] = (ride.id, deadline)
+            self._chained_rides[ride.id] = option.driver_id
+            self.chained += 1
+            if self._timers.push(deadline, ride.id) and self._wakeup is not None:
+                self._wakeup.set()
+            return option
+        return None
+
+    def chained_driver(self, ride_id: int) -> Optional[int]:
+        return self._chained_rides.get(ride_id)
+
+    def drop(self, ride_id: int) -> None:
+        """
+        Forget a chained ride (cancelled or matched elsewhere).
+        """
+        driver_id = self._chained_rides.pop(ride_id, None)
+        if driver_id is not None:
+            self._chains.pop(driver_id, None)
+
+    def expire_due(self, now: Optional[float] = None) -> List[int]:
+        """
+        Release chains past their deadline; returns their ride ids.
+        """
+        now = time.time() if now is None else now
+        expired = []
+        for ride_id in self._timers.pop_due(now):
+            driver_id = self._chained_rides.get(ride_id)
+            if driver_id is None or self._chains[driver_id][1] > now:
+                continue
+            self.drop(ride_id)
+            self.timed_out += 1
+            expired.append(ride_id)
+        return expired
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "rides_in_progress": len(self._current_rides),
+            "pending_chains": len(self._chains),
+            "chained": self.chained,
+            "handed_over": self.handed_over,
+            "timed_out": self.timed_out,
+        }
+
+    def start(self) -> None:
+        if self._task is None:
+            self._wakeup = asyncio.Event()
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        # Hand chained rides back to the dispatch queue
+        for ride_id in list(self._chained_rides):
+            self.drop(ride_id)
+            await self._notify_expired(ride_id)
+
+    async def _notify_expired(self, ride_id: int) -> None:
+        try:
+            await self.expired(ride_id)
+        except Exception:
+            logger.exception("Releasing chained ride %d failed", ride_id)
+
+    async def _run(self) -> None:
+        wakeup = self._wakeup
+        while True:
+            wakeup.clear()
+            for ride_id in self.expire_due():
+                await self._notify_expired(ride_id)
+            deadline = self._timers.next_deadline()
+            timeout = None if deadline is None else max(0.0, deadline - time.time())
+            try:
+                await asyncio.wait_for(wakeup.wait(), timeout)
+            except asyncio.TimeoutError:
+                pass
@@ -1,69 +1,136 @@
 import asyncio
-import random
-from typing import List, Optional, Tuple
+from typing import List, Optional, Set, Tuple
 
+from app.core.config import settings
+from app.core.executor import cpu_executor
 from app.models.user import User, UserRole
 from app.models.ride import Ride, RideStatus
+from app.services.dispatch.queue import KIND_REMATCH, dispatch_queue
+from app.services.location.store import location_store
+from app.services.location.tracks import track_store
+from app.services.ride_matching.candidate_cache import CandidateCache
+from app.services.ride_matching.distance import haversine_km
+from app.services.ride_matching.driver_stats import driver_stats
+from app.services.ride_matching.geo_index import driver_index
+from app.services.ride_matching.lookahead import LookaheadPlanner, travel_minutes
+from app.services.ride_matching.offers import MODE_INSTANT, OfferEngine
+from app.services.ride_matching.pooling import pool_planner
+from app.services.ride_matching.ranking import DriverCandidates, RankingWeights, rank_candidates, with_road_etas
+from app.services.ride_matching.rematch import rematch_candidates
+from app.services.ride_matching.reservations import ASSIGNED, RIDE_TAKEN, driver_reservations
+from app.services.ride_matching.surge import surge_engine
+from app.services.tracking.hub import tracking_hub
 
 
 async def find_nearby_drivers(
     latitude: float,
     longitude: float,
-    max_distance_km: float = 5.0
+    max_distance_km: float = settings.MATCHING_MAX_DISTANCE_KM,
+    limit: int = settings.MATCHING_CANDIDATE_LIMIT
 ) -> List[User]:
     """
-    Find drivers near the specified location.
-    In a real application, this would use geospatial queries.
+    Find available drivers near the specified location, closest first.
     
-    For demonstration, we'll just return random available drivers.
+    Candidates come from the pickup cell's precomputed top-K when it is
+    fresh enough, otherwise from the in-memory driver geo index; the
+    database is only used to drop drivers who are inactive or already on a
+    ride.
     """
-    # Get all active drivers
-    # In a real app, you would use geospatial queries to find nearby drivers
-    drivers = await User.filter(role=UserRole.DRIVER, is_active=True).limit(5)
+    cached = candidate_cache.nearby(latitude, longitude, max_distance_km, limit)
+    if cached is not None:
+        fresh = location_store.fresh_positions(cached)
+        drivers = await load_available_drivers([driver_id for driver_id in cached if driver_id in fresh])
+        return drivers[:limit]
     
-    # Simulate filtering by distance
-    # In a real app, this would be done in the database query
-    return drivers
+    # Over-fetch so busy drivers can be filtered out without a second lookup
+    nearest = driver_index.nearest(latitude, longitude, k=limit * 2, max_distance_km=max_distance_km)
+    if not nearest:
+        return []
+    
+    # Drivers whose last ping is older than the freshness TTL are skipped
+    fresh = location_store.fresh_positions(driver_id for driver_id, _ in nearest)
+    drivers = await load_available_drivers([driver_id for driver_id, _ in nearest if driver_id in fresh])
+    return drivers[:limit]
+
+
+async def load_available_drivers(driver_ids: List[int]) -> List[User]:
+    """
+    Load the drivers among `driver_ids` who are active and not on a ride,
+    preserving the order of `driver_ids`.
+    """
+    if not driver_ids:
+        return []
+    
+    busy_ids = set(await Ride.filter(
+        driver_id__in=driver_ids,
+        status__in=[RideStatus.ACCEPTED, RideStatus.ARRIVED, RideStatus.IN_PROGRESS]
+    ).values_list("driver_id", flat=True))
+    
+    drivers = await User.filter(
+        id__in=[driver_id for driver_id in driver_ids if driver_id not in busy_ids],
+        role=UserRole.DRIVER,
+        is_active=True
+    )
+    
+    by_id = {driver.id: driver for driver in drivers}
+    return [by_id[driver_id] for driver_id in driver_ids if driver_id in by_id]
 
 
 async def rank_drivers(
     drivers: List[User],
-    ride: Ride
+    ride: Ride,
+    weights: Optional[RankingWeights] = None,
+    limit: Optional[int] = None
 ) -> List[Tuple[User, float]]:
     """
-    Rank drivers based on various factors like distance, rating, etc.
+    Rank drivers based on distance, rating, acceptance rate and idle time.
     
-    In a real application, this would use an ML model for intelligent ranking.
+    Candidates are scored, filtered and cut to the top `limit` in single
+    vectorised passes over columnar arrays. With a road graph loaded, the
+    distance term is the road ETA to the pickup. Large candidate sets are
+    scored on the CPU executor. Drivers all taken from the pickup cell's
+    precomputed list keep the scores computed there.
     """
-    ranked_drivers = []
-    
-    for driver in drivers:
-        # In a real app, these would be actual metrics
-        # For demonstration, we'll use random scores
-        distance_score = random.uniform(0, 1)  # Lower is better
-        rating_score = random.uniform(0, 1)    # Higher is better
-        acceptance_rate = random.uniform(0, 1) # Higher is better
-        
-        # Combined score (in a real app, this would use a more sophisticated algorithm)
-        score = (1 - distance_score) * 0.5 + rating_score * 0.3 + acceptance_rate * 0.2
-        
-        ranked_drivers.append((driver, score))
+    if weights is None:
+        cached = candidate_cache.scores(ride.pickup_latitude, ride.pickup_longitude, [driver.id for driver in drivers])
+        if cached is not None:
+            ranked = sorted(zip(drivers, cached), key=lambda pair: -pair[1])
+            return ranked if limit is None else ranked[:limit]
     
-    # Sort by score, highest first
-    ranked_drivers.sort(key=lambda x: x[1], reverse=True)
+    candidates = DriverCandidates.build(
+        [driver.id for driver in drivers],
+        ride.pickup_latitude,
+        ride.pickup_longitude
+    )
+    candidates = await with_road_etas(candidates, ride.pickup_latitude, ride.pickup_longitude)
+    if len(drivers) >= settings.CPU_OFFLOAD_MIN_CANDIDATES:
+        ranked = await cpu_executor.run(rank_candidates, candidates, weights, limit)
+    else:
+        ranked = rank_candidates(candidates, weights=weights, limit=limit)
     
-    return ranked_drivers
+    return [(drivers[position], score) for position, score in ranked]
 
 
 async def match_ride_with_driver(ride_id: int) -> Optional[User]:
     """
     Match a ride with the best available driver.
     This is a background task that is run when a ride is created.
+    
+    The best driver is assigned without being asked; `offer_ride` asks
+    them first (OFFER_MODE).
     """
     # Get the ride
     ride = await Ride.filter(id=ride_id).first()
     if not ride or ride.status != RideStatus.REQUESTED:
         return None
+    if lookahead_planner.chained_driver(ride.id) is not None:
+        return None
+    
+    # Pooled rides first try to join a vehicle already carrying riders
+    if ride.pooled:
+        for driver_id in pool_planner.ranked_drivers(ride):
+            if await assign_driver(ride, driver_id):
+                return await User.filter(id=driver_id).first()
     
     # Find nearby drivers
     nearby_drivers = await find_nearby_drivers(
@@ -71,34 +138,226 @@ async def match_ride_with_driver(ride_id: int) -> Optional[User]:
         longitude=ride.pickup_longitude
     )
     
-    if not nearby_drivers:
-        # No drivers available
+    # Rank drivers, kept for a quick re-match if the driver backs out
+    ranked_drivers = await rank_drivers(nearby_drivers, ride) if nearby_drivers else []
+    if settings.REMATCH_CACHE_ENABLED:
+        rematch_candidates.remember(ride.id, [driver.id for driver, _ in ranked_drivers])
+    
+    # A driver about to drop off nearby may get there first
+    if chain_to_soon_free(ride, [driver.id for driver, _ in ranked_drivers]):
         return None
     
-    # Rank drivers
-    ranked_drivers = await rank_drivers(nearby_drivers, ride)
-    
-    # In a real application, you would:
-    # 1. Send a notification to the top-ranked driver
-    # 2. Wait for their response
-    # 3. If they decline or timeout, try the next driver
-    
-    # For demonstration, we'll simply select the top-ranked driver
-    if ranked_drivers:
-        best_driver, _ = ranked_drivers[0]
-        
-        # Assign the driver to the ride
-        ride.driver = best_driver
-        ride.status = RideStatus.ACCEPTED
-        await ride.save()
-        
-        # In a real app, send notifications to both rider and driver
-        
-        return best_driver
+    # Best first; a driver taken by a parallel matcher is skipped
+    for driver, _ in ranked_drivers:
+        if await assign_driver(ride, driver.id):
+            return driver
+        if not await Ride.filter(id=ride.id, status=RideStatus.REQUESTED).exists():
+            break
     
     return None
 
 
+async def assign_driver(ride: Ride, driver_id: int) -> bool:
+    """
+    Assign a driver to a ride that is still waiting for one. Returns False
+    when the driver was taken by another ride or the ride was matched or
+    cancelled in the meantime.
+    """
+    return await _assign(ride, driver_id) == ASSIGNED
+
+
+async def _assign(ride: Ride, driver_id: int) -> str:
+    # assign_driver, reporting why an assignment failed (reservations)
+    outcome = await driver_reservations.assign(ride.id, driver_id, pooled=ride.pooled)
+    if outcome != ASSIGNED:
+        return outcome
+    
+    ride.driver_id = driver_id
+    ride.status = RideStatus.ACCEPTED
+    if ride.pooled:
+        pool_planner.commit(driver_id, ride)
+    driver_stats.mark_busy(driver_id)
+    surge_engine.close_request(ride.id)
+    surge_engine.remove_driver(driver_id)
+    track_store.begin(ride.id, driver_id)
+    tracking_hub.publish_ride(ride)
+    
+    # In a real app, send notifications to both rider and driver
+    
+    return ASSIGNED
+
+
+async def offer_ride(ride_id: int) -> bool:
+    """
+    Offer a ride to its best ranked drivers (OFFER_MODE). Returns True when
+    offers are out (the offer engine takes it from there) or the ride no
+    longer needs a driver, False when no driver is available right now.
+    """
+    ride = await Ride.filter(id=ride_id).first()
+    if not ride or ride.status != RideStatus.REQUESTED:
+        return True
+    if offer_engine.offering(ride.id) or lookahead_planner.chained_driver(ride.id) is not None:
+        return True
+    
+    ranked = await offerable_drivers(ride, set())
+    if settings.REMATCH_CACHE_ENABLED:
+        rematch_candidates.remember(ride.id, ranked)
+    if chain_to_soon_free(ride, ranked):
+        return True
+    return offer_engine.open(ride.id, ranked)
+
+
+async def rematch_ride(ride: Ride, exclude: Set[int]) -> bool:
+    """
+    Re-dispatch a ride whose driver backed out from the candidates it was
+    matched from (REMATCH_CACHE_ENABLED), skipping `exclude`: the next
+    ones still available and within reach are assigned, or offered to
+    (OFFER_MODE), right away. Pooled rides try the vehicles they fit into
+    first. Returns False when nobody on the list is left, in which case
+    the ride needs a full match.
+    """
+    if not settings.REMATCH_CACHE_ENABLED:
+        return False
+    exclude = exclude | offer_engine.busy_drivers()
+    ranked = rematch_candidates.next_candidates(ride.id, exclude)
+    if not ranked:
+        return False
+    
+    pooled = pool_planner.ranked_drivers(ride, exclude) if ride.pooled else []
+    in_reach = [driver_id for driver_id in ranked if driver_id not in pooled and _within_reach(ride, driver_id)]
+    driver_ids = pooled + await _available_driver_ids(in_reach)
+    if not driver_ids:
+        return False
+    
+    if settings.OFFER_MODE != MODE_INSTANT:
+        return offer_engine.open(ride.id, driver_ids)
+    for driver_id in driver_ids:
+        if await assign_driver(ride, driver_id):
+            return True
+        if not await Ride.filter(id=ride.id, status=RideStatus.REQUESTED).exists():
+            return True
+    return False
+
+
+def release_driver(ride: Ride, driver_id: int) -> bool:
+    """
+    Put the driver of a ride that ended or was cancelled straight back into
+    the available pool: idle for ranking and the candidate lists, and
+    counted as surge supply at their last position without waiting for
+    their next ping. A pooled driver with other riders on their route
+    stays busy. Returns whether the driver was released.
+    """
+    if pool_planner.finish(ride.id):
+        return False
+    driver_stats.mark_idle(driver_id)
+    position = driver_index.get(driver_id)
+    if position is not None:
+        surge_engine.record_driver(driver_id, position[0], position[1])
+    return True
+
+
+def chain_to_soon_free(ride: Ride, ranked_driver_ids: List[int]) -> bool:
+    """
+    Chain the ride to a driver finishing a ride nearby when they would
+    reach the pickup sooner than the best free driver (LOOKAHEAD_ENABLED).
+    """
+    if not settings.LOOKAHEAD_ENABLED:
+        return False
+    free_minutes = None
+    position = driver_index.get(ranked_driver_ids[0]) if ranked_driver_ids else None
+    if position is not None:
+        free_minutes = travel_minutes(position[0], position[1], ride.pickup_latitude, ride.pickup_longitude)
+    return lookahead_planner.chain_if_sooner(ride, free_minutes) is not None
+
+
+def track_ride_in_progress(ride: Ride) -> None:
+    rematch_candidates.forget(ride.id)
+    # Pooled drivers pick up more riders on the way, so they are never
+    # about to be free
+    if ride.pooled:
+        pool_planner.picked_up(ride.id)
+    elif settings.LOOKAHEAD_ENABLED:
+        lookahead_planner.track(ride)
+
+
+async def hand_over_chained_ride(driver_id: int) -> None:
+    """
+    A driver's ride ended: assign (or offer) them the ride chained to them,
+    or send it back to matching if that fails.
+    """
+    ride_id = lookahead_planner.release(driver_id)
+    if ride_id is None:
+        return
+    ride = await Ride.filter(id=ride_id).first()
+    if not ride or ride.status != RideStatus.REQUESTED:
+        return
+    if settings.OFFER_MODE == MODE_INSTANT:
+        handed_over = await assign_driver(ride, driver_id)
+    else:
+        handed_over = offer_engine.open(ride.id, [driver_id])
+    if not handed_over:
+        await dispatch_queue.enqueue(KIND_REMATCH, ride)
+
+
+async def offerable_drivers(ride: Ride, exclude: Set[int]) -> List[int]:
+    """
+    Ranked ids of available drivers near the pickup, skipping `exclude` and
+    drivers who already hold an offer. Pooled rides list the vehicles they
+    fit into first.
+    """
+    exclude = exclude | offer_engine.busy_drivers()
+    pooled = pool_planner.ranked_drivers(ride, exclude) if ride.pooled else []
+    drivers = await find_nearby_drivers(
+        latitude=ride.pickup_latitude,
+        longitude=ride.pickup_longitude,
+        limit=settings.MATCHING_CANDIDATE_LIMIT + len(exclude)
+    )
+    drivers = [driver for driver in drivers if driver.id not in exclude][:settings.MATCHING_CANDIDATE_LIMIT]
+    if not drivers:
+        return pooled
+    return pooled + [driver.id for driver, _ in await rank_drivers(drivers, ride)]
+
+
+def _within_reach(ride: Ride, driver_id: int) -> bool:
+    position = driver_index.get(driver_id)
+    return position is not None and haversine_km(
+        position[0], position[1], ride.pickup_latitude, ride.pickup_longitude
+    ) <= settings.MATCHING_MAX_DISTANCE_KM
+
+
+async def _available_driver_ids(driver_ids: List[int]) -> List[int]:
+    fresh = location_store.fresh_positions(driver_ids)
+    return [driver.id for driver in await load_available_drivers([driver_id for driver_id in driver_ids if driver_id in fresh])]
+
+
+async def _next_offer_candidates(ride_id: int, exclude: Set[int]) -> List[int]:
+    ride = await Ride.filter(id=ride_id).first()
+    if not ride or ride.status != RideStatus.REQUESTED:
+        return []
+    return await offerable_drivers(ride, exclude)
+
+
+async def _accept_offer(ride_id: int, driver_id: int) -> str:
+    ride = await Ride.filter(id=ride_id).first()
+    if ride is None:
+        return RIDE_TAKEN
+    return await _assign(ride, driver_id)
+
+
+async def _chain_expired(ride_id: int) -> None:
+    # The chained driver did not free up in time: match the ride again
+    ride = await Ride.filter(id=ride_id).first()
+    if ride and ride.status == RideStatus.REQUESTED:
+        await dispatch_queue.enqueue(KIND_REMATCH, ride)
+
+
+async def _offers_exhausted(ride_id: int) -> None:
+    # Nobody accepted: try again later through the dispatch queue
+    ride = await Ride.filter(id=ride_id).first()
+    if ride and ride.status == RideStatus.REQUESTED:
+        await dispatch_queue.enqueue(KIND_REMATCH, ride, delay_seconds=settings.OFFER_RETRY_DELAY_SECONDS)
+
+
 async def simulate_driver_matching(ride_id: int) -> None:
     """
     Simulate the process of matching a ride with a driver.
@@ -116,4 +375,14 @@ async def simulate_driver_matching(ride_id: int) -> None:
         if ride and ride.status == RideStatus.REQUESTED:
             # No driver found after timeout
             # In a real app, you might retry or notify the user
-            pass 
\ No newline at end of file
+            pass 
+
+
+# Process-wide precomputed candidate lists
+candidate_cache = CandidateCache(_available_driver_ids)
+
+# Process-wide offer engine
+offer_engine = OfferEngine(_next_offer_candidates, _accept_offer, _offers_exhausted)
+
+# Process-wide look-ahead planner
+lookahead_planner = LookaheadPlanner(_chain_expired)
@@ -0,0 +1,362 @@
+import asyncio
+import heapq
+import itertools
+import logging
+import time
+from collections import deque
+from typing import Any, Awaitable, Callable, Deque, Dict, List, NamedTuple, Optional, Set, Tuple
+
+from app.core.config import settings
+from app.core.metrics import metrics
+from app.services.ride_matching.driver_stats import driver_stats
+from app.services.ride_matching.reservations import ASSIGNED, RIDE_TAKEN
+
+logger = logging.getLogger(__name__)
+
+
+MODE_SEQUENTIAL = "sequential"
+MODE_BROADCAST = "broadcast"
+# Callers assign the best driver directly; the engine is not used
+MODE_INSTANT = "instant"
+
+# Milliseconds
+OFFER_BUCKETS = (100, 500, 1000, 2000, 5000, 10000, 15000, 30000, 60000, 120000)
+
+# Ranked driver ids for a ride, excluding the given ones
+CandidateSource = Callable[[int, Set[int]], Awaitable[List[int]]]
+# Assigns a driver to a ride; returns ASSIGNED or why not (reservations)
+AssignDriver = Callable[[int, int], Awaitable[str]]
+# Called when every candidate declined or timed out
+OffersExhausted = Callable[[int], Awaitable[None]]
+
+
+class OfferError(Exception):
+    """
+    An offer response that cannot be honoured (unknown, expired, withdrawn
+    or already taken).
+    """
+    pass
+
+
+class Offer(NamedTuple):
+    id: int
+    ride_id: int
+    driver_id: int
+    sent_at: float
+    expires_at: float
+
+
+class TimerHeap:
+    """
+    Deadlines for many pending items behind a single sleeper.
+
+    Entries are never removed when their item resolves early; `pop_due`
+    hands them back and the owner ignores the ones it no longer tracks.
+    """
+
+    def __init__(self):
+        self._heap: List[Tuple[float, int]] = []
+
+    def __len__(self) -> int:
+        return len(self._heap)
+
+    def push(self, deadline: float, key: int) -> bool:
+        """
+        Add a deadline. Returns True when it is now the earliest one, so the
+        sleeper has to wake up early.
+        """
+        heapq.heappush(self._heap, (deadline, key))
+        return self._heap[0][1] == key
+
+    def next_deadline(self) -> Optional[float]:
+        return self._heap[0][0] if self._heap else None
+
+    def pop_due(self, now: float) -> List[int]:
+        due = []
+        while self._heap and self._heap[0][0] <= now:
+            due.append(heapq.heappop(self._heap)[1])
+        return due
+
+
+class _Cascade:
+    """
+    Offer state for one ride: ranked drivers still to ask, who was already
+    asked, and the offers currently out.
+    """
+
+    def __init__(self, ride_id: int, ranked_driver_ids: List[int]):
+        self.ride_id = ride_id
+        self.opened_at = time.time()
+        self.queue: Deque[int] = deque(ranked_driver_ids)
+        self.asked: Set[int] = set(ranked_driver_ids)
+        self.outstanding: Dict[int, Offer] = {}
+        self.refill: Optional[asyncio.Task] = None
+        self.source_exhausted = False
+        # Set while an acceptance is being written; no new offers meanwhile
+        self.assigning = False
+
+
+class OfferEngine:
+    """
+    Offers rides to drivers and waits for them to accept.
+
+    In "sequential" mode a ride is offered to one driver at a time, best
+    ranked first, moving on when they decline or the offer times out; in
+    "broadcast" mode the top `broadcast_size` drivers get it at once and the
+    first to accept wins. While offers are out, the next candidates are
+    fetched in the background once fewer than `prefetch_remaining` are
+    queued, so a decline is followed by the next offer without a search.
+
+    Expiry of every pending offer is driven by one timer heap and one task,
+    however many rides are waiting. A driver holds at most one offer.
+    """
+
+    def __init__(
+        self,
+        candidates: CandidateSource,
+        assign: AssignDriver,
+        exhausted: OffersExhausted,
+        mode: str = settings.OFFER_MODE,
+        timeout_seconds: float = settings.OFFER_TIMEOUT_SECONDS,
+        broadcast_size: int = settings.OFFER_BROADCAST_SIZE,
+        prefetch_remaining: int = settings.OFFER_PREFETCH_REMAINING
+    ):
+        if mode not in (MODE_SEQUENTIAL, MODE_BROADCAST, MODE_INSTANT):
+            raise ValueError(f"Unknown offer mode: {mode}")
+        self.candidates = candidates
+        self.assign = assign
+        self.exhausted = exhausted
+        self.mode = mode
+        self.timeout_seconds = timeout_seconds
+        self.width = broadcast_size if mode == MODE_BROADCAST else 1
+        self.prefetch_remaining = prefetch_remaining
+        self.sent = 0
+        self.accepted = 0
+        self.declined = 0
+        self.expired = 0
+        self._ids = itertools.count(1)
+        self._rides: Dict[int, _Cascade] = {}
+        self._offers: Dict[int, Offer] = {}
+        self._driver_offers: Dict[int, int] = {}
+        self._timers = TimerHeap()
+        self._wakeup: Optional[asyncio.Event] = None
+        self._task: Optional[asyncio.Task] = None
+        self._time_to_accept = metrics.histogram("offers.time_to_accept_ms", OFFER_BUCKETS)
+        self._time_to_respond = metrics.histogram("offers.time_to_respond_ms", OFFER_BUCKETS)
+
+    def offering(self, ride_id: int) -> bool:
+        return ride_id in self._rides
+
+    def offer_for_driver(self, driver_id: int) -> Optional[Offer]:
+        offer_id = self._driver_offers.get(driver_id)
+        return None if offer_id is None else self._offers.get(offer_id)
+
+    def busy_drivers(self) -> Set[int]:
+        """
+        Drivers holding an offer; they are not offered another ride.
+        """
+        return set(self._driver_offers)
+
+    def open(self, ride_id: int, ranked_driver_ids: List[int]) -> bool:
+        """
+        Start offering a ride to `ranked_driver_ids` (best first). Returns
+        False when none of them can take an offer; True also when the ride
+        already has offers out.
+        """
+        if ride_id in self._rides:
+            return True
+        available = [d for d in ranked_driver_ids if d not in self._driver_offers]
+        if not available:
+            return False
+        cascade = self._rides[ride_id] = _Cascade(ride_id, available)
+        self._advance(cascade)
+        return True
+
+    async def respond(self, offer_id: int, driver_id: int, accepted: bool) -> Offer:
+        """
+        Record a driver's answer. An acceptance assigns them to the ride or
+        raises OfferError when they were too late.
+        """
+        offer = self._offers.get(offer_id)
+        if offer is None or offer.driver_id != driver_id:
+            raise OfferError("Offer is no longer open")
+        now = time.time()
+        self._time_to_respond.observe((now - offer.sent_at) * 1000)
+        if now > offer.expires_at:
+            self._expire(offer)
+            raise OfferError("Offer has expired")
+
+        self._close(offer)
+        cascade = self._rides.get(offer.ride_id)
+        driver_stats.record_offer(driver_id, accepted)
+        if not accepted:
+            self.declined += 1
+            if cascade is not None:
+                self._advance(cascade)
+            return offer
+
+        if cascade is None:
+            raise OfferError("Ride is no longer available")
+        cascade.assigning = True
+        outcome = None
+        try:
+            outcome = await self.assign(offer.ride_id, driver_id)
+        finally:
+            cascade.assigning = False
+            # Unless the ride is gone, a failed (or crashed) assignment
+            # moves on to the next candidate
+            if outcome not in (ASSIGNED, RIDE_TAKEN) and self._rides.get(cascade.ride_id) is cascade:
+                self._advance(cascade)
+        if outcome == RIDE_TAKEN:
+            # Another driver accepted first, or the ride was cancelled
+            self._finish(cascade)
+            raise OfferError("Ride is no longer available")
+        if outcome != ASSIGNED:
+            # The driver is being assigned elsewhere or is on another ride
+            raise OfferError("Driver cannot take this ride")
+
+        self.accepted += 1
+        self._time_to_accept.observe((now - cascade.opened_at) * 1000)
+        self._finish(cascade)
+        return offer
+
+    def cancel(self, ride_id: int) -> None:
+        """
+        Withdraw every offer for a ride (cancelled or matched elsewhere).
+        """
+        cascade = self._rides.get(ride_id)
+        if cascade is not None:
+            self._finish(cascade)
+
+    def _advance(self, cascade: _Cascade) -> None:
+        """
+        Send offers until `width` are out, start a prefetch when the queue
+        runs low, and give up once there is nobody left to ask.
+        """
+        if cascade.assigning:
+            return
+        while len(cascade.outstanding) < self.width and cascade.queue:
+            driver_id = cascade.queue.popleft()
+            if driver_id not in self._driver_offers:
+                self._send(cascade, driver_id)
+
+        if len(cascade.queue) < self.prefetch_remaining and not cascade.source_exhausted and cascade.refill is None:
+            cascade.refill = asyncio.create_task(self._refill(cascade))
+
+        if not cascade.outstanding and not cascade.queue and cascade.refill is None:
+            self._finish(cascade)
+            asyncio.create_task(self._notify_exhausted(cascade.ride_id))
+
+    def _send(self, cascade: _Cascade, driver_id: int) -> None:
+        now = time.time()
+        offer = Offer(next(self._ids), cascade.ride_id, driver_id, now, now + self.timeout_seconds)
+        self._offers[offer.id] = offer
+        self._driver_offers[driver_id] = offer.id
+        cascade.outstanding[offer.id] = offer
+        self.sent += 1
+        if self._timers.push(offer.expires_at, offer.id) and self._wakeup is not None:
+            self._wakeup.set()
+
+    def _close(self, offer: Offer) -> None:
+        self._offers.pop(offer.id, None)
+        if self._driver_offers.get(offer.driver_id) == offer.id:
+            del self._driver_offers[offer.driver_id]
+        cascade = self._rides.get(offer.ride_id)
+        if cascade is not None:
+            cascade.outstanding.pop(offer.id, None)
+
+    def _expire(self, offer: Offer) -> None:
+        self._close(offer)
+        self.expired += 1
+        driver_stats.record_offer(offer.driver_id, False)
+        cascade = self._rides.get(offer.ride_id)
+        if cascade is not None:
+            self._advance(cascade)
+
+    def _finish(self, cascade: _Cascade) -> None:
+        for offer in list(cascade.outstanding.values()):
+            self._close(offer)
+        if cascade.refill is not None:
+            cascade.refill.cancel()
+            cascade.refill = None
+        self._rides.pop(cascade.ride_id, None)
+
+    async def _refill(self, cascade: _Cascade) -> None:
+        try:
+            more = await self.candidates(cascade.ride_id, set(cascade.asked))
+        except Exception:
+            logger.exception("Fetching more candidates for ride %d failed", cascade.ride_id)
+            more = []
+        cascade.refill = None
+        if self._rides.get(cascade.ride_id) is not cascade:
+            return
+        fresh = [driver_id for driver_id in more if driver_id not in cascade.asked]
+        if not fresh:
+            cascade.source_exhausted = True
+        cascade.asked.update(fresh)
+        cascade.queue.extend(fresh)
+        self._advance(cascade)
+
+    async def _notify_exhausted(self, ride_id: int) -> None:
+        try:
+            await self.exhausted(ride_id)
+        except Exception:
+            logger.exception("Handling exhausted offers for ride %d failed", ride_id)
+
+    def expire_due(self, now: Optional[float] = None) -> int:
+        """
+        Time out every offer past its deadline. Returns how many expired.
+        """
+        now = time.time() if now is None else now
+        count = 0
+        for offer_id in self._timers.pop_due(now):
+            offer = self._offers.get(offer_id)
+            if offer is not None:
+                self._expire(offer)
+                count += 1
+        return count
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "mode": self.mode,
+            "rides": len(self._rides),
+            "pending_offers": len(self._offers),
+            "timers": len(self._timers),
+            "sent": self.sent,
+            "accepted": self.accepted,
+            "declined": self.declined,
+            "expired": self.expired,
+        }
+
+    def start(self) -> None:
+        if self._task is None:
+            self._wakeup = asyncio.Event()
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        # Hand rides still waiting for an answer back to the dispatch queue
+        for cascade in list(self._rides.values()):
+            self._finish(cascade)
+            await self._notify_exhausted(cascade.ride_id)
+
+    async def _run(self) -> None:
+        wakeup = self._wakeup
+        while True:
+            wakeup.clear()
+            try:
+                self.expire_due()
+            except Exception:
+                logger.exception("Expiring driver offers failed")
+            deadline = self._timers.next_deadline()
+            timeout = None if deadline is None else max(0.0, deadline - time.time())
+            try:
+                await asyncio.wait_for(wakeup.wait(), timeout)
+            except asyncio.TimeoutError:
+                pass
@@ -0,0 +1,351 @@
+import logging
+import time
+from typing import Any, Dict, List, NamedTuple, Optional, Tuple
+
+import numpy as np
+
+from app.core.config import settings
+from app.models.ride import Ride, RideStatus
+from app.services.ride_matching.distance import equirectangular_km_array, haversine_km_array
+from app.services.ride_matching.geo_index import driver_index
+from app.services.routing.speed_profiles import speed_profiles
+from app.services.tracking.eta import DEFAULT_ROUTE_FACTOR
+
+logger = logging.getLogger(__name__)
+
+
+PICKUP = "pickup"
+DROPOFF = "dropoff"
+
+
+class Stop(NamedTuple):
+    """
+    A point on a pooled vehicle's route and the time (epoch seconds) by
+    which it must be reached to keep its rider's detour within tolerance.
+    """
+    ride_id: int
+    kind: str
+    latitude: float
+    longitude: float
+    deadline: float
+
+
+class Insertion(NamedTuple):
+    """
+    The cheapest feasible way to fit a ride into one vehicle's route: the
+    pickup goes before stop `pickup_index` and the drop-off before stop
+    `dropoff_index` of the current route (equal indices place them back to
+    back; the route length appends at the end).
+    """
+    driver_id: int
+    pickup_index: int
+    dropoff_index: int
+    added_minutes: float
+    pickup_minutes: float
+    ride_minutes: float
+
+
+def _minutes(latitude_a, longitude_a, latitude_b, longitude_b, speed_kmh: float) -> np.ndarray:
+    distance_km = equirectangular_km_array(latitude_a, longitude_a, latitude_b, longitude_b) * DEFAULT_ROUTE_FACTOR
+    return distance_km / speed_kmh * 60.0
+
+
+def best_insertions(
+    points: np.ndarray,
+    counts: np.ndarray,
+    deadlines: np.ndarray,
+    loads: np.ndarray,
+    pickup: Tuple[float, float],
+    dropoff: Tuple[float, float],
+    max_detour_minutes: float,
+    max_wait_minutes: float,
+    capacity: int,
+    speed_kmh: float
+) -> Tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray, np.ndarray]:
+    """
+    Cheapest insertion of one ride into each of V vehicle routes at once.
+
+    `points` is (V, S + 1, 2): each vehicle's position followed by its S
+    stops, routes shorter than S padded by repeating their last point.
+    `counts` (V,) are real stop counts, `deadlines` (V, S) minutes from now
+    by which each stop must be reached (inf for padding) and `loads`
+    (V, S + 1) riders on board when leaving each point.
+
+    Every (pickup, drop-off) position pair is tried for all vehicles in one
+    vectorised pass. A pair is feasible when no later stop is pushed past
+    its deadline, the vehicle never exceeds `capacity`, the new rider is
+    picked up within `max_wait_minutes` and rides at most
+    `max_detour_minutes` longer than the direct trip. Returns per vehicle
+    the added route minutes (inf when nothing fits), the pickup and
+    drop-off indices, and the new rider's pickup and in-vehicle minutes.
+    """
+    vehicles, width = points.shape[0], points.shape[1]
+    latitudes, longitudes = points[:, :, 0], points[:, :, 1]
+    zero = np.zeros((vehicles, 1))
+
+    # Leg minutes between consecutive points (a trailing 0 past the end)
+    legs = np.hstack([_minutes(latitudes[:, :-1], longitudes[:, :-1], latitudes[:, 1:], longitudes[:, 1:], speed_kmh), zero])
+    arrival = np.hstack([zero, np.cumsum(legs[:, :-1], axis=1)])
+    to_pickup = _minutes(latitudes, longitudes, pickup[0], pickup[1], speed_kmh)
+    from_pickup = np.hstack([_minutes(pickup[0], pickup[1], latitudes, longitudes, speed_kmh), zero])
+    to_dropoff = _minutes(latitudes, longitudes, dropoff[0], dropoff[1], speed_kmh)
+    from_dropoff = np.hstack([_minutes(dropoff[0], dropoff[1], latitudes, longitudes, speed_kmh), zero])
+    direct = float(_minutes(pickup[0], pickup[1], dropoff[0], dropoff[1], speed_kmh))
+
+    # Delay each point can absorb, and the least of it from each point on
+    slack = np.hstack([np.full((vehicles, 1), np.inf), deadlines - arrival[:, 1:]])
+    later_slack = np.hstack([np.minimum.accumulate(slack[:, ::-1], axis=1)[:, ::-1], np.full((vehicles, 1), np.inf)])
+
+    best = np.full(vehicles, np.inf)
+    best_pickup = np.zeros(vehicles, dtype=np.int64)
+    best_dropoff = np.zeros(vehicles, dtype=np.int64)
+    best_wait = np.zeros(vehicles)
+    best_ride = np.zeros(vehicles)
+
+    for i in range(width):
+        has_next = i < counts
+        wait = arrival[:, i] + to_pickup[:, i]
+        pickup_delay = to_pickup[:, i] + np.where(has_next, from_pickup[:, i + 1] - legs[:, i], 0.0)
+        between_slack = np.full(vehicles, np.inf)
+        load = loads[:, i].copy()
+        for j in range(i, width):
+            if j == i:
+                added = to_pickup[:, i] + direct + np.where(has_next, from_dropoff[:, i + 1] - legs[:, i], 0.0)
+                ride_minutes = np.full(vehicles, direct)
+                first_ok = True
+            else:
+                between_slack = np.minimum(between_slack, slack[:, j])
+                load = np.maximum(load, loads[:, j])
+                dropoff_delay = to_dropoff[:, j] + np.where(j < counts, from_dropoff[:, j + 1] - legs[:, j], 0.0)
+                added = pickup_delay + dropoff_delay
+                ride_minutes = from_pickup[:, i + 1] + arrival[:, j] - arrival[:, i + 1] + to_dropoff[:, j]
+                first_ok = between_slack >= pickup_delay
+            feasible = (
+                (j <= counts)
+                & first_ok
+                & (later_slack[:, j + 1] >= added)
+                & (load < capacity)
+                & (wait <= max_wait_minutes)
+                & (ride_minutes <= direct + max_detour_minutes)
+                & (added < best)
+            )
+            best = np.where(feasible, added, best)
+            best_pickup = np.where(feasible, i, best_pickup)
+            best_dropoff = np.where(feasible, j, best_dropoff)
+            best_wait = np.where(feasible, wait, best_wait)
+            best_ride = np.where(feasible, ride_minutes, best_ride)
+
+    return best, best_pickup, best_dropoff, best_wait, best_ride
+
+
+class PoolPlanner:
+    """
+    Routes of vehicles carrying pooled rides and cheap insertion of new
+    pooled requests into them.
+
+    Each pooled driver has an ordered stop sequence (pickups and drop-offs)
+    with a deadline per stop derived from its rider's detour tolerance. A
+    new request is evaluated against every nearby pooled vehicle at once
+    (`best_insertions`), and the vehicles are ranked by the route minutes
+    the insertion adds. Travel times are straight-line estimates at the
+    historical speed around the pickup, which keeps evaluation to a few
+    array operations per request.
+    """
+
+    def __init__(
+        self,
+        capacity: int = settings.POOL_CAPACITY,
+        max_wait_minutes: float = settings.POOL_MAX_WAIT_MINUTES,
+        candidate_limit: int = settings.POOL_CANDIDATE_LIMIT,
+        max_distance_km: float = settings.MATCHING_MAX_DISTANCE_KM
+    ):
+        self.capacity = capacity
+        self.max_wait_minutes = max_wait_minutes
+        self.candidate_limit = candidate_limit
+        self.max_distance_km = max_distance_km
+        self.inserted = 0
+        self.started = 0
+        self.evaluations = 0
+        self._routes: Dict[int, List[Stop]] = {}
+        self._onboard: Dict[int, int] = {}
+        self._ride_drivers: Dict[int, int] = {}
+
+    def route(self, driver_id: int) -> List[Stop]:
+        return list(self._routes.get(driver_id, []))
+
+    def driver_for(self, ride_id: int) -> Optional[int]:
+        return self._ride_drivers.get(ride_id)
+
+    # Planning
+
+    def plan(self, ride: Ride, now: Optional[float] = None, driver_ids: Optional[List[int]] = None) -> List[Insertion]:
+        """
+        Feasible insertions of `ride` into nearby pooled vehicles (or just
+        `driver_ids`), cheapest first.
+        """
+        now = time.time() if now is None else now
+        candidates = self._nearby(ride, driver_ids)
+        if not candidates:
+            return []
+        self.evaluations += 1
+
+        max_stops = max(len(self._routes[driver_id]) for driver_id, _ in candidates)
+        vehicles = len(candidates)
+        points = np.empty((vehicles, max_stops + 1, 2))
+        deadlines = np.full((vehicles, max_stops), np.inf)
+        loads = np.zeros((vehicles, max_stops + 1))
+        counts = np.empty(vehicles, dtype=np.int64)
+        for row, (driver_id, position) in enumerate(candidates):
+            stops = self._routes[driver_id]
+            counts[row] = len(stops)
+            points[row, 0] = position
+            load = self._onboard.get(driver_id, 0)
+            loads[row, 0] = load
+            for column, stop in enumerate(stops, start=1):
+                points[row, column] = (stop.latitude, stop.longitude)
+                deadlines[row, column - 1] = (stop.deadline - now) / 60.0
+                load += 1 if stop.kind == PICKUP else -1
+                loads[row, column] = load
+            points[row, len(stops) + 1:] = points[row, len(stops)]
+
+        speed_kmh = max(speed_profiles.speed_kmh(ride.pickup_latitude, ride.pickup_longitude), settings.ETA_MIN_SPEED_KMH)
+        added, pickup_index, dropoff_index, wait, ride_minutes = best_insertions(
+            points, counts, deadlines, loads,
+            (ride.pickup_latitude, ride.pickup_longitude),
+            (ride.destination_latitude, ride.destination_longitude),
+            self.max_detour_minutes(ride), self.max_wait_minutes, self.capacity, speed_kmh
+        )
+        order = np.argsort(added, kind="stable")
+        return [
+            Insertion(candidates[row][0], int(pickup_index[row]), int(dropoff_index[row]),
+                      float(added[row]), float(wait[row]), float(ride_minutes[row]))
+            for row in order.tolist() if np.isfinite(added[row])
+        ]
+
+    def ranked_drivers(self, ride: Ride, exclude: Optional[set] = None) -> List[int]:
+        exclude = exclude or set()
+        return [insertion.driver_id for insertion in self.plan(ride) if insertion.driver_id not in exclude]
+
+    @staticmethod
+    def max_detour_minutes(ride: Ride) -> float:
+        if ride.max_detour_minutes is None:
+            return settings.POOL_DEFAULT_MAX_DETOUR_MINUTES
+        return min(ride.max_detour_minutes, settings.POOL_MAX_DETOUR_MINUTES)
+
+    def _nearby(self, ride: Ride, driver_ids: Optional[List[int]]) -> List[Tuple[int, Tuple[float, float]]]:
+        # Pooled vehicles with a free seat somewhere on their route, by
+        # distance from the pickup
+        pool = []
+        for driver_id in (self._routes if driver_ids is None else driver_ids):
+            stops = self._routes.get(driver_id)
+            position = driver_index.get(driver_id)
+            if stops is None or position is None or len(stops) >= 2 * self.capacity:
+                continue
+            pool.append((driver_id, position))
+        if not pool:
+            return []
+        positions = np.array([position for _, position in pool])
+        distances = haversine_km_array(positions[:, 0], positions[:, 1], ride.pickup_latitude, ride.pickup_longitude)
+        order = np.argsort(distances, kind="stable")[:self.candidate_limit]
+        return [pool[row] for row in order.tolist() if distances[row] <= self.max_distance_km]
+
+    # Route changes
+
+    def commit(self, driver_id: int, ride: Ride, now: Optional[float] = None) -> Optional[Insertion]:
+        """
+        Add a ride just assigned to `driver_id` to their route. The
+        insertion is re-planned against the route as it is now; a driver
+        without a route starts one. When nothing fits any more (the route
+        changed since ranking) the ride is appended.
+        """
+        now = time.time() if now is None else now
+        if driver_id not in self._routes:
+            self._routes[driver_id] = []
+            self._onboard[driver_id] = 0
+            self.started += 1
+        else:
+            self.inserted += 1
+        options = self.plan(ride, now, [driver_id])
+        stops = self._routes[driver_id]
+        if options:
+            insertion = options[0]
+        else:
+            if stops:
+                logger.warning("Pooled ride %d no longer fits driver %d's route; appending it", ride.id, driver_id)
+            insertion = Insertion(driver_id, len(stops), len(stops), 0.0, 0.0, 0.0)
+
+        pickup_deadline = now + max(self.max_wait_minutes, insertion.pickup_minutes) * 60.0
+        dropoff_deadline = now + (insertion.pickup_minutes + self._direct_minutes(ride)
+                                  + self.max_detour_minutes(ride)) * 60.0
+        pickup = Stop(ride.id, PICKUP, ride.pickup_latitude, ride.pickup_longitude, pickup_deadline)
+        dropoff = Stop(ride.id, DROPOFF, ride.destination_latitude, ride.destination_longitude, dropoff_deadline)
+        stops.insert(insertion.dropoff_index, dropoff)
+        stops.insert(insertion.pickup_index, pickup)
+        self._ride_drivers[ride.id] = driver_id
+        return insertion
+
+    def picked_up(self, ride_id: int) -> None:
+        driver_id = self._ride_drivers.get(ride_id)
+        if driver_id is None:
+            return
+        stops = self._routes[driver_id]
+        remaining = [stop for stop in stops if not (stop.ride_id == ride_id and stop.kind == PICKUP)]
+        if len(remaining) != len(stops):
+            self._routes[driver_id] = remaining
+            self._onboard[driver_id] += 1
+
+    def finish(self, ride_id: int) -> bool:
+        """
+        Drop a completed, cancelled or reassigned ride from its route.
+        Returns True while the driver still has other pooled stops.
+        """
+        driver_id = self._ride_drivers.pop(ride_id, None)
+        if driver_id is None:
+            return False
+        stops = self._routes[driver_id]
+        if not any(stop.ride_id == ride_id and stop.kind == PICKUP for stop in stops):
+            self._onboard[driver_id] = max(0, self._onboard[driver_id] - 1)
+        remaining = [stop for stop in stops if stop.ride_id != ride_id]
+        if remaining:
+            self._routes[driver_id] = remaining
+            return True
+        del self._routes[driver_id]
+        del self._onboard[driver_id]
+        return False
+
+    async def load(self) -> int:
+        """
+        Rebuild routes from the active pooled rides, e.g. after a restart.
+        Stops are ordered by acceptance and get fresh deadlines.
+        """
+        rides = await Ride.filter(
+            pooled=True,
+            driver_id__isnull=False,
+            status__in=[RideStatus.ACCEPTED, RideStatus.ARRIVED, RideStatus.IN_PROGRESS]
+        ).order_by("updated_at")
+        for ride in rides:
+            self.commit(ride.driver_id, ride)
+            if ride.status == RideStatus.IN_PROGRESS:
+                self.picked_up(ride.id)
+        return len(rides)
+
+    @staticmethod
+    def _direct_minutes(ride: Ride) -> float:
+        speed_kmh = max(speed_profiles.speed_kmh(ride.pickup_latitude, ride.pickup_longitude), settings.ETA_MIN_SPEED_KMH)
+        return float(_minutes(ride.pickup_latitude, ride.pickup_longitude,
+                              ride.destination_latitude, ride.destination_longitude, speed_kmh))
+
+    def stats(self) -> Dict[str, Any]:
+        riders = len(self._ride_drivers)
+        return {
+            "vehicles": len(self._routes),
+            "riders": riders,
+            "riders_per_vehicle": round(riders / len(self._routes), 2) if self._routes else 0.0,
+            "routes_started": self.started,
+            "insertions": self.inserted,
+            "evaluations": self.evaluations,
+        }
+
+
+# Process-wide pooled routes
+pool_planner = PoolPlanner()
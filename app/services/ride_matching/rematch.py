@@ -0,0 +1,49 @@
+from typing import Iterable, List, Optional, Set, Tuple
+
+from app.core.cache import TTLCache
+from app.core.config import settings
+
+
+class RematchCandidates(TTLCache[Tuple[int, ...]]):
+    """
+    The ranked driver ids each ride was matched from, kept for a short TTL.
+
+    When a driver backs out before pickup, the ride goes to the next of
+    these candidates instead of a new geo query, availability check and
+    ranking. Rankings age, so callers confirm the candidates are still
+    available and near the pickup; an expired or exhausted list means a
+    full match.
+    """
+
+    def __init__(
+        self,
+        ttl_seconds: float = settings.REMATCH_CANDIDATE_TTL_SECONDS,
+        max_entries: int = settings.REMATCH_CACHE_MAX_ENTRIES
+    ):
+        super().__init__(ttl_seconds, max_entries)
+
+    def remember(self, ride_id: int, ranked_driver_ids: Iterable[int], now: Optional[float] = None) -> None:
+        ranked = tuple(ranked_driver_ids)
+        if ranked:
+            self.put(ride_id, ranked, now)
+
+    def next_candidates(self, ride_id: int, exclude: Set[int], now: Optional[float] = None) -> List[int]:
+        """
+        The ride's remaining candidates, best first, skipping `exclude`.
+        Empty when the list expired or nobody is left on it.
+        """
+        ranked = self.get(ride_id, now)
+        if ranked is None:
+            self.misses += 1
+            return []
+        return [driver_id for driver_id in ranked if driver_id not in exclude]
+
+    def forget(self, ride_id: int) -> None:
+        """
+        Drop the list of a ride that no longer needs a driver.
+        """
+        self._entries.pop(ride_id, None)
+
+
+# Process-wide ranked candidates of recent matches
+rematch_candidates = RematchCandidates()
@@ -0,0 +1,193 @@
+import logging
+import time
+import uuid
+from typing import Any, Dict, Tuple
+
+from app.core.config import settings
+from app.models.ride import Ride, RideStatus
+
+logger = logging.getLogger(__name__)
+
+
+ACTIVE_RIDE_STATUSES = [RideStatus.ACCEPTED, RideStatus.ARRIVED, RideStatus.IN_PROGRESS]
+
+# Outcomes of an assignment attempt
+ASSIGNED = "assigned"
+# Another matcher holds the driver's lease right now
+DRIVER_CONTENDED = "contended"
+# The driver already has an active ride (or a full pooled vehicle)
+DRIVER_BUSY = "driver_busy"
+# The ride was matched or cancelled in the meantime
+RIDE_TAKEN = "ride_taken"
+
+# Deletes the lease only if it still holds our token
+REDIS_RELEASE_SCRIPT = """
+if redis.call('GET', KEYS[1]) == ARGV[1] then
+    return redis.call('DEL', KEYS[1])
+end
+return 0
+"""
+
+
+class ReservationBackend:
+    """
+    Short per-driver leases with compare-and-set semantics: `acquire`
+    succeeds for one token at a time until it is released or expires.
+    """
+
+    shared = False
+
+    async def acquire(self, driver_id: int, token: str, ttl_seconds: float) -> bool:
+        raise NotImplementedError
+
+    async def release(self, driver_id: int, token: str) -> bool:
+        """
+        Drop the lease if `token` still holds it; an expired lease that
+        someone else took over is left alone.
+        """
+        raise NotImplementedError
+
+    async def close(self) -> None:
+        pass
+
+
+class InMemoryReservationBackend(ReservationBackend):
+    """
+    Process-local leases, suitable for a single worker and for tests. The
+    check and the write happen without yielding to the event loop, so they
+    are atomic for every matcher in the process.
+    """
+
+    def __init__(self):
+        self._leases: Dict[int, Tuple[str, float]] = {}
+
+    async def acquire(self, driver_id: int, token: str, ttl_seconds: float) -> bool:
+        now = time.monotonic()
+        lease = self._leases.get(driver_id)
+        if lease is not None and lease[1] > now:
+            return False
+        self._leases[driver_id] = (token, now + ttl_seconds)
+        return True
+
+    async def release(self, driver_id: int, token: str) -> bool:
+        lease = self._leases.get(driver_id)
+        if lease is None or lease[0] != token:
+            return False
+        del self._leases[driver_id]
+        return True
+
+
+class RedisReservationBackend(ReservationBackend):
+    """
+    Leases shared by all workers: SET NX PX to acquire, a compare-and-delete
+    script to release. `client` is any object exposing the redis.asyncio
+    command subset used here.
+    """
+
+    shared = True
+
+    def __init__(self, client, key_prefix: str = "driver:lease"):
+        self.client = client
+        self.key_prefix = key_prefix
+        self._release = client.register_script(REDIS_RELEASE_SCRIPT)
+
+    def _key(self, driver_id: int) -> str:
+        return f"{self.key_prefix}:{driver_id}"
+
+    async def acquire(self, driver_id: int, token: str, ttl_seconds: float) -> bool:
+        return bool(await self.client.set(self._key(driver_id), token, nx=True, px=int(ttl_seconds * 1000)))
+
+    async def release(self, driver_id: int, token: str) -> bool:
+        return bool(await self._release(keys=[self._key(driver_id)], args=[token]))
+
+    async def close(self) -> None:
+        await self.client.close()
+
+
+def create_reservation_backend(name: str) -> ReservationBackend:
+    """
+    Build the backend selected by settings.DRIVER_RESERVATION_BACKEND ("memory" or "redis").
+    """
+    if name == "memory":
+        return InMemoryReservationBackend()
+    if name == "redis":
+        from redis import asyncio as redis_asyncio
+
+        client = redis_asyncio.Redis(host=settings.REDIS_HOST, port=settings.REDIS_PORT, decode_responses=True)
+        return RedisReservationBackend(client)
+    raise ValueError(f"Unknown reservation backend: {name}")
+
+
+class DriverReservations:
+    """
+    Assigns drivers to rides without double booking, so any number of
+    matchers can run in parallel.
+
+    A matcher first takes a short lease on the driver; only the lease
+    holder may then check that the driver has no active ride and move the
+    ride from REQUESTED to ACCEPTED in a conditional update. The lease makes
+    check-and-write atomic per driver, the conditional update makes it
+    atomic per ride, and the lease TTL frees drivers held by a matcher that
+    died mid-assignment.
+    """
+
+    def __init__(
+        self,
+        backend: ReservationBackend,
+        lease_seconds: float = settings.DRIVER_RESERVATION_LEASE_SECONDS
+    ):
+        self.backend = backend
+        self.lease_seconds = lease_seconds
+        self.assigned = 0
+        self.contended = 0
+        self.driver_busy = 0
+        self.ride_taken = 0
+
+    async def assign(self, ride_id: int, driver_id: int, pooled: bool = False) -> str:
+        """
+        Atomically assign `driver_id` to a ride still waiting for a driver.
+        Returns ASSIGNED, or why not: DRIVER_CONTENDED when the driver is
+        being assigned elsewhere, DRIVER_BUSY when they already have an
+        active ride, RIDE_TAKEN when the ride was matched or cancelled. A
+        `pooled` ride may join a driver whose active rides are all pooled,
+        up to POOL_CAPACITY of them.
+        """
+        token = uuid.uuid4().hex
+        if not await self.backend.acquire(driver_id, token, self.lease_seconds):
+            self.contended += 1
+            return DRIVER_CONTENDED
+        try:
+            if await self._driver_busy(driver_id, pooled):
+                self.driver_busy += 1
+                return DRIVER_BUSY
+            updated = await Ride.filter(id=ride_id, status=RideStatus.REQUESTED).update(
+                driver_id=driver_id, status=RideStatus.ACCEPTED
+            )
+            if not updated:
+                self.ride_taken += 1
+                return RIDE_TAKEN
+            self.assigned += 1
+            return ASSIGNED
+        finally:
+            await self.backend.release(driver_id, token)
+
+    @staticmethod
+    async def _driver_busy(driver_id: int, pooled: bool) -> bool:
+        active = Ride.filter(driver_id=driver_id, status__in=ACTIVE_RIDE_STATUSES)
+        if not pooled:
+            return await active.exists()
+        shared = await active.values_list("pooled", flat=True)
+        return not all(shared) or len(shared) >= settings.POOL_CAPACITY
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "backend": type(self.backend).__name__,
+            "assigned": self.assigned,
+            "contended": self.contended,
+            "driver_busy": self.driver_busy,
+            "ride_taken": self.ride_taken,
+        }
+
+
+# Process-wide driver reservations
+driver_reservations = DriverReservations(create_reservation_backend(settings.DRIVER_RESERVATION_BACKEND))
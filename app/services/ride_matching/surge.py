@@ -0,0 +1,239 @@
+import asyncio
+import logging
+import math
+import time
+from collections import OrderedDict
+from typing import Any, Dict, NamedTuple, Optional, Tuple
+
+from app.core.config import settings
+from app.services.ride_matching.distance import KM_PER_DEGREE
+
+logger = logging.getLogger(__name__)
+
+
+CellKey = Tuple[int, int]
+
+
+class CellSurge(NamedTuple):
+    """
+    Published surge for one cell. `epoch` is the recompute round in which
+    the factor last changed; quotes keyed by it stay valid until it moves.
+    """
+    factor: float
+    epoch: int
+    previous_epoch: Optional[int]
+
+
+NO_SURGE = CellSurge(1.0, 0, None)
+
+
+class SurgeEngine:
+    """
+    Per-cell surge pricing from streaming supply and demand.
+
+    Open ride requests and idle-driver pings are counted per grid cell as
+    they happen. Entries older than the sliding window drop out (requests
+    that were never closed, drivers that stopped pinging), so counts track
+    the recent state without rescanning. Every `recompute_seconds` the
+    demand/supply ratio of each active cell is turned into a capped factor,
+    smoothed against the previous value and rounded to `step`, so quotes do
+    not flicker. Lookups are a dict access on the published table.
+    """
+
+    def __init__(
+        self,
+        cell_size_km: float = settings.SURGE_CELL_SIZE_KM,
+        window_seconds: float = settings.SURGE_WINDOW_SECONDS,
+        recompute_seconds: float = settings.SURGE_RECOMPUTE_SECONDS,
+        sensitivity: float = settings.SURGE_SENSITIVITY,
+        smoothing: float = settings.SURGE_SMOOTHING,
+        max_factor: float = settings.SURGE_MAX_FACTOR,
+        step: float = settings.SURGE_STEP,
+        honour_seconds: float = settings.FARE_CACHE_TTL_SECONDS
+    ):
+        self.cell_degrees = cell_size_km / KM_PER_DEGREE
+        self.window_seconds = window_seconds
+        self.recompute_seconds = recompute_seconds
+        self.sensitivity = sensitivity
+        self.smoothing = smoothing
+        self.max_factor = max_factor
+        self.step = step
+        # Quotes from a cell's previous epoch are honoured for this long
+        self.honour_seconds = honour_seconds
+        self.epoch = 0
+        # Oldest first, so expiry pops from the front
+        self._requests: "OrderedDict[int, Tuple[CellKey, float]]" = OrderedDict()
+        self._drivers: "OrderedDict[int, Tuple[CellKey, float]]" = OrderedDict()
+        self._demand: Dict[CellKey, int] = {}
+        self._supply: Dict[CellKey, int] = {}
+        self._smoothed: Dict[CellKey, float] = {}
+        self._published: Dict[CellKey, CellSurge] = {}
+        # Cells published back at 1.0 -> when they calmed down
+        self._calmed: Dict[CellKey, float] = {}
+        self._task: Optional[asyncio.Task] = None
+
+    def cell_for(self, latitude: float, longitude: float) -> CellKey:
+        return (
+            int(math.floor(latitude / self.cell_degrees)),
+            int(math.floor(longitude / self.cell_degrees)),
+        )
+
+    # Demand
+
+    def record_request(self, ride_id: int, latitude: float, longitude: float, at: Optional[float] = None) -> None:
+        at = time.time() if at is None else at
+        self.close_request(ride_id)
+        cell = self.cell_for(latitude, longitude)
+        self._requests[ride_id] = (cell, at)
+        self._demand[cell] = self._demand.get(cell, 0) + 1
+
+    def close_request(self, ride_id: int) -> None:
+        """
+        Stop counting a request once it is matched, cancelled or expired.
+        """
+        entry = self._requests.pop(ride_id, None)
+        if entry is not None:
+            self._decrement(self._demand, entry[0])
+
+    # Supply
+
+    def record_driver(self, driver_id: int, latitude: float, longitude: float, at: Optional[float] = None) -> None:
+        """
+        Count an idle driver's ping in its current cell.
+        """
+        at = time.time() if at is None else at
+        cell = self.cell_for(latitude, longitude)
+        previous = self._drivers.pop(driver_id, None)
+        if previous is None or previous[0] != cell:
+            if previous is not None:
+                self._decrement(self._supply, previous[0])
+            self._supply[cell] = self._supply.get(cell, 0) + 1
+        self._drivers[driver_id] = (cell, at)
+
+    def remove_driver(self, driver_id: int) -> None:
+        entry = self._drivers.pop(driver_id, None)
+        if entry is not None:
+            self._decrement(self._supply, entry[0])
+
+    @staticmethod
+    def _decrement(counts: Dict[CellKey, int], cell: CellKey) -> None:
+        remaining = counts[cell] - 1
+        if remaining:
+            counts[cell] = remaining
+        else:
+            del counts[cell]
+
+    def counts(self, latitude: float, longitude: float) -> Tuple[int, int]:
+        """
+        (open requests, idle drivers) currently counted in the cell.
+        """
+        cell = self.cell_for(latitude, longitude)
+        return self._demand.get(cell, 0), self._supply.get(cell, 0)
+
+    # Pricing
+
+    def surge_for(self, latitude: float, longitude: float) -> CellSurge:
+        return self._published.get(self.cell_for(latitude, longitude), NO_SURGE)
+
+    def factor(self, latitude: float, longitude: float) -> float:
+        return self.surge_for(latitude, longitude).factor
+
+    def expire(self, now: Optional[float] = None) -> None:
+        cutoff = (time.time() if now is None else now) - self.window_seconds
+        for entries, counts in ((self._requests, self._demand), (self._drivers, self._supply)):
+            while entries:
+                key, (cell, at) = next(iter(entries.items()))
+                if at >= cutoff:
+                    break
+                del entries[key]
+                self._decrement(counts, cell)
+
+    def target_factor(self, demand: int, supply: int) -> float:
+        """
+        Unsmoothed factor for a cell: rises with the demand/supply ratio
+        above 1, capped at `max_factor`.
+        """
+        ratio = demand / max(supply, 1)
+        return min(self.max_factor, max(1.0, 1.0 + self.sensitivity * (ratio - 1.0)))
+
+    def recompute(self, now: Optional[float] = None) -> int:
+        """
+        Recompute and publish factors for every active or still-surging
+        cell. Returns the new epoch.
+        """
+        now = time.time() if now is None else now
+        self.expire(now)
+        self.epoch += 1
+        alpha = self.smoothing
+        smoothed: Dict[CellKey, float] = {}
+        published = dict(self._published)
+
+        # Cells with supply but no demand and no surge to decay stay at 1.0
+        for cell in self._demand.keys() | self._smoothed.keys():
+            target = self.target_factor(self._demand.get(cell, 0), self._supply.get(cell, 0))
+            value = (1 - alpha) * self._smoothed.get(cell, 1.0) + alpha * target
+            factor = round(round(value / self.step) * self.step, 2)
+            if factor > 1.0 or target > 1.0:
+                smoothed[cell] = value
+
+            current = published.get(cell, NO_SURGE)
+            if factor != current.factor:
+                # Cells that calm down keep a 1.0 entry so quotes from the
+                # surge they leave behind can still be honoured
+                published[cell] = CellSurge(factor, self.epoch, current.epoch)
+                if factor > 1.0:
+                    self._calmed.pop(cell, None)
+                else:
+                    self._calmed[cell] = now
+
+        # Once those quotes can no longer be honoured, the entry goes
+        for cell, calmed_at in list(self._calmed.items()):
+            if now - calmed_at > self.honour_seconds and cell not in smoothed:
+                del self._calmed[cell]
+                published.pop(cell, None)
+
+        # Swap whole tables so lookups never see a half-applied round
+        self._smoothed = smoothed
+        self._published = published
+        return self.epoch
+
+    def published(self) -> Dict[CellKey, CellSurge]:
+        """
+        The published factor of every active cell as of the last recompute.
+        """
+        return dict(self._published)
+
+    def stats(self) -> Dict[str, Any]:
+        factors = [surge.factor for surge in self._published.values()]
+        return {
+            "epoch": self.epoch,
+            "open_requests": len(self._requests),
+            "idle_drivers": len(self._drivers),
+            "surging_cells": sum(1 for factor in factors if factor > 1.0),
+            "max_factor": max(factors, default=1.0),
+        }
+
+    def start(self) -> None:
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def _run(self) -> None:
+        while True:
+            await asyncio.sleep(self.recompute_seconds)
+            try:
+                self.recompute()
+            except Exception:
+                logger.exception("Surge recompute failed")
+
+
+# Process-wide surge engine, started on application startup
+surge_engine = SurgeEngine()
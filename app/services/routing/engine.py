@@ -0,0 +1,244 @@
+import heapq
+import math
+from typing import List, NamedTuple, Optional
+
+import numpy as np
+from scipy.sparse.csgraph import dijkstra
+
+from app.core.config import settings
+from app.services.ride_matching.distance import haversine_km_array
+from app.services.routing.graph import RoadGraph
+
+
+# Speed used to size the first one-to-many search radius; slower routes
+# trigger a wider second search
+INITIAL_LIMIT_SPEED_KMH = 20.0
+# Sources per csgraph call; each returns a dense (sources, nodes) array
+SEARCH_CHUNK = 16
+
+
+class Route(NamedTuple):
+    """
+    Shortest (fastest) road route between two snapped points.
+    """
+    distance_km: float
+    duration_seconds: float
+
+    @property
+    def duration_minutes(self) -> int:
+        return int(math.ceil(self.duration_seconds / 60.0))
+
+
+class RoutingEngine:
+    """
+    Point-to-point and one-to-many fastest-path queries on a RoadGraph.
+
+    Point-to-point queries run A* with ALT (A*, landmarks, triangle
+    inequality) lower bounds: travel times from and to a few landmarks
+    spread around the graph edge are precomputed once, and for any node v
+    and target t, |d(L, t) - d(L, v)| style differences bound d(v, t) from
+    below. That steers the search towards the target, so it settles a small
+    fraction of the nodes plain Dijkstra would.
+
+    One-to-many and many-to-many queries run bounded Dijkstra searches in C
+    via scipy.sparse.csgraph.
+    """
+
+    def __init__(
+        self,
+        graph: RoadGraph,
+        landmark_count: int = settings.ROUTING_LANDMARKS,
+        max_snap_km: float = settings.ROUTING_MAX_SNAP_KM,
+        access_speed_kmh: float = settings.ROUTING_ACCESS_SPEED_KMH
+    ):
+        self.graph = graph
+        self.landmark_count = landmark_count
+        self.max_snap_km = max_snap_km
+        self.access_speed_kmh = access_speed_kmh
+        # Python lists for the A* inner loop; indexing NumPy scalars one at a
+        # time is several times slower
+        self._indptr: List[int] = graph.indptr.tolist()
+        self._indices: List[int] = graph.indices.tolist()
+        self._travel_s: List[float] = graph.travel_s.tolist()
+        self._length_m: List[float] = graph.length_m.tolist()
+        self.landmarks = np.empty(0, dtype=np.int64)
+        # (landmarks, nodes) travel seconds from and to each landmark
+        self._from_landmarks = np.empty((0, graph.node_count), dtype=np.float32)
+        self._to_landmarks = np.empty((0, graph.node_count), dtype=np.float32)
+
+    def prepare(self) -> None:
+        """
+        Pick landmarks by farthest-point selection and precompute travel
+        times from and to each of them.
+        """
+        forward = self.graph.matrix()
+        backward = self.graph.reverse_matrix()
+        n = self.graph.node_count
+        count = min(self.landmark_count, n)
+
+        landmarks: List[int] = []
+        from_rows: List[np.ndarray] = []
+        to_rows: List[np.ndarray] = []
+        # Seed from the node farthest from an arbitrary start, then keep
+        # adding the node farthest from all landmarks chosen so far
+        closest = dijkstra(forward, indices=0)
+        for _ in range(count):
+            reachable = np.where(np.isfinite(closest), closest, -1.0)
+            if landmarks:
+                reachable[landmarks] = -1.0
+            landmark = int(np.argmax(reachable))
+            landmarks.append(landmark)
+            from_rows.append(dijkstra(forward, indices=landmark))
+            to_rows.append(dijkstra(backward, indices=landmark))
+            closest = from_rows[-1] if len(landmarks) == 1 else np.minimum(closest, from_rows[-1])
+
+        self.landmarks = np.array(landmarks, dtype=np.int64)
+        self._from_landmarks = np.array(from_rows, dtype=np.float32).reshape(-1, n)
+        self._to_landmarks = np.array(to_rows, dtype=np.float32).reshape(-1, n)
+
+    def _heuristic(self, target: int) -> List[float]:
+        """
+        ALT lower bound on the travel time from every node to `target`.
+        """
+        if not len(self.landmarks):
+            return [0.0] * self.graph.node_count
+        with np.errstate(invalid="ignore"):
+            ahead = self._from_landmarks[:, target, None] - self._from_landmarks
+            behind = self._to_landmarks - self._to_landmarks[:, target, None]
+            bound = np.maximum(ahead.max(axis=0), behind.max(axis=0))
+        # Infinite or NaN differences come from unreachable landmarks
+        bound[~np.isfinite(bound)] = 0.0
+        return np.maximum(bound, 0.0).tolist()
+
+    def shortest_path(self, source: int, target: int) -> Optional[Route]:
+        """
+        Fastest route between two graph nodes, or None if unreachable.
+        """
+        if source == target:
+            return Route(0.0, 0.0)
+
+        h = self._heuristic(target)
+        indptr, indices, travel_s, length_m = self._indptr, self._indices, self._travel_s, self._length_m
+        best = {source: 0.0}
+        lengths = {source: 0.0}
+        heap = [(h[source], 0.0, source)]
+        heappush, heappop = heapq.heappush, heapq.heappop
+
+        while heap:
+            _, time_s, node = heappop(heap)
+            if node == target:
+                return Route(lengths[node] / 1000.0, time_s)
+            if time_s > best[node]:
+                continue
+            node_length = lengths[node]
+            for edge in range(indptr[node], indptr[node + 1]):
+                neighbour = indices[edge]
+                candidate = time_s + travel_s[edge]
+                if candidate < best.get(neighbour, math.inf):
+                    best[neighbour] = candidate
+                    lengths[neighbour] = node_length + length_m[edge]
+                    heappush(heap, (candidate + h[neighbour], candidate, neighbour))
+        return None
+
+    def route(
+        self,
+        origin_latitude: float,
+        origin_longitude: float,
+        destination_latitude: float,
+        destination_longitude: float
+    ) -> Optional[Route]:
+        """
+        Fastest road route between two coordinates, including the legs to
+        and from the snapped graph nodes. None when either point is too far
+        from the road network or no path exists.
+        """
+        nodes, snap_km = self.graph.nearest_nodes(
+            [origin_latitude, destination_latitude], [origin_longitude, destination_longitude]
+        )
+        if snap_km.max() > self.max_snap_km:
+            return None
+
+        route = self.shortest_path(int(nodes[0]), int(nodes[1]))
+        if route is None:
+            return None
+        access_km = float(snap_km.sum())
+        return Route(
+            route.distance_km + access_km,
+            route.duration_seconds + access_km / self.access_speed_kmh * 3600.0,
+        )
+
+    def travel_times_from(
+        self,
+        origin_latitude: float,
+        origin_longitude: float,
+        latitudes: np.ndarray,
+        longitudes: np.ndarray,
+        limit_seconds: float = settings.ROUTING_SEARCH_LIMIT_SECONDS
+    ) -> np.ndarray:
+        """
+        Travel seconds from one origin to many destinations.
+        """
+        return self.travel_time_matrix(
+            [origin_latitude], [origin_longitude], latitudes, longitudes, limit_seconds
+        )[0]
+
+    def travel_time_matrix(
+        self,
+        origin_latitudes: np.ndarray,
+        origin_longitudes: np.ndarray,
+        destination_latitudes: np.ndarray,
+        destination_longitudes: np.ndarray,
+        limit_seconds: float = settings.ROUTING_SEARCH_LIMIT_SECONDS
+    ) -> np.ndarray:
+        """
+        (origins, destinations) matrix of travel seconds. Pairs with an end
+        off the network, unreachable or beyond `limit_seconds` are inf.
+
+        Runs one bounded Dijkstra per distinct snapped node on the smaller
+        side: forward from the origins, or backward over the reversed graph
+        from the destinations (e.g. many drivers to one pickup).
+        """
+        origin_nodes, origin_snap_km = self.graph.nearest_nodes(origin_latitudes, origin_longitudes)
+        destination_nodes, destination_snap_km = self.graph.nearest_nodes(destination_latitudes, destination_longitudes)
+        origin_ok = origin_snap_km <= self.max_snap_km
+        destination_ok = destination_snap_km <= self.max_snap_km
+        times = np.full((len(origin_nodes), len(destination_nodes)), np.inf)
+        if not origin_ok.any() or not destination_ok.any():
+            return times
+
+        # Search cost grows with the square of the radius, so start with a
+        # limit sized to the farthest pair and widen only if needed
+        straight_km = haversine_km_array(
+            np.asarray(origin_latitudes, dtype=np.float64)[origin_ok, None],
+            np.asarray(origin_longitudes, dtype=np.float64)[origin_ok, None],
+            np.asarray(destination_latitudes, dtype=np.float64)[None, destination_ok],
+            np.asarray(destination_longitudes, dtype=np.float64)[None, destination_ok],
+        )
+        limit = min(limit_seconds, max(60.0, float(straight_km.max()) / INITIAL_LIMIT_SPEED_KMH * 3600.0))
+
+        backward = len(np.unique(destination_nodes[destination_ok])) < len(np.unique(origin_nodes[origin_ok]))
+        if backward:
+            sources, sources_ok, targets = destination_nodes, destination_ok, origin_nodes
+            matrix = self.graph.reverse_matrix()
+        else:
+            sources, sources_ok, targets = origin_nodes, origin_ok, destination_nodes
+            matrix = self.graph.matrix()
+
+        search_nodes, inverse = np.unique(sources[sources_ok], return_inverse=True)
+        block = np.full((len(sources), len(targets)), np.inf)
+        while True:
+            for start in range(0, len(search_nodes), SEARCH_CHUNK):
+                chunk = search_nodes[start:start + SEARCH_CHUNK]
+                rows = dijkstra(matrix, indices=chunk, limit=limit)[:, targets]
+                picks = np.flatnonzero((inverse >= start) & (inverse < start + len(chunk)))
+                block[np.flatnonzero(sources_ok)[picks]] = rows[inverse[picks] - start]
+            reached = block[np.ix_(sources_ok, origin_ok if backward else destination_ok)]
+            if limit >= limit_seconds or np.isfinite(reached).all():
+                break
+            limit = min(limit_seconds, limit * 2)
+
+        times = block.T if backward else block
+        times = times + (origin_snap_km[:, None] + destination_snap_km[None, :]) / self.access_speed_kmh * 3600.0
+        times[~origin_ok, :] = np.inf
+        times[:, ~destination_ok] = np.inf
+        return times
@@ -0,0 +1,122 @@
+from typing import Optional, Tuple
+
+import numpy as np
+from scipy.sparse import csr_matrix
+from scipy.spatial import cKDTree
+
+from app.services.ride_matching.distance import EARTH_RADIUS_KM
+
+
+class RoadGraph:
+    """
+    Directed road network in compressed sparse row (CSR) form.
+
+    Node i has outgoing edges indices[indptr[i]:indptr[i + 1]], each with a
+    length in metres and a free-flow travel time in seconds. Graph files are
+    `.npz` archives with the arrays `latitude`, `longitude`, `indptr`,
+    `indices`, `length_m` and `travel_s`, typically exported from an OSM
+    extract by an offline job.
+    """
+
+    def __init__(
+        self,
+        latitudes: np.ndarray,
+        longitudes: np.ndarray,
+        indptr: np.ndarray,
+        indices: np.ndarray,
+        length_m: np.ndarray,
+        travel_s: np.ndarray
+    ):
+        self.latitudes = np.asarray(latitudes, dtype=np.float64)
+        self.longitudes = np.asarray(longitudes, dtype=np.float64)
+        self.indptr = np.asarray(indptr, dtype=np.int64)
+        self.indices = np.asarray(indices, dtype=np.int32)
+        self.length_m = np.asarray(length_m, dtype=np.float32)
+        self.travel_s = np.asarray(travel_s, dtype=np.float32)
+        self._tree: Optional[cKDTree] = None
+        self._matrix: Optional[csr_matrix] = None
+        self._reverse_matrix: Optional[csr_matrix] = None
+
+    @property
+    def node_count(self) -> int:
+        return len(self.latitudes)
+
+    @property
+    def edge_count(self) -> int:
+        return len(self.indices)
+
+    @classmethod
+    def load(cls, path: str) -> "RoadGraph":
+        with np.load(path) as data:
+            return cls(
+                data["latitude"], data["longitude"], data["indptr"],
+                data["indices"], data["length_m"], data["travel_s"]
+            )
+
+    def save(self, path: str) -> None:
+        np.savez(
+            path, latitude=self.latitudes, longitude=self.longitudes, indptr=self.indptr,
+            indices=self.indices, length_m=self.length_m, travel_s=self.travel_s
+        )
+
+    @classmethod
+    def from_edges(
+        cls,
+        latitudes: np.ndarray,
+        longitudes: np.ndarray,
+        sources: np.ndarray,
+        targets: np.ndarray,
+        length_m: np.ndarray,
+        speed_kmh: np.ndarray
+    ) -> "RoadGraph":
+        """
+        Build a graph from an edge list. Two-way roads need an edge in each
+        direction.
+        """
+        sources = np.asarray(sources, dtype=np.int64)
+        order = np.argsort(sources, kind="stable")
+        counts = np.bincount(sources, minlength=len(latitudes))
+        indptr = np.concatenate(([0], np.cumsum(counts)))
+        length_m = np.asarray(length_m, dtype=np.float64)[order]
+        travel_s = length_m / (np.asarray(speed_kmh, dtype=np.float64)[order] / 3.6)
+        return cls(latitudes, longitudes, indptr, np.asarray(targets)[order], length_m, travel_s)
+
+    def matrix(self) -> csr_matrix:
+        """
+        Travel-time adjacency matrix for scipy.sparse.csgraph routines.
+        """
+        if self._matrix is None:
+            n = self.node_count
+            # csgraph treats explicit zeros as missing edges
+            weights = np.maximum(self.travel_s.astype(np.float64), 1e-3)
+            self._matrix = csr_matrix((weights, self.indices, self.indptr), shape=(n, n))
+        return self._matrix
+
+    def reverse_matrix(self) -> csr_matrix:
+        """
+        Travel-time matrix of the graph with every edge reversed.
+        """
+        if self._reverse_matrix is None:
+            self._reverse_matrix = self.matrix().T.tocsr()
+        return self._reverse_matrix
+
+    def _project(self, latitudes, longitudes) -> np.ndarray:
+        mean_lat = np.radians(self.latitudes.mean()) if self.node_count else 0.0
+        return np.column_stack((
+            np.radians(np.asarray(longitudes, dtype=np.float64)) * np.cos(mean_lat) * EARTH_RADIUS_KM,
+            np.radians(np.asarray(latitudes, dtype=np.float64)) * EARTH_RADIUS_KM,
+        ))
+
+    def nearest_nodes(self, latitudes, longitudes) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Snap coordinates to their nearest graph nodes.
+        Returns (node ids, snap distances in km).
+        """
+        if self._tree is None:
+            self._tree = cKDTree(self._project(self.latitudes, self.longitudes))
+        distances_km, nodes = self._tree.query(self._project(np.atleast_1d(latitudes), np.atleast_1d(longitudes)))
+        return nodes.astype(np.int64), distances_km
+
+    def nearest_node(self, latitude: float, longitude: float) -> Tuple[int, float]:
+        nodes, distances_km = self.nearest_nodes(latitude, longitude)
+        return int(nodes[0]), float(distances_km[0])
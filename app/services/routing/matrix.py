@@ -0,0 +1,122 @@
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+
+from app.core.cache import TTLCache
+from app.core.config import settings
+from app.services.ride_matching.distance import KM_PER_DEGREE
+from app.services.routing.service import RoadRouter, road_router
+
+
+class TravelTimeMatrix:
+    """
+    Many-to-many road travel times with a cell-to-cell cache.
+
+    Origins and destinations are snapped to square-degree cells roughly
+    `cell_size_km` wide; a computed time is reused for any later pair in the
+    same two cells until it expires, so popular pairs (busy pickup areas,
+    airport runs) are answered without a graph search. Only the rows and
+    columns with cache misses are searched, as one matrix query on a small
+    worker pool so the event loop is not blocked.
+    """
+
+    def __init__(
+        self,
+        router: RoadRouter = road_router,
+        cell_size_km: float = settings.ETA_MATRIX_CELL_SIZE_KM,
+        ttl_seconds: float = settings.ETA_MATRIX_CACHE_TTL_SECONDS,
+        max_entries: int = settings.ETA_MATRIX_CACHE_MAX_ENTRIES,
+        workers: int = settings.ETA_MATRIX_WORKERS
+    ):
+        self.router = router
+        self.cell_degrees = cell_size_km / KM_PER_DEGREE
+        self.cache: TTLCache[float] = TTLCache(ttl_seconds, max_entries)
+        self.workers = workers
+        self._executor: Optional[ThreadPoolExecutor] = None
+
+    @property
+    def available(self) -> bool:
+        return self.router.available
+
+    def _cells(self, latitudes: np.ndarray, longitudes: np.ndarray) -> List[Tuple[int, int]]:
+        rows = np.floor(np.asarray(latitudes, dtype=np.float64) / self.cell_degrees).astype(np.int64)
+        cols = np.floor(np.asarray(longitudes, dtype=np.float64) / self.cell_degrees).astype(np.int64)
+        return list(zip(rows.tolist(), cols.tolist()))
+
+    async def many_to_many(
+        self,
+        origin_latitudes: np.ndarray,
+        origin_longitudes: np.ndarray,
+        destination_latitudes: np.ndarray,
+        destination_longitudes: np.ndarray
+    ) -> Optional[np.ndarray]:
+        """
+        (origins, destinations) travel seconds, inf where unreachable. None
+        when no road graph is loaded.
+        """
+        engine = self.router.engine
+        if engine is None:
+            return None
+
+        origin_latitudes = np.asarray(origin_latitudes, dtype=np.float64)
+        origin_longitudes = np.asarray(origin_longitudes, dtype=np.float64)
+        destination_latitudes = np.asarray(destination_latitudes, dtype=np.float64)
+        destination_longitudes = np.asarray(destination_longitudes, dtype=np.float64)
+        origin_cells = self._cells(origin_latitudes, origin_longitudes)
+        destination_cells = self._cells(destination_latitudes, destination_longitudes)
+
+        times = np.empty((len(origin_cells), len(destination_cells)))
+        missing = np.zeros(times.shape, dtype=bool)
+        for i, origin_cell in enumerate(origin_cells):
+            for j, destination_cell in enumerate(destination_cells):
+                cached = self.cache.get((origin_cell, destination_cell))
+                if cached is None:
+                    missing[i, j] = True
+                else:
+                    times[i, j] = cached
+        if not missing.any():
+            return times
+
+        rows = np.flatnonzero(missing.any(axis=1))
+        cols = np.flatnonzero(missing.any(axis=0))
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="eta-matrix")
+        loop = asyncio.get_running_loop()
+        computed = await loop.run_in_executor(
+            self._executor, engine.travel_time_matrix,
+            origin_latitudes[rows], origin_longitudes[rows],
+            destination_latitudes[cols], destination_longitudes[cols],
+        )
+
+        self.cache.misses += int(missing.sum())
+        for a, i in enumerate(rows.tolist()):
+            for b, j in enumerate(cols.tolist()):
+                if missing[i, j]:
+                    times[i, j] = computed[a, b]
+                    self.cache.put((origin_cells[i], destination_cells[j]), float(computed[a, b]))
+        return times
+
+    async def many_to_one(
+        self,
+        origin_latitudes: np.ndarray,
+        origin_longitudes: np.ndarray,
+        destination_latitude: float,
+        destination_longitude: float
+    ) -> Optional[np.ndarray]:
+        """
+        Travel seconds from each origin (e.g. candidate drivers) to one
+        destination (the pickup).
+        """
+        times = await self.many_to_many(
+            origin_latitudes, origin_longitudes, [destination_latitude], [destination_longitude]
+        )
+        return None if times is None else times[:, 0]
+
+    def stats(self) -> Dict[str, Any]:
+        return self.cache.stats()
+
+
+# Process-wide travel-time matrix
+travel_time_matrix = TravelTimeMatrix()
@@ -0,0 +1,82 @@
+import asyncio
+import logging
+import os
+from typing import Optional
+
+import numpy as np
+
+from app.core.config import settings
+from app.services.routing.engine import Route, RoutingEngine
+from app.services.routing.graph import RoadGraph
+
+logger = logging.getLogger(__name__)
+
+
+class RoadRouter:
+    """
+    Process-wide access to the road routing engine.
+
+    The graph is optional: until one is loaded (or when no graph file is
+    deployed) every query returns None and callers fall back to their
+    straight-line estimates.
+    """
+
+    def __init__(self):
+        self.engine: Optional[RoutingEngine] = None
+
+    @property
+    def available(self) -> bool:
+        return self.engine is not None
+
+    def use(self, graph: RoadGraph) -> RoutingEngine:
+        """
+        Prepare an engine for `graph` and make it the active one.
+        """
+        engine = RoutingEngine(graph)
+        engine.prepare()
+        self.engine = engine
+        return engine
+
+    async def load(self, path: str = settings.ROUTING_GRAPH_PATH) -> bool:
+        """
+        Load and prepare the road graph off the event loop.
+        """
+        if not os.path.exists(path):
+            logger.info("No road graph at %s, using straight-line estimates", path)
+            return False
+
+        loop = asyncio.get_running_loop()
+        try:
+            graph = await loop.run_in_executor(None, RoadGraph.load, path)
+            await loop.run_in_executor(None, self.use, graph)
+        except Exception:
+            logger.exception("Failed to load road graph from %s", path)
+            return False
+        logger.info("Loaded road graph from %s (%d nodes, %d edges)", path, graph.node_count, graph.edge_count)
+        return True
+
+    def route(
+        self,
+        origin_latitude: float,
+        origin_longitude: float,
+        destination_latitude: float,
+        destination_longitude: float
+    ) -> Optional[Route]:
+        if self.engine is None:
+            return None
+        return self.engine.route(origin_latitude, origin_longitude, destination_latitude, destination_longitude)
+
+    def travel_times_from(
+        self,
+        origin_latitude: float,
+        origin_longitude: float,
+        latitudes: np.ndarray,
+        longitudes: np.ndarray
+    ) -> Optional[np.ndarray]:
+        if self.engine is None:
+            return None
+        return self.engine.travel_times_from(origin_latitude, origin_longitude, latitudes, longitudes)
+
+
+# Process-wide router, loaded on application startup
+road_router = RoadRouter()
@@ -0,0 +1,239 @@
+import asyncio
+import logging
+import math
+import os
+from datetime import datetime, timedelta
+from typing import Dict, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+from app.core.config import settings
+from app.models.ride import Ride, RideStatus
+from app.services.ride_matching.distance import KM_PER_DEGREE
+
+logger = logging.getLogger(__name__)
+
+
+HOURS_PER_WEEK = 7 * 24
+
+# Key of row 0, the city-wide profile used for cells without one of their own
+CITY_CELL = (np.iinfo(np.int32).min, np.iinfo(np.int32).min)
+
+# Completed rides outside this range are GPS or bookkeeping errors
+MIN_TRIP_SPEED_KMH = 2.0
+MAX_TRIP_SPEED_KMH = 120.0
+
+PROFILE_DTYPE = np.dtype([
+    ("row", np.int32),
+    ("col", np.int32),
+    ("speed_kmh", np.float32, (HOURS_PER_WEEK,)),
+])
+
+
+def hour_of_week(at: datetime) -> int:
+    """
+    0 for Monday 00:00-00:59 up to 167 for Sunday 23:00-23:59, in the same
+    (UTC) clock the ride timestamps are stored in.
+    """
+    return at.weekday() * 24 + at.hour
+
+
+def build_speed_profiles(
+    rides: pd.DataFrame,
+    cell_size_km: float = settings.SPEED_PROFILE_CELL_SIZE_KM,
+    min_samples: int = settings.SPEED_PROFILE_MIN_SAMPLES
+) -> np.ndarray:
+    """
+    Aggregate completed rides into per-cell x hour-of-week median speeds.
+
+    `rides` needs the columns pickup_latitude, pickup_longitude, started_at,
+    completed_at and distance_km. A trip counts towards its pickup cell and
+    the hour it started in. Slots with fewer than `min_samples` trips take
+    the city-wide median for that hour, which itself falls back to the
+    overall median. The first row of the result is the city-wide profile.
+    """
+    frame = rides.dropna(subset=["started_at", "completed_at", "distance_km"])
+    started = pd.to_datetime(frame["started_at"], utc=True)
+    hours = (pd.to_datetime(frame["completed_at"], utc=True) - started).dt.total_seconds().to_numpy() / 3600.0
+    with np.errstate(divide="ignore", invalid="ignore"):
+        speed = frame["distance_km"].to_numpy(dtype=np.float64) / hours
+    keep = (hours > 0) & (speed >= MIN_TRIP_SPEED_KMH) & (speed <= MAX_TRIP_SPEED_KMH)
+
+    cell_degrees = cell_size_km / KM_PER_DEGREE
+    trips = pd.DataFrame({
+        "row": np.floor(frame["pickup_latitude"].to_numpy()[keep] / cell_degrees).astype(np.int32),
+        "col": np.floor(frame["pickup_longitude"].to_numpy()[keep] / cell_degrees).astype(np.int32),
+        "how": (started.dt.dayofweek * 24 + started.dt.hour).to_numpy()[keep],
+        "speed": speed[keep],
+    })
+
+    city = np.full(HOURS_PER_WEEK, settings.SPEED_PROFILE_DEFAULT_KMH, dtype=np.float32)
+    if len(trips):
+        city[:] = trips["speed"].median()
+        by_hour = trips.groupby("how")["speed"].agg(["median", "size"])
+        by_hour = by_hour[by_hour["size"] >= min_samples]
+        city[by_hour.index.to_numpy()] = by_hour["median"].to_numpy()
+
+    slots = trips.groupby(["row", "col", "how"])["speed"].agg(["median", "size"])
+    slots = slots[slots["size"] >= min_samples].reset_index()
+    cells = slots[["row", "col"]].drop_duplicates().reset_index(drop=True)
+
+    table = np.empty(len(cells) + 1, dtype=PROFILE_DTYPE)
+    table[0] = (CITY_CELL[0], CITY_CELL[1], city)
+    table["row"][1:] = cells["row"].to_numpy()
+    table["col"][1:] = cells["col"].to_numpy()
+    table["speed_kmh"][1:] = city
+
+    cell_index = pd.MultiIndex.from_frame(cells).get_indexer(pd.MultiIndex.from_frame(slots[["row", "col"]]))
+    table["speed_kmh"][cell_index + 1, slots["how"].to_numpy()] = slots["median"].to_numpy()
+    return table
+
+
+def save_speed_profiles(table: np.ndarray, path: str) -> None:
+    """
+    Write a profile table as a plain `.npy` so it can be memory-mapped,
+    replacing any previous file atomically.
+    """
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    temporary = f"{path}.tmp.npy"
+    np.save(temporary, table)
+    os.replace(temporary, path)
+
+
+class SpeedProfiles:
+    """
+    Historical travel speeds per grid cell and hour of week.
+
+    The table is memory-mapped read-only, so every worker shares one copy
+    in the page cache; only the small cell-to-row index lives in the
+    process. Lookups are a dict access and an array read. Without a table
+    every lookup returns `default_speed_kmh`.
+
+    When `rebuild_interval_seconds` is set, a background job periodically
+    aggregates recently completed rides into a new table. The file is
+    replaced atomically, so workers rebuilding concurrently only repeat
+    work; every worker remaps the file when it changes.
+    """
+
+    def __init__(
+        self,
+        path: str = settings.SPEED_PROFILE_PATH,
+        cell_size_km: float = settings.SPEED_PROFILE_CELL_SIZE_KM,
+        default_speed_kmh: float = settings.SPEED_PROFILE_DEFAULT_KMH,
+        reload_interval_seconds: float = settings.SPEED_PROFILE_RELOAD_INTERVAL_SECONDS,
+        rebuild_interval_seconds: float = settings.SPEED_PROFILE_REBUILD_INTERVAL_SECONDS,
+        history_days: int = settings.SPEED_PROFILE_HISTORY_DAYS
+    ):
+        self.path = path
+        self.cell_degrees = cell_size_km / KM_PER_DEGREE
+        self.default_speed_kmh = default_speed_kmh
+        self.reload_interval_seconds = reload_interval_seconds
+        self.rebuild_interval_seconds = rebuild_interval_seconds
+        self.history_days = history_days
+        self._speeds: Optional[np.ndarray] = None
+        self._rows: Dict[Tuple[int, int], int] = {}
+        self._mtime = 0.0
+        self._task: Optional[asyncio.Task] = None
+
+    @property
+    def available(self) -> bool:
+        return self._speeds is not None
+
+    def use(self, table: np.ndarray) -> None:
+        """
+        Make `table` the active profile table.
+        """
+        rows = {cell: i for i, cell in enumerate(zip(table["row"].tolist(), table["col"].tolist()))}
+        # Swap both together so lookups never mix two tables
+        self._rows, self._speeds = rows, table["speed_kmh"]
+
+    def load(self, path: Optional[str] = None) -> bool:
+        """
+        Map the table at `path` if it changed since the last load.
+        """
+        path = path or self.path
+        try:
+            mtime = os.stat(path).st_mtime
+        except FileNotFoundError:
+            return False
+        if mtime == self._mtime:
+            return False
+        self.use(np.load(path, mmap_mode="r"))
+        self._mtime = mtime
+        logger.info("Loaded speed profiles for %d cells from %s", len(self._rows) - 1, path)
+        return True
+
+    def _row_for(self, latitude: float, longitude: float) -> int:
+        cell = (int(math.floor(latitude / self.cell_degrees)), int(math.floor(longitude / self.cell_degrees)))
+        return self._rows.get(cell, 0)
+
+    def speed_kmh(self, latitude: float, longitude: float, at: Optional[datetime] = None) -> float:
+        speeds = self._speeds
+        if speeds is None:
+            return self.default_speed_kmh
+        at = datetime.utcnow() if at is None else at
+        return float(speeds[self._row_for(latitude, longitude), hour_of_week(at)])
+
+    def speeds_kmh(self, latitudes: np.ndarray, longitudes: np.ndarray, at: Optional[datetime] = None) -> np.ndarray:
+        """
+        Vectorised `speed_kmh` for many points at the same time.
+        """
+        speeds = self._speeds
+        if speeds is None:
+            return np.full(len(latitudes), self.default_speed_kmh)
+        at = datetime.utcnow() if at is None else at
+        rows = [self._row_for(lat, lon) for lat, lon in zip(np.asarray(latitudes).tolist(), np.asarray(longitudes).tolist())]
+        return np.asarray(speeds[rows, hour_of_week(at)], dtype=np.float64)
+
+    async def rebuild(self) -> bool:
+        """
+        Aggregate recently completed rides into a new table file and load it.
+        """
+        since = datetime.utcnow() - timedelta(days=self.history_days)
+        records = await Ride.filter(status=RideStatus.COMPLETED, completed_at__gte=since).values(
+            "pickup_latitude", "pickup_longitude", "started_at", "completed_at", "distance_km"
+        )
+        if not records:
+            return False
+
+        loop = asyncio.get_running_loop()
+        await loop.run_in_executor(None, self._build_and_save, pd.DataFrame.from_records(records))
+        return self.load()
+
+    def _build_and_save(self, rides: pd.DataFrame) -> None:
+        save_speed_profiles(build_speed_profiles(rides), self.path)
+
+    def start(self) -> None:
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def _run(self) -> None:
+        loop = asyncio.get_running_loop()
+        # The table on disk was mapped at startup; the first rebuild can wait
+        next_rebuild = loop.time() + self.rebuild_interval_seconds
+        while True:
+            try:
+                if self.rebuild_interval_seconds and loop.time() >= next_rebuild:
+                    next_rebuild = loop.time() + self.rebuild_interval_seconds
+                    await self.rebuild()
+                else:
+                    self.load()
+            except Exception:
+                logger.exception("Speed profile refresh failed")
+            await asyncio.sleep(self.reload_interval_seconds)
+
+
+# Process-wide speed profiles, mapped on application startup
+speed_profiles = SpeedProfiles()
@@ -0,0 +1,346 @@
+import asyncio
+import itertools
+import logging
+import multiprocessing
+import threading
+from typing import Any, Dict, List, Optional, Sequence, Set, Tuple
+
+from app.core.config import settings
+from app.services.ride_matching.ranking import rank_candidates
+from app.services.ride_matching.surge import CellKey, CellSurge
+from app.services.sharding.ring import HashRing, RegionMap
+from app.services.sharding.shard import (
+    Candidate,
+    DriverPing,
+    MatchingShard,
+    ShardMatch,
+    ShardRide,
+    candidates_to_columns,
+)
+
+logger = logging.getLogger(__name__)
+
+
+class ShardError(Exception):
+    """
+    A shard failed to run a command (or its process went away).
+    """
+    pass
+
+
+class LocalShardClient:
+    """
+    Runs a shard in the calling process; used for a single shard and in
+    development.
+    """
+
+    def __init__(self, shard_id: int):
+        self.shard_id = shard_id
+        self.shard = MatchingShard(shard_id)
+
+    async def call(self, command: str, *args: Any) -> Any:
+        try:
+            return self.shard.handle(command, args)
+        except Exception as exc:
+            raise ShardError(f"Shard {self.shard_id} {command} failed: {exc!r}") from exc
+
+    def close(self) -> None:
+        pass
+
+
+def _serve_shard(shard_id: int, conn) -> None:
+    """
+    Shard process main loop: run commands in arrival order and reply with
+    (request id, ok, result or error text).
+    """
+    shard = MatchingShard(shard_id)
+    while True:
+        try:
+            message = conn.recv()
+        except EOFError:
+            break
+        if message is None:
+            break
+        request_id, command, args = message
+        try:
+            conn.send((request_id, True, shard.handle(command, args)))
+        except Exception as exc:
+            conn.send((request_id, False, repr(exc)))
+    conn.close()
+
+
+class ProcessShardClient:
+    """
+    Runs a shard in its own process, talking over a pipe.
+
+    Commands are sent from the event loop and answered in order; a reader
+    thread resolves the waiting futures, so the loop never blocks on a
+    shard.
+    """
+
+    def __init__(self, shard_id: int):
+        self.shard_id = shard_id
+        context = multiprocessing.get_context("spawn")
+        self._conn, child_conn = context.Pipe()
+        self._process = context.Process(
+            target=_serve_shard, args=(shard_id, child_conn), name=f"matching-shard-{shard_id}", daemon=True
+        )
+        self._process.start()
+        child_conn.close()
+        self._ids = itertools.count()
+        self._pending: Dict[int, Tuple[asyncio.AbstractEventLoop, asyncio.Future]] = {}
+        self._lock = threading.Lock()
+        self._reader = threading.Thread(target=self._read, name=f"matching-shard-{shard_id}-reader", daemon=True)
+        self._reader.start()
+
+    async def call(self, command: str, *args: Any) -> Any:
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        request_id = next(self._ids)
+        with self._lock:
+            self._pending[request_id] = (loop, future)
+        try:
+            self._conn.send((request_id, command, args))
+        except (OSError, ValueError) as exc:
+            with self._lock:
+                self._pending.pop(request_id, None)
+            raise ShardError(f"Shard {self.shard_id} is not reachable: {exc!r}") from exc
+        return await future
+
+    def _read(self) -> None:
+        while True:
+            try:
+                request_id, ok, result = self._conn.recv()
+            except (EOFError, OSError):
+                break
+            with self._lock:
+                pending = self._pending.pop(request_id, None)
+            if pending is not None:
+                self._complete(pending, ok, result)
+
+        # The shard process is gone; fail everything still waiting on it
+        with self._lock:
+            pending, self._pending = list(self._pending.values()), {}
+        for waiting in pending:
+            self._complete(waiting, False, "shard process exited")
+
+    def _complete(self, pending: Tuple[asyncio.AbstractEventLoop, asyncio.Future], ok: bool, result: Any) -> None:
+        loop, future = pending
+        try:
+            loop.call_soon_threadsafe(self._resolve, future, ok, result)
+        except RuntimeError:
+            # The caller's event loop has already been closed
+            pass
+
+    def _resolve(self, future: asyncio.Future, ok: bool, result: Any) -> None:
+        if future.done():
+            return
+        if ok:
+            future.set_result(result)
+        else:
+            future.set_exception(ShardError(f"Shard {self.shard_id}: {result}"))
+
+    def close(self) -> None:
+        try:
+            self._conn.send(None)
+        except (OSError, ValueError):
+            pass
+        self._process.join(timeout=5)
+        if self._process.is_alive():
+            self._process.terminate()
+        self._conn.close()
+
+
+class ShardCoordinator:
+    """
+    Routes driver pings and rides to the shard owning their region.
+
+    Regions are spread over the shards by consistent hashing. A ride whose
+    nearest drivers are all inside its own shard's regions is matched there
+    in one round trip; one close to a region border also asks the
+    neighbouring shards within the search radius for candidates, ranks the
+    merged set and reserves the winner on the shard that holds them.
+
+    Like the shards it drives, the coordinator does not touch the database:
+    it is a simulation of region-sharded matching, not an assignment path.
+    """
+
+    def __init__(
+        self,
+        shard_count: int,
+        processes: bool = True,
+        region_size_km: float = settings.SHARD_REGION_SIZE_KM,
+        virtual_nodes: int = settings.SHARD_VIRTUAL_NODES,
+        candidate_limit: int = settings.MATCHING_CANDIDATE_LIMIT,
+        max_distance_km: float = settings.MATCHING_MAX_DISTANCE_KM
+    ):
+        client_class = ProcessShardClient if processes else LocalShardClient
+        self.clients = {shard_id: client_class(shard_id) for shard_id in range(shard_count)}
+        self.regions = RegionMap(HashRing(list(self.clients), virtual_nodes), region_size_km)
+        self.candidate_limit = candidate_limit
+        self.max_distance_km = max_distance_km
+        self.fanned_out = 0
+        self._driver_shards: Dict[int, int] = {}
+        self._busy: Set[int] = set()
+
+    # Drivers
+
+    async def update_drivers(self, pings: Sequence[DriverPing]) -> int:
+        """
+        Index idle drivers on the shard owning their position, moving them
+        between shards as they cross region borders. Pings from drivers on
+        a ride are ignored until they are released.
+        """
+        updates: Dict[int, List[DriverPing]] = {}
+        moves: Dict[int, List[int]] = {}
+        for ping in pings:
+            if ping.driver_id in self._busy:
+                continue
+            shard_id = self.regions.shard_for(ping.latitude, ping.longitude)
+            previous = self._driver_shards.get(ping.driver_id)
+            if previous is not None and previous != shard_id:
+                moves.setdefault(previous, []).append(ping.driver_id)
+            self._driver_shards[ping.driver_id] = shard_id
+            updates.setdefault(shard_id, []).append(ping)
+
+        calls = [self.clients[shard_id].call("remove_drivers", ids) for shard_id, ids in moves.items()]
+        calls += [self.clients[shard_id].call("update_drivers", batch) for shard_id, batch in updates.items()]
+        await asyncio.gather(*calls)
+        return sum(len(batch) for batch in updates.values())
+
+    async def remove_drivers(self, driver_ids: Sequence[int]) -> None:
+        removals: Dict[int, List[int]] = {}
+        for driver_id in driver_ids:
+            self._busy.discard(driver_id)
+            shard_id = self._driver_shards.pop(driver_id, None)
+            if shard_id is not None:
+                removals.setdefault(shard_id, []).append(driver_id)
+        await asyncio.gather(*(self.clients[s].call("remove_drivers", ids) for s, ids in removals.items()))
+
+    async def release(self, ping: DriverPing) -> None:
+        """
+        Make a driver available again at their current position.
+        """
+        self._busy.discard(ping.driver_id)
+        await self.update_drivers([ping])
+
+    # Rides
+
+    def _shard_ride(self, ride_id: int, latitude: float, longitude: float) -> Tuple[int, ShardRide]:
+        local_km = self.regions.foreign_distance_km(latitude, longitude, self.max_distance_km)
+        return (
+            self.regions.shard_for(latitude, longitude),
+            ShardRide(ride_id, latitude, longitude, local_km),
+        )
+
+    async def match(self, ride_id: int, latitude: float, longitude: float) -> Optional[Tuple[int, float]]:
+        """
+        Match one ride; returns (driver_id, distance_km) or None.
+        """
+        return (await self.match_many([(ride_id, latitude, longitude)]))[ride_id]
+
+    async def match_many(
+        self,
+        rides: Sequence[Tuple[int, float, float]]
+    ) -> Dict[int, Optional[Tuple[int, float]]]:
+        """
+        Match a batch of (ride_id, latitude, longitude). Each shard gets its
+        rides in a single round trip; border rides are then settled one by
+        one across shards.
+        """
+        batches: Dict[int, List[ShardRide]] = {}
+        for ride_id, latitude, longitude in rides:
+            shard_id, ride = self._shard_ride(ride_id, latitude, longitude)
+            batches.setdefault(shard_id, []).append(ride)
+
+        shard_ids = list(batches)
+        replies = await asyncio.gather(*(self.clients[s].call("match_many", batches[s]) for s in shard_ids))
+
+        results: Dict[int, Optional[Tuple[int, float]]] = {}
+        deferred: List[Tuple[int, ShardRide, ShardMatch]] = []
+        for shard_id, matches in zip(shard_ids, replies):
+            for ride, outcome in zip(batches[shard_id], matches):
+                if outcome.candidates is not None:
+                    deferred.append((shard_id, ride, outcome))
+                elif outcome.driver_id is None:
+                    results[ride.ride_id] = None
+                else:
+                    self._busy.add(outcome.driver_id)
+                    results[ride.ride_id] = (outcome.driver_id, outcome.distance_km)
+
+        if deferred:
+            gathered = await asyncio.gather(*(
+                self._border_candidates(owner, ride, outcome.candidates) for owner, ride, outcome in deferred
+            ))
+            # Reserved one by one, so two border rides never race for the
+            # same driver; one taken meanwhile just fails its reservation
+            for (owner, ride, _), merged in zip(deferred, gathered):
+                results[ride.ride_id] = await self._reserve_best(owner, ride, merged)
+        return results
+
+    async def _border_candidates(
+        self,
+        owner: int,
+        ride: ShardRide,
+        local: List[Candidate]
+    ) -> List[Tuple[Candidate, int]]:
+        """
+        The K nearest (candidate, shard id) pairs over the owning shard and
+        every neighbour within the search radius.
+        """
+        self.fanned_out += 1
+        k, max_km = self.candidate_limit, self.max_distance_km
+        neighbours = sorted(self.regions.shards_within(ride.latitude, ride.longitude, max_km) - {owner})
+        remote = await asyncio.gather(*(
+            self.clients[s].call("candidates", ride.latitude, ride.longitude, k, max_km) for s in neighbours
+        ))
+
+        merged = [(candidate, owner) for candidate in local]
+        for shard_id, candidates in zip(neighbours, remote):
+            merged.extend((candidate, shard_id) for candidate in candidates)
+        merged.sort(key=lambda item: item[0].distance_km)
+        return merged[:k]
+
+    async def _reserve_best(
+        self,
+        owner: int,
+        ride: ShardRide,
+        merged: List[Tuple[Candidate, int]]
+    ) -> Optional[Tuple[int, float]]:
+        if not merged:
+            return None
+        columns = candidates_to_columns([candidate for candidate, _ in merged])
+        for position, _ in rank_candidates(columns, max_distance_km=self.max_distance_km):
+            candidate, shard_id = merged[position]
+            if await self.clients[shard_id].call("reserve", candidate.driver_id):
+                self._busy.add(candidate.driver_id)
+                await self.clients[owner].call("close_request", ride.ride_id)
+                return candidate.driver_id, candidate.distance_km
+        return None
+
+    # Surge
+
+    async def recompute_surge(self) -> None:
+        await asyncio.gather(*(client.call("recompute_surge") for client in self.clients.values()))
+
+    async def surge_table(self) -> Dict[CellKey, CellSurge]:
+        """
+        City-wide surge table. Shards own disjoint cells, so their tables
+        merge without conflicts.
+        """
+        table: Dict[CellKey, CellSurge] = {}
+        for shard_table in await asyncio.gather(*(c.call("surge_table") for c in self.clients.values())):
+            table.update(shard_table)
+        return table
+
+    async def stats(self) -> Dict[str, Any]:
+        shards = await asyncio.gather(*(client.call("stats") for client in self.clients.values()))
+        return {
+            "shards": list(shards),
+            "fanned_out": self.fanned_out,
+            "busy_drivers": len(self._busy),
+        }
+
+    def close(self) -> None:
+        for client in self.clients.values():
+            client.close()
@@ -0,0 +1,116 @@
+import bisect
+import hashlib
+import math
+from typing import Dict, List, Sequence, Set, Tuple
+
+from app.core.config import settings
+from app.services.ride_matching.distance import KM_PER_DEGREE
+
+
+RegionKey = Tuple[int, int]
+
+
+def _hash(key: str) -> int:
+    return int.from_bytes(hashlib.blake2b(key.encode(), digest_size=8).digest(), "big")
+
+
+class HashRing:
+    """
+    Consistent hash ring over shard ids.
+
+    Each shard owns `virtual_nodes` points on the ring; a key belongs to the
+    first point clockwise of its hash. Adding or removing a shard only moves
+    the keys between its points and their predecessors, about 1/N of them.
+    """
+
+    def __init__(self, shard_ids: Sequence[int], virtual_nodes: int = settings.SHARD_VIRTUAL_NODES):
+        if not shard_ids:
+            raise ValueError("A hash ring needs at least one shard")
+        points = sorted(
+            (_hash(f"shard-{shard_id}-{replica}"), shard_id)
+            for shard_id in shard_ids
+            for replica in range(virtual_nodes)
+        )
+        self.shard_ids = sorted(shard_ids)
+        self._hashes = [point for point, _ in points]
+        self._shards = [shard_id for _, shard_id in points]
+
+    def shard_for(self, key: str) -> int:
+        position = bisect.bisect(self._hashes, _hash(key)) % len(self._hashes)
+        return self._shards[position]
+
+
+class RegionMap:
+    """
+    Assigns square geographic regions (blocks of driver-index cells about
+    `region_size_km` wide) to shards through a hash ring.
+
+    Region boundaries line up with the driver-index and surge cells when
+    `region_size_km` is a multiple of their size, so every cell belongs to
+    exactly one shard.
+    """
+
+    def __init__(self, ring: HashRing, region_size_km: float = settings.SHARD_REGION_SIZE_KM):
+        self.ring = ring
+        self.region_size_km = region_size_km
+        self.region_degrees = region_size_km / KM_PER_DEGREE
+        self._owners: Dict[RegionKey, int] = {}
+
+    def region_for(self, latitude: float, longitude: float) -> RegionKey:
+        return (
+            int(math.floor(latitude / self.region_degrees)),
+            int(math.floor(longitude / self.region_degrees)),
+        )
+
+    def owner(self, region: RegionKey) -> int:
+        shard_id = self._owners.get(region)
+        if shard_id is None:
+            shard_id = self._owners[region] = self.ring.shard_for(f"{region[0]}:{region[1]}")
+        return shard_id
+
+    def shard_for(self, latitude: float, longitude: float) -> int:
+        return self.owner(self.region_for(latitude, longitude))
+
+    def _regions_near(self, latitude: float, longitude: float, radius_km: float) -> List[Tuple[RegionKey, float]]:
+        """
+        Regions intersecting the box around a `radius_km` circle, each with
+        a lower bound on its distance (km) from the point.
+        """
+        lat_span = radius_km / KM_PER_DEGREE
+        lon_span = lat_span / max(0.01, math.cos(math.radians(latitude)))
+        row0, col0 = self.region_for(latitude - lat_span, longitude - lon_span)
+        row1, col1 = self.region_for(latitude + lat_span, longitude + lon_span)
+        km_per_lon_degree = KM_PER_DEGREE * math.cos(math.radians(latitude))
+
+        regions = []
+        for row in range(row0, row1 + 1):
+            south, north = row * self.region_degrees, (row + 1) * self.region_degrees
+            dy = max(south - latitude, 0.0, latitude - north) * KM_PER_DEGREE
+            for col in range(col0, col1 + 1):
+                west, east = col * self.region_degrees, (col + 1) * self.region_degrees
+                dx = max(west - longitude, 0.0, longitude - east) * km_per_lon_degree
+                regions.append(((row, col), math.hypot(dx, dy)))
+        return regions
+
+    def shards_within(self, latitude: float, longitude: float, radius_km: float) -> Set[int]:
+        """
+        Shards owning any region within `radius_km` of a point.
+        """
+        return {
+            self.owner(region)
+            for region, distance_km in self._regions_near(latitude, longitude, radius_km)
+            if distance_km <= radius_km
+        }
+
+    def foreign_distance_km(self, latitude: float, longitude: float, radius_km: float) -> float:
+        """
+        Distance from a point to the nearest region owned by another shard,
+        or `radius_km` when there is none that close. Drivers closer than
+        this are guaranteed to live on the point's own shard.
+        """
+        owner = self.shard_for(latitude, longitude)
+        nearest = radius_km
+        for region, distance_km in self._regions_near(latitude, longitude, radius_km):
+            if distance_km < nearest and self.owner(region) != owner:
+                nearest = distance_km
+        return nearest
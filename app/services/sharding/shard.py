@@ -0,0 +1,190 @@
+import time
+from typing import Any, Dict, List, NamedTuple, Optional, Sequence, Tuple
+
+import numpy as np
+
+from app.core.config import settings
+from app.services.ride_matching.driver_stats import DriverStatsStore
+from app.services.ride_matching.geo_index import DriverGeoIndex
+from app.services.ride_matching.ranking import DriverCandidates, rank_candidates
+from app.services.ride_matching.surge import CellKey, CellSurge, SurgeEngine
+
+
+class DriverPing(NamedTuple):
+    driver_id: int
+    latitude: float
+    longitude: float
+
+
+class ShardRide(NamedTuple):
+    """
+    A ride sent to its owning shard. Drivers closer to the pickup than
+    `local_km` are guaranteed to be indexed on that shard.
+    """
+    ride_id: int
+    latitude: float
+    longitude: float
+    local_km: float
+
+
+class Candidate(NamedTuple):
+    driver_id: int
+    distance_km: float
+    rating: float
+    acceptance_rate: float
+    idle_minutes: float
+
+
+class ShardMatch(NamedTuple):
+    """
+    Outcome of matching on the owning shard: either `driver_id` (None when
+    no driver is in range), or `candidates` the coordinator has to merge
+    with the neighbouring shards' before choosing.
+    """
+    ride_id: int
+    driver_id: Optional[int]
+    distance_km: Optional[float]
+    candidates: Optional[List[Candidate]]
+
+
+def candidates_to_columns(candidates: Sequence[Candidate]) -> DriverCandidates:
+    return DriverCandidates(
+        driver_ids=np.array([c.driver_id for c in candidates], dtype=np.int64),
+        distance_km=np.array([c.distance_km for c in candidates], dtype=float),
+        rating=np.array([c.rating for c in candidates], dtype=float),
+        acceptance_rate=np.array([c.acceptance_rate for c in candidates], dtype=float),
+        idle_minutes=np.array([c.idle_minutes for c in candidates], dtype=float),
+    )
+
+
+class MatchingShard:
+    """
+    Matching state for the geographic regions one shard owns: its slice of
+    the driver index, driver statistics and surge counters.
+
+    A ride is matched entirely on its shard when the nearest candidates all
+    lie inside the distance that is known to be local; rides near a border
+    return their local candidates so the coordinator can merge them with
+    the neighbouring shards' before ranking.
+
+    This models sharded matching in memory only: `reserve` takes a driver
+    out of this shard's index and never goes through driver_reservations or
+    the Ride table, so no ride is assigned here. The API matches through
+    ride_matching.matching; only benchmarks/bench_sharded_matching runs shards.
+    """
+
+    COMMANDS = (
+        "update_drivers", "remove_drivers", "candidates", "reserve", "release",
+        "close_request", "match_many", "recompute_surge", "surge_table", "stats",
+    )
+
+    def __init__(
+        self,
+        shard_id: int,
+        cell_size_km: float = settings.DRIVER_INDEX_CELL_SIZE_KM,
+        candidate_limit: int = settings.MATCHING_CANDIDATE_LIMIT,
+        max_distance_km: float = settings.MATCHING_MAX_DISTANCE_KM
+    ):
+        self.shard_id = shard_id
+        self.candidate_limit = candidate_limit
+        self.max_distance_km = max_distance_km
+        self.index = DriverGeoIndex(cell_size_km)
+        self.stats_store = DriverStatsStore()
+        self.surge = SurgeEngine()
+        self.matched_local = 0
+        self.deferred = 0
+        self.unmatched = 0
+
+    # Drivers
+
+    def update_drivers(self, pings: Sequence[DriverPing], now: Optional[float] = None) -> int:
+        now = time.time() if now is None else now
+        for driver_id, latitude, longitude in pings:
+            if driver_id not in self.index:
+                self.stats_store.mark_idle(driver_id, now)
+            self.index.update(driver_id, latitude, longitude)
+            self.surge.record_driver(driver_id, latitude, longitude, now)
+        return len(pings)
+
+    def remove_drivers(self, driver_ids: Sequence[int]) -> int:
+        for driver_id in driver_ids:
+            self.index.remove(driver_id)
+            self.stats_store.mark_busy(driver_id)
+            self.surge.remove_driver(driver_id)
+        return len(driver_ids)
+
+    def reserve(self, driver_id: int) -> bool:
+        """
+        Take a driver out of matching. False if they were already taken
+        (or moved to another shard).
+        """
+        if driver_id not in self.index:
+            return False
+        self.remove_drivers([driver_id])
+        return True
+
+    def release(self, ping: DriverPing, now: Optional[float] = None) -> None:
+        self.update_drivers([ping], now)
+
+    # Rides
+
+    def candidates(self, latitude: float, longitude: float, k: int, max_distance_km: float) -> List[Candidate]:
+        nearest = self.index.nearest(latitude, longitude, k, max_distance_km)
+        if not nearest:
+            return []
+        driver_ids = [driver_id for driver_id, _ in nearest]
+        rating, acceptance, idle = self.stats_store.columns(driver_ids)
+        return [
+            Candidate(driver_id, distance_km, float(rating[i]), float(acceptance[i]), float(idle[i]))
+            for i, (driver_id, distance_km) in enumerate(nearest)
+        ]
+
+    def close_request(self, ride_id: int) -> None:
+        self.surge.close_request(ride_id)
+
+    def match(self, ride: ShardRide) -> ShardMatch:
+        k, max_km = self.candidate_limit, self.max_distance_km
+        self.surge.record_request(ride.ride_id, ride.latitude, ride.longitude)
+        local = self.candidates(ride.latitude, ride.longitude, k, max_km)
+
+        # Anything a neighbouring shard could offer is at least local_km away
+        complete = ride.local_km >= max_km or (len(local) == k and local[-1].distance_km <= ride.local_km)
+        if not complete:
+            self.deferred += 1
+            return ShardMatch(ride.ride_id, None, None, local)
+
+        for position, _ in rank_candidates(candidates_to_columns(local), max_distance_km=max_km):
+            candidate = local[position]
+            if self.reserve(candidate.driver_id):
+                self.close_request(ride.ride_id)
+                self.matched_local += 1
+                return ShardMatch(ride.ride_id, candidate.driver_id, candidate.distance_km, None)
+
+        self.unmatched += 1
+        return ShardMatch(ride.ride_id, None, None, None)
+
+    def match_many(self, rides: Sequence[ShardRide]) -> List[ShardMatch]:
+        return [self.match(ride) for ride in rides]
+
+    # Surge
+
+    def recompute_surge(self, now: Optional[float] = None) -> int:
+        return self.surge.recompute(now)
+
+    def surge_table(self) -> Dict[CellKey, CellSurge]:
+        return self.surge.published()
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "shard": self.shard_id,
+            "drivers": len(self.index),
+            "matched_local": self.matched_local,
+            "deferred": self.deferred,
+            "unmatched": self.unmatched,
+            "surge": self.surge.stats(),
+        }
+
+    def handle(self, command: str, args: Tuple) -> Any:
+        if command not in self.COMMANDS:
+            raise ValueError(f"Unknown shard command {command!r}")
+        return getattr(self, command)(*args)
@@ -0,0 +1,164 @@
+import math
+import time
+from typing import Optional, Tuple
+
+from app.core.config import settings
+from app.models.ride import Ride, RideStatus
+from app.services.ride_matching.distance import KM_PER_DEGREE, haversine_km
+
+
+# Road distance over straight-line distance when the ride gives no better hint
+DEFAULT_ROUTE_FACTOR = 1.3
+# Pings implying faster movement than this are GPS jumps, not driving
+MAX_PLAUSIBLE_SPEED_KMH = 150.0
+
+
+class EtaTracker:
+    """
+    Incrementally maintained ETA for one ride.
+
+    Before pickup the target is the pickup point, afterwards the destination.
+    Remaining road distance is measured as the straight-line distance to
+    the target scaled by the ride's route factor. Between measurements each
+    ping takes off the part of its move that points toward the target (and
+    adds it back when the driver heads away); the distance is measured from
+    scratch again after a GPS jump and every ETA_REMEASURE_SECONDS, which
+    bounds the drift whether or not anything was published. Speed is an
+    exponentially weighted average of observed movement between pings.
+    Pings that barely move the driver are skipped, and a new ETA is only
+    published when it moves by at least ETA_MIN_CHANGE_MINUTES (or has been
+    silent for ETA_MAX_SILENCE_SECONDS).
+    """
+
+    def __init__(
+        self,
+        target: Tuple[float, float],
+        route_factor: float = DEFAULT_ROUTE_FACTOR,
+        speed_kmh: float = settings.ETA_DEFAULT_SPEED_KMH,
+        estimated_minutes: int = 0
+    ):
+        self.target = target
+        self.route_factor = route_factor
+        self.speed_kmh = speed_kmh
+        self.minutes = estimated_minutes
+        self.remaining_km: Optional[float] = None
+        self._last_point: Optional[Tuple[float, float, float]] = None
+        # Direction to the target as of the last measurement; dotted with a
+        # move in degrees it gives the progress toward the target in degrees
+        # of latitude
+        self._heading = (0.0, 0.0)
+        self._measured_at = 0.0
+        self._last_emit = 0.0
+
+    @classmethod
+    def for_ride(cls, ride: Ride, driver_position: Optional[Tuple[float, float]] = None) -> "EtaTracker":
+        """
+        Build the tracker for a ride. While the ride is ACCEPTED the initial
+        ETA is the driver's way to the pickup, from `driver_position` when
+        known, rather than the trip's estimated duration.
+        """
+        straight_km = haversine_km(
+            ride.pickup_latitude, ride.pickup_longitude,
+            ride.destination_latitude, ride.destination_longitude
+        )
+        route_factor = DEFAULT_ROUTE_FACTOR
+        if ride.estimated_distance_km and straight_km > 0.1:
+            route_factor = max(1.0, ride.estimated_distance_km / straight_km)
+
+        speed_kmh = settings.ETA_DEFAULT_SPEED_KMH
+        if ride.estimated_distance_km and ride.estimated_duration_minutes:
+            speed_kmh = ride.estimated_distance_km / (ride.estimated_duration_minutes / 60.0)
+
+        tracker = cls(
+            target=cls.target_for(ride, ride.status),
+            route_factor=route_factor,
+            speed_kmh=max(settings.ETA_MIN_SPEED_KMH, speed_kmh),
+        )
+        if ride.status != RideStatus.ACCEPTED:
+            tracker.minutes = ride.estimated_duration_minutes or 0
+        elif driver_position is not None:
+            tracker.minutes = tracker.estimate_minutes(driver_position[0], driver_position[1])
+        return tracker
+
+    @staticmethod
+    def target_for(ride: Ride, status: RideStatus) -> Tuple[float, float]:
+        if status in (RideStatus.IN_PROGRESS, RideStatus.COMPLETED):
+            return ride.destination_latitude, ride.destination_longitude
+        return ride.pickup_latitude, ride.pickup_longitude
+
+    def retarget(self, target: Tuple[float, float]) -> None:
+        """
+        Switch to a new target, e.g. from pickup to destination.
+        """
+        if target != self.target:
+            self.target = target
+            self.remaining_km = None
+            self._last_emit = 0.0
+
+    def estimate_minutes(self, latitude: float, longitude: float) -> int:
+        """
+        Minutes to the target from a position, measured from scratch.
+        """
+        remaining_km = haversine_km(latitude, longitude, self.target[0], self.target[1]) * self.route_factor
+        return int(math.ceil(remaining_km / max(self.speed_kmh, settings.ETA_MIN_SPEED_KMH) * 60.0))
+
+    def update(
+        self,
+        latitude: float,
+        longitude: float,
+        timestamp: Optional[float] = None
+    ) -> Optional[int]:
+        """
+        Fold in a driver position. Returns the new ETA in minutes when it
+        changed meaningfully, otherwise None.
+        """
+        timestamp = time.time() if timestamp is None else timestamp
+        last = self._last_point
+        silent_for = timestamp - self._last_emit
+
+        if last is not None and self.remaining_km is not None:
+            moved_km = haversine_km(last[0], last[1], latitude, longitude)
+            if moved_km * 1000 < settings.ETA_MIN_MOVE_METERS and silent_for < settings.ETA_MAX_SILENCE_SECONDS:
+                return None
+
+            elapsed_hours = (timestamp - last[2]) / 3600.0
+            observed_kmh = moved_km / elapsed_hours if elapsed_hours > 0 else math.inf
+            if observed_kmh > MAX_PLAUSIBLE_SPEED_KMH or timestamp - self._measured_at >= settings.ETA_REMEASURE_SECONDS:
+                # A GPS jump, or time to correct the drift: measure afresh below
+                self.remaining_km = None
+            else:
+                alpha = settings.ETA_SPEED_SMOOTHING
+                self.speed_kmh = (1 - alpha) * self.speed_kmh + alpha * observed_kmh
+                # Only progress toward the target counts; scaled like the
+                # measured distance, so heading straight for the target
+                # matches measuring it from scratch
+                toward_km = (
+                    (latitude - last[0]) * self._heading[0] + (longitude - last[1]) * self._heading[1]
+                ) * KM_PER_DEGREE
+                self.remaining_km = max(0.0, self.remaining_km - toward_km * self.route_factor)
+
+        self._last_point = (latitude, longitude, timestamp)
+        if self.remaining_km is None:
+            self._measure(latitude, longitude, timestamp)
+
+        speed_kmh = max(self.speed_kmh, settings.ETA_MIN_SPEED_KMH)
+        minutes = int(math.ceil(self.remaining_km / speed_kmh * 60.0))
+
+        if abs(minutes - self.minutes) >= settings.ETA_MIN_CHANGE_MINUTES or silent_for >= settings.ETA_MAX_SILENCE_SECONDS:
+            self.minutes = minutes
+            self._last_emit = timestamp
+            return minutes
+        return None
+
+    def _measure(self, latitude: float, longitude: float, timestamp: float) -> None:
+        self.remaining_km = haversine_km(latitude, longitude, self.target[0], self.target[1]) * self.route_factor
+        self._measured_at = timestamp
+
+        lon_scale = math.cos(math.radians(latitude))
+        north = self.target[0] - latitude
+        east = (self.target[1] - longitude) * lon_scale
+        norm = math.hypot(north, east)
+        if norm > 0:
+            self._heading = (north / norm, east / norm * lon_scale)
+        else:
+            self._heading = (0.0, 0.0)
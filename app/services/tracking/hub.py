@@ -0,0 +1,274 @@
+import asyncio
+import json
+import time
+from collections import deque
+from typing import Deque, Dict, Optional, Set
+
+from fastapi import WebSocket
+
+from app.core.config import settings
+from app.models.ride import Ride, RideStatus
+from app.services.location.store import location_store
+from app.services.tracking.eta import EtaTracker
+
+
+class Subscriber:
+    """
+    One tracking socket and its bounded outbound queue.
+
+    Location frames supersede each other, so only the newest unsent one is
+    kept; a slow consumer therefore gets the latest position instead of a
+    growing backlog. Other frames (status changes) queue up to `max_queue`,
+    dropping the oldest when full.
+    """
+
+    def __init__(self, websocket: WebSocket, ride_id: int, max_queue: int):
+        self.websocket = websocket
+        self.ride_id = ride_id
+        self.pending_location: Optional[str] = None
+        self.queue: Deque[str] = deque(maxlen=max_queue)
+        self.wakeup = asyncio.Event()
+        self.last_seen = self.last_sent = time.monotonic()
+        self.closing = False
+        self.dropped = 0
+
+    def offer_location(self, frame: str) -> None:
+        if self.pending_location is not None:
+            self.dropped += 1
+        self.pending_location = frame
+        self.wakeup.set()
+
+    def offer(self, frame: str) -> None:
+        if len(self.queue) == self.queue.maxlen:
+            self.dropped += 1
+        self.queue.append(frame)
+        self.wakeup.set()
+
+    def close(self) -> None:
+        self.closing = True
+        self.wakeup.set()
+
+    def drain(self):
+        frames = list(self.queue)
+        self.queue.clear()
+        if self.pending_location is not None:
+            frames.append(self.pending_location)
+            self.pending_location = None
+        self.wakeup.clear()
+        return frames
+
+
+class RideChannel:
+    """
+    Per-ride state needed to build tracking frames without touching the DB.
+    """
+
+    def __init__(self, ride: Ride):
+        self.ride_id = ride.id
+        self.driver_id: Optional[int] = ride.driver_id
+        self.status: RideStatus = ride.status
+        self.latitude = ride.pickup_latitude
+        self.longitude = ride.pickup_longitude
+        driver_position = None
+        if ride.driver_id is not None:
+            driver_position = location_store.fresh_positions([ride.driver_id]).get(ride.driver_id)
+        self.eta = EtaTracker.for_ride(ride, driver_position)
+        self.estimated_arrival_minutes = self.eta.minutes
+        self.subscribers: Set[Subscriber] = set()
+
+    def frame(self) -> str:
+        """
+        Serialise the current state as a RideTracking frame.
+        """
+        # Built by hand rather than through the pydantic schema: this runs on
+        # every location ping of every tracked ride
+        return json.dumps({
+            "ride_id": self.ride_id,
+            "current_latitude": self.latitude,
+            "current_longitude": self.longitude,
+            "estimated_arrival_minutes": self.estimated_arrival_minutes,
+            "status": self.status.value,
+        })
+
+
+class TrackingHub:
+    """
+    Fans driver location updates out to every socket tracking a ride.
+
+    Ride state is loaded once when the first socket subscribes and then kept
+    up to date by the publish calls, so pushing a location costs a dict
+    lookup, one JSON encode per ride and one queue write per socket.
+    Each socket is served by a single coroutine that only wakes when it has
+    frames to send; heartbeats and idle eviction are driven by one sweep
+    task for the whole hub rather than a timer per socket.
+
+    Hubs are per worker process: a socket only sees locations ingested by
+    the worker that holds it.
+    """
+
+    def __init__(
+        self,
+        max_queue: int = settings.TRACKING_MAX_QUEUE,
+        heartbeat_seconds: float = settings.TRACKING_HEARTBEAT_SECONDS,
+        idle_timeout_seconds: float = settings.TRACKING_IDLE_TIMEOUT_SECONDS
+    ):
+        self.max_queue = max_queue
+        self.heartbeat_seconds = heartbeat_seconds
+        self.idle_timeout_seconds = idle_timeout_seconds
+        self._channels: Dict[int, RideChannel] = {}
+        self._driver_rides: Dict[int, Set[int]] = {}
+        self._sweeper: Optional[asyncio.Task] = None
+
+    @property
+    def connection_count(self) -> int:
+        return sum(len(channel.subscribers) for channel in self._channels.values())
+
+    def subscribe(self, websocket: WebSocket, ride: Ride) -> Subscriber:
+        channel = self._channels.get(ride.id)
+        if channel is None:
+            channel = self._channels[ride.id] = RideChannel(ride)
+            self._link_driver(channel)
+
+        subscriber = Subscriber(websocket, ride.id, self.max_queue)
+        channel.subscribers.add(subscriber)
+        subscriber.offer_location(channel.frame())
+        return subscriber
+
+    def unsubscribe(self, subscriber: Subscriber) -> None:
+        channel = self._channels.get(subscriber.ride_id)
+        if channel is None:
+            return
+        channel.subscribers.discard(subscriber)
+        if not channel.subscribers:
+            self._unlink_driver(channel)
+            del self._channels[channel.ride_id]
+
+    def publish_location(
+        self,
+        driver_id: int,
+        latitude: float,
+        longitude: float,
+        timestamp: Optional[float] = None
+    ) -> None:
+        """
+        Push a driver's new position, and the ETA when it changed, to every
+        socket tracking their rides.
+        """
+        ride_ids = self._driver_rides.get(driver_id)
+        if not ride_ids:
+            return
+        for ride_id in ride_ids:
+            channel = self._channels[ride_id]
+            channel.latitude = latitude
+            channel.longitude = longitude
+            minutes = channel.eta.update(latitude, longitude, timestamp)
+            if minutes is not None:
+                channel.estimated_arrival_minutes = minutes
+            self._broadcast_location(channel)
+
+    def publish_ride(self, ride: Ride) -> None:
+        """
+        Push a ride's status or driver change to its subscribers.
+        """
+        channel = self._channels.get(ride.id)
+        if channel is None:
+            return
+        if channel.driver_id != ride.driver_id:
+            self._unlink_driver(channel)
+            channel.driver_id = ride.driver_id
+            self._link_driver(channel)
+        channel.status = ride.status
+        channel.eta.retarget(EtaTracker.target_for(ride, ride.status))
+
+        frame = channel.frame()
+        for subscriber in channel.subscribers:
+            subscriber.offer(frame)
+
+    async def serve(self, subscriber: Subscriber) -> None:
+        """
+        Send queued frames to the socket until it disconnects or is evicted.
+        Client messages of any kind count as liveness.
+        """
+        receiver = asyncio.create_task(self._receive(subscriber))
+        try:
+            while True:
+                await subscriber.wakeup.wait()
+                if subscriber.closing:
+                    if not receiver.done():
+                        await subscriber.websocket.close()
+                    break
+                for frame in subscriber.drain():
+                    await subscriber.websocket.send_text(frame)
+                subscriber.last_sent = time.monotonic()
+        except Exception:
+            # Send failures mean the client went away
+            pass
+        finally:
+            receiver.cancel()
+            self.unsubscribe(subscriber)
+
+    def sweep(self, now: Optional[float] = None) -> int:
+        """
+        Queue heartbeats for quiet sockets and evict idle ones.
+        Returns the number of evicted sockets.
+        """
+        now = time.monotonic() if now is None else now
+        heartbeat = json.dumps({"heartbeat": time.time()})
+        evicted = 0
+        for channel in self._channels.values():
+            for subscriber in channel.subscribers:
+                if now - subscriber.last_seen > self.idle_timeout_seconds:
+                    subscriber.close()
+                    evicted += 1
+                elif now - subscriber.last_sent >= self.heartbeat_seconds:
+                    subscriber.offer(heartbeat)
+        return evicted
+
+    def start(self) -> None:
+        if self._sweeper is None or self._sweeper.done():
+            self._sweeper = asyncio.create_task(self._run_sweeper())
+
+    async def stop(self) -> None:
+        if self._sweeper is not None:
+            self._sweeper.cancel()
+            try:
+                await self._sweeper
+            except asyncio.CancelledError:
+                pass
+            self._sweeper = None
+
+    async def _run_sweeper(self) -> None:
+        while True:
+            await asyncio.sleep(self.heartbeat_seconds)
+            self.sweep()
+
+    async def _receive(self, subscriber: Subscriber) -> None:
+        try:
+            while True:
+                await subscriber.websocket.receive_text()
+                subscriber.last_seen = time.monotonic()
+        except Exception:
+            # WebSocketDisconnect or a broken connection ends the session
+            subscriber.close()
+
+    def _broadcast_location(self, channel: RideChannel) -> None:
+        frame = channel.frame()
+        for subscriber in channel.subscribers:
+            subscriber.offer_location(frame)
+
+    def _link_driver(self, channel: RideChannel) -> None:
+        if channel.driver_id is not None:
+            self._driver_rides.setdefault(channel.driver_id, set()).add(channel.ride_id)
+
+    def _unlink_driver(self, channel: RideChannel) -> None:
+        if channel.driver_id is None:
+            return
+        ride_ids = self._driver_rides.get(channel.driver_id)
+        if ride_ids is not None:
+            ride_ids.discard(channel.ride_id)
+            if not ride_ids:
+                del self._driver_rides[channel.driver_id]
+
+
+# Process-wide tracking hub
+tracking_hub = TrackingHub()
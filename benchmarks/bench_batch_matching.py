@@ -0,0 +1,73 @@
+"""
+Greedy per-ride matching vs. windowed min-cost assignment.
+
+Simulates one matching window of concurrent requests in a dense area and
+reports total pickup distance and solver throughput for both strategies.
+
+    python -m benchmarks.bench_batch_matching
+"""
+import random
+import time
+
+from app.services.ride_matching.batch_matching import solve_assignment
+from app.services.ride_matching.geo_index import DriverGeoIndex
+
+
+CENTER = (12.9716, 77.5946)
+SPAN_DEGREES = 0.03
+CANDIDATES = 10
+MAX_DISTANCE_KM = 5.0
+
+
+def greedy(candidates):
+    taken = set()
+    matched = {}
+    for ride_id, options in candidates.items():
+        for driver_id, distance in options:
+            if driver_id not in taken:
+                taken.add(driver_id)
+                matched[ride_id] = (driver_id, distance)
+                break
+    return matched
+
+
+def run(rides: int, drivers: int, rng: random.Random) -> None:
+    index = DriverGeoIndex(cell_size_km=0.5)
+    for driver_id in range(drivers):
+        index.update(
+            driver_id,
+            CENTER[0] + rng.uniform(-SPAN_DEGREES, SPAN_DEGREES),
+            CENTER[1] + rng.uniform(-SPAN_DEGREES, SPAN_DEGREES),
+        )
+
+    candidates = {}
+    for ride_id in range(rides):
+        latitude = CENTER[0] + rng.uniform(-SPAN_DEGREES, SPAN_DEGREES)
+        longitude = CENTER[1] + rng.uniform(-SPAN_DEGREES, SPAN_DEGREES)
+        candidates[ride_id] = index.nearest(latitude, longitude, k=CANDIDATES, max_distance_km=MAX_DISTANCE_KM)
+
+    results = {}
+    for name, strategy in (("greedy", greedy), ("batch", solve_assignment)):
+        start = time.perf_counter()
+        matched = strategy(candidates)
+        elapsed = time.perf_counter() - start
+        total_km = sum(distance for _, distance in matched.values())
+        results[name] = (len(matched), total_km, elapsed)
+
+    for name, (count, total_km, elapsed) in results.items():
+        print(
+            f"{rides:>5} rides / {drivers:>5} drivers  {name:<6} "
+            f"matched {count:>5}  pickup {total_km:9.1f} km  "
+            f"mean {total_km / max(count, 1):5.2f} km  "
+            f"{count / elapsed:12.0f} matches/s"
+        )
+
+
+def main() -> None:
+    rng = random.Random(7)
+    for rides, drivers in ((50, 60), (200, 250), (1000, 1200)):
+        run(rides, drivers, rng)
+
+
+if __name__ == "__main__":
+    main()
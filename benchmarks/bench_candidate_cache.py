@@ -0,0 +1,111 @@
+"""
+Per-request driver candidate selection: live geo query plus scoring
+against the precomputed per-cell top-K lists, and what keeping the lists
+fresh costs as drivers move. The database availability check is the same
+on both paths and left out (every driver counts as available).
+
+    python -m benchmarks.bench_candidate_cache
+"""
+import asyncio
+import random
+import time
+from typing import List
+
+import numpy as np
+
+from app.core.config import settings
+from app.services.ride_matching.candidate_cache import CandidateCache
+from app.services.ride_matching.driver_stats import DriverStatsStore
+from app.services.ride_matching.geo_index import DriverGeoIndex
+from app.services.ride_matching.ranking import DriverCandidates, rank_candidates
+
+
+DRIVERS = 20000
+ACTIVE_CELLS = 400
+REQUESTS = 20000
+AREA_DEGREES = 0.3  # about 33 km across
+ORIGIN = (12.8, 77.45)
+MOVING_SHARE = 0.1
+
+
+async def all_available(driver_ids: List[int]) -> List[int]:
+    return driver_ids
+
+
+def live(index: DriverGeoIndex, stats: DriverStatsStore, latitude: float, longitude: float) -> List[int]:
+    limit = settings.MATCHING_CANDIDATE_LIMIT
+    nearest = index.nearest(latitude, longitude, k=limit * 2, max_distance_km=settings.MATCHING_MAX_DISTANCE_KM)
+    driver_ids = [driver_id for driver_id, _ in nearest][:limit]
+    candidates = DriverCandidates.build(driver_ids, latitude, longitude, index, stats)
+    return [driver_ids[position] for position, _ in rank_candidates(candidates)]
+
+
+def cached(cache: CandidateCache, index: DriverGeoIndex, stats: DriverStatsStore, latitude: float, longitude: float) -> List[int]:
+    limit = settings.MATCHING_CANDIDATE_LIMIT
+    driver_ids = cache.nearby(latitude, longitude, settings.MATCHING_MAX_DISTANCE_KM, limit)
+    if driver_ids is None:
+        return live(index, stats, latitude, longitude)
+    scores = cache.scores(latitude, longitude, driver_ids)
+    return [driver_id for driver_id, _ in sorted(zip(driver_ids, scores), key=lambda pair: -pair[1])]
+
+
+async def main() -> None:
+    rng = random.Random(24)
+    index = DriverGeoIndex(settings.DRIVER_INDEX_CELL_SIZE_KM)
+    stats = DriverStatsStore()
+    for driver_id in range(DRIVERS):
+        index.update(driver_id, ORIGIN[0] + rng.uniform(0, AREA_DEGREES), ORIGIN[1] + rng.uniform(0, AREA_DEGREES))
+        stats.set_rating(driver_id, rng.uniform(3.5, 5.0))
+        stats.mark_idle(driver_id, time.time() - rng.uniform(0, 1800))
+
+    # Refreshed by hand below; the staleness bound is lifted so the timed
+    # loops read the lists built before them
+    cache = CandidateCache(all_available, refresh_seconds=3600.0, max_staleness_seconds=3600.0, index=index, stats=stats)
+    cache.start()
+    cells = [(ORIGIN[0] + rng.uniform(0, AREA_DEGREES), ORIGIN[1] + rng.uniform(0, AREA_DEGREES)) for _ in range(ACTIVE_CELLS)]
+    for latitude, longitude in cells:
+        cache.lookup(latitude, longitude)
+    started = time.perf_counter()
+    built = await cache.refresh()
+    build_ms = (time.perf_counter() - started) * 1000.0
+
+    pickups = [
+        (latitude + rng.uniform(-0.002, 0.002), longitude + rng.uniform(-0.002, 0.002))
+        for latitude, longitude in (rng.choice(cells) for _ in range(REQUESTS))
+    ]
+    # Pickups jittered across a cell edge use the neighbouring cell's list
+    for latitude, longitude in pickups:
+        cache.lookup(latitude, longitude)
+    await cache.refresh()
+
+    timings = {}
+    for name, select in (("live", lambda lat, lon: live(index, stats, lat, lon)), ("cached", lambda lat, lon: cached(cache, index, stats, lat, lon))):
+        samples = np.empty(len(pickups))
+        for i, (latitude, longitude) in enumerate(pickups):
+            started = time.perf_counter()
+            select(latitude, longitude)
+            samples[i] = (time.perf_counter() - started) * 1e6
+        timings[name] = samples
+
+    same = np.mean([live(index, stats, lat, lon) == cached(cache, index, stats, lat, lon) for lat, lon in pickups[:2000]])
+
+    # One refresher tick after a share of the drivers moved by ~300 m
+    for driver_id in rng.sample(range(DRIVERS), int(DRIVERS * MOVING_SHARE)):
+        latitude, longitude = index.get(driver_id)
+        index.update(driver_id, latitude + rng.uniform(-0.003, 0.003), longitude + rng.uniform(-0.003, 0.003))
+    started = time.perf_counter()
+    rebuilt = await cache.refresh()
+    tick_ms = (time.perf_counter() - started) * 1000.0
+    await cache.stop()
+
+    print(f"{DRIVERS} drivers, {cache.stats()['lists']} active cells, top-{cache.top_k}, {REQUESTS} requests")
+    print(f"{'path':8} {'p50 us':>8} {'p99 us':>8} {'requests/s':>11}")
+    for name, samples in timings.items():
+        print(f"{name:8} {np.percentile(samples, 50):8.1f} {np.percentile(samples, 99):8.1f} {1e6 / samples.mean():11.0f}")
+    print(f"same ranked candidates as live: {same:.1%}; cache {cache.stats()}")
+    print(f"initial build: {built} lists in {build_ms:.0f} ms; "
+          f"tick after {MOVING_SHARE:.0%} of drivers moved: {rebuilt} lists in {tick_ms:.0f} ms")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,94 @@
+"""
+Latency of an unrelated, trivial endpoint while fare estimates (road
+routing) run concurrently on the same event loop: inline on the loop as
+before, then on the thread and process CPU executors. Estimate throughput
+is bounded by the cores available; the point is the probe latency.
+
+    python -m benchmarks.bench_cpu_executor
+"""
+import asyncio
+import random
+import time
+
+import numpy as np
+
+from app.core import executor
+from app.core.executor import CpuExecutor
+from app.services.ride_matching.fare_estimator import estimate_fare
+from app.services.routing.service import road_router
+from benchmarks.road_grid import grid_city
+
+
+ESTIMATE_CLIENTS = 16
+PROBE_INTERVAL_SECONDS = 0.005
+DURATION_SECONDS = 5.0
+
+
+class InlineExecutor:
+    """
+    Runs the work directly on the event loop, as before the executor layer.
+    """
+
+    async def run(self, fn, *args, **kwargs):
+        return fn(*args, **kwargs)
+
+    def shutdown(self) -> None:
+        pass
+
+
+async def estimate_load(rng: random.Random, deadline: float, completed: list) -> None:
+    while time.perf_counter() < deadline:
+        await estimate_fare(
+            12.86 + rng.uniform(0, 0.25), 77.46 + rng.uniform(0, 0.25),
+            12.86 + rng.uniform(0, 0.25), 77.46 + rng.uniform(0, 0.25),
+        )
+        completed.append(1)
+        # Each estimate is its own request; the loop gets control in between
+        await asyncio.sleep(0)
+
+
+async def ping() -> dict:
+    # Stand-in for a cheap endpoint such as a status or location read
+    await asyncio.sleep(0)
+    return {"status": "ok"}
+
+
+async def probe(deadline: float, latencies: list) -> None:
+    async def timed(scheduled: float) -> None:
+        await ping()
+        latencies.append(time.perf_counter() - scheduled)
+
+    tasks = []
+    while time.perf_counter() < deadline:
+        tasks.append(asyncio.create_task(timed(time.perf_counter())))
+        await asyncio.sleep(PROBE_INTERVAL_SECONDS)
+    await asyncio.gather(*tasks)
+
+
+async def run(name: str, pool) -> None:
+    executor.cpu_executor = pool
+    rng = random.Random(3)
+    deadline = time.perf_counter() + DURATION_SECONDS
+    latencies: list = []
+    completed: list = []
+    await asyncio.gather(
+        probe(deadline, latencies),
+        *(estimate_load(random.Random(rng.random()), deadline, completed) for _ in range(ESTIMATE_CLIENTS)),
+    )
+    pool.shutdown()
+
+    ms = np.array(latencies) * 1000
+    print(f"{name:8} {np.percentile(ms, 50):8.2f} {np.percentile(ms, 99):8.2f} {ms.max():8.2f} "
+          f"{len(completed) / DURATION_SECONDS:12.0f}")
+
+
+def main() -> None:
+    road_router.use(grid_city())
+    print(f"{'mode':8} {'p50 ms':>8} {'p99 ms':>8} {'max ms':>8} {'estimates/s':>12}")
+    asyncio.run(run("inline", InlineExecutor()))
+    asyncio.run(run("thread", CpuExecutor(name="bench-thread", kind="thread")))
+    asyncio.run(run("process", CpuExecutor(name="bench-process", kind="process")))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,76 @@
+"""
+Dispatch queue throughput per broker, and how long SOS jobs wait behind a
+backlog of ordinary matches thanks to the priority lanes.
+
+    python -m benchmarks.bench_dispatch_queue
+"""
+import asyncio
+import os
+import random
+import tempfile
+import time
+from typing import NamedTuple
+
+import numpy as np
+
+from app.services.dispatch.brokers import InMemoryDispatchBroker, SQLiteDispatchBroker
+from app.services.dispatch.queue import KIND_MATCH, KIND_SOS, DispatchQueue
+
+
+JOBS = 5000
+SOS_EVERY = 100
+
+
+class FakeRide(NamedTuple):
+    id: int
+    pickup_latitude: float
+    pickup_longitude: float
+
+
+async def run(name: str, broker) -> None:
+    queue = DispatchQueue(broker, concurrency=4, poll_seconds=0.01)
+    rng = random.Random(9)
+    sos_waits = []
+    enqueued_at = {}
+
+    async def handle(job) -> bool:
+        if job.kind == KIND_SOS:
+            sos_waits.append(time.perf_counter() - enqueued_at[job.id])
+        return True
+
+    queue.register(KIND_MATCH, handle)
+    queue.register(KIND_SOS, handle)
+
+    rides = [FakeRide(i, 12.97 + rng.uniform(-0.3, 0.3), 77.59 + rng.uniform(-0.3, 0.3)) for i in range(JOBS)]
+    start = time.perf_counter()
+    for ride in rides:
+        await queue.enqueue(KIND_MATCH, ride)
+    enqueue_seconds = time.perf_counter() - start
+
+    # SOS jobs arrive while the backlog drains
+    queue.start()
+    start = time.perf_counter()
+    for ride in rides[::SOS_EVERY]:
+        job = await queue.enqueue(KIND_SOS, ride)
+        enqueued_at[job.id] = time.perf_counter()
+        await asyncio.sleep(0.001)
+    while (await broker.stats())["jobs"]:
+        await asyncio.sleep(0.01)
+    drain_seconds = time.perf_counter() - start
+    await queue.stop()
+    await broker.close()
+
+    waits = np.array(sos_waits) * 1000
+    print(f"{name:8} {JOBS / enqueue_seconds:10.0f} {queue.processed / drain_seconds:10.0f} "
+          f"{np.percentile(waits, 50):10.2f} {waits.max():10.2f}")
+
+
+def main() -> None:
+    print(f"{'broker':8} {'enqueue/s':>10} {'process/s':>10} {'sos p50 ms':>10} {'sos max ms':>10}")
+    asyncio.run(run("memory", InMemoryDispatchBroker()))
+    with tempfile.TemporaryDirectory() as directory:
+        asyncio.run(run("sqlite", SQLiteDispatchBroker(os.path.join(directory, "dispatch.db"))))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,58 @@
+"""
+Per-update cost of incremental ETA tracking across thousands of rides.
+
+Each simulated driver heads to its destination at a noisy city speed and
+pings every 4 seconds.
+
+    python -m benchmarks.bench_eta
+"""
+import random
+import time
+
+from app.services.tracking.eta import EtaTracker
+
+
+RIDES = 5000
+PINGS = 60
+PING_SECONDS = 4.0
+
+
+def main() -> None:
+    rng = random.Random(5)
+    trackers = []
+    drivers = []
+    for _ in range(RIDES):
+        start = (12.97 + rng.uniform(-0.1, 0.1), 77.59 + rng.uniform(-0.1, 0.1))
+        target = (start[0] + rng.uniform(-0.05, 0.05), start[1] + rng.uniform(-0.05, 0.05))
+        trackers.append(EtaTracker(target=target, route_factor=1.3, speed_kmh=25.0))
+        drivers.append(list(start))
+
+    updates = 0
+    emitted = 0
+    elapsed = 0.0
+    clock = time.time()
+    for _ in range(PINGS):
+        clock += PING_SECONDS
+        for tracker, position in zip(trackers, drivers):
+            # Move ~25 km/h (+/- noise) straight towards the target
+            step = rng.uniform(0.5, 1.5) * 25.0 / 3600 * PING_SECONDS / 111.0
+            d_lat = tracker.target[0] - position[0]
+            d_lon = tracker.target[1] - position[1]
+            norm = max((d_lat ** 2 + d_lon ** 2) ** 0.5, 1e-9)
+            position[0] += d_lat / norm * min(step, norm)
+            position[1] += d_lon / norm * min(step, norm)
+
+            start = time.perf_counter()
+            result = tracker.update(position[0], position[1], clock)
+            elapsed += time.perf_counter() - start
+
+            updates += 1
+            emitted += result is not None
+
+    print(f"{RIDES} rides, {updates} updates: {elapsed / updates * 1e6:.2f} us per update, "
+          f"{emitted / updates:.1%} of updates changed the published ETA")
+    print(f"CPU for one ping from every ride: {elapsed / PINGS * 1000:.2f} ms")
+
+
+if __name__ == "__main__":
+    main()
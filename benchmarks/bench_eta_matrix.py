@@ -0,0 +1,65 @@
+"""
+Driver-to-pickup ETAs for ranking: one route query per candidate vs. a
+single many-to-one matrix query, cold and with the cell-pair cache warm.
+
+    python -m benchmarks.bench_eta_matrix
+"""
+import asyncio
+import time
+
+import numpy as np
+
+from app.services.routing.matrix import TravelTimeMatrix
+from app.services.routing.service import RoadRouter
+from benchmarks.road_grid import grid_city
+
+
+RIDES = 40
+CANDIDATES = 50
+
+
+async def main() -> None:
+    router = RoadRouter()
+    router.use(grid_city())
+    graph = router.engine.graph
+    matrix = TravelTimeMatrix(router=router)
+
+    rng = np.random.default_rng(8)
+    rides = []
+    for node in rng.integers(0, graph.node_count, RIDES):
+        pickup = (graph.latitudes[node], graph.longitudes[node])
+        drivers = np.column_stack((
+            pickup[0] + rng.uniform(-0.02, 0.02, CANDIDATES),
+            pickup[1] + rng.uniform(-0.02, 0.02, CANDIDATES),
+        ))
+        rides.append((pickup, drivers))
+
+    start = time.perf_counter()
+    for pickup, drivers in rides[:5]:
+        for lat, lon in drivers:
+            router.route(lat, lon, pickup[0], pickup[1])
+    per_route = (time.perf_counter() - start) / 5
+
+    results = {}
+    for label in ("matrix, cold cache", "matrix, warm cache"):
+        start = time.perf_counter()
+        for i, (pickup, drivers) in enumerate(rides):
+            results.setdefault(i, []).append(
+                await matrix.many_to_one(drivers[:, 0], drivers[:, 1], pickup[0], pickup[1])
+            )
+        per_ride = (time.perf_counter() - start) / RIDES
+        print(f"{label:<20} {per_ride * 1000:8.2f} ms per ride")
+    print(f"{'per-candidate route':<20} {per_route * 1000:8.2f} ms per ride")
+
+    # Drivers sharing a cell share one cached time, so warm answers are
+    # approximate within a cell
+    error = max(
+        np.abs(cold[both] - warm[both]).max(initial=0.0)
+        for cold, warm in results.values()
+        for both in [np.isfinite(cold) & np.isfinite(warm)]
+    )
+    print(f"max cell-cache error {error:.0f} s; cache: {matrix.stats()}")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
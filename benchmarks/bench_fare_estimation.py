@@ -0,0 +1,68 @@
+"""
+Geodesic (per pair) vs. vectorised haversine / equirectangular distance
+kernels, and the end-to-end batch estimate for both modes.
+
+    python -m benchmarks.bench_fare_estimation
+"""
+import asyncio
+import random
+import timeit
+
+import numpy as np
+from geopy.distance import geodesic
+
+from app.schemas.ride import RideEstimateTrip
+from app.services.ride_matching.distance import equirectangular_km_array, haversine_km_array
+from app.services.ride_matching.fare_estimator import estimate_fares_batch
+
+
+BATCH_SIZES = (1, 10, 100, 1000)
+
+
+def make_trips(count: int, rng: random.Random):
+    return [
+        RideEstimateTrip(
+            pickup_latitude=12.97 + rng.uniform(-0.15, 0.15),
+            pickup_longitude=77.59 + rng.uniform(-0.15, 0.15),
+            destination_latitude=12.97 + rng.uniform(-0.15, 0.15),
+            destination_longitude=77.59 + rng.uniform(-0.15, 0.15),
+        )
+        for _ in range(count)
+    ]
+
+
+def best_of(fn, number: int) -> float:
+    return min(timeit.repeat(fn, number=number, repeat=5)) / number
+
+
+def main() -> None:
+    rng = random.Random(11)
+    print(f"{'pairs':>6} {'geodesic':>12} {'haversine':>12} {'equirect':>12} "
+          f"{'batch precise':>14} {'batch fast':>12}   max err (m)")
+
+    for count in BATCH_SIZES:
+        trips = make_trips(count, rng)
+        coordinates = np.array([
+            (t.pickup_latitude, t.pickup_longitude, t.destination_latitude, t.destination_longitude)
+            for t in trips
+        ])
+        lat_a, lon_a, lat_b, lon_b = coordinates.T
+        number = max(1, 2000 // count)
+
+        geodesic_s = best_of(lambda: [geodesic(p[:2], p[2:]).kilometers for p in coordinates], number)
+        haversine_s = best_of(lambda: haversine_km_array(lat_a, lon_a, lat_b, lon_b), number)
+        equirect_s = best_of(lambda: equirectangular_km_array(lat_a, lon_a, lat_b, lon_b), number)
+        precise_s = best_of(lambda: asyncio.run(estimate_fares_batch(trips, precise=True)), number)
+        fast_s = best_of(lambda: asyncio.run(estimate_fares_batch(trips)), number)
+
+        exact = np.array([geodesic(p[:2], p[2:]).kilometers for p in coordinates])
+        error_m = np.abs(haversine_km_array(lat_a, lon_a, lat_b, lon_b) - exact).max() * 1000
+
+        print(
+            f"{count:>6} {geodesic_s * 1e6:>9.1f} us {haversine_s * 1e6:>9.1f} us {equirect_s * 1e6:>9.1f} us "
+            f"{precise_s * 1e6:>11.1f} us {fast_s * 1e6:>9.1f} us   {error_m:8.1f}"
+        )
+
+
+if __name__ == "__main__":
+    main()
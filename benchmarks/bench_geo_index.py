@@ -0,0 +1,68 @@
+"""
+Query latency of the in-memory driver geo index.
+
+Run from the repository root:
+
+    python -m benchmarks.bench_geo_index
+"""
+import random
+import statistics
+import time
+
+from app.services.ride_matching.geo_index import DriverGeoIndex
+
+
+# Roughly a 40 x 40 km metro area centred on Bengaluru
+CENTER = (12.9716, 77.5946)
+SPAN_DEGREES = 0.18
+QUERIES = 2000
+
+
+def populate(index: DriverGeoIndex, drivers: int, rng: random.Random) -> None:
+    for driver_id in range(drivers):
+        index.update(
+            driver_id,
+            CENTER[0] + rng.uniform(-SPAN_DEGREES, SPAN_DEGREES),
+            CENTER[1] + rng.uniform(-SPAN_DEGREES, SPAN_DEGREES),
+        )
+
+
+def time_queries(fn, points) -> list:
+    samples = []
+    for latitude, longitude in points:
+        start = time.perf_counter()
+        fn(latitude, longitude)
+        samples.append((time.perf_counter() - start) * 1e6)
+    return samples
+
+
+def summarize(samples: list) -> str:
+    samples = sorted(samples)
+    p50 = statistics.median(samples)
+    p99 = samples[int(len(samples) * 0.99) - 1]
+    return f"p50 {p50:8.1f} us   p99 {p99:8.1f} us"
+
+
+def main() -> None:
+    rng = random.Random(42)
+    points = [
+        (
+            CENTER[0] + rng.uniform(-SPAN_DEGREES, SPAN_DEGREES),
+            CENTER[1] + rng.uniform(-SPAN_DEGREES, SPAN_DEGREES),
+        )
+        for _ in range(QUERIES)
+    ]
+
+    for drivers in (1_000, 10_000, 100_000):
+        index = DriverGeoIndex(cell_size_km=0.5)
+        populate(index, drivers, rng)
+
+        knn = time_queries(lambda lat, lon: index.nearest(lat, lon, k=10, max_distance_km=5.0), points)
+        radius = time_queries(lambda lat, lon: index.within_radius(lat, lon, 1.0), points)
+
+        print(f"{drivers:>7} drivers  nearest(k=10)  {summarize(knn)}")
+        print(f"{drivers:>7} drivers  radius(1 km)   {summarize(radius)}")
+
+
+if __name__ == "__main__":
+    main()
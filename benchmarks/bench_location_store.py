@@ -0,0 +1,64 @@
+"""
+Driver location ingest throughput through the write-behind location store.
+
+Each driver pings several times per flush interval; the store coalesces
+them so the backend sees one write per driver per flush.
+
+    python -m benchmarks.bench_location_store
+"""
+import asyncio
+import random
+import time
+
+from app.services.location.backends import InMemoryLocationBackend, RedisLocationBackend
+from app.services.location.store import LocationStore
+from app.services.ride_matching.geo_index import DriverGeoIndex
+from benchmarks.redis_standin import RedisStandIn
+
+
+CENTER = (12.9716, 77.5946)
+DRIVERS = 20_000
+PINGS_PER_FLUSH = 3
+FLUSHES = 10
+
+
+async def run(name: str, backend) -> None:
+    rng = random.Random(11)
+    store = LocationStore(backend, index=DriverGeoIndex(0.5), ttl_seconds=30.0)
+
+    pings = 0
+    record_seconds = 0.0
+    flush_seconds = 0.0
+    for _ in range(FLUSHES):
+        start = time.perf_counter()
+        for _ in range(PINGS_PER_FLUSH):
+            for driver_id in range(DRIVERS):
+                store.record(
+                    driver_id,
+                    CENTER[0] + rng.uniform(-0.2, 0.2),
+                    CENTER[1] + rng.uniform(-0.2, 0.2),
+                )
+                pings += 1
+        record_seconds += time.perf_counter() - start
+
+        start = time.perf_counter()
+        await store.flush()
+        flush_seconds += time.perf_counter() - start
+
+    fresh = store.fresh_positions(range(DRIVERS))
+    print(
+        f"{name:<14} {pings / record_seconds:12.0f} pings/s recorded   "
+        f"flush {flush_seconds / FLUSHES * 1000:7.1f} ms / {DRIVERS} drivers   "
+        f"fresh {len(fresh)}"
+    )
+    if isinstance(backend, RedisLocationBackend):
+        print(f"{'':<14} {backend.client.round_trips} backend round trips for {pings} pings")
+
+
+async def main() -> None:
+    await run("memory", InMemoryLocationBackend())
+    await run("redis-standin", RedisLocationBackend(RedisStandIn()))
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
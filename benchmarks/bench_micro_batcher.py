@@ -0,0 +1,77 @@
+"""
+Per-row sklearn predictions on the event loop vs. the async micro-batcher.
+
+Simulates bursts of concurrent fare predictions against a random forest
+and reports throughput, caller latency and the batch-size histogram.
+
+    python -m benchmarks.bench_micro_batcher
+"""
+import asyncio
+import time
+
+import numpy as np
+from sklearn.ensemble import RandomForestRegressor
+
+from app.services.ml.batcher import MicroBatcher
+from app.services.ml.registry import ModelRegistry
+
+
+CALLERS = 2000
+FEATURES = 6
+
+
+def train_model() -> RandomForestRegressor:
+    rng = np.random.default_rng(1)
+    X = rng.random((5000, FEATURES))
+    y = 50 + X[:, 0] * 400 + rng.normal(0, 10, len(X))
+    return RandomForestRegressor(n_estimators=50, max_depth=10, n_jobs=1, random_state=1).fit(X, y)
+
+
+async def per_row(model, rows: np.ndarray) -> np.ndarray:
+    async def call(row):
+        return model.predict(row.reshape(1, -1))[0]
+    return np.array(await asyncio.gather(*(call(row) for row in rows)))
+
+
+async def batched(batcher: MicroBatcher, rows: np.ndarray) -> np.ndarray:
+    latencies = []
+
+    async def call(row):
+        start = time.perf_counter()
+        result = await batcher.predict(row)
+        latencies.append(time.perf_counter() - start)
+        return result
+
+    results = np.array(await asyncio.gather(*(call(row) for row in rows)))
+    latencies_ms = np.array(latencies) * 1000
+    print(f"  caller latency p50 {np.percentile(latencies_ms, 50):6.1f} ms   "
+          f"p99 {np.percentile(latencies_ms, 99):6.1f} ms")
+    return results
+
+
+async def main() -> None:
+    model = train_model()
+    registry = ModelRegistry()
+    registry.set("fare", model)
+    rows = np.random.default_rng(2).random((CALLERS, FEATURES))
+
+    start = time.perf_counter()
+    expected = await per_row(model, rows)
+    elapsed = time.perf_counter() - start
+    print(f"per-row predict:  {CALLERS / elapsed:8.0f} predictions/s (blocks the event loop)")
+
+    for max_batch_size in (16, 64, 256):
+        batcher = MicroBatcher("fare", max_batch_size=max_batch_size, max_wait_ms=5.0, registry=registry)
+        # Batchers for one model share histograms, so report this run's delta
+        count, total = batcher.batch_sizes.count, batcher.batch_sizes.sum
+        start = time.perf_counter()
+        results = await batched(batcher, rows)
+        elapsed = time.perf_counter() - start
+        await batcher.stop()
+        assert np.allclose(results, expected)
+        print(f"batched (max {max_batch_size:>3}): {CALLERS / elapsed:8.0f} predictions/s, "
+              f"mean batch {(batcher.batch_sizes.sum - total) / (batcher.batch_sizes.count - count):.1f}")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,93 @@
+"""
+Time to match with driver offers, sequential vs broadcast, for thousands of
+rides waiting at once. Driver behaviour is simulated with scaled-down time:
+offers expire after 0.5 s, drivers who answer do so within 0.05-0.4 s.
+
+    python -m benchmarks.bench_offer_engine
+"""
+import asyncio
+import random
+import time
+
+import numpy as np
+
+from app.services.ride_matching.offers import MODE_BROADCAST, MODE_SEQUENTIAL, OfferEngine, OfferError
+from app.services.ride_matching.reservations import ASSIGNED, RIDE_TAKEN
+
+
+RIDES = 5000
+CANDIDATES = 12
+TIMEOUT_SECONDS = 0.5
+ACCEPT_RATE = 0.35
+DECLINE_RATE = 0.35  # the rest never answer
+
+
+async def run(mode: str) -> None:
+    rng = random.Random(20)
+    loop = asyncio.get_running_loop()
+    opened_at = {}
+    matched_at = {}
+    exhausted = []
+    peak_pending = 0
+
+    async def candidates(ride_id, exclude):
+        pool = range(ride_id * CANDIDATES, (ride_id + 1) * CANDIDATES)
+        return [driver_id for driver_id in pool if driver_id not in exclude][:4]
+
+    async def assign(ride_id, driver_id):
+        if ride_id in matched_at:
+            return RIDE_TAKEN
+        matched_at[ride_id] = time.perf_counter()
+        return ASSIGNED
+
+    async def on_exhausted(ride_id):
+        exhausted.append(ride_id)
+
+    async def answer(offer, accepted):
+        try:
+            await engine.respond(offer.id, offer.driver_id, accepted)
+        except OfferError:
+            pass
+
+    engine = OfferEngine(candidates, assign, on_exhausted, mode=mode, timeout_seconds=TIMEOUT_SECONDS)
+    engine.start()
+    answered = set()
+
+    for ride_id in range(RIDES):
+        opened_at[ride_id] = time.perf_counter()
+        engine.open(ride_id, await candidates(ride_id, set()))
+
+    # Drivers look at their offer as it arrives and answer after a delay
+    while engine.stats()["rides"]:
+        peak_pending = max(peak_pending, engine.stats()["pending_offers"])
+        for driver_id in engine.busy_drivers():
+            offer = engine.offer_for_driver(driver_id)
+            if offer is None or offer.id in answered:
+                continue
+            answered.add(offer.id)
+            roll = rng.random()
+            if roll < ACCEPT_RATE + DECLINE_RATE:
+                delay = rng.uniform(0.05, 0.4)
+                loop.call_later(delay, asyncio.ensure_future, answer(offer, roll < ACCEPT_RATE))
+        await asyncio.sleep(0.01)
+    await engine.stop()
+
+    waits = np.array([matched_at[r] - opened_at[r] for r in matched_at]) * 1000
+    stats = engine.stats()
+    if waits.size:
+        p50, p90 = f"{np.percentile(waits, 50):8.0f}", f"{np.percentile(waits, 90):8.0f}"
+    else:
+        p50, p90 = f"{'n/a':>8}", f"{'n/a':>8}"
+    print(f"{mode:10} {len(matched_at) / RIDES:8.1%} {p50} {p90} "
+          f"{stats['sent'] / RIDES:8.1f} {peak_pending:8d} {len(exhausted):9d}")
+
+
+def main() -> None:
+    print(f"{RIDES} rides, {CANDIDATES} candidates each, offers expire after {TIMEOUT_SECONDS * 1000:.0f} ms")
+    print(f"{'mode':10} {'matched':>8} {'p50 ms':>8} {'p90 ms':>8} {'offers':>8} {'pending':>8} {'exhausted':>9}")
+    for mode in (MODE_SEQUENTIAL, MODE_BROADCAST):
+        asyncio.run(run(mode))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,112 @@
+"""
+Re-matching a ride whose driver backed out before pickup: a full match
+(geo query, availability check, ranking, assignment) against handing the
+ride to the next of the candidates kept from its first match
+(rematch_ride). Every ride is re-matched both ways from the same state, the
+backed-out driver having gone offline, and the drivers chosen are compared.
+
+    python -m benchmarks.bench_rematch
+"""
+import asyncio
+import os
+import random
+import tempfile
+import time
+
+import numpy as np
+from tortoise import Tortoise
+
+from app.core.config import settings
+from app.models.ride import Ride, RideStatus
+from app.models.user import User, UserRole
+from app.services.location.store import location_store
+from app.services.location.tracks import track_store
+from app.services.ride_matching.matching import match_ride_with_driver, release_driver, rematch_ride
+from app.services.ride_matching.offers import MODE_INSTANT
+from app.services.ride_matching.rematch import rematch_candidates
+
+
+DRIVERS = 2000
+RIDES = 300
+AREA_DEGREES = 0.1  # about 11 km across
+ORIGIN = (12.92, 77.54)
+
+
+async def back_out(ride: Ride) -> None:
+    # What the status endpoint does when a driver hands a ride back
+    driver_id = ride.driver_id
+    ride.status = RideStatus.REQUESTED
+    ride.driver_id = None
+    await ride.save()
+    await track_store.finish(ride.id)
+    release_driver(ride, driver_id)
+
+
+async def main() -> None:
+    # Timed is the assignment itself, not drivers answering offers
+    settings.OFFER_MODE = MODE_INSTANT
+    rng = random.Random(25)
+    with tempfile.TemporaryDirectory() as directory:
+        await Tortoise.init(
+            db_url=f"sqlite://{os.path.join(directory, 'rematch.db')}",
+            modules={"models": ["app.models.user", "app.models.ride", "app.models.payment"]},
+        )
+        await Tortoise.generate_schemas()
+
+        rider = await User.create(email="rider@example.com", hashed_password="x", phone_number="100")
+        for i in range(DRIVERS):
+            driver = await User.create(
+                email=f"driver{i}@example.com", hashed_password="x", phone_number=f"2{i:05d}", role=UserRole.DRIVER
+            )
+            location_store.record(driver.id, ORIGIN[0] + rng.uniform(0, AREA_DEGREES), ORIGIN[1] + rng.uniform(0, AREA_DEGREES))
+        await location_store.flush()
+
+        timings = {"full": [], "cached": []}
+        same = 0
+        for _ in range(RIDES):
+            ride = await Ride.create(
+                rider=rider,
+                pickup_latitude=ORIGIN[0] + rng.uniform(0, AREA_DEGREES),
+                pickup_longitude=ORIGIN[1] + rng.uniform(0, AREA_DEGREES),
+                pickup_address="pickup",
+                destination_latitude=ORIGIN[0],
+                destination_longitude=ORIGIN[1],
+                destination_address="destination",
+            )
+            first = await match_ride_with_driver(ride.id)
+            if first is None:
+                continue
+            ride = await Ride.get(id=ride.id)
+            await User.filter(id=first.id).update(is_active=False)
+
+            # Cached first: a full match replaces the kept candidates
+            chosen = {}
+            for name in ("cached", "full"):
+                await back_out(ride)
+                started = time.perf_counter()
+                if name == "cached":
+                    await rematch_ride(ride, {first.id})
+                else:
+                    await match_ride_with_driver(ride.id)
+                timings[name].append((time.perf_counter() - started) * 1000.0)
+                ride = await Ride.get(id=ride.id)
+                chosen[name] = ride.driver_id
+            same += chosen["cached"] == chosen["full"]
+
+            ride.status = RideStatus.COMPLETED
+            await ride.save()
+            await track_store.finish(ride.id)
+            release_driver(ride, ride.driver_id)
+            await User.filter(id=first.id).update(is_active=True)
+        await Tortoise.close_connections()
+
+    print(f"{DRIVERS} drivers, {len(timings['full'])} backed-out rides re-matched")
+    print(f"{'re-match':8} {'p50 ms':>7} {'p99 ms':>7} {'mean ms':>8}")
+    for name, samples in timings.items():
+        samples = np.array(samples)
+        print(f"{name:8} {np.percentile(samples, 50):7.2f} {np.percentile(samples, 99):7.2f} {samples.mean():8.2f}")
+    print(f"same driver chosen: {same / len(timings['full']):.1%}; kept candidates {rematch_candidates.stats()}")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
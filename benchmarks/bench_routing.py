@@ -0,0 +1,61 @@
+"""
+Road routing on a synthetic ~90k node city: ALT A* vs. plain A*/Dijkstra
+point-to-point queries, and one-to-many travel times.
+
+    python -m benchmarks.bench_routing
+"""
+import time
+
+import numpy as np
+from scipy.sparse.csgraph import dijkstra
+
+from app.services.routing.engine import RoutingEngine
+from benchmarks.road_grid import grid_city
+
+
+QUERIES = 200
+CANDIDATES = 50
+
+
+def main() -> None:
+    graph = grid_city()
+    print(f"graph: {graph.node_count} nodes, {graph.edge_count} edges")
+
+    start = time.perf_counter()
+    engine = RoutingEngine(graph, landmark_count=8)
+    engine.prepare()
+    print(f"ALT preprocessing (8 landmarks): {time.perf_counter() - start:.2f} s")
+    plain = RoutingEngine(graph, landmark_count=0)
+    plain.prepare()
+
+    rng = np.random.default_rng(4)
+    pairs = rng.integers(0, graph.node_count, size=(QUERIES, 2))
+    matrix = graph.matrix()
+
+    for label, router in (("ALT A*", engine), ("Dijkstra", plain)):
+        latencies = []
+        for source, target in pairs:
+            start = time.perf_counter()
+            route = router.shortest_path(int(source), int(target))
+            latencies.append(time.perf_counter() - start)
+            if label == "ALT A*" and route is not None:
+                expected = dijkstra(matrix, indices=int(source))[target]
+                assert abs(route.duration_seconds - expected) < 1e-3 * max(expected, 1.0)
+        latencies_ms = np.array(latencies) * 1000
+        print(f"{label:<9} point-to-point p50 {np.percentile(latencies_ms, 50):7.2f} ms   "
+              f"p99 {np.percentile(latencies_ms, 99):7.2f} ms")
+
+    latencies = []
+    for source, _ in pairs[:50]:
+        lat, lon = graph.latitudes[source], graph.longitudes[source]
+        offsets = rng.uniform(-0.03, 0.03, size=(CANDIDATES, 2))
+        start = time.perf_counter()
+        engine.travel_times_from(lat, lon, lat + offsets[:, 0], lon + offsets[:, 1], limit_seconds=1800)
+        latencies.append(time.perf_counter() - start)
+    latencies_ms = np.array(latencies) * 1000
+    print(f"one-to-{CANDIDATES} travel times p50 {np.percentile(latencies_ms, 50):7.2f} ms   "
+          f"p99 {np.percentile(latencies_ms, 99):7.2f} ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,67 @@
+"""
+Sharded matching throughput at 1, 2, 4 and 8 shard processes, with the
+share of rides that needed candidates from a neighbouring shard and a
+check that no driver was handed two rides.
+
+    python -m benchmarks.bench_sharded_matching
+
+Shards scale with cores: on a machine with fewer cores than shards the
+processes share CPUs and throughput levels off.
+"""
+import asyncio
+import os
+import random
+import time
+
+from app.services.sharding.cluster import ShardCoordinator
+from app.services.sharding.shard import DriverPing
+
+
+DRIVERS = 20000
+RIDES = 10000
+BATCH = 250
+CENTER = (12.97, 77.59)
+SPREAD_DEGREES = 0.2  # about 45 km across
+
+
+def random_point(rng: random.Random):
+    return (
+        CENTER[0] + rng.uniform(-SPREAD_DEGREES, SPREAD_DEGREES),
+        CENTER[1] + rng.uniform(-SPREAD_DEGREES, SPREAD_DEGREES),
+    )
+
+
+async def run(shards: int) -> None:
+    rng = random.Random(19)
+    coordinator = ShardCoordinator(shards, processes=True)
+    try:
+        pings = [DriverPing(driver_id, *random_point(rng)) for driver_id in range(DRIVERS)]
+        start = time.perf_counter()
+        for i in range(0, DRIVERS, 1000):
+            await coordinator.update_drivers(pings[i:i + 1000])
+        ingest_seconds = time.perf_counter() - start
+
+        rides = [(ride_id, *random_point(rng)) for ride_id in range(RIDES)]
+        start = time.perf_counter()
+        assigned = {}
+        for i in range(0, RIDES, BATCH):
+            assigned.update(await coordinator.match_many(rides[i:i + BATCH]))
+        match_seconds = time.perf_counter() - start
+
+        drivers = [match[0] for match in assigned.values() if match is not None]
+        assert len(drivers) == len(set(drivers)), "driver assigned twice"
+        print(f"{shards:6d} {DRIVERS / ingest_seconds:12.0f} {RIDES / match_seconds:10.0f} "
+              f"{len(drivers) / RIDES:9.1%} {coordinator.fanned_out / RIDES:9.1%}")
+    finally:
+        coordinator.close()
+
+
+def main() -> None:
+    print(f"{os.cpu_count()} CPUs, {DRIVERS} drivers, {RIDES} rides in batches of {BATCH}")
+    print(f"{'shards':>6} {'pings/s':>12} {'rides/s':>10} {'matched':>9} {'fan-out':>9}")
+    for shards in (1, 2, 4, 8):
+        asyncio.run(run(shards))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,84 @@
+"""
+Speed-profile table: the batch aggregation over a few months of completed
+rides, the size of the memory-mapped table, and the per-estimate lookup.
+
+    python -m benchmarks.bench_speed_profiles
+"""
+import os
+import random
+import tempfile
+import time
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+
+from app.services.routing.speed_profiles import SpeedProfiles, build_speed_profiles, save_speed_profiles
+
+
+RIDES = 1_000_000
+LOOKUPS = 200_000
+
+
+def synthetic_rides(rng: np.random.Generator) -> pd.DataFrame:
+    started = pd.Timestamp("2026-06-01") + pd.to_timedelta(rng.uniform(0, 56 * 86400, RIDES), unit="s")
+    # Slower at the centre and in the evening peak
+    latitude = 12.97 + rng.uniform(-0.06, 0.06, RIDES)
+    longitude = 77.59 + rng.uniform(-0.06, 0.06, RIDES)
+    centre_km = np.hypot(latitude - 12.97, longitude - 77.59) * 111.0
+    peak = np.isin(started.hour, (8, 9, 18, 19))
+    speed = (14 + centre_km) * np.where(peak, 0.7, 1.0) * rng.lognormal(0, 0.2, RIDES)
+    distance = rng.uniform(1, 20, RIDES)
+    return pd.DataFrame({
+        "pickup_latitude": latitude,
+        "pickup_longitude": longitude,
+        "started_at": started,
+        "completed_at": started + pd.to_timedelta(distance / speed * 3600, unit="s"),
+        "distance_km": distance,
+    })
+
+
+def main() -> None:
+    rides = synthetic_rides(np.random.default_rng(7))
+
+    start = time.perf_counter()
+    table = build_speed_profiles(rides)
+    build_seconds = time.perf_counter() - start
+
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, "speed_profiles.npy")
+        save_speed_profiles(table, path)
+        size_kb = os.path.getsize(path) / 1024
+
+        profiles = SpeedProfiles(path=path)
+        start = time.perf_counter()
+        profiles.load()
+        load_seconds = time.perf_counter() - start
+
+        rng = random.Random(7)
+        points = [(12.97 + rng.uniform(-0.06, 0.06), 77.59 + rng.uniform(-0.06, 0.06)) for _ in range(LOOKUPS)]
+        at = datetime(2026, 8, 3, 18, 30)
+        start = time.perf_counter()
+        for lat, lon in points:
+            profiles.speed_kmh(lat, lon, at)
+        lookup_seconds = time.perf_counter() - start
+
+        latitudes = np.array([lat for lat, _ in points])
+        longitudes = np.array([lon for _, lon in points])
+        start = time.perf_counter()
+        profiles.speeds_kmh(latitudes, longitudes, at)
+        vector_seconds = time.perf_counter() - start
+
+        centre_peak = profiles.speed_kmh(12.97, 77.59, at)
+        edge_night = profiles.speed_kmh(13.025, 77.645, datetime(2026, 8, 3, 3, 0))
+
+    print(f"build        {build_seconds:6.2f} s  for {RIDES} rides -> {len(table) - 1} cells, {size_kb:.0f} KiB")
+    print(f"map          {load_seconds * 1000:6.2f} ms")
+    print(f"lookup       {lookup_seconds / LOOKUPS * 1e6:6.2f} us")
+    print(f"vectorised   {vector_seconds / LOOKUPS * 1e6:6.2f} us per point")
+    print(f"centre, Monday 18:00  {centre_peak:5.1f} km/h")
+    print(f"edge, Monday 03:00    {edge_night:5.1f} km/h")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,55 @@
+"""
+Surge engine cost: counter updates per event, a full recompute across a
+city's worth of active cells, and the O(1) lookup on the estimate path.
+
+    python -m benchmarks.bench_surge
+"""
+import random
+import time
+
+from app.services.ride_matching.surge import SurgeEngine
+
+
+DRIVERS = 50_000
+REQUESTS = 20_000
+LOOKUPS = 200_000
+
+
+def main() -> None:
+    rng = random.Random(6)
+    engine = SurgeEngine()
+    now = time.time()
+
+    def point():
+        return 12.97 + rng.uniform(-0.25, 0.25), 77.59 + rng.uniform(-0.25, 0.25)
+
+    pings = [(driver_id % DRIVERS, *point()) for driver_id in range(DRIVERS * 4)]
+    start = time.perf_counter()
+    for driver_id, lat, lon in pings:
+        engine.record_driver(driver_id, lat, lon, now)
+    ping_seconds = time.perf_counter() - start
+
+    requests = [(ride_id, *point()) for ride_id in range(REQUESTS)]
+    start = time.perf_counter()
+    for ride_id, lat, lon in requests:
+        engine.record_request(ride_id, lat, lon, now)
+    request_seconds = time.perf_counter() - start
+
+    start = time.perf_counter()
+    engine.recompute(now)
+    recompute_seconds = time.perf_counter() - start
+
+    lookups = [point() for _ in range(LOOKUPS)]
+    start = time.perf_counter()
+    for lat, lon in lookups:
+        engine.surge_for(lat, lon)
+    lookup_seconds = time.perf_counter() - start
+
+    print(f"driver ping update   {ping_seconds / len(pings) * 1e6:6.2f} us")
+    print(f"request update       {request_seconds / REQUESTS * 1e6:6.2f} us")
+    print(f"recompute            {recompute_seconds * 1000:6.2f} ms for {engine.stats()}")
+    print(f"lookup               {lookup_seconds / LOOKUPS * 1e6:6.2f} us")
+
+
+if __name__ == "__main__":
+    main()
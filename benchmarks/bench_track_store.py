@@ -0,0 +1,64 @@
+"""
+Append, flush and replay cost of the packed per-ride track store.
+
+    python -m benchmarks.bench_track_store
+"""
+import asyncio
+import os
+import tempfile
+import time
+
+import numpy as np
+
+from app.services.location.tracks import TrackStore
+
+
+RIDES = 2000
+# A 40 minute ride pinging every 4 seconds
+POINTS_PER_RIDE = 600
+
+
+async def run(compress: bool) -> None:
+    directory = tempfile.mkdtemp(prefix="tracks-")
+    store = TrackStore(directory=directory, compress=compress)
+    rng = np.random.default_rng(9)
+    start_ts = time.time()
+
+    for ride_id in range(RIDES):
+        store.begin(ride_id, driver_id=ride_id)
+
+    start = time.perf_counter()
+    for i in range(POINTS_PER_RIDE):
+        ts = start_ts + i * 4.0
+        for ride_id in range(RIDES):
+            store.record_driver_point(ride_id, 12.97 + i * 1e-4, 77.59 + rng.random() * 1e-5, ts)
+    append_seconds = time.perf_counter() - start
+    points = RIDES * POINTS_PER_RIDE
+
+    start = time.perf_counter()
+    for ride_id in range(RIDES):
+        await store.finish(ride_id)
+    flush_seconds = time.perf_counter() - start
+
+    disk_bytes = sum(os.path.getsize(os.path.join(directory, name)) for name in os.listdir(directory))
+
+    start = time.perf_counter()
+    replayed = sum(store.load(ride_id).size for ride_id in range(0, RIDES, 10))
+    replay_seconds = time.perf_counter() - start
+
+    label = "compressed" if compress else "mmap"
+    print(
+        f"{label:<10} append {append_seconds / points * 1e6:5.2f} us/point   "
+        f"flush {flush_seconds / RIDES * 1000:5.2f} ms/ride   "
+        f"disk {disk_bytes / points:5.2f} B/point   "
+        f"replay {replayed / replay_seconds / 1e6:6.1f} M points/s"
+    )
+
+
+async def main() -> None:
+    await run(compress=False)
+    await run(compress=True)
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,93 @@
+"""
+Tracking hub fan-out with 50k concurrent in-process sockets.
+
+Sockets are in-memory fakes, so this measures the hub itself: memory per
+connection, publish cost and end-to-end delivery of location frames.
+
+    python -m benchmarks.bench_tracking_hub [--no-freeze]
+"""
+import asyncio
+import gc
+import sys
+import time
+import tracemalloc
+from types import SimpleNamespace
+
+from app.models.ride import RideStatus
+from app.services.tracking.hub import TrackingHub
+
+
+SOCKETS = 50_000
+SOCKETS_PER_RIDE = 2
+ROUNDS = 5
+
+
+class FakeWebSocket:
+    def __init__(self):
+        self.received = 0
+        self._closed = asyncio.Event()
+
+    async def send_text(self, text: str) -> None:
+        self.received += 1
+
+    async def receive_text(self) -> str:
+        await self._closed.wait()
+        raise ConnectionError("closed")
+
+    async def close(self) -> None:
+        self._closed.set()
+
+
+async def main() -> None:
+    hub = TrackingHub(heartbeat_seconds=60.0, idle_timeout_seconds=600.0)
+    rides = SOCKETS // SOCKETS_PER_RIDE
+
+    tracemalloc.start()
+    sockets = []
+    tasks = []
+    for ride_id in range(rides):
+        ride = SimpleNamespace(
+            id=ride_id, driver_id=ride_id, status=RideStatus.IN_PROGRESS,
+            pickup_latitude=12.97, pickup_longitude=77.59,
+            destination_latitude=12.99, destination_longitude=77.61,
+            estimated_duration_minutes=20, estimated_distance_km=4.0,
+        )
+        for _ in range(SOCKETS_PER_RIDE):
+            websocket = FakeWebSocket()
+            sockets.append(websocket)
+            tasks.append(asyncio.create_task(hub.serve(hub.subscribe(websocket, ride))))
+    await asyncio.sleep(0)
+    current, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    print(f"{hub.connection_count} sockets, {current / len(sockets) / 1024:.1f} KiB per socket")
+
+    # With 100k long-lived coroutines the cyclic GC dominates publish cost;
+    # freezing them mirrors what a worker should do once sockets settle.
+    if "--no-freeze" not in sys.argv:
+        gc.freeze()
+
+    for round_number in range(ROUNDS):
+        start = time.perf_counter()
+        for driver_id in range(rides):
+            hub.publish_location(driver_id, 12.97 + round_number * 1e-4, 77.59)
+        publish_seconds = time.perf_counter() - start
+
+        start = time.perf_counter()
+        target = (round_number + 2) * SOCKETS
+        while sum(websocket.received for websocket in sockets) < target:
+            await asyncio.sleep(0)
+        deliver_seconds = time.perf_counter() - start
+
+        print(
+            f"round {round_number}: publish {rides} updates in {publish_seconds * 1000:6.1f} ms "
+            f"({rides / publish_seconds:9.0f}/s), delivered to {SOCKETS} sockets in "
+            f"{deliver_seconds * 1000:6.1f} ms"
+        )
+
+    for websocket in sockets:
+        await websocket.close()
+    await asyncio.gather(*tasks)
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,85 @@
+"""
+Minimal in-process stand-in for the redis.asyncio commands used by the
+Redis-backed services, so they can be exercised without a Redis server.
+"""
+from typing import Dict, List
+
+
+class _Pipeline:
+    def __init__(self, client: "RedisStandIn"):
+        self._client = client
+        self._calls = []
+
+    def __getattr__(self, name):
+        command = getattr(self._client, name)
+
+        def queue(*args, **kwargs):
+            self._calls.append((command, args, kwargs))
+            return self
+        return queue
+
+    async def execute(self) -> List:
+        results = [await command(*args, **kwargs) for command, args, kwargs in self._calls]
+        self._calls = []
+        return results
+
+
+class RedisStandIn:
+    def __init__(self):
+        self.hashes: Dict[str, Dict[str, str]] = {}
+        self.sorted_sets: Dict[str, Dict[str, float]] = {}
+        self.commands = 0
+        self.round_trips = 0
+
+    def pipeline(self, transaction: bool = True) -> _Pipeline:
+        self.round_trips += 1
+        return _Pipeline(self)
+
+    async def hset(self, key, field=None, value=None, mapping=None):
+        self.commands += 1
+        target = self.hashes.setdefault(key, {})
+        if field is not None:
+            target[str(field)] = value
+        target.update({str(k): v for k, v in (mapping or {}).items()})
+
+    async def hmget(self, key, fields):
+        self.commands += 1
+        target = self.hashes.get(key, {})
+        return [target.get(str(field)) for field in fields]
+
+    async def hdel(self, key, *fields):
+        self.commands += 1
+        target = self.hashes.get(key, {})
+        return sum(target.pop(str(field), None) is not None for field in fields)
+
+    async def zadd(self, key, mapping):
+        self.commands += 1
+        self.sorted_sets.setdefault(key, {}).update({str(k): float(v) for k, v in mapping.items()})
+
+    async def zrem(self, key, *members):
+        self.commands += 1
+        target = self.sorted_sets.get(key, {})
+        return sum(target.pop(str(member), None) is not None for member in members)
+
+    async def zrangebyscore(self, key, low, high):
+        self.commands += 1
+        low_value, low_open = self._bound(low)
+        high_value, high_open = self._bound(high)
+        members = sorted(self.sorted_sets.get(key, {}).items(), key=lambda item: item[1])
+        return [
+            member for member, score in members
+            if (score > low_value if low_open else score >= low_value)
+            and (score < high_value if high_open else score <= high_value)
+        ]
+
+    async def close(self):
+        pass
+
+    @staticmethod
+    def _bound(value):
+        text = str(value)
+        if text in ("-inf", "+inf", "inf"):
+            return float(text), False
+        if text.startswith("("):
+            return float(text[1:]), True
+        return float(text), False
@@ -0,0 +1,44 @@
+"""
+Synthetic road network for routing benchmarks: a grid city with faster
+arterials every few blocks and a river crossed only by a handful of bridges.
+"""
+import numpy as np
+
+from app.services.ride_matching.distance import KM_PER_DEGREE
+from app.services.routing.graph import RoadGraph
+
+
+def grid_city(
+    rows: int = 300,
+    cols: int = 300,
+    spacing_m: float = 100.0,
+    origin=(12.85, 77.45),
+    seed: int = 0
+) -> RoadGraph:
+    rng = np.random.default_rng(seed)
+    step_lat = spacing_m / 1000.0 / KM_PER_DEGREE
+    step_lon = step_lat / np.cos(np.radians(origin[0]))
+
+    row_ids, col_ids = np.divmod(np.arange(rows * cols), cols)
+    latitudes = origin[0] + row_ids * step_lat
+    longitudes = origin[1] + col_ids * step_lon
+    node = np.arange(rows * cols).reshape(rows, cols)
+
+    # East-west streets, minus those crossing the river except at bridges
+    river_col = cols // 2
+    east_src, east_dst = node[:, :-1].ravel(), node[:, 1:].ravel()
+    crosses_river = (east_src % cols) == river_col
+    bridge = (east_src // cols) % 60 == 30
+    keep = ~crosses_river | bridge
+    east_src, east_dst = east_src[keep], east_dst[keep]
+    north_src, north_dst = node[:-1, :].ravel(), node[1:, :].ravel()
+
+    sources = np.concatenate((east_src, east_dst, north_src, north_dst))
+    targets = np.concatenate((east_dst, east_src, north_dst, north_src))
+
+    # Arterials every 10 blocks, local streets otherwise
+    arterial = ((row_ids[sources] % 10 == 0) & (row_ids[targets] % 10 == 0)) | \
+               ((col_ids[sources] % 10 == 0) & (col_ids[targets] % 10 == 0))
+    speed_kmh = np.where(arterial, 50.0, rng.uniform(15.0, 30.0, len(sources)))
+    length_m = np.full(len(sources), spacing_m)
+    return RoadGraph.from_edges(latitudes, longitudes, sources, targets, length_m, speed_kmh)
@@ -0,0 +1,179 @@
+"""
+Peak-hour dispatch simulation with and without look-ahead to drivers who
+are about to drop off. Same drivers, same ride stream; reports rides served,
+rider wait until pickup, driver utilisation (share of driver time spent
+carrying riders) and the empty pickup minutes per ride.
+
+    python -m benchmarks.sim_lookahead_matching
+"""
+import heapq
+import random
+from typing import Dict, List, NamedTuple, Optional, Tuple
+
+import numpy as np
+
+from app.core.config import settings
+from app.services.ride_matching.distance import haversine_km
+from app.services.ride_matching.geo_index import DriverGeoIndex, driver_index
+from app.services.ride_matching.lookahead import LookaheadPlanner, travel_minutes
+
+
+DRIVERS = 200
+RIDES_PER_MINUTE = 14.0
+SIM_MINUTES = 240
+AREA_DEGREES = 0.09  # about 10 km across
+TRIP_DEGREES = 0.03
+PATIENCE_MINUTES = 20.0
+ORIGIN = (12.93, 77.55)
+
+
+class SimRide(NamedTuple):
+    id: int
+    requested_at: float
+    pickup_latitude: float
+    pickup_longitude: float
+    destination_latitude: float
+    destination_longitude: float
+    driver_id: Optional[int] = None
+
+
+class Leg(NamedTuple):
+    start: float
+    duration: float
+    origin: Tuple[float, float]
+    target: Tuple[float, float]
+
+    def position(self, now: float) -> Tuple[float, float]:
+        done = 1.0 if self.duration <= 0 else min(1.0, (now - self.start) / self.duration)
+        return (
+            self.origin[0] + (self.target[0] - self.origin[0]) * done,
+            self.origin[1] + (self.target[1] - self.origin[1]) * done,
+        )
+
+
+def ride_stream(rng: random.Random) -> List[SimRide]:
+    rides, now = [], 0.0
+    while True:
+        now += rng.expovariate(RIDES_PER_MINUTE)
+        if now >= SIM_MINUTES:
+            return rides
+        pickup = (ORIGIN[0] + rng.uniform(0, AREA_DEGREES), ORIGIN[1] + rng.uniform(0, AREA_DEGREES))
+        destination = (
+            min(max(pickup[0] + rng.uniform(-TRIP_DEGREES, TRIP_DEGREES), ORIGIN[0]), ORIGIN[0] + AREA_DEGREES),
+            min(max(pickup[1] + rng.uniform(-TRIP_DEGREES, TRIP_DEGREES), ORIGIN[1]), ORIGIN[1] + AREA_DEGREES),
+        )
+        rides.append(SimRide(len(rides), now, *pickup, *destination))
+
+
+def simulate(rides: List[SimRide], lookahead: bool, seed: int = 22) -> Dict[str, float]:
+    rng = random.Random(seed)
+    planner = LookaheadPlanner(expired=None)
+    idle = DriverGeoIndex(settings.DRIVER_INDEX_CELL_SIZE_KM)
+    driver_index.clear()
+    legs: Dict[int, Leg] = {}
+    pickup_minutes = 0.0
+    trip_minutes = 0.0
+    finished_at = 0.0
+    for driver_id in range(DRIVERS):
+        position = (ORIGIN[0] + rng.uniform(0, AREA_DEGREES), ORIGIN[1] + rng.uniform(0, AREA_DEGREES))
+        idle.update(driver_id, *position)
+        driver_index.update(driver_id, *position)
+
+    events: List[Tuple[float, int, str, int, int]] = [(ride.requested_at, ride.id, "request", ride.id, -1) for ride in rides]
+    heapq.heapify(events)
+    waiting: Dict[int, SimRide] = {}
+    waits: List[float] = []
+    abandoned = 0
+
+    def drive(now: float, driver_id: int, origin, target, kind: str, ride_id: int) -> None:
+        nonlocal pickup_minutes, trip_minutes
+        duration = travel_minutes(origin[0], origin[1], target[0], target[1])
+        legs[driver_id] = Leg(now, duration, origin, target)
+        if kind == "pickup":
+            pickup_minutes += duration
+        else:
+            trip_minutes += duration
+        heapq.heappush(events, (now + duration, ride_id, kind, ride_id, driver_id))
+
+    def dispatch(now: float, driver_id: int, ride: SimRide) -> None:
+        idle.remove(driver_id)
+        origin = driver_index.get(driver_id)
+        drive(now, driver_id, origin, (ride.pickup_latitude, ride.pickup_longitude), "pickup", ride.id)
+
+    def refresh_positions(now: float) -> None:
+        for driver_id, leg in legs.items():
+            driver_index.update(driver_id, *leg.position(now))
+
+    while events:
+        now, _, kind, ride_id, driver_id = heapq.heappop(events)
+        ride = rides[ride_id]
+        finished_at = now
+
+        if kind == "request":
+            refresh_positions(now)
+            nearest = idle.nearest(ride.pickup_latitude, ride.pickup_longitude, 1, settings.MATCHING_MAX_DISTANCE_KM)
+            free_minutes = None
+            if nearest:
+                position = idle.get(nearest[0][0])
+                free_minutes = travel_minutes(position[0], position[1], ride.pickup_latitude, ride.pickup_longitude)
+            if lookahead and planner.chain_if_sooner(ride, free_minutes) is not None:
+                continue
+            if nearest:
+                dispatch(now, nearest[0][0], ride)
+            else:
+                waiting[ride.id] = ride
+
+        elif kind == "pickup":
+            waits.append(now - ride.requested_at)
+            origin = (ride.pickup_latitude, ride.pickup_longitude)
+            planner.track(ride._replace(driver_id=driver_id))
+            drive(now, driver_id, origin, (ride.destination_latitude, ride.destination_longitude), "dropoff", ride.id)
+
+        elif kind == "dropoff":
+            del legs[driver_id]
+            position = (ride.destination_latitude, ride.destination_longitude)
+            driver_index.update(driver_id, *position)
+            chained = planner.release(driver_id)
+            if chained is not None:
+                drive(now, driver_id, position, (rides[chained].pickup_latitude, rides[chained].pickup_longitude),
+                      "pickup", chained)
+                continue
+            idle.update(driver_id, *position)
+            # Riders who gave up are dropped; the longest waiting nearby goes first
+            for waiting_id in list(waiting):
+                if now - waiting[waiting_id].requested_at > PATIENCE_MINUTES:
+                    del waiting[waiting_id]
+                    abandoned += 1
+            for waiting_ride in sorted(waiting.values(), key=lambda r: r.requested_at):
+                distance_km = haversine_km(position[0], position[1], waiting_ride.pickup_latitude, waiting_ride.pickup_longitude)
+                if distance_km <= settings.MATCHING_MAX_DISTANCE_KM:
+                    del waiting[waiting_ride.id]
+                    dispatch(now, driver_id, waiting_ride)
+                    break
+
+    abandoned += len(waiting)
+    wait_array = np.array(waits)
+    return {
+        "served": len(waits) / len(rides),
+        "abandoned": abandoned,
+        "wait_mean": float(wait_array.mean()),
+        "wait_p90": float(np.percentile(wait_array, 90)),
+        "utilisation": trip_minutes / (DRIVERS * finished_at),
+        "pickup_minutes": pickup_minutes / len(waits),
+        "chained": planner.chained,
+    }
+
+
+def main() -> None:
+    rides = ride_stream(random.Random(22))
+    print(f"{DRIVERS} drivers, {len(rides)} rides over {SIM_MINUTES} min ({RIDES_PER_MINUTE:.0f}/min)")
+    print(f"{'matching':10} {'served':>7} {'abandoned':>9} {'wait min':>8} {'p90 min':>8} {'util':>6} {'empty min':>9} {'chained':>7}")
+    for name, enabled in (("greedy", False), ("lookahead", True)):
+        result = simulate(rides, enabled)
+        print(f"{name:10} {result['served']:7.1%} {result['abandoned']:9d} {result['wait_mean']:8.1f} "
+              f"{result['wait_p90']:8.1f} {result['utilisation']:6.1%} "
+              f"{result['pickup_minutes']:9.1f} {result['chained']:7d}")
+
+
+if __name__ == "__main__":
+    main()
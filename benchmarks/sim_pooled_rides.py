@@ -0,0 +1,183 @@
+"""
+Pooled ride simulation: vehicles drive their stop sequences in fixed time
+steps while pooled requests arrive. Each request is inserted into a
+vehicle already on a pooled route when one fits (PoolPlanner), otherwise
+it starts a new route with the nearest idle vehicle. The same ride stream
+is replayed with one rider per vehicle for comparison.
+
+Reports vehicle-km driven (and saved by pooling), rider wait and detour,
+and matching latency per request.
+
+    python -m benchmarks.sim_pooled_rides
+"""
+import random
+import time
+from typing import Dict, List, NamedTuple, Optional
+
+import numpy as np
+
+from app.core.config import settings
+from app.services.ride_matching.distance import haversine_km
+from app.services.ride_matching.geo_index import DriverGeoIndex, driver_index
+from app.services.ride_matching.pooling import DROPOFF, PICKUP, PoolPlanner
+from app.services.tracking.eta import DEFAULT_ROUTE_FACTOR
+
+
+VEHICLES = 300
+RIDES_PER_MINUTE = 12.0
+SIM_MINUTES = 120
+STEP_SECONDS = 10.0
+AREA_DEGREES = 0.12  # about 13 km across
+PATIENCE_MINUTES = 5.0
+SPEED_KMH = settings.SPEED_PROFILE_DEFAULT_KMH
+ORIGIN = (12.90, 77.52)
+
+
+class SimRide(NamedTuple):
+    id: int
+    requested_at: float
+    pickup_latitude: float
+    pickup_longitude: float
+    destination_latitude: float
+    destination_longitude: float
+    pooled: bool = True
+    max_detour_minutes: Optional[float] = None
+
+
+def road_km(a, b) -> float:
+    return haversine_km(a[0], a[1], b[0], b[1]) * DEFAULT_ROUTE_FACTOR
+
+
+def ride_stream(rng: random.Random) -> List[SimRide]:
+    # Demand concentrates around a few hubs so trips overlap, as at peak
+    hubs = [(ORIGIN[0] + rng.uniform(0, AREA_DEGREES), ORIGIN[1] + rng.uniform(0, AREA_DEGREES)) for _ in range(6)]
+    rides, now = [], 0.0
+    while True:
+        now += rng.expovariate(RIDES_PER_MINUTE / 60.0)
+        if now >= SIM_MINUTES * 60:
+            return rides
+        start, end = rng.sample(hubs, 2)
+        rides.append(SimRide(
+            len(rides), now,
+            start[0] + rng.gauss(0, 0.008), start[1] + rng.gauss(0, 0.008),
+            end[0] + rng.gauss(0, 0.008), end[1] + rng.gauss(0, 0.008),
+        ))
+
+
+def simulate(rides: List[SimRide], pooled: bool, seed: int = 23) -> Dict[str, float]:
+    rng = random.Random(seed)
+    planner = PoolPlanner(max_wait_minutes=settings.POOL_MAX_WAIT_MINUTES)
+    idle = DriverGeoIndex(settings.DRIVER_INDEX_CELL_SIZE_KM)
+    driver_index.clear()
+    positions = {}
+    busy = set()
+    for driver_id in range(VEHICLES):
+        positions[driver_id] = (ORIGIN[0] + rng.uniform(0, AREA_DEGREES), ORIGIN[1] + rng.uniform(0, AREA_DEGREES))
+        idle.update(driver_id, *positions[driver_id])
+        driver_index.update(driver_id, *positions[driver_id])
+
+    step_km = SPEED_KMH * STEP_SECONDS / 3600.0
+    vehicle_km = 0.0
+    picked_at: Dict[int, float] = {}
+    waits: List[float] = []
+    detours: List[float] = []
+    latencies: List[float] = []
+    pending: List[SimRide] = []
+    upcoming = iter(rides)
+    next_ride = next(upcoming, None)
+    now = 0.0
+
+    while now < SIM_MINUTES * 60 or busy:
+        while next_ride is not None and next_ride.requested_at <= now:
+            pending.append(next_ride)
+            next_ride = next(upcoming, None)
+
+        # Match waiting requests (oldest first)
+        still_pending = []
+        for ride in pending:
+            started = time.perf_counter()
+            options = planner.plan(ride, now) if pooled else []
+            driver_id = options[0].driver_id if options else None
+            if driver_id is None:
+                nearest = idle.nearest(ride.pickup_latitude, ride.pickup_longitude, 1, settings.MATCHING_MAX_DISTANCE_KM)
+                driver_id = nearest[0][0] if nearest else None
+            if driver_id is not None:
+                idle.remove(driver_id)
+                busy.add(driver_id)
+                planner.commit(driver_id, ride, now)
+            latencies.append((time.perf_counter() - started) * 1000.0)
+            if driver_id is None and now - ride.requested_at < PATIENCE_MINUTES * 60:
+                still_pending.append(ride)
+        pending = still_pending
+
+        # Drive every busy vehicle along its stops for one step
+        for driver_id in list(busy):
+            budget = step_km
+            position = positions[driver_id]
+            while budget > 0:
+                stops = planner.route(driver_id)
+                if not stops:
+                    break
+                stop = stops[0]
+                target = (stop.latitude, stop.longitude)
+                distance = road_km(position, target)
+                if distance > budget:
+                    fraction = budget / distance
+                    position = (position[0] + (target[0] - position[0]) * fraction,
+                                position[1] + (target[1] - position[1]) * fraction)
+                    vehicle_km += budget
+                    break
+                vehicle_km += distance
+                budget -= distance
+                position = target
+                ride = rides[stop.ride_id]
+                if stop.kind == PICKUP:
+                    planner.picked_up(stop.ride_id)
+                    picked_at[ride.id] = now
+                    waits.append((now - ride.requested_at) / 60.0)
+                elif stop.kind == DROPOFF:
+                    planner.finish(stop.ride_id)
+                    direct = road_km((ride.pickup_latitude, ride.pickup_longitude),
+                                     (ride.destination_latitude, ride.destination_longitude)) / SPEED_KMH * 60.0
+                    detours.append((now - picked_at[ride.id]) / 60.0 - direct)
+            positions[driver_id] = position
+            driver_index.update(driver_id, *position)
+            if not planner.route(driver_id):
+                busy.discard(driver_id)
+                idle.update(driver_id, *position)
+        now += STEP_SECONDS
+
+    latency = np.array(latencies)
+    served = len(detours)
+    return {
+        "served": served,
+        "vehicle_km": vehicle_km,
+        "km_per_ride": vehicle_km / served,
+        "wait_mean": float(np.mean(waits)),
+        "detour_mean": float(np.mean(detours)),
+        "detour_p90": float(np.percentile(detours, 90)),
+        "latency_p50": float(np.percentile(latency, 50)),
+        "latency_p99": float(np.percentile(latency, 99)),
+        "riders_per_route": served / max(1, planner.started),
+    }
+
+
+def main() -> None:
+    rides = ride_stream(random.Random(23))
+    print(f"{VEHICLES} vehicles, {len(rides)} pooled requests over {SIM_MINUTES} min, "
+          f"capacity {settings.POOL_CAPACITY}, detour tolerance {settings.POOL_DEFAULT_MAX_DETOUR_MINUTES:.0f} min")
+    print(f"{'matching':8} {'served':>6} {'vehicle km':>10} {'km/ride':>7} {'wait min':>8} "
+          f"{'detour min':>10} {'p90':>5} {'riders/route':>12} {'match p50 ms':>12} {'p99 ms':>7}")
+    results = {}
+    for name, pooled in (("solo", False), ("pooled", True)):
+        result = results[name] = simulate(rides, pooled)
+        print(f"{name:8} {result['served']:6d} {result['vehicle_km']:10.0f} {result['km_per_ride']:7.2f} "
+              f"{result['wait_mean']:8.1f} {result['detour_mean']:10.1f} {result['detour_p90']:5.1f} "
+              f"{result['riders_per_route']:12.2f} {result['latency_p50']:12.3f} {result['latency_p99']:7.3f}")
+    saved = 1.0 - results["pooled"]["km_per_ride"] / results["solo"]["km_per_ride"]
+    print(f"vehicle-km saved per ride by pooling: {saved:.1%} "
+          f"({results['solo']['vehicle_km'] - results['pooled']['vehicle_km']:.0f} km in total)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,160 @@
+"""
+Concurrency stress test for driver reservations: many matchers assign a
+small pool of drivers to a stream of rides in parallel, drivers finish
+rides and become free again, and the database is checked throughout for a
+driver holding two active rides. The same load is also run through a naive
+read-then-save assignment to show the race the reservations close.
+
+    python -m benchmarks.stress_driver_reservations
+"""
+import asyncio
+import os
+import random
+import tempfile
+import time
+
+from tortoise import Tortoise
+from tortoise.functions import Count
+
+from app.models.ride import Ride, RideStatus
+from app.models.user import User, UserRole
+from app.services.location.store import location_store
+from app.services.ride_matching.matching import find_nearby_drivers, match_ride_with_driver, rank_drivers
+from app.services.ride_matching.reservations import ACTIVE_RIDE_STATUSES, driver_reservations
+
+
+DRIVERS = 20
+RIDES = 600
+MATCHERS = 50
+CENTER = (12.97, 77.59)
+# Drivers ping again this often, well inside LOCATION_TTL_SECONDS
+PING_SECONDS = 5.0
+# A ride still unmatched after this many tries fails the run
+MAX_ATTEMPTS_PER_RIDE = 5000
+
+
+async def naive_match(ride_id: int) -> bool:
+    # The pre-reservation logic: pick the best free driver, then save
+    ride = await Ride.get(id=ride_id)
+    drivers = await find_nearby_drivers(ride.pickup_latitude, ride.pickup_longitude)
+    if not drivers:
+        return False
+    ranked = await rank_drivers(drivers, ride)
+    ride.driver_id = ranked[0][0].id
+    ride.status = RideStatus.ACCEPTED
+    await ride.save()
+    return True
+
+
+async def reserved_match(ride_id: int) -> bool:
+    return await match_ride_with_driver(ride_id) is not None
+
+
+async def double_booked() -> int:
+    """
+    Drivers currently holding more than one active ride.
+    """
+    rows = await Ride.filter(status__in=ACTIVE_RIDE_STATUSES, driver_id__isnull=False) \
+        .annotate(active=Count("id")).group_by("driver_id").values("driver_id", "active")
+    return sum(1 for row in rows if row["active"] > 1)
+
+
+async def run(name: str, match) -> None:
+    rng = random.Random(21)
+    with tempfile.TemporaryDirectory() as directory:
+        await Tortoise.init(
+            db_url=f"sqlite://{os.path.join(directory, 'stress.db')}",
+            modules={"models": ["app.models.user", "app.models.ride", "app.models.payment"]},
+        )
+        await Tortoise.generate_schemas()
+
+        rider = await User.create(email="rider@example.com", hashed_password="x", phone_number="100")
+        positions = {}
+        for i in range(DRIVERS):
+            driver = await User.create(
+                email=f"driver{i}@example.com", hashed_password="x", phone_number=f"2{i:03d}", role=UserRole.DRIVER
+            )
+            positions[driver.id] = (CENTER[0] + rng.uniform(-0.01, 0.01), CENTER[1] + rng.uniform(-0.01, 0.01))
+
+        async def ping() -> None:
+            for driver_id, (latitude, longitude) in positions.items():
+                location_store.record(driver_id, latitude, longitude)
+            await location_store.flush()
+
+        await ping()
+
+        ride_ids = asyncio.Queue()
+        for _ in range(RIDES):
+            ride = await Ride.create(
+                rider=rider,
+                pickup_latitude=CENTER[0] + rng.uniform(-0.01, 0.01),
+                pickup_longitude=CENTER[1] + rng.uniform(-0.01, 0.01),
+                pickup_address="pickup",
+                destination_latitude=CENTER[0],
+                destination_longitude=CENTER[1] + 0.05,
+                destination_address="destination",
+            )
+            ride_ids.put_nowait(ride.id)
+
+        matched = 0
+        worst = 0
+        attempts = {}
+        done = asyncio.Event()
+
+        async def matcher() -> None:
+            nonlocal matched
+            while not ride_ids.empty():
+                ride_id = ride_ids.get_nowait()
+                if await match(ride_id):
+                    matched += 1
+                    continue
+                attempts[ride_id] = attempts.get(ride_id, 0) + 1
+                if attempts[ride_id] >= MAX_ATTEMPTS_PER_RIDE:
+                    raise RuntimeError(f"Ride {ride_id} still unmatched after {MAX_ATTEMPTS_PER_RIDE} attempts")
+                # Retry later, once some driver is free again
+                await asyncio.sleep(0.01)
+                ride_ids.put_nowait(ride_id)
+
+        async def finisher() -> None:
+            # Drivers complete rides at random, freeing themselves up, and
+            # keep pinging so their positions stay fresh
+            last_ping = time.monotonic()
+            while not done.is_set():
+                if time.monotonic() - last_ping >= PING_SECONDS:
+                    await ping()
+                    last_ping = time.monotonic()
+                active = await Ride.filter(status=RideStatus.ACCEPTED).values_list("id", flat=True)
+                for ride_id in rng.sample(active, min(len(active), 5)):
+                    await Ride.filter(id=ride_id).update(status=RideStatus.COMPLETED)
+                await asyncio.sleep(0.005)
+
+        async def checker() -> None:
+            nonlocal worst
+            while not done.is_set():
+                worst = max(worst, await double_booked())
+                await asyncio.sleep(0.01)
+
+        start = time.perf_counter()
+        background = [asyncio.create_task(finisher()), asyncio.create_task(checker())]
+        await asyncio.gather(*(matcher() for _ in range(MATCHERS)))
+        seconds = time.perf_counter() - start
+        done.set()
+        await asyncio.gather(*background)
+        worst = max(worst, await double_booked())
+        await Tortoise.close_connections()
+
+    print(f"{name:12} {matched:8d} {matched / seconds:10.0f} {worst:14d}")
+    if name == "reserved":
+        assert worst == 0, "a driver held two active rides"
+
+
+def main() -> None:
+    print(f"{DRIVERS} drivers, {RIDES} rides, {MATCHERS} concurrent matchers")
+    print(f"{'assignment':12} {'matched':>8} {'matches/s':>10} {'double booked':>14}")
+    asyncio.run(run("naive", naive_match))
+    asyncio.run(run("reserved", reserved_match))
+    print("reservations:", driver_reservations.stats())
+
+
+if __name__ == "__main__":
+    main()
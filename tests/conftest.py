@@ -0,0 +1,26 @@
+import asyncio
+
+import pytest
+from tortoise import Tortoise
+
+
+MODELS = ["app.models.user", "app.models.ride", "app.models.payment"]
+
+
+@pytest.fixture
+def database():
+    """
+    Runs an async scenario against a fresh in-memory database.
+    """
+    def run(scenario):
+        async def wrapper():
+            await Tortoise.init(db_url="sqlite://:memory:", modules={"models": MODELS})
+            await Tortoise.generate_schemas()
+            try:
+                await scenario()
+            finally:
+                await Tortoise.close_connections()
+
+        asyncio.run(wrapper())
+
+    return run
@@ -0,0 +1,55 @@
+from app.core.config import settings
+from app.models.ride import Ride, RideStatus
+from app.models.user import User
+from app.services.dispatch.brokers import DispatchJob
+from app.services.dispatch.handlers import handle_match
+from app.services.ride_matching.batch_matching import MatchingWindow, matching_window, solve_assignment
+
+
+async def create_ride():
+    rider = await User.create(email="rider@example.com", hashed_password="x", phone_number="100")
+    return await Ride.create(
+        rider=rider,
+        pickup_latitude=12.97,
+        pickup_longitude=77.59,
+        pickup_address="pickup",
+        destination_latitude=13.0,
+        destination_longitude=77.6,
+        destination_address="destination",
+    )
+
+
+def test_assignment_uses_each_driver_once():
+    assignment = solve_assignment({1: [(10, 0.5), (11, 0.9)], 2: [(10, 0.4)]})
+    assert assignment == {1: (11, 0.9), 2: (10, 0.4)}
+
+
+def test_unmatched_ride_leaves_the_window_after_max_attempts(database):
+    async def scenario():
+        ride = await create_ride()
+        window = MatchingWindow(max_attempts=3)
+        window.submit(ride.id)
+        for _ in range(3):
+            # No drivers are indexed, so nothing matches
+            assert await window.flush() == {}
+        assert await window.flush() == {}
+        assert window.dropped == 1
+
+    database(scenario)
+
+
+def test_batch_match_job_is_done_only_once_the_ride_is_matched(database, monkeypatch):
+    async def scenario():
+        ride = await create_ride()
+        monkeypatch.setattr(settings, "MATCHING_MODE", "batch")
+        matching_window.start()
+        try:
+            job = DispatchJob(f"match:{ride.id}", "match", ride.id, 0, 1, token="a")
+            assert await handle_match(job) is False
+
+            await Ride.filter(id=ride.id).update(status=RideStatus.ACCEPTED)
+            assert await handle_match(job) is True
+        finally:
+            await matching_window.stop()
+
+    database(scenario)
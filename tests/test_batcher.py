@@ -0,0 +1,59 @@
+import asyncio
+
+import numpy as np
+import pytest
+
+from app.services.ml.batcher import MicroBatcher
+from app.services.ml.registry import ModelRegistry
+
+
+class SumModel:
+    """
+    Predicts the sum of each row, scaled, and records its batch sizes.
+    """
+
+    def __init__(self, scale=1.0):
+        self.scale = scale
+        self.batches = []
+
+    def predict(self, rows):
+        self.batches.append(len(rows))
+        return rows.sum(axis=1) * self.scale
+
+
+def test_concurrent_predictions_are_batched_and_routed_back():
+    async def scenario():
+        registry = ModelRegistry()
+        model = SumModel()
+        registry.set("fare", model)
+        batcher = MicroBatcher("fare", max_batch_size=4, max_wait_ms=50.0, max_concurrency=2, registry=registry)
+        try:
+            rows = [np.array([float(i), 1.0]) for i in range(10)]
+            predictions = await asyncio.gather(*(batcher.predict(row) for row in rows))
+        finally:
+            await batcher.stop()
+
+        assert predictions == [i + 1.0 for i in range(10)]
+        assert sorted(model.batches, reverse=True) == [4, 4, 2]
+
+    asyncio.run(scenario())
+
+
+def test_next_batch_uses_a_swapped_model_and_missing_models_fail():
+    async def scenario():
+        registry = ModelRegistry()
+        registry.set("fare", SumModel())
+        batcher = MicroBatcher("fare", max_batch_size=8, max_wait_ms=1.0, registry=registry)
+        try:
+            assert await batcher.predict([1.0, 2.0]) == 3.0
+            registry.set("fare", SumModel(scale=10.0))
+            assert await batcher.predict([1.0, 2.0]) == 30.0
+
+            other = MicroBatcher("fraud", max_wait_ms=1.0, registry=registry)
+            with pytest.raises(LookupError):
+                await other.predict([1.0])
+            await other.stop()
+        finally:
+            await batcher.stop()
+
+    asyncio.run(scenario())
@@ -0,0 +1,95 @@
+import asyncio
+import time
+
+import numpy as np
+
+from app.services.ride_matching.candidate_cache import CandidateCache
+from app.services.ride_matching.driver_stats import DriverStatsStore
+from app.services.ride_matching.geo_index import DriverGeoIndex
+from app.services.ride_matching.ranking import DriverCandidates, rank_candidates
+
+PICKUP = (12.97, 77.59)
+
+
+def populated(now, count=60, seed=11):
+    index = DriverGeoIndex()
+    stats = DriverStatsStore()
+    rng = np.random.default_rng(seed)
+    for driver_id in range(count):
+        index.update(driver_id, PICKUP[0] + rng.normal(0, 0.02), PICKUP[1] + rng.normal(0, 0.02))
+        stats.set_rating(driver_id, 3.0 + rng.random() * 2.0)
+        stats.mark_idle(driver_id, at=now - rng.random() * 600.0)
+    return index, stats
+
+
+def make_cache(index, stats, busy):
+    async def available(driver_ids):
+        return [driver_id for driver_id in driver_ids if driver_id not in busy]
+
+    return CandidateCache(
+        available, cell_size_km=1.0, top_k=20, max_staleness_seconds=30.0, refresh_seconds=3600.0,
+        min_move_meters=50.0, max_distance_km=5.0, index=index, stats=stats
+    )
+
+
+def test_cached_candidates_match_a_live_query():
+    async def scenario():
+        now = time.time()
+        index, stats = populated(now)
+        busy = {3, 7}
+        cache = make_cache(index, stats, busy)
+        cache.start()
+        try:
+            assert cache.lookup(*PICKUP, now=now) is None
+            assert await cache.refresh(now=now) == 1
+            assert cache.lookup(*PICKUP, now=now) is not None
+
+            found = cache.nearby(*PICKUP, max_distance_km=5.0, limit=8)
+            live = [
+                driver_id for driver_id, _ in index.nearest(*PICKUP, k=10, max_distance_km=5.0)
+                if driver_id not in busy
+            ][:8]
+            assert found == live
+
+            scores = cache.scores(*PICKUP, found)
+            candidates = DriverCandidates.build(found, *PICKUP, index=index, stats=stats, now=now)
+            expected = dict(rank_candidates(candidates, max_distance_km=5.0))
+            assert np.allclose(scores, [expected[position] for position in range(len(found))])
+        finally:
+            await cache.stop()
+
+    asyncio.run(scenario())
+
+
+def test_lists_are_rebuilt_when_a_listed_driver_changes_or_they_age():
+    async def scenario():
+        now = time.time()
+        index, stats = populated(now)
+        busy = set()
+        cache = make_cache(index, stats, busy)
+        cache.start()
+        try:
+            cache.lookup(*PICKUP, now=now)
+            await cache.refresh(now=now)
+            nearest = cache.nearby(*PICKUP, max_distance_km=5.0, limit=1)[0]
+
+            # Pings that barely move a driver do not trigger a rebuild
+            position = index.get(nearest)
+            index.update(nearest, position[0] + 0.0001, position[1])
+            await cache.refresh(now=now + 1.0)
+            index.update(nearest, position[0] + 0.0002, position[1])
+            assert await cache.refresh(now=now + 2.0) == 0
+
+            busy.add(nearest)
+            stats.mark_busy(nearest)
+            assert await cache.refresh(now=now + 3.0) == 1
+            assert nearest not in cache.nearby(*PICKUP, max_distance_km=5.0, limit=8)
+
+            assert await cache.refresh(now=now + 10.0) == 0
+            assert await cache.refresh(now=now + 20.0) == 1
+            assert cache.lookup(*PICKUP, now=now + 60.0) is None
+            assert cache.stats()["misses"] == 2
+        finally:
+            await cache.stop()
+
+    asyncio.run(scenario())
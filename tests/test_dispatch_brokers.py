@@ -0,0 +1,76 @@
+import asyncio
+import os
+
+import pytest
+
+from app.services.dispatch.brokers import (
+    DispatchJob,
+    InMemoryDispatchBroker,
+    RedisDispatchBroker,
+    SQLiteDispatchBroker,
+)
+
+
+NOW = 1_700_000_000.0
+LEASE = 30.0
+
+
+def make_job(kind="match", ride_id=1, priority=1, token="a"):
+    return DispatchJob(f"{kind}:{ride_id}", kind, ride_id, 0, priority, token=token)
+
+
+@pytest.fixture(params=["memory", "sqlite"])
+def broker(request, tmp_path):
+    if request.param == "memory":
+        yield InMemoryDispatchBroker()
+    else:
+        broker = SQLiteDispatchBroker(os.path.join(str(tmp_path), "dispatch.db"))
+        yield broker
+        asyncio.run(broker.close())
+
+
+def test_copy_enqueued_while_claimed_survives_the_first_ack(broker):
+    async def scenario():
+        await broker.enqueue(make_job(token="first"), NOW)
+        claimed = await broker.claim([0], NOW, LEASE)
+        assert claimed.token == "first" and claimed.attempts == 1
+
+        # Enqueued again while the first copy runs
+        await broker.enqueue(make_job(token="second"), NOW)
+        await broker.ack(claimed)
+        assert (await broker.stats())["jobs"] == 1
+
+        again = await broker.claim([0], NOW, LEASE)
+        assert again.token == "second"
+        await broker.ack(again)
+        assert (await broker.stats())["jobs"] == 0
+
+    asyncio.run(scenario())
+
+
+def test_claims_by_priority_and_settles_retry_and_bury(broker):
+    async def scenario():
+        await broker.enqueue(make_job("match", 1, priority=1), NOW - 10)
+        await broker.enqueue(make_job("sos", 2, priority=0), NOW)
+
+        first = await broker.claim([0], NOW, LEASE)
+        assert first.kind == "sos"
+        second = await broker.claim([0], NOW, LEASE)
+        assert second.kind == "match"
+        # Both are leased now
+        assert await broker.claim([0], NOW, LEASE) is None
+
+        await broker.retry(second, NOW + 5)
+        assert await broker.claim([0], NOW + 1, LEASE) is None
+        retried = await broker.claim([0], NOW + 5, LEASE)
+        assert retried.id == second.id and retried.attempts == 2
+
+        await broker.bury(first)
+        assert await broker.stats() == {"jobs": 1, "dead": 1}
+
+    asyncio.run(scenario())
+
+
+def test_redis_job_body_round_trips_with_its_token():
+    job = make_job(token="abc123")._replace(attempts=3)
+    assert RedisDispatchBroker._decode(job.id, RedisDispatchBroker._encode(job).encode(), 3) == job
@@ -0,0 +1,51 @@
+import asyncio
+
+import numpy as np
+from geopy.distance import geodesic
+
+from app.schemas.ride import RideEstimateTrip
+from app.services.ride_matching.distance import equirectangular_km_array, haversine_km, haversine_km_array
+from app.services.ride_matching.fare_estimator import estimate_fare, estimate_fares_batch
+
+
+def random_points(count, seed, spread):
+    rng = np.random.default_rng(seed)
+    return 12.97 + (rng.random((count, 2)) - 0.5) * spread, 77.59 + (rng.random((count, 2)) - 0.5) * spread
+
+
+def test_array_kernels_agree_with_scalar_and_geodesic_distances():
+    latitudes, longitudes = random_points(100, seed=1, spread=0.4)
+    distances = haversine_km_array(latitudes[:, 0], longitudes[:, 0], latitudes[:, 1], longitudes[:, 1])
+    flat = equirectangular_km_array(latitudes[:, 0], longitudes[:, 0], latitudes[:, 1], longitudes[:, 1])
+
+    for i in range(len(distances)):
+        a, b = (latitudes[i, 0], longitudes[i, 0]), (latitudes[i, 1], longitudes[i, 1])
+        assert abs(distances[i] - haversine_km(*a, *b)) < 1e-9
+        # The sphere is within about half a percent of the ellipsoid
+        assert abs(distances[i] - geodesic(a, b).km) <= 0.006 * geodesic(a, b).km
+    assert np.allclose(flat, distances, rtol=1e-3)
+
+    # Scalars broadcast against arrays
+    to_one = haversine_km_array(latitudes[:, 0], longitudes[:, 0], 12.97, 77.59)
+    assert to_one.shape == (100,)
+    assert haversine_km_array(12.97, 77.59, 12.97, 77.59) == 0.0
+
+
+def test_batch_estimates_match_estimating_each_trip():
+    async def scenario():
+        latitudes, longitudes = random_points(20, seed=2, spread=0.3)
+        trips = [
+            RideEstimateTrip(
+                pickup_latitude=latitudes[i, 0],
+                pickup_longitude=longitudes[i, 0],
+                destination_latitude=latitudes[i, 1],
+                destination_longitude=longitudes[i, 1],
+            )
+            for i in range(20)
+        ]
+        batch = await estimate_fares_batch(trips)
+        single = [await estimate_fare(**trip.dict()) for trip in trips]
+        assert batch == single
+        assert await estimate_fares_batch([]) == []
+
+    asyncio.run(scenario())
@@ -0,0 +1,59 @@
+from types import SimpleNamespace
+
+from app.models.ride import RideStatus
+from app.services.ride_matching.distance import haversine_km
+from app.services.tracking.eta import EtaTracker
+
+
+def make_ride(status):
+    return SimpleNamespace(
+        status=status,
+        pickup_latitude=12.97,
+        pickup_longitude=77.59,
+        destination_latitude=13.07,
+        destination_longitude=77.59,
+        estimated_distance_km=14.4,
+        estimated_duration_minutes=36,
+    )
+
+
+def test_accepted_ride_starts_from_the_way_to_the_pickup():
+    ride = make_ride(RideStatus.ACCEPTED)
+    # About 2.2 km from the pickup at 24 km/h
+    tracker = EtaTracker.for_ride(ride, driver_position=(12.95, 77.59))
+    assert tracker.minutes == 8
+
+    assert EtaTracker.for_ride(ride).minutes == 0
+    assert EtaTracker.for_ride(make_ride(RideStatus.IN_PROGRESS)).minutes == 36
+
+
+def test_remaining_distance_follows_the_driver():
+    tracker = EtaTracker(target=(13.0, 77.59), route_factor=1.0, speed_kmh=30.0)
+    tracker.update(12.90, 77.59, 1000.0)
+    start_km = tracker.remaining_km
+
+    # Heading straight for the target matches measuring from scratch
+    tracker.update(12.91, 77.59, 1120.0)
+    assert abs(tracker.remaining_km - (start_km - 1.112)) < 0.01
+
+    # A GPS jump is measured afresh instead of being taken off
+    tracker.update(12.99, 77.59, 1125.0)
+    assert abs(tracker.remaining_km - 1.112) < 0.01
+
+
+def test_driver_heading_away_does_not_shorten_the_eta():
+    target = (12.97, 77.59)
+    tracker = EtaTracker(target=target, route_factor=1.0, speed_kmh=36.0)
+    latitude, timestamp = 12.97 - 0.065, 1000.0
+    tracker.update(latitude, 77.59, timestamp)
+    first = tracker.minutes
+
+    # 36 km/h straight away from the pickup, a ping every 4 seconds
+    for _ in range(200):
+        latitude -= 0.04 / 111.195
+        timestamp += 4.0
+        tracker.update(latitude, 77.59, timestamp)
+        real_km = haversine_km(latitude, 77.59, target[0], target[1])
+        assert abs(tracker.remaining_km - real_km) < 0.05
+
+    assert tracker.minutes > first
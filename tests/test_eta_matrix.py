@@ -0,0 +1,52 @@
+import asyncio
+
+import numpy as np
+
+from app.services.routing.matrix import TravelTimeMatrix
+from app.services.routing.service import RoadRouter
+from benchmarks.road_grid import grid_city
+
+
+def test_matrix_only_searches_uncached_cell_pairs():
+    async def scenario():
+        router = RoadRouter()
+        engine = router.use(grid_city(rows=40, cols=40))
+        graph = engine.graph
+        matrix = TravelTimeMatrix(router, cell_size_km=0.05)
+        rng = np.random.default_rng(4)
+        drivers = rng.integers(0, graph.node_count, 10)
+        pickups = rng.integers(0, graph.node_count, 2)
+
+        times = await matrix.many_to_many(
+            graph.latitudes[drivers], graph.longitudes[drivers], graph.latitudes[pickups], graph.longitudes[pickups]
+        )
+        expected = engine.travel_time_matrix(
+            graph.latitudes[drivers], graph.longitudes[drivers], graph.latitudes[pickups], graph.longitudes[pickups]
+        )
+        assert np.allclose(times, expected)
+        assert matrix.stats()["misses"] == 20
+
+        # Same cells again: answered from the cache
+        to_first = await matrix.many_to_one(
+            graph.latitudes[drivers], graph.longitudes[drivers], graph.latitudes[pickups[0]], graph.longitudes[pickups[0]]
+        )
+        assert np.allclose(to_first, expected[:, 0])
+        assert matrix.stats()["misses"] == 20
+
+        # One new driver is one new row
+        extra = np.append(drivers, (drivers[0] + 1) % graph.node_count)
+        await matrix.many_to_many(
+            graph.latitudes[extra], graph.longitudes[extra], graph.latitudes[pickups], graph.longitudes[pickups]
+        )
+        assert matrix.stats()["misses"] == 22
+
+    asyncio.run(scenario())
+
+
+def test_matrix_without_a_road_graph_returns_none():
+    async def scenario():
+        matrix = TravelTimeMatrix(RoadRouter())
+        assert not matrix.available
+        assert await matrix.many_to_one([12.97], [77.59], 12.98, 77.60) is None
+
+    asyncio.run(scenario())
@@ -0,0 +1,63 @@
+import asyncio
+import threading
+import time
+
+import pytest
+
+from app.core.executor import CpuExecutor, ExecutorSaturated, _call_cpu_bound
+from app.services.ride_matching.distance import haversine_km
+from app.services.ride_matching.fare_estimator import measure_trip
+
+
+def test_work_runs_off_the_event_loop_and_backlog_is_bounded():
+    async def scenario():
+        executor = CpuExecutor("test", kind="thread", max_workers=1, max_queue=1)
+        release = threading.Event()
+        ticks = []
+
+        async def heartbeat():
+            while not release.is_set():
+                ticks.append(time.monotonic())
+                await asyncio.sleep(0.005)
+
+        beating = asyncio.create_task(heartbeat())
+        running = [asyncio.create_task(executor.run(release.wait, 1.0)) for _ in range(2)]
+        await asyncio.sleep(0.05)
+
+        with pytest.raises(ExecutorSaturated):
+            await executor.run(threading.get_ident)
+        assert executor.stats()["rejected"] == 1
+        # The loop kept turning while the worker was blocked
+        assert len(ticks) >= 5
+
+        release.set()
+        await asyncio.gather(*running, beating)
+        assert await executor.run(threading.get_ident) != threading.get_ident()
+        assert executor.stats()["completed"] == 3
+        assert executor.stats()["pending"] == 0
+        executor.shutdown()
+
+    asyncio.run(scenario())
+
+
+def test_cpu_bound_functions_run_by_name_in_worker_processes():
+    async def scenario():
+        executor = CpuExecutor("test-process", kind="process", max_workers=1, max_queue=0)
+        try:
+            assert await executor.run(haversine_km, 12.97, 77.59, 13.0, 77.6) == haversine_km(12.97, 77.59, 13.0, 77.6)
+
+            trip = (12.97, 77.59, 13.0, 77.6)
+            assert await executor.run(
+                _call_cpu_bound, measure_trip.__module__, measure_trip.__qualname__, trip, {}
+            ) == measure_trip.__wrapped__(*trip)
+            # The decorated coroutine runs the same body on the shared executor
+            assert await measure_trip(*trip) == measure_trip.__wrapped__(*trip)
+        finally:
+            executor.shutdown()
+
+    asyncio.run(scenario())
+
+
+def test_unknown_executor_kind_is_rejected():
+    with pytest.raises(ValueError):
+        CpuExecutor("test", kind="fiber")
@@ -0,0 +1,70 @@
+import asyncio
+
+from app.schemas.ride import RideEstimate
+from app.services.ride_matching import fare_estimator
+from app.services.ride_matching.fare_cache import FareEstimateCache
+from app.services.ride_matching.surge import SurgeEngine
+
+PICKUP = (12.97, 77.59)
+DESTINATION = (13.02, 77.64)
+
+
+def surge_cell(engine, demand, supply, now):
+    for index in range(demand):
+        engine.record_request(len(engine._requests) + index + 1, *PICKUP, at=now)
+    for index in range(supply):
+        engine.record_driver(len(engine._drivers) + index + 1, *PICKUP, at=now)
+    return engine.recompute(now)
+
+
+def test_concurrent_misses_share_one_computation():
+    async def scenario():
+        cache = FareEstimateCache()
+        calls = []
+
+        async def compute():
+            calls.append(1)
+            await asyncio.sleep(0.01)
+            return RideEstimate(estimated_fare=100, estimated_duration_minutes=10, estimated_distance_km=5.0)
+
+        key = cache.key_for(*PICKUP, *DESTINATION, surge_epoch=0)
+        estimates = await asyncio.gather(*(cache.get_or_compute(key, compute) for _ in range(5)))
+
+        assert len(calls) == 1
+        assert all(estimate is estimates[0] for estimate in estimates)
+        assert cache.stats()["coalesced"] == 4
+
+        # Nearby endpoints share the key, a new surge epoch does not
+        assert cache.key_for(PICKUP[0] + 0.0001, PICKUP[1], *DESTINATION, surge_epoch=0) == key
+        assert cache.key_for(*PICKUP, *DESTINATION, surge_epoch=1) != key
+
+    asyncio.run(scenario())
+
+
+def test_rider_keeps_the_quote_shown_before_surge_moved(monkeypatch):
+    async def scenario():
+        engine = SurgeEngine(sensitivity=0.5, smoothing=1.0, step=0.1, max_factor=3.0)
+        monkeypatch.setattr(fare_estimator, "surge_engine", engine)
+        cache = FareEstimateCache()
+
+        def quote(rider_id, honour=True):
+            return fare_estimator.quote_fare(
+                *PICKUP, *DESTINATION, rider_id=rider_id, honour_previous_epoch=honour, cache=cache
+            )
+
+        shown = await quote(rider_id=1)
+        surge_cell(engine, demand=4, supply=1, now=1000.0)
+        assert engine.surge_for(*PICKUP).factor == 2.5
+
+        # The rider who saw the calm quote books at that price, nobody else does
+        assert await quote(rider_id=1) == shown
+        surged = await quote(rider_id=2)
+        assert surged.estimated_fare > shown.estimated_fare
+        assert await quote(rider_id=3, honour=False) == surged
+
+        # Only the previous epoch is honoured
+        surge_cell(engine, demand=10, supply=0, now=1001.0)
+        assert engine.surge_for(*PICKUP).previous_epoch == 1
+        assert (await quote(rider_id=1)).estimated_fare > surged.estimated_fare
+
+    asyncio.run(scenario())
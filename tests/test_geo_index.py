@@ -0,0 +1,37 @@
+import math
+import random
+
+from app.services.ride_matching.distance import EARTH_RADIUS_KM, haversine_km
+from app.services.ride_matching.geo_index import DriverGeoIndex
+
+
+KM_PER_LATITUDE_DEGREE = EARTH_RADIUS_KM * math.pi / 180
+
+
+def test_ring_search_does_not_stop_before_a_closer_driver():
+    index = DriverGeoIndex(cell_size_km=1.0)
+    # Query at the northern edge of its cell
+    row = math.floor(12.97 / index.cell_degrees)
+    latitude = (row + 1) * index.cell_degrees - 1e-9
+    index.update(1, latitude + 0.9990 / KM_PER_LATITUDE_DEGREE, 77.59)
+    index.update(2, latitude - 0.9995 / KM_PER_LATITUDE_DEGREE, 77.59)
+
+    assert [driver_id for driver_id, _ in index.nearest(latitude, 77.59, k=1, max_distance_km=5.0)] == [1]
+
+
+def test_nearest_matches_brute_force():
+    rng = random.Random(1)
+    index = DriverGeoIndex(cell_size_km=0.5)
+    drivers = {}
+    for driver_id in range(500):
+        drivers[driver_id] = (12.97 + rng.uniform(-0.05, 0.05), 77.59 + rng.uniform(-0.05, 0.05))
+        index.update(driver_id, *drivers[driver_id])
+
+    for _ in range(50):
+        latitude, longitude = 12.97 + rng.uniform(-0.05, 0.05), 77.59 + rng.uniform(-0.05, 0.05)
+        expected = sorted(
+            (haversine_km(latitude, longitude, *position), driver_id) for driver_id, position in drivers.items()
+        )
+        expected = [driver_id for distance, driver_id in expected if distance <= 2.0][:5]
+        found = [driver_id for driver_id, _ in index.nearest(latitude, longitude, k=5, max_distance_km=2.0)]
+        assert found == expected
@@ -0,0 +1,63 @@
+import asyncio
+import time
+
+from app.services.location.backends import InMemoryLocationBackend
+from app.services.location.store import LocationStore
+from app.services.ride_matching.geo_index import DriverGeoIndex
+
+
+class SlowBackend(InMemoryLocationBackend):
+    """
+    Holds every write until released, like a Redis round-trip in flight.
+    """
+
+    def __init__(self):
+        super().__init__()
+        self.release = asyncio.Event()
+
+    async def write_many(self, locations):
+        await self.release.wait()
+        await super().write_many(locations)
+
+
+def test_driver_removed_during_a_flush_stays_removed():
+    async def scenario():
+        backend = SlowBackend()
+        store = LocationStore(backend, index=DriverGeoIndex())
+        store.record(7, 12.97, 77.59, time.time() - 1)
+        flush = asyncio.create_task(store.flush())
+        await asyncio.sleep(0)
+
+        await store.remove(7)
+        backend.release.set()
+        await flush
+
+        assert 7 not in store.index
+        assert not store.is_fresh(7)
+        assert await backend.read_many([7]) == {}
+
+        # Coming back online is a newer ping
+        store.record(7, 12.98, 77.60)
+        await store.flush()
+        assert 7 in store.index
+
+    asyncio.run(scenario())
+
+
+def test_ping_flushed_after_a_sync_reaches_other_workers():
+    async def scenario():
+        backend = InMemoryLocationBackend()
+        writer = LocationStore(backend, index=DriverGeoIndex())
+        reader = LocationStore(backend, index=DriverGeoIndex())
+
+        # Stamped before the reader's sync, but written after it
+        stamped = time.time() - 1
+        await reader.sync_from_backend()
+        writer.record(7, 12.97, 77.59, stamped)
+        await writer.flush()
+
+        await reader.sync_from_backend()
+        assert 7 in reader.index
+        assert reader.is_fresh(7)
+
+    asyncio.run(scenario())
@@ -0,0 +1,77 @@
+import time
+from types import SimpleNamespace
+
+from app.services.ride_matching import lookahead
+from app.services.ride_matching.geo_index import DriverGeoIndex
+from app.services.ride_matching.lookahead import LookaheadPlanner, travel_minutes
+
+PICKUP = (12.97, 77.59)
+
+
+async def never_expires(ride_id):
+    raise AssertionError("no chain should be released here")
+
+
+def ride(ride_id, driver_id=None, pickup=PICKUP, destination=PICKUP):
+    return SimpleNamespace(
+        id=ride_id,
+        driver_id=driver_id,
+        pickup_latitude=pickup[0],
+        pickup_longitude=pickup[1],
+        destination_latitude=destination[0],
+        destination_longitude=destination[1],
+    )
+
+
+def make_planner(monkeypatch):
+    index = DriverGeoIndex()
+    monkeypatch.setattr(lookahead, "driver_index", index)
+    planner = LookaheadPlanner(never_expires, max_remaining_minutes=10.0, min_gain_minutes=2.0, grace_minutes=3.0)
+    # Driver 1 is about to drop off a rider right at the pickup
+    index.update(1, PICKUP[0] - 0.005, PICKUP[1])
+    planner.track(ride(100, driver_id=1, destination=(PICKUP[0] + 0.001, PICKUP[1])))
+    # Driver 2 finishes far too late to be worth waiting for
+    index.update(2, PICKUP[0] - 0.2, PICKUP[1])
+    planner.track(ride(101, driver_id=2, destination=PICKUP))
+    return planner
+
+
+def test_ride_is_chained_only_when_the_soon_free_driver_is_clearly_sooner(monkeypatch):
+    planner = make_planner(monkeypatch)
+    options = planner.candidates(*PICKUP)
+    assert [option.driver_id for option in options] == [1]
+    soon = options[0].total_minutes
+
+    # A free driver about as close wins
+    assert planner.chain_if_sooner(ride(1), free_pickup_minutes=soon + 1.0) is None
+    chained = planner.chain_if_sooner(ride(1), free_pickup_minutes=soon + 5.0)
+    assert chained.driver_id == 1 and chained.current_ride_id == 100
+    assert planner.chained_driver(1) == 1
+
+    # One chained ride per driver, and no free driver at all still chains
+    assert planner.chain_if_sooner(ride(2), free_pickup_minutes=None) is None
+
+    assert planner.release(1) == 1
+    assert planner.chained_driver(1) is None
+    assert planner.release(2) is None
+    assert planner.stats()["handed_over"] == 1
+    assert planner.stats()["rides_in_progress"] == 0
+
+
+def test_chain_is_released_after_its_deadline(monkeypatch):
+    planner = make_planner(monkeypatch)
+    chained = planner.chain_if_sooner(ride(1), free_pickup_minutes=None)
+    deadline = time.time() + (chained.remaining_minutes + 3.0) * 60.0
+
+    assert planner.expire_due(deadline - 5.0) == []
+    assert planner.expire_due(deadline + 5.0) == [1]
+    assert planner.chained_driver(1) is None
+    # The driver can be chained again
+    assert planner.chain_if_sooner(ride(2), free_pickup_minutes=None).driver_id == 1
+    planner.drop(2)
+    assert planner.stats()["pending_chains"] == 0
+
+
+def test_travel_minutes_follow_the_route_factor():
+    straight = travel_minutes(*PICKUP, PICKUP[0] + 0.01, PICKUP[1], route_factor=1.0)
+    assert abs(travel_minutes(*PICKUP, PICKUP[0] + 0.01, PICKUP[1], route_factor=1.5) - 1.5 * straight) < 1e-9
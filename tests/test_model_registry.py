@@ -0,0 +1,55 @@
+import asyncio
+import os
+
+import joblib
+import numpy as np
+
+from app.services.ml.registry import ModelRegistry
+
+
+def test_models_are_loaded_once_and_swapped_when_the_file_changes(tmp_path):
+    async def scenario():
+        path = str(tmp_path / "fare.joblib")
+        registry = ModelRegistry()
+        registry.register("fare", path)
+
+        # Nothing deployed yet
+        assert await registry.load("fare") is False
+        assert registry.get("fare") is None
+
+        joblib.dump({"weights": np.arange(3.0)}, path)
+        os.utime(path, (1000.0, 1000.0))
+        assert await registry.load("fare") is True
+        first = registry.get("fare")
+        assert first["weights"].tolist() == [0.0, 1.0, 2.0]
+        # Arrays are shared read-only through the page cache
+        assert not first["weights"].flags.writeable
+        assert await registry.load("fare") is False
+
+        joblib.dump({"weights": np.arange(4.0)}, path)
+        os.utime(path, (2000.0, 2000.0))
+        await registry.load_all()
+        assert registry.get("fare")["weights"].tolist() == [0.0, 1.0, 2.0, 3.0]
+        # Holders of the previous model keep a working copy
+        assert first["weights"].tolist() == [0.0, 1.0, 2.0]
+        assert registry.loaded("fare").mtime == 2000.0
+
+    asyncio.run(scenario())
+
+
+def test_corrupt_file_keeps_the_working_model(tmp_path):
+    async def scenario():
+        path = str(tmp_path / "fare.joblib")
+        registry = ModelRegistry()
+        registry.register("fare", path)
+        joblib.dump({"version": 1}, path)
+        os.utime(path, (1000.0, 1000.0))
+        await registry.load("fare")
+
+        with open(path, "wb") as half_written:
+            half_written.write(b"\x80\x04 not a model")
+        os.utime(path, (2000.0, 2000.0))
+        assert await registry.load("fare") is False
+        assert registry.get("fare") == {"version": 1}
+
+    asyncio.run(scenario())
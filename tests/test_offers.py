@@ -0,0 +1,113 @@
+import asyncio
+import time
+
+import pytest
+
+from app.services.ride_matching.offers import MODE_BROADCAST, MODE_SEQUENTIAL, OfferEngine, OfferError
+from app.services.ride_matching.reservations import ASSIGNED, DRIVER_BUSY, RIDE_TAKEN
+
+
+class Dispatcher:
+    """
+    Candidate source and assignment for one engine: every driver can take
+    the ride unless listed as busy, and only the first assignment wins.
+    """
+
+    def __init__(self, busy=()):
+        self.busy = set(busy)
+        self.assigned = {}
+        self.exhausted = []
+
+    async def candidates(self, ride_id, exclude):
+        return []
+
+    async def assign(self, ride_id, driver_id):
+        await asyncio.sleep(0)
+        if driver_id in self.busy:
+            return DRIVER_BUSY
+        if ride_id in self.assigned:
+            return RIDE_TAKEN
+        self.assigned[ride_id] = driver_id
+        return ASSIGNED
+
+    async def on_exhausted(self, ride_id):
+        self.exhausted.append(ride_id)
+
+    def engine(self, mode, width=3):
+        return OfferEngine(
+            self.candidates, self.assign, self.on_exhausted,
+            mode=mode, timeout_seconds=10.0, broadcast_size=width, prefetch_remaining=0,
+        )
+
+
+def test_sequential_cascade_moves_on_after_decline_and_timeout():
+    async def scenario():
+        dispatcher = Dispatcher()
+        engine = dispatcher.engine(MODE_SEQUENTIAL)
+        engine.open(1, [10, 11, 12])
+
+        first = engine.offer_for_driver(10)
+        assert engine.offer_for_driver(11) is None
+        await engine.respond(first.id, 10, accepted=False)
+
+        assert engine.expire_due(time.time() + 11.0) == 1
+        third = engine.offer_for_driver(12)
+        await engine.respond(third.id, 12, accepted=True)
+
+        assert dispatcher.assigned == {1: 12}
+        assert not engine.offering(1)
+        assert engine.stats()["declined"] == 1 and engine.stats()["expired"] == 1
+
+    asyncio.run(scenario())
+
+
+def test_cascade_reports_exhaustion_when_everyone_declines():
+    async def scenario():
+        dispatcher = Dispatcher()
+        engine = dispatcher.engine(MODE_SEQUENTIAL)
+        engine.open(1, [10])
+        await engine.respond(engine.offer_for_driver(10).id, 10, accepted=False)
+        await asyncio.sleep(0.01)
+
+        assert dispatcher.exhausted == [1]
+        assert not engine.offering(1)
+
+    asyncio.run(scenario())
+
+
+def test_broadcast_first_acceptance_wins():
+    async def scenario():
+        dispatcher = Dispatcher()
+        engine = dispatcher.engine(MODE_BROADCAST)
+        engine.open(1, [10, 11, 12])
+        offers = [engine.offer_for_driver(driver_id) for driver_id in (10, 11, 12)]
+        assert all(offers)
+
+        results = await asyncio.gather(
+            engine.respond(offers[0].id, 10, accepted=True),
+            engine.respond(offers[1].id, 11, accepted=True),
+            return_exceptions=True,
+        )
+        assert results[0] == offers[0]
+        assert isinstance(results[1], OfferError)
+        assert dispatcher.assigned == {1: 10}
+        # The remaining offer was withdrawn
+        assert engine.offer_for_driver(12) is None
+        with pytest.raises(OfferError):
+            await engine.respond(offers[2].id, 12, accepted=True)
+
+    asyncio.run(scenario())
+
+
+def test_busy_driver_acceptance_moves_to_the_next_candidate():
+    async def scenario():
+        dispatcher = Dispatcher(busy={10})
+        engine = dispatcher.engine(MODE_SEQUENTIAL)
+        engine.open(1, [10, 11])
+
+        with pytest.raises(OfferError):
+            await engine.respond(engine.offer_for_driver(10).id, 10, accepted=True)
+        await engine.respond(engine.offer_for_driver(11).id, 11, accepted=True)
+        assert dispatcher.assigned == {1: 11}
+
+    asyncio.run(scenario())
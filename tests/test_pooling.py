@@ -0,0 +1,132 @@
+from types import SimpleNamespace
+
+import numpy as np
+
+from app.services.ride_matching import pooling
+from app.services.ride_matching.geo_index import DriverGeoIndex
+from app.services.ride_matching.pooling import DROPOFF, PICKUP, PoolPlanner, _minutes, best_insertions
+
+SPEED_KMH = 30.0
+
+
+def leg(a, b):
+    return float(_minutes(a[0], a[1], b[0], b[1], SPEED_KMH))
+
+
+def route_minutes(points):
+    return sum(leg(a, b) for a, b in zip(points, points[1:]))
+
+
+def brute_force_added(route, pickup, dropoff):
+    # Cheapest extra minutes over every placement, ignoring constraints
+    base = route_minutes(route)
+    best = np.inf
+    stops = len(route) - 1
+    for i in range(stops + 1):
+        for j in range(i, stops + 1):
+            tail = route[1:]
+            changed = [route[0]] + tail[:i] + [pickup] + tail[i:j] + [dropoff] + tail[j:]
+            best = min(best, route_minutes(changed) - base)
+    return best
+
+
+def pack(routes):
+    width = max(len(route) for route in routes)
+    points = np.empty((len(routes), width, 2))
+    for row, route in enumerate(routes):
+        points[row, :len(route)] = route
+        points[row, len(route):] = route[-1]
+    counts = np.array([len(route) - 1 for route in routes])
+    return points, counts
+
+
+def test_unconstrained_insertion_matches_brute_force():
+    rng = np.random.default_rng(7)
+    routes = [
+        [tuple(point) for point in 12.9 + rng.random((stops + 1, 2)) * 0.1]
+        for stops in rng.integers(0, 5, size=40)
+    ]
+    pickup, dropoff = (12.94, 12.96), (12.97, 12.93)
+    points, counts = pack(routes)
+    width = points.shape[1]
+
+    added, *_ = best_insertions(
+        points, counts, np.full((len(routes), width - 1), np.inf), np.zeros((len(routes), width)),
+        pickup, dropoff, np.inf, np.inf, 10, SPEED_KMH
+    )
+
+    expected = [brute_force_added(route, pickup, dropoff) for route in routes]
+    assert np.allclose(added, expected)
+
+
+def test_deadlines_and_capacity_rule_out_insertions():
+    # A rider on board to be dropped off 2 km north, due in 5 minutes
+    route = [(12.90, 77.60), (12.918, 77.60)]
+    points, counts = pack([route])
+    pickup, dropoff = (12.90, 77.61), (12.918, 77.61)
+
+    added, pickup_index, dropoff_index, _, _ = best_insertions(
+        points, counts, np.array([[5.0]]), np.array([[1.0, 0.0]]),
+        pickup, dropoff, np.inf, np.inf, 2, SPEED_KMH
+    )
+    # Picking up first would be cheapest but makes the drop-off late
+    assert np.isfinite(added[0])
+    assert (pickup_index[0], dropoff_index[0]) == (1, 1)
+
+    full, *_ = best_insertions(
+        points, counts, np.array([[np.inf]]), np.array([[1.0, 0.0]]),
+        pickup, dropoff, np.inf, np.inf, 1, SPEED_KMH
+    )
+    assert np.isfinite(full[0])
+    assert full[0] > leg(route[0], pickup)
+
+    blocked, *_ = best_insertions(
+        points, counts, np.array([[5.0]]), np.array([[1.0, 0.0]]),
+        pickup, dropoff, np.inf, 1.0, 2, SPEED_KMH
+    )
+    assert np.isinf(blocked[0])
+
+
+def make_ride(ride_id, pickup, destination):
+    return SimpleNamespace(
+        id=ride_id,
+        pickup_latitude=pickup[0],
+        pickup_longitude=pickup[1],
+        destination_latitude=destination[0],
+        destination_longitude=destination[1],
+        max_detour_minutes=None,
+    )
+
+
+def test_planner_routes_follow_commits_pickups_and_finishes(monkeypatch):
+    index = DriverGeoIndex()
+    monkeypatch.setattr(pooling, "driver_index", index)
+    planner = PoolPlanner(capacity=2)
+    index.update(1, 12.90, 77.60)
+
+    first = make_ride(10, (12.901, 77.60), (12.93, 77.60))
+    planner.commit(1, first, now=1000.0)
+    assert [(stop.ride_id, stop.kind) for stop in planner.route(1)] == [(10, PICKUP), (10, DROPOFF)]
+
+    # A second rider along the same corridor slots in between
+    second = make_ride(11, (12.91, 77.60), (12.92, 77.60))
+    options = planner.plan(second, now=1000.0)
+    assert [option.driver_id for option in options] == [1]
+    planner.commit(1, second, now=1000.0)
+    assert [(stop.ride_id, stop.kind) for stop in planner.route(1)] == [
+        (10, PICKUP), (11, PICKUP), (11, DROPOFF), (10, DROPOFF)
+    ]
+    assert planner.driver_for(11) == 1
+
+    # With both seats taken a third rider can only board after a drop-off
+    planner.picked_up(10)
+    planner.picked_up(11)
+    third = make_ride(12, (12.915, 77.60), (12.925, 77.60))
+    assert [(stop.ride_id, stop.kind) for stop in planner.route(1)] == [(11, DROPOFF), (10, DROPOFF)]
+    assert [option.pickup_index for option in planner.plan(third, now=1000.0)] == [1]
+
+    assert planner.finish(11) is True
+    assert [option.pickup_index for option in planner.plan(third, now=1000.0)] == [0]
+    assert planner.finish(10) is False
+    assert planner.route(1) == []
+    assert planner.stats()["vehicles"] == 0
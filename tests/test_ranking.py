@@ -0,0 +1,72 @@
+import numpy as np
+
+from app.core.config import settings
+from app.services.ride_matching.driver_stats import DriverStatsStore
+from app.services.ride_matching.geo_index import DriverGeoIndex
+from app.services.ride_matching.ranking import DriverCandidates, RankingWeights, rank_candidates, top_k
+
+WEIGHTS = RankingWeights(distance=0.45, rating=0.25, acceptance=0.2, idle=0.1)
+PICKUP = (12.97, 77.59)
+
+
+def reference_score(distance_km, rating, acceptance_rate, idle_minutes, max_distance_km):
+    # One driver at a time, as rank_drivers used to score them
+    if not distance_km <= max_distance_km:
+        return -np.inf
+    distance_score = 1.0 - min(distance_km / max_distance_km, 1.0)
+    rating_score = min(max((rating - 1.0) / 4.0, 0.0), 1.0)
+    acceptance_score = min(max(acceptance_rate, 0.0), 1.0)
+    idle_score = max(min(idle_minutes / settings.RANKING_IDLE_SATURATION_MINUTES, 1.0), 0.0)
+    return (WEIGHTS.distance * distance_score + WEIGHTS.rating * rating_score
+            + WEIGHTS.acceptance * acceptance_score + WEIGHTS.idle * idle_score)
+
+
+def test_vectorised_ranking_matches_scoring_each_driver():
+    rng = np.random.default_rng(3)
+    count = 200
+    candidates = DriverCandidates(
+        driver_ids=np.arange(count, dtype=np.int64),
+        distance_km=np.where(rng.random(count) < 0.1, np.inf, rng.random(count) * 12.0),
+        rating=1.0 + rng.random(count) * 4.0,
+        acceptance_rate=rng.random(count),
+        idle_minutes=rng.random(count) * 60.0,
+    )
+
+    ranked = rank_candidates(candidates, WEIGHTS, max_distance_km=10.0)
+
+    expected = sorted(
+        ((i, reference_score(*(column[i] for column in candidates[1:]), 10.0)) for i in range(count)),
+        key=lambda pair: -pair[1]
+    )
+    expected = [(i, score) for i, score in expected if np.isfinite(score)]
+    assert [i for i, _ in ranked] == [i for i, _ in expected]
+    assert np.allclose([score for _, score in ranked], [score for _, score in expected])
+    assert [i for i, _ in rank_candidates(candidates, WEIGHTS, limit=5, max_distance_km=10.0)] == [
+        i for i, _ in expected[:5]
+    ]
+
+
+def test_top_k_keeps_the_best_finite_scores_in_order():
+    scores = np.array([0.2, -np.inf, 0.9, 0.5, 0.9, 0.1])
+    assert top_k(scores, 3).tolist() == [2, 4, 3]
+    assert top_k(scores, 10).tolist() == [2, 4, 3, 0, 5]
+    assert top_k(scores, 0).tolist() == []
+
+
+def test_candidates_are_built_from_the_index_and_driver_stats():
+    index = DriverGeoIndex()
+    stats = DriverStatsStore()
+    index.update(1, PICKUP[0] + 0.01, PICKUP[1])
+    index.update(2, PICKUP[0] + 0.05, PICKUP[1])
+    stats.set_rating(1, 3.0)
+    stats.mark_idle(2, at=1000.0)
+
+    candidates = DriverCandidates.build([1, 2, 3], *PICKUP, index=index, stats=stats, now=1600.0)
+
+    assert np.allclose(candidates.distance_km[:2], [1.112, 5.560], atol=0.01)
+    # No indexed position: never ranked
+    assert np.isinf(candidates.distance_km[2])
+    assert candidates.rating[0] == 3.0
+    assert candidates.idle_minutes[1] == 10.0
+    assert [i for i, _ in rank_candidates(candidates, WEIGHTS, max_distance_km=10.0)] == [0, 1]
+    assert [i for i, _ in rank_candidates(candidates, WEIGHTS, max_distance_km=5.0)] == [0]
@@ -0,0 +1,70 @@
+from app.core.config import settings
+from app.models.ride import Ride, RideStatus
+from app.models.user import User, UserRole
+from app.services.location.backends import InMemoryLocationBackend
+from app.services.location.store import LocationStore
+from app.services.ride_matching import matching
+from app.services.ride_matching.geo_index import DriverGeoIndex
+from app.services.ride_matching.offers import MODE_INSTANT
+from app.services.ride_matching.rematch import RematchCandidates
+
+PICKUP = (12.97, 77.59)
+
+
+def test_candidates_skip_excluded_drivers_and_expire():
+    candidates = RematchCandidates(ttl_seconds=60.0, max_entries=10)
+    candidates.remember(1, [10, 11, 12], now=1000.0)
+    candidates.remember(2, [], now=1000.0)
+
+    assert candidates.next_candidates(1, {10}, now=1030.0) == [11, 12]
+    assert candidates.next_candidates(2, set(), now=1030.0) == []
+    assert candidates.next_candidates(1, set(), now=1061.0) == []
+
+    candidates.remember(3, [10], now=1000.0)
+    candidates.forget(3)
+    assert candidates.next_candidates(3, set(), now=1000.0) == []
+
+
+def test_backed_out_ride_goes_to_the_next_candidate_in_reach(database, monkeypatch):
+    async def scenario():
+        index = DriverGeoIndex()
+        store = LocationStore(InMemoryLocationBackend(), index=index)
+        candidates = RematchCandidates()
+        monkeypatch.setattr(matching, "driver_index", index)
+        monkeypatch.setattr(matching, "location_store", store)
+        monkeypatch.setattr(matching, "rematch_candidates", candidates)
+        monkeypatch.setattr(settings, "REMATCH_CACHE_ENABLED", True)
+        monkeypatch.setattr(settings, "OFFER_MODE", MODE_INSTANT)
+
+        rider = await User.create(email="rider@example.com", hashed_password="x", phone_number="100")
+        ride = await Ride.create(
+            rider=rider,
+            pickup_latitude=PICKUP[0],
+            pickup_longitude=PICKUP[1],
+            pickup_address="pickup",
+            destination_latitude=13.0,
+            destination_longitude=77.6,
+            destination_address="destination",
+        )
+        drivers = [
+            await User.create(
+                email=f"driver{number}@example.com", hashed_password="x",
+                phone_number=f"2{number:03d}", role=UserRole.DRIVER
+            )
+            for number in range(3)
+        ]
+        backed_out, far_away, near = (driver.id for driver in drivers)
+        store.record(backed_out, *PICKUP)
+        store.record(far_away, PICKUP[0] + 1.0, PICKUP[1])
+        store.record(near, PICKUP[0] + 0.01, PICKUP[1])
+        await store.flush()
+
+        # Without a remembered ranking the ride needs a full match
+        assert await matching.rematch_ride(ride, {backed_out}) is False
+
+        candidates.remember(ride.id, [backed_out, far_away, near])
+        assert await matching.rematch_ride(ride, {backed_out}) is True
+        ride = await Ride.get(id=ride.id)
+        assert (ride.status, ride.driver_id) == (RideStatus.ACCEPTED, near)
+
+    database(scenario)
@@ -0,0 +1,95 @@
+import asyncio
+
+from app.core.config import settings
+from app.models.ride import Ride, RideStatus
+from app.models.user import User, UserRole
+from app.services.ride_matching.reservations import (
+    ASSIGNED,
+    DRIVER_BUSY,
+    DRIVER_CONTENDED,
+    RIDE_TAKEN,
+    DriverReservations,
+    InMemoryReservationBackend,
+)
+
+
+async def create_rides(count, pooled=False):
+    rider = await User.create(email="rider@example.com", hashed_password="x", phone_number="100")
+    return [
+        await Ride.create(
+            rider=rider,
+            pickup_latitude=12.97,
+            pickup_longitude=77.59,
+            pickup_address="pickup",
+            destination_latitude=13.0,
+            destination_longitude=77.6,
+            destination_address="destination",
+            pooled=pooled,
+        )
+        for _ in range(count)
+    ]
+
+
+async def create_driver(number):
+    return await User.create(
+        email=f"driver{number}@example.com", hashed_password="x", phone_number=f"2{number:03d}", role=UserRole.DRIVER
+    )
+
+
+def test_parallel_matchers_never_double_book_a_driver(database):
+    async def scenario():
+        rides = await create_rides(10)
+        driver = await create_driver(1)
+        reservations = DriverReservations(InMemoryReservationBackend())
+
+        outcomes = await asyncio.gather(*(reservations.assign(ride.id, driver.id) for ride in rides))
+
+        assert outcomes.count(ASSIGNED) == 1
+        assert set(outcomes) <= {ASSIGNED, DRIVER_CONTENDED, DRIVER_BUSY}
+        assert await Ride.filter(driver_id=driver.id, status=RideStatus.ACCEPTED).count() == 1
+        # The lease was released: the driver is busy now, not contended
+        assert await reservations.assign(rides[0].id, driver.id) in (DRIVER_BUSY, RIDE_TAKEN)
+
+    database(scenario)
+
+
+def test_ride_goes_to_one_driver_only(database):
+    async def scenario():
+        ride, = await create_rides(1)
+        first, second = await create_driver(1), await create_driver(2)
+        reservations = DriverReservations(InMemoryReservationBackend())
+
+        assert await reservations.assign(ride.id, first.id) == ASSIGNED
+        assert await reservations.assign(ride.id, second.id) == RIDE_TAKEN
+        assert (await Ride.get(id=ride.id)).driver_id == first.id
+
+    database(scenario)
+
+
+def test_pooled_rides_share_a_driver_up_to_capacity(database):
+    async def scenario():
+        rides = await create_rides(settings.POOL_CAPACITY + 1, pooled=True)
+        driver = await create_driver(1)
+        reservations = DriverReservations(InMemoryReservationBackend())
+
+        outcomes = [await reservations.assign(ride.id, driver.id, pooled=True) for ride in rides]
+        assert outcomes == [ASSIGNED] * settings.POOL_CAPACITY + [DRIVER_BUSY]
+
+    database(scenario)
+
+
+def test_lease_is_exclusive_until_released_or_expired():
+    async def scenario():
+        backend = InMemoryReservationBackend()
+        assert await backend.acquire(7, "a", 60.0)
+        assert not await backend.acquire(7, "b", 60.0)
+        # Only the holder can release it
+        assert not await backend.release(7, "b")
+        assert await backend.release(7, "a")
+
+        assert await backend.acquire(7, "c", 0.01)
+        await asyncio.sleep(0.02)
+        assert await backend.acquire(7, "d", 60.0)
+        assert not await backend.release(7, "c")
+
+    asyncio.run(scenario())
@@ -0,0 +1,93 @@
+import numpy as np
+from scipy.sparse.csgraph import dijkstra
+
+from app.services.routing.engine import RoutingEngine
+from app.services.routing.graph import RoadGraph
+from benchmarks.road_grid import grid_city
+
+
+def make_engine(graph, **options):
+    engine = RoutingEngine(graph, **options)
+    engine.prepare()
+    return engine
+
+
+def test_landmark_search_finds_the_fastest_route():
+    graph = grid_city(rows=40, cols=40)
+    engine = make_engine(graph, landmark_count=4)
+    rng = np.random.default_rng(5)
+    sources = rng.integers(0, graph.node_count, 20)
+    targets = rng.integers(0, graph.node_count, 20)
+    expected = dijkstra(graph.matrix(), indices=sources)
+
+    for row, (source, target) in enumerate(zip(sources.tolist(), targets.tolist())):
+        route = engine.shortest_path(source, target)
+        assert abs(route.duration_seconds - expected[row, target]) < 1e-3 * max(1.0, expected[row, target])
+        # Every block is 100 m
+        assert round(route.distance_km * 10) >= abs(source // 40 - target // 40) + abs(source % 40 - target % 40)
+
+
+def test_routes_between_coordinates_snap_to_the_network():
+    graph = grid_city(rows=40, cols=40)
+    engine = make_engine(graph, landmark_count=2, max_snap_km=0.5, access_speed_kmh=10.0)
+    a, b = 0, 39 * 40 + 39
+
+    direct = engine.shortest_path(a, b)
+    route = engine.route(graph.latitudes[a], graph.longitudes[a], graph.latitudes[b], graph.longitudes[b])
+    assert route == direct
+
+    # Starting off the network adds the walk to the nearest node
+    off_lat = graph.latitudes[a] - 0.1 / 111.195
+    snapped = engine.route(off_lat, graph.longitudes[a], graph.latitudes[b], graph.longitudes[b])
+    assert abs(snapped.distance_km - direct.distance_km - 0.1) < 1e-3
+    assert abs(snapped.duration_seconds - direct.duration_seconds - 36.0) < 0.5
+
+    assert engine.route(graph.latitudes[a] - 0.1, graph.longitudes[a], graph.latitudes[b], graph.longitudes[b]) is None
+
+
+def test_one_way_street_is_unreachable_backwards(tmp_path):
+    graph = RoadGraph.from_edges(
+        np.array([12.97, 12.971, 12.972]), np.array([77.59, 77.59, 77.59]),
+        np.array([0, 1]), np.array([1, 2]), np.array([111.0, 111.0]), np.array([36.0, 36.0])
+    )
+    path = str(tmp_path / "graph.npz")
+    graph.save(path)
+    engine = make_engine(RoadGraph.load(path), landmark_count=2)
+
+    route = engine.shortest_path(0, 2)
+    assert abs(route.distance_km - 0.222) < 1e-6
+    assert abs(route.duration_seconds - 22.2) < 1e-3
+    assert engine.shortest_path(2, 0) is None
+    assert engine.route(12.972, 77.59, 12.97, 77.59) is None
+
+
+def test_travel_time_matrix_matches_full_searches_in_both_directions():
+    graph = grid_city(rows=40, cols=40)
+    engine = make_engine(graph, landmark_count=2)
+    rng = np.random.default_rng(9)
+    origins = rng.integers(0, graph.node_count, 12)
+    destinations = rng.integers(0, graph.node_count, 3)
+    expected = dijkstra(graph.matrix(), indices=origins)[:, destinations]
+
+    # Many drivers to a few pickups searches backwards from the pickups
+    times = engine.travel_time_matrix(
+        graph.latitudes[origins], graph.longitudes[origins],
+        graph.latitudes[destinations], graph.longitudes[destinations],
+        limit_seconds=7200.0
+    )
+    assert np.allclose(times, expected, rtol=1e-4)
+
+    reverse = engine.travel_time_matrix(
+        graph.latitudes[destinations], graph.longitudes[destinations],
+        graph.latitudes[origins], graph.longitudes[origins],
+        limit_seconds=7200.0
+    )
+    assert np.allclose(reverse, dijkstra(graph.matrix(), indices=destinations)[:, origins], rtol=1e-4)
+
+    # Pairs beyond the search limit are inf
+    bounded = engine.travel_time_matrix(
+        graph.latitudes[origins], graph.longitudes[origins],
+        graph.latitudes[destinations], graph.longitudes[destinations],
+        limit_seconds=60.0
+    )
+    assert np.array_equal(np.isinf(bounded), expected > 60.0)
@@ -0,0 +1,52 @@
+import asyncio
+import random
+
+from app.services.sharding.cluster import ShardCoordinator
+from app.services.sharding.shard import DriverPing
+
+
+def test_ride_takes_the_only_driver_across_a_region_border():
+    async def scenario():
+        coordinator = ShardCoordinator(4, processes=False)
+        driver = (12.97, 77.59)
+        owner = coordinator.regions.shard_for(*driver)
+        # Walk east until the pickup lies on another shard
+        longitude = driver[1]
+        while coordinator.regions.shard_for(driver[0], longitude) == owner:
+            longitude += 0.001
+        try:
+            await coordinator.update_drivers([DriverPing(1, *driver)])
+            match = await coordinator.match(10, driver[0], longitude)
+            assert match is not None and match[0] == 1
+            # Taken now: the next ride nearby finds nobody
+            assert await coordinator.match(11, driver[0], longitude) is None
+        finally:
+            coordinator.close()
+
+    asyncio.run(scenario())
+
+
+def test_batch_never_assigns_a_driver_twice_and_surge_tables_merge():
+    async def scenario():
+        rng = random.Random(19)
+        coordinator = ShardCoordinator(4, processes=False)
+
+        def point():
+            return 12.97 + rng.uniform(-0.1, 0.1), 77.59 + rng.uniform(-0.1, 0.1)
+
+        try:
+            await coordinator.update_drivers([DriverPing(driver_id, *point()) for driver_id in range(300)])
+            matches = await coordinator.match_many([(ride_id, *point()) for ride_id in range(400)])
+            drivers = [match[0] for match in matches.values() if match is not None]
+            assert len(drivers) == len(set(drivers))
+
+            await coordinator.recompute_surge()
+            table = await coordinator.surge_table()
+            expected = {}
+            for client in coordinator.clients.values():
+                expected.update(client.shard.surge.published())
+            assert table == expected
+        finally:
+            coordinator.close()
+
+    asyncio.run(scenario())
@@ -0,0 +1,61 @@
+from datetime import datetime, timedelta
+
+import numpy as np
+import pandas as pd
+
+from app.services.routing.speed_profiles import (
+    SpeedProfiles,
+    build_speed_profiles,
+    hour_of_week,
+    save_speed_profiles,
+)
+
+MONDAY_8AM = datetime(2026, 10, 12, 8, 5)
+BUSY = (12.97, 77.59)
+QUIET = (13.10, 77.70)
+
+
+def trips(pickup, count, speed_kmh, started_at=MONDAY_8AM, distance_km=5.0):
+    duration = timedelta(hours=distance_km / speed_kmh)
+    return pd.DataFrame({
+        "pickup_latitude": [pickup[0]] * count,
+        "pickup_longitude": [pickup[1]] * count,
+        "started_at": [started_at] * count,
+        "completed_at": [started_at + duration] * count,
+        "distance_km": [distance_km] * count,
+    })
+
+
+def test_profiles_use_cell_medians_with_city_fallback(tmp_path):
+    rides = pd.concat([
+        trips(BUSY, 6, 12.0),
+        trips(BUSY, 4, 20.0, started_at=MONDAY_8AM + timedelta(hours=6)),
+        # Too few trips for a cell profile of their own
+        trips(QUIET, 2, 40.0),
+        # Impossible speeds are dropped
+        trips(BUSY, 5, 500.0),
+    ])
+    table = build_speed_profiles(rides, cell_size_km=1.0, min_samples=3)
+    assert len(table) == 2
+
+    profiles = SpeedProfiles(path=str(tmp_path / "speeds.npy"), cell_size_km=1.0, default_speed_kmh=25.0)
+    assert profiles.speed_kmh(*BUSY, at=MONDAY_8AM) == 25.0
+    save_speed_profiles(table, profiles.path)
+    assert profiles.load() is True
+    assert profiles.load() is False
+
+    assert profiles.speed_kmh(*BUSY, at=MONDAY_8AM) == 12.0
+    assert profiles.speed_kmh(*BUSY, at=MONDAY_8AM + timedelta(hours=6)) == 20.0
+    # The quiet cell and unseen hours get the city-wide figures
+    city_8am = float(np.median([12.0] * 6 + [40.0] * 2))
+    assert profiles.speed_kmh(*QUIET, at=MONDAY_8AM) == city_8am
+    assert profiles.speed_kmh(*BUSY, at=MONDAY_8AM + timedelta(days=2)) == float(np.median([12.0] * 6 + [20.0] * 4 + [40.0] * 2))
+
+    assert profiles.speeds_kmh(np.array([BUSY[0], QUIET[0]]), np.array([BUSY[1], QUIET[1]]), at=MONDAY_8AM).tolist() == [
+        12.0, city_8am
+    ]
+
+
+def test_hour_of_week_starts_on_monday():
+    assert hour_of_week(MONDAY_8AM) == 8
+    assert hour_of_week(MONDAY_8AM + timedelta(days=6, hours=15)) == 167
@@ -0,0 +1,76 @@
+from app.services.ride_matching.surge import SurgeEngine
+
+CELL = (12.97, 77.59)
+FAR = (13.20, 77.80)
+
+
+def make_engine(**overrides):
+    options = dict(
+        window_seconds=60.0, sensitivity=0.5, smoothing=1.0, max_factor=3.0, step=0.1, honour_seconds=30.0
+    )
+    options.update(overrides)
+    return SurgeEngine(**options)
+
+
+def test_counts_follow_requests_and_driver_pings():
+    engine = make_engine()
+    for ride_id in range(3):
+        engine.record_request(ride_id, *CELL, at=1000.0)
+    engine.record_driver(1, *CELL, at=1000.0)
+    engine.record_driver(2, *CELL, at=1000.0)
+    assert engine.counts(*CELL) == (3, 2)
+
+    # A driver moving on is counted in the new cell only
+    engine.record_driver(2, *FAR, at=1030.0)
+    engine.close_request(0)
+    assert engine.counts(*CELL) == (2, 1)
+    assert engine.counts(*FAR) == (0, 1)
+
+    # Entries older than the window drop out, fresh pings stay
+    engine.expire(1070.0)
+    assert engine.counts(*CELL) == (0, 0)
+    assert engine.counts(*FAR) == (0, 1)
+
+
+def test_factor_is_smoothed_and_epoch_only_moves_with_it():
+    engine = make_engine(smoothing=0.5)
+    for ride_id in range(5):
+        engine.record_request(ride_id, *CELL, at=1000.0)
+    engine.record_driver(1, *CELL, at=1000.0)
+
+    # Target 3.0 reached halfway per round
+    engine.recompute(1001.0)
+    first = engine.surge_for(*CELL)
+    assert (first.factor, first.epoch, first.previous_epoch) == (2.0, 1, 0)
+    engine.recompute(1002.0)
+    second = engine.surge_for(*CELL)
+    assert (second.factor, second.epoch, second.previous_epoch) == (2.5, 2, 1)
+
+    # Once settled, further rounds keep the epoch quotes are keyed by
+    for now in range(1003, 1010):
+        engine.recompute(float(now))
+    settled = engine.surge_for(*CELL)
+    assert settled.factor == 3.0
+    engine.recompute(1010.0)
+    assert engine.surge_for(*CELL) == settled
+    assert engine.surge_for(*FAR).factor == 1.0
+
+
+def test_calmed_cell_is_kept_while_its_quotes_can_be_honoured():
+    engine = make_engine()
+    for ride_id in range(4):
+        engine.record_request(ride_id, *CELL, at=1000.0)
+    engine.recompute(1000.0)
+    surged = engine.surge_for(*CELL)
+    assert surged.factor == 2.5
+
+    for ride_id in range(4):
+        engine.close_request(ride_id)
+    engine.recompute(1010.0)
+    calm = engine.surge_for(*CELL)
+    assert (calm.factor, calm.previous_epoch) == (1.0, surged.epoch)
+    assert engine.cell_for(*CELL) in engine.published()
+
+    engine.recompute(1041.0)
+    assert engine.cell_for(*CELL) not in engine.published()
+    assert engine.stats()["surging_cells"] == 0
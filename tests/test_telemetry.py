@@ -0,0 +1,38 @@
+import json
+
+import pytest
+
+from app.services.location.telemetry import decode_telemetry
+
+
+NOW = 1_700_000_000.0
+
+
+def test_decodes_parallel_arrays():
+    body = json.dumps({"latitudes": [12.97, 12.98], "longitudes": [77.59, 77.6], "timestamps": [NOW - 5, NOW - 10]})
+    batch = decode_telemetry(body.encode(), "application/json", now=NOW)
+
+    assert batch.size == 2
+    assert batch.latest() == (12.97, 77.59, NOW - 5)
+
+
+@pytest.mark.parametrize("payload", [
+    {"encoding": "delta", "latitudes": [10 ** 30], "longitudes": [77590000], "timestamps": [1700000000000]},
+    {"latitudes": [10 ** 400], "longitudes": [77.59], "timestamps": [NOW]},
+    {"points": [{"latitude": 10 ** 400, "longitude": 77.59, "timestamp": NOW}]},
+    {"latitudes": [1e400], "longitudes": [77.59], "timestamps": [NOW]},
+    {"latitudes": ["north"], "longitudes": [77.59], "timestamps": [NOW]},
+])
+def test_out_of_range_numbers_are_rejected_as_malformed(payload):
+    body = json.dumps(payload).replace("Infinity", "1e400").encode()
+
+    with pytest.raises(ValueError):
+        decode_telemetry(body, "application/json", now=NOW)
+
+
+@pytest.mark.parametrize("offset", [120.0, -7200.0])
+def test_points_outside_the_accepted_time_range_are_rejected(offset):
+    body = json.dumps({"latitudes": [12.97], "longitudes": [77.59], "timestamps": [NOW + offset]}).encode()
+
+    with pytest.raises(ValueError):
+        decode_telemetry(body, "application/json", now=NOW)
@@ -0,0 +1,67 @@
+import asyncio
+
+import pytest
+
+from app.services.location.tracks import TrackStore
+
+
+def test_pooled_driver_pings_reach_every_active_ride(tmp_path):
+    store = TrackStore(directory=str(tmp_path), compress=False)
+    store.begin(1, driver_id=7)
+    store.record_driver_point(7, 12.9700, 77.5900, 1000.0)
+    # A second rider joins the same vehicle
+    store.begin(2, driver_id=7)
+    store.record_driver_point(7, 12.9710, 77.5910, 1010.0)
+    store.record_driver_point(7, 12.9720, 77.5920, 1020.0)
+
+    assert store.rides_for_driver(7) == [1, 2]
+    assert store.get(1).size == 3
+    assert store.get(2).size == 2
+
+    # The first rider is dropped off; the driver still carries the second
+    first = asyncio.run(store.finish(1))
+    assert first.size == 3
+    assert first.distance_km() > 0.25
+    assert store.rides_for_driver(7) == [2]
+    store.record_driver_point(7, 12.9730, 77.5930, 1030.0)
+    assert store.get(2).size == 3
+
+    assert asyncio.run(store.finish(2)).size == 3
+    assert store.rides_for_driver(7) == []
+
+
+def test_reassigned_ride_moves_to_the_new_driver(tmp_path):
+    store = TrackStore(directory=str(tmp_path), compress=False)
+    store.begin(1, driver_id=7)
+    store.begin(1, driver_id=8)
+
+    assert store.rides_for_driver(7) == []
+    assert store.rides_for_driver(8) == [1]
+
+
+def test_free_driver_mark_is_cleared_when_a_ride_is_linked(tmp_path):
+    store = TrackStore(directory=str(tmp_path), compress=False)
+    store.mark_free(7)
+    assert store.known_free(7)
+
+    store.begin(1, driver_id=7)
+    assert not store.known_free(7)
+
+
+@pytest.mark.parametrize("compress", [False, True])
+def test_segments_of_a_rematched_ride_share_its_file(tmp_path, compress):
+    store = TrackStore(directory=str(tmp_path), compress=compress)
+    store.begin(1, driver_id=7)
+    store.record_driver_point(7, 12.9700, 77.5900, 1000.0)
+    store.record_driver_point(7, 12.9710, 77.5910, 1010.0)
+    # The driver backs out and the ride is re-matched
+    assert asyncio.run(store.finish(1)).size == 2
+
+    store.begin(1, driver_id=8)
+    store.record_driver_point(8, 12.9800, 77.6000, 1100.0)
+    assert asyncio.run(store.finish(1)).size == 1
+
+    track = store.get(1)
+    assert track.size == 3
+    assert list(track.timestamps) == [1000.0, 1010.0, 1100.0]
+    assert track.latitudes[2] == pytest.approx(12.98)
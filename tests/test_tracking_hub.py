@@ -0,0 +1,111 @@
+import asyncio
+import json
+from types import SimpleNamespace
+
+from app.models.ride import RideStatus
+from app.services.tracking.hub import TrackingHub
+
+
+class FakeSocket:
+    """
+    Records sent frames; the client stays silent until `disconnect`.
+    """
+
+    def __init__(self):
+        self.sent = []
+        self.closed = False
+        self._gone = asyncio.Event()
+
+    async def send_text(self, frame):
+        self.sent.append(json.loads(frame))
+
+    async def receive_text(self):
+        await self._gone.wait()
+        raise ConnectionError("client went away")
+
+    async def close(self):
+        self.closed = True
+
+    def disconnect(self):
+        self._gone.set()
+
+
+def make_ride(driver_id=7, status=RideStatus.IN_PROGRESS):
+    return SimpleNamespace(
+        id=1,
+        driver_id=driver_id,
+        status=status,
+        pickup_latitude=12.97,
+        pickup_longitude=77.59,
+        destination_latitude=13.07,
+        destination_longitude=77.59,
+        estimated_distance_km=14.4,
+        estimated_duration_minutes=36,
+    )
+
+
+def test_slow_subscriber_only_gets_the_latest_location():
+    hub = TrackingHub(max_queue=2)
+    subscriber = hub.subscribe(FakeSocket(), make_ride())
+    for step in range(5):
+        hub.publish_location(7, 12.98 + step * 0.001, 77.59, timestamp=1000.0 + step)
+    ride = make_ride(status=RideStatus.COMPLETED)
+    hub.publish_ride(ride)
+
+    frames = [json.loads(frame) for frame in subscriber.drain()]
+    assert [frame["status"] for frame in frames] == ["completed", "in_progress"]
+    assert frames[-1]["current_latitude"] == 12.984
+    assert subscriber.dropped == 5
+
+
+def test_locations_fan_out_to_the_ride_of_the_current_driver():
+    hub = TrackingHub()
+    first, second = hub.subscribe(FakeSocket(), make_ride()), hub.subscribe(FakeSocket(), make_ride())
+    for subscriber in (first, second):
+        subscriber.drain()
+
+    hub.publish_location(7, 12.99, 77.59, timestamp=1000.0)
+    assert all(len(subscriber.drain()) == 1 for subscriber in (first, second))
+
+    # After a reassignment only the new driver's pings are relayed
+    hub.publish_ride(make_ride(driver_id=8, status=RideStatus.ACCEPTED))
+    first.drain()
+    hub.publish_location(7, 12.99, 77.59, timestamp=1001.0)
+    assert first.drain() == []
+    hub.publish_location(8, 12.96, 77.59, timestamp=1001.0)
+    assert json.loads(first.drain()[0])["current_latitude"] == 12.96
+
+    hub.unsubscribe(first)
+    hub.unsubscribe(second)
+    assert hub.connection_count == 0
+    assert hub._driver_rides == {}
+
+
+def test_serve_sends_frames_and_sweep_evicts_idle_sockets():
+    async def scenario():
+        hub = TrackingHub(heartbeat_seconds=5.0, idle_timeout_seconds=30.0)
+        quiet, gone = FakeSocket(), FakeSocket()
+        quiet_subscriber = hub.subscribe(quiet, make_ride())
+        gone_subscriber = hub.subscribe(gone, make_ride())
+        serving = [asyncio.create_task(hub.serve(subscriber)) for subscriber in (quiet_subscriber, gone_subscriber)]
+        await asyncio.sleep(0.01)
+
+        hub.publish_location(7, 12.99, 77.59, timestamp=1000.0)
+        await asyncio.sleep(0.01)
+        assert [frame["current_latitude"] for frame in quiet.sent] == [12.97, 12.99]
+
+        gone.disconnect()
+        await asyncio.sleep(0.01)
+        assert hub.connection_count == 1
+
+        now = quiet_subscriber.last_sent
+        assert hub.sweep(now + 10.0) == 0
+        await asyncio.sleep(0.01)
+        assert "heartbeat" in quiet.sent[-1]
+
+        assert hub.sweep(now + 31.0) == 1
+        await asyncio.gather(*serving)
+        assert quiet.closed
+        assert hub.connection_count == 0
+
+    asyncio.run(scenario())